@@ -5,16 +5,30 @@ ANALISE DE CONSISTENCIA DO vehicle_counts
 
 Ferramenta de apoio para investigar diferencas entre os dados locais
 salvos em vehicle_counts e o que foi ou nao enviado para a MFWeb.
+
+As metricas sao calculadas em uma unica leitura de vehicle_counts, por uma
+conexao somente leitura (metricas_vehicle_counts.py).
 """
 
 import sqlite3
 import argparse
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from conexao_db import abrir_leitura
+from metricas_vehicle_counts import MetricasVehicleCounts, coletar_metricas
+
 class AnalisadorContagem:
     def __init__(self, db_path: str) -> None:
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
+        self.conn = abrir_leitura(db_path)
+        self._metricas: MetricasVehicleCounts | None = None
+
+    @property
+    def metricas(self) -> MetricasVehicleCounts:
+        """Metricas de vehicle_counts, coletadas em uma unica leitura na primeira consulta."""
+        if self._metricas is None:
+            self._metricas = coletar_metricas(self.conn)
+        return self._metricas
 
     # ------------------------------------------------------------------ #
     # Estrutura
@@ -25,16 +39,14 @@ class AnalisadorContagem:
         print("ESTRUTURA DO BANCO DE DADOS")
         print("=" * 60)
 
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tabelas = [t[0] for t in self.cursor.fetchall()]
+        tabelas = self.metricas.tabelas
         print(f"Tabelas encontradas: {tabelas}")
 
         if "vehicle_counts" not in tabelas:
             print("ERRO: tabela vehicle_counts nao encontrada!")
             return
 
-        self.cursor.execute("PRAGMA table_info(vehicle_counts)")
-        colunas = self.cursor.fetchall()
+        colunas = self.metricas.colunas["vehicle_counts"]
         print("\nColunas da tabela vehicle_counts:")
         for col in colunas:
             print(f"  {col[1]} ({col[2]}) - Default: {col[4]}")
@@ -57,65 +69,23 @@ class AnalisadorContagem:
         print("CONTAGEM GERAL")
         print("=" * 60)
 
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM vehicle_counts")
-            total = self.cursor.fetchone()[0]
-            print(f"Total de registros na tabela: {total}")
-
-            self.cursor.execute(
-                """
-                SELECT COUNT(*) FROM vehicle_counts
-                WHERE count_out = 1
-                  AND tempo_permanencia IS NOT NULL
-                """
-            )
-            total_saidas = self.cursor.fetchone()[0]
-            print(f"Saidas com tempo (count_out=1): {total_saidas}")
-
-            self.cursor.execute(
-                """
-                SELECT COUNT(*) FROM vehicle_counts
-                WHERE count_out = 1
-                  AND tempo_permanencia IS NULL
-                """
-            )
-            saidas_sem_tempo = self.cursor.fetchone()[0]
-            print(f"Saidas sem tempo registrado: {saidas_sem_tempo}")
-
-            self.cursor.execute(
-                """
-                SELECT enviado, COUNT(*) FROM vehicle_counts
-                WHERE count_out = 1
-                  AND tempo_permanencia IS NOT NULL
-                GROUP BY enviado
-                """
-            )
-            status_envio = self.cursor.fetchall()
-            if status_envio:
-                print("\nRegistros de saida por status de envio:")
-                for enviado, qtd in status_envio:
-                    label = "Nao enviado" if enviado == 0 else "Enviado"
-                    print(f"  {label:<12}: {qtd}")
-
-            self.cursor.execute(
-                """
-                SELECT DATE(timestamp) AS data, COUNT(*) as qtd
-                FROM vehicle_counts
-                WHERE count_out = 1
-                  AND tempo_permanencia IS NOT NULL
-                GROUP BY DATE(timestamp)
-                ORDER BY data DESC
-                LIMIT 10
-                """
-            )
-            por_dia = self.cursor.fetchall()
-            if por_dia:
-                print("\nSaidas com tempo por dia (ultimos 10):")
-                for data, qtd in por_dia:
-                    print(f"  {data}: {qtd}")
-
-        except sqlite3.Error as err:
-            print(f"ERRO na contagem geral: {err}")
+        metricas = self.metricas
+        print(f"Total de registros na tabela: {metricas.total}")
+        print(f"Saidas com tempo (count_out=1): {metricas.saidas_com_tempo}")
+        print(f"Saidas sem tempo registrado: {metricas.saidas_sem_tempo}")
+
+        status_envio = sorted(metricas.por_enviado.items(), key=lambda item: (item[0] is not None, item[0] or 0))
+        if status_envio:
+            print("\nRegistros de saida por status de envio:")
+            for enviado, qtd in status_envio:
+                label = "Nao enviado" if enviado == 0 else "Enviado"
+                print(f"  {label:<12}: {qtd}")
+
+        por_dia = metricas.dias_desc(limite=10)
+        if por_dia:
+            print("\nSaidas com tempo por dia (ultimos 10):")
+            for data, resumo in por_dia:
+                print(f"  {data}: {resumo.total}")
 
     # ------------------------------------------------------------------ #
     # Duplicados e inconsistencias
@@ -126,33 +96,19 @@ class AnalisadorContagem:
         print("ANALISE DE REGISTROS DUPLICADOS")
         print("=" * 60)
 
-        try:
-            query = """
-            SELECT timestamp, vehicle_code, tempo_permanencia,
-                   COUNT(*) AS qtd, GROUP_CONCAT(id) AS ids
-            FROM vehicle_counts
-            WHERE count_out = 1
-              AND tempo_permanencia IS NOT NULL
-            GROUP BY timestamp, vehicle_code, tempo_permanencia
-            HAVING COUNT(*) > 1
-            ORDER BY timestamp DESC
-            """
-            self.cursor.execute(query)
-            duplicados = self.cursor.fetchall()
-
-            if not duplicados:
-                print("Nenhum registro duplicado encontrado.")
-                return
-
-            total_duplicados = sum(row[3] - 1 for row in duplicados)
-            print(f"Encontrados {len(duplicados)} grupos duplicados ({total_duplicados} registros extras).")
-            for ts, code, tempo, qtd, ids in duplicados[:10]:
-                print(f"  {ts} | code={code} | tempo={tempo:.2f}s | qtd={qtd} | ids={ids}")
-            if len(duplicados) > 10:
-                print("  ...")
+        metricas = self.metricas
+        if not metricas.grupos_duplicados:
+            print("Nenhum registro duplicado encontrado.")
+            return
 
-        except sqlite3.Error as err:
-            print(f"ERRO na analise de duplicados: {err}")
+        print(
+            f"Encontrados {metricas.grupos_duplicados} grupos duplicados "
+            f"({metricas.registros_duplicados_extras} registros extras)."
+        )
+        for ts, code, tempo, qtd, ids in metricas.duplicados_recentes:
+            print(f"  {ts} | code={code} | tempo={tempo:.2f}s | qtd={qtd} | ids={ids}")
+        if metricas.grupos_duplicados > len(metricas.duplicados_recentes):
+            print("  ...")
 
     def analisar_registros_invalidos(self) -> None:
         """Aponta registros com valores questionaveis."""
@@ -160,37 +116,15 @@ class AnalisadorContagem:
         print("ANALISE DE REGISTROS INVALIDOS")
         print("=" * 60)
 
-        try:
-            checks = {
-                "vehicle_code NULL ou <= 0": """
-                    SELECT COUNT(*) FROM vehicle_counts
-                    WHERE vehicle_code IS NULL OR vehicle_code <= 0
-                """,
-                "tempo_permanencia < 1s (saidas)": """
-                    SELECT COUNT(*) FROM vehicle_counts
-                    WHERE count_out = 1
-                      AND tempo_permanencia IS NOT NULL
-                      AND tempo_permanencia < 1
-                """,
-                "tempo_permanencia >= 3600s (saidas)": """
-                    SELECT COUNT(*) FROM vehicle_counts
-                    WHERE count_out = 1
-                      AND tempo_permanencia IS NOT NULL
-                      AND tempo_permanencia >= 3600
-                """,
-                "timestamp NULL ou vazio": """
-                    SELECT COUNT(*) FROM vehicle_counts
-                    WHERE timestamp IS NULL OR timestamp = ''
-                """,
-            }
-
-            for descricao, query in checks.items():
-                self.cursor.execute(query)
-                qtd = self.cursor.fetchone()[0]
-                print(f"{descricao}: {qtd}")
-
-        except sqlite3.Error as err:
-            print(f"ERRO na analise de registros invalidos: {err}")
+        metricas = self.metricas
+        checks = {
+            "vehicle_code NULL ou <= 0": metricas.vehicle_code_invalido,
+            "tempo_permanencia < 1s (saidas)": metricas.tempos_baixos,
+            "tempo_permanencia >= 3600s (saidas)": metricas.tempos_altos,
+            "timestamp NULL ou vazio": metricas.timestamps_vazios,
+        }
+        for descricao, qtd in checks.items():
+            print(f"{descricao}: {qtd}")
 
     # ------------------------------------------------------------------ #
     # Distribuicoes
@@ -201,24 +135,12 @@ class AnalisadorContagem:
         print("ANALISE POR AREA")
         print("=" * 60)
 
-        try:
-            self.cursor.execute(
-                """
-                SELECT area, COUNT(*) FROM vehicle_counts
-                WHERE count_out = 1
-                  AND tempo_permanencia IS NOT NULL
-                GROUP BY area
-                ORDER BY COUNT(*) DESC
-                """
-            )
-            por_area = self.cursor.fetchall()
-            if por_area:
-                for area, qtd in por_area:
-                    print(f"  Area {area}: {qtd}")
-            else:
-                print("Nenhum dado de saida encontrado.")
-        except sqlite3.Error as err:
-            print(f"ERRO na analise por area: {err}")
+        por_area = self.metricas.por_area.most_common()
+        if por_area:
+            for area, qtd in por_area:
+                print(f"  Area {area}: {qtd}")
+        else:
+            print("Nenhum dado de saida encontrado.")
 
     def analisar_por_vehicle_code(self) -> None:
         """Resumo por vehicle_code."""
@@ -226,27 +148,14 @@ class AnalisadorContagem:
         print("ANALISE POR VEHICLE_CODE")
         print("=" * 60)
 
-        try:
-            self.cursor.execute(
-                """
-                SELECT vehicle_code, COUNT(*) FROM vehicle_counts
-                WHERE vehicle_code IS NOT NULL
-                  AND count_out = 1
-                  AND tempo_permanencia IS NOT NULL
-                GROUP BY vehicle_code
-                ORDER BY COUNT(*) DESC
-                """
-            )
-            por_vehicle = self.cursor.fetchall()
-            if por_vehicle:
-                for code, qtd in por_vehicle[:20]:
-                    print(f"  Codigo {code}: {qtd}")
-                if len(por_vehicle) > 20:
-                    print("  ...")
-            else:
-                print("Nenhum dado encontrado.")
-        except sqlite3.Error as err:
-            print(f"ERRO na analise por vehicle_code: {err}")
+        por_vehicle = self.metricas.top_vehicle_codes(incluir_nulo=False)
+        if por_vehicle:
+            for code, qtd in por_vehicle[:20]:
+                print(f"  Codigo {code}: {qtd}")
+            if len(por_vehicle) > 20:
+                print("  ...")
+        else:
+            print("Nenhum dado encontrado.")
 
     # ------------------------------------------------------------------ #
     # Sugerir comandos de limpeza
@@ -300,6 +209,8 @@ GROUP BY enviado;"""
         print("Banco analisado:", self.db_path)
 
         self.verificar_estrutura_banco()
+        if "vehicle_counts" not in self.metricas.tabelas:
+            return
         self.contagem_geral()
         self.analisar_duplicados()
         self.analisar_registros_invalidos()
@@ -332,8 +243,8 @@ def main() -> None:
         analisador = AnalisadorContagem(args.db_path)
         analisador.relatorio_completo()
         analisador.close()
-    except FileNotFoundError:
-        print(f"ERRO: arquivo de banco nao encontrado: {args.db_path}")
+    except (FileNotFoundError, sqlite3.OperationalError) as err:
+        print(f"ERRO: nao foi possivel abrir o banco {args.db_path}: {err}")
     except Exception as err:
         print(f"ERRO inesperado: {err}")
 
@@ -1,5 +1,4 @@
 import requests
-import sqlite3
 from requests.auth import HTTPBasicAuth
 import json
 import logging
@@ -7,19 +6,22 @@ import datetime
 import argparse
 import os
 
+from conexao_db import TAMANHO_PAGINA, abrir_escrita, abrir_leitura, ler_em_paginas
 
-# Configuração de logging
-data_log = datetime.datetime.now().strftime("%Y-%m-%d")
-# Garante diretório de logs
-try:
-    os.makedirs('log', exist_ok=True)
-    logfile = os.path.join('log', f'tmpprm_api_{data_log}.log')
-except Exception:
-    # fallback para diretório atual
-    logfile = f'tmpprm_api_{data_log}.log'
 
-logging.basicConfig(level=logging.INFO, filename=logfile, filemode='a',
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Configuração de logging (chamada no main: importar o módulo não cria arquivos de log)
+def configurar_log():
+    data_log = datetime.datetime.now().strftime("%Y-%m-%d")
+    # Garante diretório de logs
+    try:
+        os.makedirs('log', exist_ok=True)
+        logfile = os.path.join('log', f'tmpprm_api_{data_log}.log')
+    except Exception:
+        # fallback para diretório atual
+        logfile = f'tmpprm_api_{data_log}.log'
+
+    logging.basicConfig(level=logging.INFO, filename=logfile, filemode='a',
+                        format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Dados para autenticação
 url = 'https://mfweb.maisfluxo.com.br/MaisFluxoServidorWEB/rest/dwell/'
@@ -31,55 +33,55 @@ username = 'veiculos.t.permanencia'
 password = 'u41t.0r14'
 
 
-# Configuração de argparse para capturar o caminho do banco de dados como argumento
-parser = argparse.ArgumentParser(description="Envia dados de permanência de veículos para a API.")
-parser.add_argument('--db_path', type=str, default='yolo8.db', help='Caminho para o banco de dados SQLite.')
-args = parser.parse_args()
+# Garante a coluna 'enviado' na vehicle_counts
+def garantir_coluna_enviado(db_path):
+    # Leitura primeiro: a conexão de escrita (ALTER TABLE) só é aberta em bancos antigos sem a coluna
+    conn = abrir_leitura(db_path)
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(vehicle_counts)").fetchall()]
+    conn.close()
+    if 'enviado' in columns:
+        return
 
-# Caminho para o banco de dados SQLite
-db_path = args.db_path
+    conn = abrir_escrita(db_path)
+    conn.execute("ALTER TABLE vehicle_counts ADD COLUMN enviado INTEGER DEFAULT 0")
+    conn.commit()
+    conn.close()
+    logging.info("Coluna 'enviado' adicionada à tabela 'vehicle_counts'.")
 
 
 # Consulta os dados de tempo de permanência que ainda não foram enviados
-# e faz uma lista para iteração baseada no campo 'enviado'
-def buscar_dados():
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Garantir coluna 'enviado' na vehicle_counts
-    cursor.execute("PRAGMA table_info(vehicle_counts)")
-    columns = [column[1] for column in cursor.fetchall()]
-    if 'enviado' not in columns:
-        cursor.execute("ALTER TABLE vehicle_counts ADD COLUMN enviado INTEGER DEFAULT 0")
-        conn.commit()
-        logging.info("Coluna 'enviado' adicionada à tabela 'vehicle_counts'.")
+# (campo 'enviado') em páginas de tamanho fixo, entregando um registro por vez:
+# (id, timestamp, vehicle_code, tempo_permanencia, timestamp já normalizado ou None)
+def buscar_dados(db_path, tamanho_pagina=TAMANHO_PAGINA):
+    garantir_coluna_enviado(db_path)
 
     # CORREÇÃO: Filtrar vehicle_code=-1 para evitar envio de dados inválidos
     # Registros com -1 são erros de mapeamento e não devem ser enviados para API
+    # Keyset no id (conexao_db.ler_em_paginas): a memória não cresce com o backlog
+    # e, em autocommit, nenhuma leitura fica aberta enquanto os envios marcam os registros
     query = (
-        "SELECT id, timestamp, vehicle_code, tempo_permanencia "
+        f"SELECT id, timestamp, vehicle_code, tempo_permanencia, {sql_timestamp_api()} "
         "FROM vehicle_counts "
         "WHERE enviado = 0 "
         "AND tempo_permanencia IS NOT NULL "
         "AND vehicle_code != -1 "
-        "ORDER BY timestamp"
+        "AND id > ? "
+        "ORDER BY id "
+        "LIMIT ?"
     )
     logging.info("Buscando registros válidos (excluindo vehicle_code=-1)")
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    conn.close()
-
-    if not rows:
-        logging.info('Nenhum dado novo para processar.')
-        return False
-    else:
-        logging.info(f'Encontrados {len(rows)} registros não enviados para processar.')
-        return rows
+    conn = abrir_leitura(db_path)
+    try:
+        for pagina in ler_em_paginas(conn, query, tamanho_pagina=tamanho_pagina):
+            logging.info(f'Página com {len(pagina)} registros não enviados para processar.')
+            yield from pagina
+    finally:
+        conn.close()
 
 
 # Marca um registro específico como enviado
-def marcar_como_enviado(record_id):
-    conn = sqlite3.connect(db_path)
+def marcar_como_enviado(db_path, record_id):
+    conn = abrir_escrita(db_path)
     cursor = conn.cursor()
     cursor.execute("UPDATE vehicle_counts SET enviado = 1 WHERE id = ?", (record_id,))
     conn.commit()
@@ -87,9 +89,8 @@ def marcar_como_enviado(record_id):
     logging.info(f'Registro ID {record_id} marcado como enviado.')
 
 
-# Formata o tempo de permanência em um json para que seja enviado para a API.
-def enviar_dados(record_id, timestamp, vehicle_code, tempo_permanencia):
-    # Normaliza timestamp para formato "YYYY-MM-DD HH:MM:SS" (sem 'T' e sem timezone)
+# Normaliza timestamp para formato "YYYY-MM-DD HH:MM:SS" (sem 'T' e sem timezone)
+def normalizar_timestamp(timestamp):
     timestamp_api = timestamp
     try:
         # Caso venha em ISO (com 'T' e offset), converter mantendo somente até segundos
@@ -113,8 +114,58 @@ def enviar_dados(record_id, timestamp, vehicle_code, tempo_permanencia):
                 pass
     except Exception as e:
         logging.warning(f"Falha ao normalizar timestamp '{timestamp}': {e}")
-
-    dados_envio = {
+    return timestamp_api
+
+
+# A mesma normalização em SQL, calculada pelo SQLite para a página inteira na
+# consulta: ISO com 'T' (com ou sem 'Z'/offset/frações) e offset sem 'T' viram
+# "YYYY-MM-DD HH:MM:SS". O resultado só é usado se datetime(..., '+0 seconds')
+# o devolver igual (o modificador força o cálculo da data: 31/02 vira 02/03) e o
+# ano for >= 1, o mesmo critério do strptime; senão a expressão dá NULL e o
+# registro passa por normalizar_timestamp (formatos raros).
+_TIMESTAMP_CANDIDATO = (
+    "CASE WHEN instr({coluna}, 'T') > 0 THEN substr(replace(replace({coluna}, 'Z', ''), 'T', ' '), 1, 19) "
+    "WHEN length({coluna}) > 19 AND substr({coluna}, 20, 1) IN ('+', '-') THEN substr({coluna}, 1, 19) "
+    "ELSE {coluna} END"
+)
+
+
+def sql_timestamp_api(coluna='timestamp'):
+    candidato = _TIMESTAMP_CANDIDATO.format(coluna=coluna)
+    return (f"(CASE WHEN datetime({candidato}, '+0 seconds') IS {candidato} AND {candidato} >= '0001' "
+            f"THEN {candidato} END)")
+
+
+# Migração única: regrava no formato "YYYY-MM-DD HH:MM:SS" os timestamps antigos
+# em outros formatos (ISO), para que o envio e os exportadores não precisem
+# normalizar nada. Retorna (registros convertidos, registros sem formato reconhecido).
+def migrar_timestamps(db_path):
+    expressao = sql_timestamp_api()
+    conn = abrir_escrita(db_path)
+    try:
+        with conn:
+            convertidos = conn.execute(
+                f"UPDATE vehicle_counts SET timestamp = {expressao} "
+                f"WHERE {expressao} IS NOT NULL AND timestamp IS NOT {expressao}"
+            ).rowcount
+            # O que o SQL não resolve passa pela normalização completa
+            restantes = conn.execute(
+                f"SELECT id, timestamp FROM vehicle_counts WHERE timestamp IS NOT NULL AND {expressao} IS NULL"
+            ).fetchall()
+            atualizacoes = [(normalizado, record_id) for record_id, timestamp in restantes
+                            if (normalizado := normalizar_timestamp(timestamp)) != timestamp]
+            conn.executemany("UPDATE vehicle_counts SET timestamp = ? WHERE id = ?", atualizacoes)
+    finally:
+        conn.close()
+    convertidos += len(atualizacoes)
+    sem_formato = len(restantes) - len(atualizacoes)
+    logging.info(f'Migração de timestamps: {convertidos} registros convertidos, {sem_formato} sem formato reconhecido.')
+    return convertidos, sem_formato
+
+
+# Formata o tempo de permanência no json enviado para a API
+def montar_dados_envio(timestamp_api, vehicle_code, tempo_permanencia):
+    return {
         "datetime": timestamp_api,
         "dwelltime": {
             str(vehicle_code): {
@@ -123,6 +174,14 @@ def enviar_dados(record_id, timestamp, vehicle_code, tempo_permanencia):
             }
         }
     }
+
+
+# Envia o tempo de permanência de um registro para a API. timestamp_api é o
+# timestamp já normalizado na consulta (buscar_dados); sem ele, normaliza aqui.
+def enviar_dados(db_path, record_id, timestamp, vehicle_code, tempo_permanencia, timestamp_api=None):
+    if timestamp_api is None:
+        timestamp_api = normalizar_timestamp(timestamp)
+    dados_envio = montar_dados_envio(timestamp_api, vehicle_code, tempo_permanencia)
     
     # LOG para debug
     logging.info(f"Enviando timestamp: '{timestamp}' -> '{timestamp_api}' para vehicle_code {vehicle_code}")
@@ -132,7 +191,7 @@ def enviar_dados(record_id, timestamp, vehicle_code, tempo_permanencia):
 
         # Se tudo der certo, marca o registro como enviado
         if response.status_code == 204:
-            marcar_como_enviado(record_id)  # Marca este registro específico como enviado
+            marcar_como_enviado(db_path, record_id)  # Marca este registro específico como enviado
             logging.info(f'Dados enviados com sucesso para registro ID {record_id} - veículo código {vehicle_code}.')
             return True
         else:
@@ -145,16 +204,36 @@ def enviar_dados(record_id, timestamp, vehicle_code, tempo_permanencia):
         return False
 
 
-if __name__ == "__main__":
-    dados = buscar_dados()
-    if dados:
-        sucessos = 0
-        falhas = 0
-        for dado in dados:
-            record_id, timestamp, vehicle_code, tempo_permanencia = dado
-            if enviar_dados(record_id, timestamp, vehicle_code, tempo_permanencia):
-                sucessos += 1
-            else:
-                falhas += 1
-        
+def main():
+    configurar_log()
+
+    # Configuração de argparse para capturar o caminho do banco de dados como argumento
+    parser = argparse.ArgumentParser(description="Envia dados de permanência de veículos para a API.")
+    parser.add_argument('--db_path', type=str, default='yolo8.db', help='Caminho para o banco de dados SQLite.')
+    parser.add_argument('--tamanho_pagina', type=int, default=TAMANHO_PAGINA, help='Registros lidos do banco por página.')
+    parser.add_argument('--migrar_timestamps', action='store_true',
+                        help='Converte antes do envio os timestamps antigos (ISO) para "YYYY-MM-DD HH:MM:SS".')
+    args = parser.parse_args()
+
+    if args.migrar_timestamps:
+        garantir_coluna_enviado(args.db_path)
+        convertidos, sem_formato = migrar_timestamps(args.db_path)
+        print(f"{convertidos} timestamp(s) convertido(s), {sem_formato} sem formato reconhecido.")
+
+    sucessos = 0
+    falhas = 0
+    for dado in buscar_dados(args.db_path, args.tamanho_pagina):
+        record_id, timestamp, vehicle_code, tempo_permanencia, timestamp_api = dado
+        if enviar_dados(args.db_path, record_id, timestamp, vehicle_code, tempo_permanencia, timestamp_api):
+            sucessos += 1
+        else:
+            falhas += 1
+
+    if sucessos + falhas == 0:
+        logging.info('Nenhum dado novo para processar.')
+    else:
         logging.info(f'Processamento concluído: {sucessos} sucessos, {falhas} falhas.')
+
+
+if __name__ == "__main__":
+    main()
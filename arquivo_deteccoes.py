@@ -0,0 +1,261 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from registro_deteccoes import extrair_deteccoes
+
+# Registro de largura fixa (32 bytes): horário de parede (epoch) + detecção
+REGISTRO = np.dtype([
+    ('ts', '<f8'),
+    ('track_id', '<i4'),
+    ('cls', '<i2'),
+    ('conf', '<f2'),
+    ('x1', '<f4'),
+    ('y1', '<f4'),
+    ('x2', '<f4'),
+    ('y2', '<f4'),
+])
+
+SEGUNDOS_DIA = 86400
+# Índice lateral: um slot por segundo do dia com o número do primeiro registro
+# daquele segundo em diante, seguido do total de registros confirmados e do
+# último segundo preenchido
+IDX_TOTAL = SEGUNDOS_DIA
+IDX_ULTIMO_SEGUNDO = SEGUNDOS_DIA + 1
+TAMANHO_INDICE = SEGUNDOS_DIA + 2
+
+# Crescimento do arquivo de registros (em registros) a cada remapeamento
+BLOCO_CRESCIMENTO = 1 << 18
+
+
+def caminhos_dia(diretorio, camera, dia):
+    """Retorna (arquivo de registros, arquivo de índice) da câmera no dia (date)."""
+    base = os.path.join(diretorio, camera, dia.strftime('%Y%m%d'))
+    return base + '.rec', base + '.idx'
+
+
+def _inicio_do_dia(dia):
+    return datetime(dia.year, dia.month, dia.day).timestamp()
+
+
+class _ArquivoDia:
+    """Arquivos de registros e índice de um único dia, abertos para escrita."""
+
+    def __init__(self, diretorio, camera, dia):
+        self.dia = dia
+        self.inicio_dia = _inicio_do_dia(dia)
+        self.caminho_rec, self.caminho_idx = caminhos_dia(diretorio, camera, dia)
+        os.makedirs(os.path.dirname(self.caminho_rec), exist_ok=True)
+
+        if not os.path.exists(self.caminho_idx):
+            indice = np.full(TAMANHO_INDICE, -1, dtype=np.int64)
+            indice[IDX_TOTAL] = 0
+            indice.tofile(self.caminho_idx)
+        self.indice = np.memmap(self.caminho_idx, dtype=np.int64, mode='r+', shape=(TAMANHO_INDICE,))
+        self.total = int(self.indice[IDX_TOTAL])
+        self.ultimo_segundo = int(self.indice[IDX_ULTIMO_SEGUNDO])
+
+        if not os.path.exists(self.caminho_rec):
+            open(self.caminho_rec, 'wb').close()
+        self.capacidade = 0
+        self.registros = None
+        self._garantir_capacidade(self.total + 1)
+        # Horário do último frame anexado (reabertura: o do último registro ou o último segundo indexado)
+        self.ultimo_epoch = float('-inf')
+        if self.ultimo_segundo >= 0:
+            self.ultimo_epoch = self.inicio_dia + self.ultimo_segundo
+        if self.total:
+            self.ultimo_epoch = max(self.ultimo_epoch, float(self.registros[self.total - 1]['ts']))
+
+    def _garantir_capacidade(self, necessaria):
+        if necessaria <= self.capacidade:
+            return
+        capacidade = max(necessaria, self.capacidade) + BLOCO_CRESCIMENTO
+        if self.registros is not None:
+            self.registros.flush()
+            del self.registros
+        with open(self.caminho_rec, 'r+b') as f:
+            f.truncate(capacidade * REGISTRO.itemsize)
+        self.registros = np.memmap(self.caminho_rec, dtype=REGISTRO, mode='r+', shape=(capacidade,))
+        self.capacidade = capacidade
+
+    def anexar(self, epoch, xyxy, ids, cls, conf):
+        """
+        Anexa as detecções de um frame. O índice e a busca binária em ts exigem
+        horários não decrescentes: se o relógio de parede voltar (correção de NTP
+        ou manual, reancoragem do FrameClock), o frame é gravado com o último
+        horário anexado até o relógio alcançá-lo.
+
+        :return: Epoch efetivamente gravado
+        """
+        epoch = max(epoch, self.ultimo_epoch)
+        self.ultimo_epoch = epoch
+        n = len(ids)
+        segundo = min(max(int(epoch - self.inicio_dia), 0), SEGUNDOS_DIA - 1)
+
+        # Segundos sem registros apontam para o próximo registro: a busca por
+        # qualquer segundo do dia vira uma única leitura do índice
+        if segundo > self.ultimo_segundo:
+            self.indice[self.ultimo_segundo + 1:segundo + 1] = self.total
+            self.ultimo_segundo = segundo
+            self.indice[IDX_ULTIMO_SEGUNDO] = segundo
+
+        if not n:
+            return epoch
+        self._garantir_capacidade(self.total + n)
+        destino = self.registros[self.total:self.total + n]
+        destino['ts'] = epoch
+        destino['track_id'] = ids
+        destino['cls'] = cls
+        destino['conf'] = conf
+        destino['x1'] = xyxy[:, 0]
+        destino['y1'] = xyxy[:, 1]
+        destino['x2'] = xyxy[:, 2]
+        destino['y2'] = xyxy[:, 3]
+        self.total += n
+        # O total é atualizado por último: leitores nunca enxergam registros incompletos
+        self.indice[IDX_TOTAL] = self.total
+        return epoch
+
+    def flush(self):
+        self.registros.flush()
+        self.indice.flush()
+
+    def close(self):
+        self.flush()
+        capacidade_final = self.total
+        del self.registros
+        del self.indice
+        # Remove a área pré-alocada não utilizada
+        with open(self.caminho_rec, 'r+b') as f:
+            f.truncate(capacidade_final * REGISTRO.itemsize)
+
+
+class ArquivoDeteccoes:
+    def __init__(self, diretorio, camera, clock, flush_a_cada=250):
+        """
+        Arquivo de auditoria das detecções rastreadas: um arquivo de registros de
+        largura fixa (REGISTRO, 32 bytes) por câmera por dia, apenas anexado e
+        mapeado em memória, com um índice lateral de 86400 slots (um por
+        segundo) para localizar qualquer horário em tempo constante. Os horários
+        gravados nunca diminuem (ver _ArquivoDia.anexar).
+
+        :param diretorio: Diretório raiz do arquivo (um subdiretório por câmera)
+        :param camera: Nome da câmera
+        :param clock: FrameClock do loop (converte os timestamps monotônicos em horário de parede)
+        :param flush_a_cada: Frames entre descargas explícitas do mmap para o disco
+        """
+        self.diretorio = diretorio
+        self.camera = camera
+        self.clock = clock
+        self.flush_a_cada = flush_a_cada
+        self._dia = None
+        self._frames = 0
+        self._ultimo_epoch = float('-inf')
+
+    def registrar(self, current_timestamp, tracks):
+        """Anexa as detecções rastreadas de um frame (timestamp monotônico do FrameClock)."""
+        # Um relógio que volta logo após a meia-noite não reabre o dia anterior
+        epoch = max(self.clock.to_epoch(current_timestamp), self._ultimo_epoch)
+        dia = datetime.fromtimestamp(epoch).date()
+        if self._dia is None or self._dia.dia != dia:
+            if self._dia is not None:
+                self._dia.close()
+            self._dia = _ArquivoDia(self.diretorio, self.camera, dia)
+
+        xyxy, ids, cls, conf = extrair_deteccoes(tracks)
+        self._ultimo_epoch = self._dia.anexar(epoch, xyxy, ids, cls, conf)
+
+        self._frames += 1
+        if self.flush_a_cada and self._frames % self.flush_a_cada == 0:
+            self._dia.flush()
+
+    def close(self):
+        if self._dia is not None:
+            self._dia.close()
+            self._dia = None
+
+
+class LeitorArquivoDeteccoes:
+    def __init__(self, diretorio, camera, dia):
+        """
+        Leitura de um dia do arquivo de detecções. Os registros são expostos como
+        um array NumPy estruturado mapeado em memória (somente leitura); as fatias
+        por horário são views, sem cópia. Pode ser usado com o arquivo ainda em
+        gravação: apenas os registros já confirmados no índice são expostos.
+
+        :param diretorio: Diretório raiz do arquivo
+        :param camera: Nome da câmera
+        :param dia: date (ou datetime) do arquivo
+        """
+        self.dia = dia.date() if isinstance(dia, datetime) else dia
+        self.inicio_dia = _inicio_do_dia(self.dia)
+        self.caminho_rec, self.caminho_idx = caminhos_dia(diretorio, camera, self.dia)
+        self.indice = np.memmap(self.caminho_idx, dtype=np.int64, mode='r', shape=(TAMANHO_INDICE,))
+        self._mapear()
+
+    def _mapear(self):
+        self.total = int(self.indice[IDX_TOTAL])
+        self.ultimo_segundo = int(self.indice[IDX_ULTIMO_SEGUNDO])
+        if self.total:
+            self.registros = np.memmap(self.caminho_rec, dtype=REGISTRO, mode='r', shape=(self.total,))
+        else:
+            self.registros = np.zeros(0, dtype=REGISTRO)
+
+    def atualizar(self):
+        """Remapeia para enxergar registros anexados depois da abertura."""
+        self._mapear()
+
+    def _posicao(self, segundo):
+        """Número do primeiro registro com segundo do dia >= segundo."""
+        if segundo <= 0:
+            return 0
+        if segundo > self.ultimo_segundo:
+            return self.total
+        return min(int(self.indice[segundo]), self.total)
+
+    def _segundo(self, momento):
+        if isinstance(momento, datetime):
+            momento = momento.timestamp()
+        return int(np.floor(momento - self.inicio_dia))
+
+    def intervalo(self, inicio=None, fim=None):
+        """
+        Registros com inicio <= horário < fim (datetime ou epoch), como view sem cópia.
+        A busca usa o índice por segundo; os limites dentro do segundo são refinados
+        por busca binária na coluna ts.
+        """
+        a = 0 if inicio is None else self._posicao(self._segundo(inicio))
+        b = self.total if fim is None else self._posicao(self._segundo(fim) + 1)
+        fatia = self.registros[a:b]
+        if inicio is not None:
+            limite = inicio.timestamp() if isinstance(inicio, datetime) else inicio
+            fatia = fatia[np.searchsorted(fatia['ts'], limite, side='left'):]
+        if fim is not None:
+            limite = fim.timestamp() if isinstance(fim, datetime) else fim
+            fatia = fatia[:np.searchsorted(fatia['ts'], limite, side='left')]
+        return fatia
+
+    def track(self, track_id, inicio=None, fim=None):
+        """Registros de um track_id no intervalo (cópia, pois o filtro não é contíguo)."""
+        fatia = self.intervalo(inicio, fim)
+        return fatia[fatia['track_id'] == track_id]
+
+
+def consultar(diretorio, camera, inicio, fim, track_id=None):
+    """
+    Gera os registros da câmera entre inicio e fim (datetimes), um array por dia,
+    opcionalmente filtrados por track_id. Dias sem arquivo são ignorados.
+    """
+    dia = inicio.date()
+    while dia <= fim.date():
+        if os.path.exists(caminhos_dia(diretorio, camera, dia)[1]):
+            leitor = LeitorArquivoDeteccoes(diretorio, camera, dia)
+            if track_id is None:
+                registros = leitor.intervalo(inicio, fim)
+            else:
+                registros = leitor.track(track_id, inicio, fim)
+            if len(registros):
+                yield registros
+        dia += timedelta(days=1)
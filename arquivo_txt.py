@@ -0,0 +1,60 @@
+import hashlib
+import os
+
+
+def montar_txt(client_code, linhas_dados):
+    """
+    Monta o conteúdo de um TXT de exportação (cabeçalho + bloco de dados).
+
+    :param client_code: Código do cliente (empresa)
+    :param linhas_dados: Linhas 'codigo;timestamp;entradas;saidas;' já formatadas
+    :return: Conteúdo do arquivo (str, quebras de linha '\\n')
+    """
+    partes = [
+        "<inicio cabecalho>",
+        f"empresa={client_code}",
+        "fonte=pixforce",
+        "servidor=servidor",
+        "<fim cabecalho>",
+        "<inicio dados>",
+        *linhas_dados,
+        "<fim dados>",
+    ]
+    return "\n".join(partes) + "\n"
+
+
+def gravar_txt_com_hash(output_directory, prefixo, conteudo, fsync=True):
+    """
+    Grava o TXT já com o nome final '{prefixo}_{SHA256}.txt'.
+
+    O hash é calculado sobre os bytes em memória, sem reler o arquivo. Os bytes
+    vão para um temporário no mesmo diretório (sem extensão .txt, ignorado por
+    quem envia os arquivos) que é renomeado com os.replace: uma queda no meio
+    da gravação nunca deixa um .txt parcial ou sem hash.
+
+    :param output_directory: Diretório de saída (criado se não existir)
+    :param prefixo: Início do nome do arquivo (ex.: '{cliente}_{YYYYMMDDHHMMSS}')
+    :param conteudo: Conteúdo do arquivo (montar_txt)
+    :param fsync: Garante os bytes no disco antes do rename
+    :return: Caminho do arquivo final
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    # Quebras de linha e codificação de um open(..., 'w') em modo texto: o hash
+    # continua o mesmo dos arquivos gerados antes
+    dados = conteudo.replace("\n", os.linesep).encode()
+    file_hash = hashlib.sha256(dados).hexdigest().upper()
+    final_path = os.path.join(output_directory, f"{prefixo}_{file_hash}.txt")
+
+    temp_path = os.path.join(output_directory, f".{prefixo}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(dados)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, final_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return final_path
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark da gravacao dos TXT de exportacao em um backfill (padrao: um mes de
+arquivos de meia hora, 48 por dia).
+
+Compara, sobre o mesmo conteudo:
+
+- legado: grava o .txt, reabre para calcular o SHA-256 em blocos de 4 KB e
+  renomeia (como dbexport_halfhour/dbexport_consolidate faziam);
+- memoria: hash calculado sobre os bytes em memoria e temporario + os.replace
+  direto para o nome final (arquivo_txt.gravar_txt_com_hash), sem fsync;
+- memoria_fsync: o mesmo com fsync antes do rename (padrao dos exportadores).
+
+Informa arquivos/s e MB/s de cada modo e o ganho em relacao ao legado. Confere
+tambem se os modos geram os mesmos nomes (mesmo hash). Rode com --dir no mesmo
+disco do diretorio de TXT das cameras: um tmpfs esconde o custo de I/O.
+
+Exemplos:
+    python benchmark_exportacao_txt.py
+    python benchmark_exportacao_txt.py --dias 31 --codigos 20 --dir D:\\mfvc\\txt_bench --saida export.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from arquivo_txt import gravar_txt_com_hash, montar_txt
+from benchmark_pipeline import commit_atual
+
+MODOS = ("legado", "memoria", "memoria_fsync")
+
+
+def gerar_intervalos(dias: int, codigos: int, client_code: str) -> list[tuple[str, str]]:
+    """Conteudo de cada arquivo de meia hora do backfill: [(prefixo, conteudo)]."""
+    inicio = datetime(2024, 1, 1, 0, 30)
+    arquivos = []
+    for i in range(dias * 48):
+        intervalo = inicio + timedelta(minutes=30 * i)
+        rounded_time = intervalo.strftime("%Y-%m-%d %H:%M:%S")
+        linhas = [f"{26051 + c};{rounded_time};{(i * 7 + c) % 40};{(i * 3 + c) % 35};" for c in range(codigos)]
+        arquivos.append((f"{client_code}_{intervalo.strftime('%Y%m%d%H%M%S')}", montar_txt(client_code, linhas)))
+    return arquivos
+
+
+def gravar_legado(output_directory: str, prefixo: str, conteudo: str) -> str:
+    """Caminho anterior: grava, rele o arquivo para o hash e renomeia."""
+    file_path = os.path.join(output_directory, f"{prefixo}.txt")
+    with open(file_path, "w") as file:
+        file.write(conteudo)
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(4096), b""):
+            hash_sha256.update(block)
+    final_path = os.path.join(output_directory, f"{prefixo}_{hash_sha256.hexdigest().upper()}.txt")
+    os.rename(file_path, final_path)
+    return final_path
+
+
+def medir_modo(modo: str, arquivos: list[tuple[str, str]], diretorio: str) -> tuple[dict, list[str]]:
+    saida = os.path.join(diretorio, modo)
+    shutil.rmtree(saida, ignore_errors=True)
+    os.makedirs(saida)
+
+    inicio = time.perf_counter()
+    if modo == "legado":
+        nomes = [gravar_legado(saida, prefixo, conteudo) for prefixo, conteudo in arquivos]
+    else:
+        fsync = modo == "memoria_fsync"
+        nomes = [gravar_txt_com_hash(saida, prefixo, conteudo, fsync=fsync) for prefixo, conteudo in arquivos]
+    duracao = time.perf_counter() - inicio
+
+    total_bytes = sum(os.path.getsize(nome) for nome in nomes)
+    shutil.rmtree(saida, ignore_errors=True)
+    resultado = {
+        "segundos": round(duracao, 3),
+        "arquivos_s": round(len(arquivos) / duracao, 1),
+        "mb_s": round(total_bytes / duracao / 1e6, 2),
+    }
+    return resultado, [os.path.basename(nome) for nome in nomes]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark da gravacao dos TXT de exportacao (hash + rename).")
+    parser.add_argument("--dias", type=int, default=30, help="Dias de backfill (48 arquivos por dia).")
+    parser.add_argument("--codigos", type=int, default=10, help="Codigos de veiculo por arquivo.")
+    parser.add_argument("--client_code", type=str, default="1724", help="Codigo do cliente nos arquivos.")
+    parser.add_argument("--dir", type=str, default=None, help="Diretorio dos arquivos temporarios (use o disco dos TXT).")
+    parser.add_argument("--saida", type=str, default=None, help="Grava o resultado em JSON.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    diretorio = args.dir or tempfile.mkdtemp(prefix="bench_export_")
+    os.makedirs(diretorio, exist_ok=True)
+    arquivos = gerar_intervalos(args.dias, args.codigos, args.client_code)
+
+    resultados = {}
+    nomes = {}
+    try:
+        for modo in MODOS:
+            resultados[modo], nomes[modo] = medir_modo(modo, arquivos, diretorio)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    referencia = resultados["legado"]
+    print(f"Backfill: {args.dias} dia(s), {len(arquivos)} arquivos, {args.codigos} codigos por arquivo | diretorio: {args.dir or '(temporario)'}")
+    print(f"{'modo':<14} {'segundos':>9} {'arquivos/s':>11} {'MB/s':>8} {'ganho':>8}")
+    for modo, dados in resultados.items():
+        ganho = dados["arquivos_s"] / referencia["arquivos_s"]
+        print(f"{modo:<14} {dados['segundos']:>9.3f} {dados['arquivos_s']:>11.1f} {dados['mb_s']:>8.2f} {ganho:>7.2f}x")
+    mesmos_nomes = all(nomes[modo] == nomes["legado"] for modo in MODOS)
+    print(f"Mesmos nomes (hash) em todos os modos: {'sim' if mesmos_nomes else 'NAO'}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"commit": commit_atual(), "dias": args.dias, "codigos": args.codigos,
+                       "arquivos": len(arquivos), "modos": resultados, "mesmos_nomes": mesmos_nomes}, arquivo, indent=2)
+        print(f"Resultado gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline do pipeline de contagem (sem camera).
+
+Reproduz um video gravado (ou frames sinteticos) pelas mesmas etapas do
+yolo16_v4.py (PipelineContagem) o mais rapido possivel, com um detector
+sintetico deterministico ou com o modelo YOLO real, e informa:
+
+- fps de ponta a ponta;
+- percentis (p50/p90/p99) de latencia por etapa;
+- pico de memoria (RSS) do processo;
+- linhas gravadas em vehicle_counts.
+
+O resultado pode ser gravado em JSON (--saida) para comparar execucoes entre
+commits. O relogio do tracking e simulado a partir do fps informado, de modo
+que permanencias e timeouts independem da velocidade da maquina.
+
+Exemplos:
+    python benchmark_pipeline.py --frames 3000 --saida bench.json
+    python benchmark_pipeline.py --video gravacao.mp4 --detector yolo --model_path modelo.pt
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from conexao_db import PERFIL_PADRAO, PERFIS_PRAGMAS
+from deteccoes import DetectorSintetico
+from frame_clock import FrameClock
+from log_config import configurar_logging, destinos_em_diretorio
+from permanence_tracker import ArrayPermanenceTracker, PermanenceTracker
+from pipeline_contagem import PipelineContagem, carregar_contador, init_db
+from registro_deteccoes import GravadorDeteccoes
+from vehicle_code_resolver import VehicleCodeResolver
+
+CLASSES_CONTADAS = [0, 1, 2, 3, 4]
+AREA_TO_FAIXA = {'area_1': 'faixa1', 'area_2': 'faixa2'}
+
+
+def load_config(file_path: str) -> dict:
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+class DetectorYolo:
+    """Detector real: mesmos parametros de model.track() usados pelo yolo16_v4.py."""
+
+    def __init__(self, model_path: str) -> None:
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+
+    def track(self, im0, **kwargs):
+        results = self.model.track(im0, persist=True, stream=True, show=False,
+                                   classes=CLASSES_CONTADAS, conf=0.60, imgsz=1024, verbose=False)
+        return list(results)
+
+
+def fonte_frames(video: str | None, largura: int, altura: int, n_frames: int, frame_skip: int):
+    """
+    Gera (indice, frame) a partir do video (ate n_frames processados ou fim do
+    arquivo) ou de frames sinteticos. Apenas 1 a cada frame_skip e entregue,
+    como no loop principal.
+    """
+    if video:
+        cap = cv2.VideoCapture(video)
+        if not cap.isOpened():
+            raise RuntimeError(f"Nao foi possivel abrir o video {video}")
+        lidos = entregues = 0
+        try:
+            while not n_frames or entregues < n_frames:
+                success, im0 = cap.read()
+                if not success:
+                    break
+                lidos += 1
+                if lidos % frame_skip != 0:
+                    continue
+                entregues += 1
+                yield lidos, im0
+        finally:
+            cap.release()
+        return
+
+    base = np.full((altura, largura, 3), 90, dtype=np.uint8)
+    for indice in range(1, n_frames * frame_skip + 1):
+        if indice % frame_skip != 0:
+            continue
+        # Copia por frame para reproduzir o custo de cap.read() e o desenho sobre um frame novo
+        yield indice, base.copy()
+
+
+def resumir_tempos(duracoes: list[float]) -> dict:
+    valores = np.asarray(duracoes, dtype=np.float64) * 1000.0
+    if not len(valores):
+        return {"amostras": 0}
+    p50, p90, p99 = np.percentile(valores, [50, 90, 99])
+    return {
+        "amostras": int(len(valores)),
+        "media_ms": round(float(valores.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p90_ms": round(float(p90), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(valores.max()), 4),
+        "total_s": round(float(valores.sum()) / 1000.0, 4),
+    }
+
+
+def rss_pico_mb() -> float | None:
+    """Pico de memoria residente do processo em MB (resource no Linux/macOS, psutil no Windows)."""
+    try:
+        import resource
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def commit_atual() -> str | None:
+    try:
+        saida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return saida.stdout.strip() or None
+
+
+def linhas_gravadas(cursor: sqlite3.Cursor) -> dict:
+    total, entradas, saidas, permanencias = cursor.execute(
+        """SELECT COUNT(*),
+                  COALESCE(SUM(count_in = 1), 0),
+                  COALESCE(SUM(count_out = 1 AND tempo_permanencia IS NULL), 0),
+                  COALESCE(SUM(tempo_permanencia IS NOT NULL), 0)
+           FROM vehicle_counts"""
+    ).fetchone()
+    return {"total": total, "entradas": entradas, "saidas": saidas, "permanencias": permanencias}
+
+
+def executar_benchmark(args: argparse.Namespace) -> dict:
+    config = load_config(args.config_path)
+    region_points = load_config(args.area_config_path)['area_1']
+    second_region_points = load_config(args.area_config_path).get('area_2', None)
+    permanencia_config = load_config(args.permanencia_config_path)
+
+    if args.detector == 'yolo':
+        detector = DetectorYolo(args.model_path)
+    else:
+        detector = DetectorSintetico(args.largura, args.altura, n_veiculos=args.veiculos, semente=args.semente)
+    class_names = detector.names
+
+    resolver = VehicleCodeResolver(config, class_names, AREA_TO_FAIXA, classes=CLASSES_CONTADAS)
+    counter = carregar_contador(config, region_points, class_names)
+
+    conn, cursor = init_db(args.db_path, perfil=args.sqlite_perfil)
+    linhas_antes = linhas_gravadas(cursor)
+
+    # Relogio simulado: o frame N ocorre em N / fps segundos apos o inicio
+    inicio = datetime.strptime(args.inicio, '%Y-%m-%d %H:%M:%S')
+    clock = FrameClock(wall_anchor=inicio.timestamp(), mono_anchor=0.0)
+    tracker_cls = ArrayPermanenceTracker if args.track_store == 'array' else PermanenceTracker
+    tracker = tracker_cls(cursor, conn, config['codigocliente'], permanencia_config, clock=clock)
+
+    pipeline = PipelineContagem(cursor, conn, tracker, resolver, permanencia_config, counter=counter,
+                                region_points=region_points, second_region_points=second_region_points,
+                                class_names=class_names, client_code=config['codigocliente'], fps=args.fps)
+
+    gravador = None
+    if args.record:
+        gravador = GravadorDeteccoes(
+            args.record, class_names, clock, fps=args.fps, frame_shape=(args.altura, args.largura),
+            extras={'config_path': args.config_path, 'area_config_path': args.area_config_path,
+                    'permanencia_config_path': args.permanencia_config_path, 'classes': CLASSES_CONTADAS}
+        )
+
+    tempos: dict[str, list[float]] = {}
+    frames = 0
+    inicio_execucao = time.perf_counter()
+    marca = inicio_execucao
+    for indice, im0 in fonte_frames(args.video, args.largura, args.altura, args.frames, args.frame_skip):
+        tempos.setdefault('leitura', []).append(time.perf_counter() - marca)
+
+        current_timestamp = clock.tick(indice / args.fps)
+
+        marca = time.perf_counter()
+        tracks = detector.track(im0)
+        tempos.setdefault('inferencia', []).append(time.perf_counter() - marca)
+        if gravador is not None:
+            gravador.registrar(current_timestamp, tracks)
+
+        marca_frame = time.perf_counter()
+        pipeline.processar_frame(im0, tracks, current_timestamp, desenhar=args.desenhar, tempos=tempos)
+        marca = time.perf_counter()
+        tempos.setdefault('pipeline', []).append(marca - marca_frame)
+        frames += 1
+
+    duracao = time.perf_counter() - inicio_execucao
+    if gravador is not None:
+        gravador.close()
+    linhas_depois = linhas_gravadas(cursor)
+    if counter is None:
+        tempos.pop('contagem', None)
+    tracker.close()
+
+    return {
+        "commit": commit_atual(),
+        "data_execucao": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "video": args.video,
+            "detector": args.detector,
+            "frames": args.frames,
+            "frame_skip": args.frame_skip,
+            "largura": args.largura,
+            "altura": args.altura,
+            "veiculos": args.veiculos,
+            "semente": args.semente,
+            "fps_video": args.fps,
+            "track_store": args.track_store,
+            "sqlite_perfil": args.sqlite_perfil,
+            "desenhar": args.desenhar,
+        },
+        "contagem_disponivel": counter is not None,
+        "frames_processados": frames,
+        "duracao_s": round(duracao, 4),
+        "fps": round(frames / duracao, 2) if duracao else None,
+        "etapas": {etapa: resumir_tempos(duracoes) for etapa, duracoes in tempos.items()},
+        "rss_pico_mb": rss_pico_mb(),
+        "linhas_db": {chave: valor - linhas_antes[chave] for chave, valor in linhas_depois.items()},
+    }
+
+
+def imprimir_resultado(resultado: dict) -> None:
+    print("BENCHMARK DO PIPELINE DE CONTAGEM")
+    print("=" * 60)
+    print(f"Commit.......: {resultado['commit']}")
+    print(f"Frames.......: {resultado['frames_processados']}")
+    print(f"Duracao......: {resultado['duracao_s']:.2f}s")
+    print(f"FPS..........: {resultado['fps']}")
+    print(f"RSS pico.....: {resultado['rss_pico_mb']} MB")
+    print(f"Linhas no DB.: {resultado['linhas_db']}")
+    if not resultado['contagem_disponivel']:
+        print("Contagem.....: ObjectCounter4 indisponivel (etapa de contagem nao medida)")
+    print("-" * 60)
+    print(f"{'Etapa':<20}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for etapa, resumo in resultado['etapas'].items():
+        if not resumo.get('amostras'):
+            continue
+        print(f"{etapa:<20}{resumo['p50_ms']:>10.3f}{resumo['p90_ms']:>10.3f}{resumo['p99_ms']:>10.3f}{resumo['total_s']:>10.2f}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark offline do pipeline de contagem (video gravado ou frames sinteticos)."
+    )
+    parser.add_argument("--video", type=str, default=None, help="Video gravado. Sem este argumento usa frames sinteticos.")
+    parser.add_argument("--frames", type=int, default=2000, help="Frames processados (0 = video inteiro). Padrao: 2000.")
+    parser.add_argument("--frame_skip", type=int, default=1, help="Processa 1 a cada N frames lidos (producao usa 2). Padrao: 1.")
+    parser.add_argument("--detector", choices=["sintetico", "yolo"], default="sintetico", help="Detector usado. Padrao: sintetico.")
+    parser.add_argument("--model_path", type=str, default=None, help="Modelo YOLO (.pt) para --detector yolo.")
+    parser.add_argument("--veiculos", type=int, default=12, help="Veiculos simultaneos do detector sintetico. Padrao: 12.")
+    parser.add_argument("--semente", type=int, default=0, help="Semente do detector sintetico. Padrao: 0.")
+    parser.add_argument("--largura", type=int, default=1280, help="Largura dos frames sinteticos. Padrao: 1280.")
+    parser.add_argument("--altura", type=int, default=720, help="Altura dos frames sinteticos. Padrao: 720.")
+    parser.add_argument("--fps", type=float, default=25.0, help="FPS do video usado no relogio simulado. Padrao: 25.")
+    parser.add_argument("--inicio", type=str, default="2024-01-15 08:00:00", help="Data/hora do primeiro frame no relogio simulado.")
+    parser.add_argument("--config_path", type=str, default="config/camera1_config.json", help="Configuracao do cliente.")
+    parser.add_argument("--area_config_path", type=str, default="area/camera1_area.json", help="Linhas de contagem.")
+    parser.add_argument("--permanencia_config_path", type=str, default="area/camera1_area_tp.json", help="Areas de permanencia.")
+    parser.add_argument("--sqlite_perfil", choices=sorted(PERFIS_PRAGMAS), default=PERFIL_PADRAO, help="Perfil de PRAGMAs do SQLite (conexao_db.PERFIS_PRAGMAS).")
+    parser.add_argument("--track_store", choices=["dict", "array"], default="dict", help="Armazenamento dos tracks ativos.")
+    parser.add_argument("--desenhar", action="store_true", help="Inclui o desenho de areas e rotulos (como em producao).")
+    parser.add_argument("--db_path", type=str, default=None, help="Banco SQLite de saida (padrao: arquivo temporario novo).")
+    parser.add_argument("--log_dir", type=str, default=None, help="Diretorio dos logs (padrao: diretorio temporario).")
+    parser.add_argument("--record", type=str, default=None, help="Grava as deteccoes em um log para replay_deteccoes.py.")
+    parser.add_argument("--saida", type=str, default=None, help="Arquivo JSON com o resultado.")
+    args = parser.parse_args()
+    if args.detector == "yolo" and not args.model_path:
+        parser.error("--detector yolo requer --model_path")
+    if not args.video and not args.frames:
+        parser.error("--frames deve ser maior que zero com frames sinteticos")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+        if args.db_path is None:
+            args.db_path = os.path.join(tmp, "benchmark.db")
+        listener = configurar_logging(destinos=destinos_em_diretorio(args.log_dir or tmp))
+        try:
+            resultado = executar_benchmark(args)
+        finally:
+            listener.stop()
+
+    imprimir_resultado(resultado)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
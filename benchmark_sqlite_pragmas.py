@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark de gravacao no vehicle_counts por perfil de PRAGMAs.
+
+Abre um banco novo com init_db em cada perfil de conexao_db.PERFIS_PRAGMAS e
+reproduz o padrao de escrita das cameras:
+
+- insercao: uma saida + commit por evento (VehicleCountsRepository.record_exits);
+- permanencia: tempo de permanencia + commit por veiculo
+  (VehicleCountsRepository.record_dwell, usado pelo PermanenceTracker).
+
+Informa operacoes/s e latencia de commit (p50/p99) por perfil e o ganho em
+relacao ao primeiro perfil. O custo do fsync depende do disco: rode com
+--dir apontando para o mesmo disco do yolo8.db (um tmpfs esconde a diferenca).
+
+Exemplos:
+    python benchmark_sqlite_pragmas.py
+    python benchmark_sqlite_pragmas.py --linhas 20000 --dir D:\\mfvc --saida pragmas.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmark_pipeline import commit_atual, resumir_tempos
+from conexao_db import PERFIS_PRAGMAS
+from pipeline_contagem import init_db
+from vehicle_counts_repository import VehicleCountsRepository
+
+def _timestamp(i: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(1_700_000_000 + i))
+
+
+def medir_perfil(perfil: str, diretorio: str, linhas: int) -> dict:
+    db_path = os.path.join(diretorio, f"bench_{perfil}.db")
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + sufixo):
+            os.remove(db_path + sufixo)
+
+    conn, cursor = init_db(db_path, perfil=perfil)
+    repository = VehicleCountsRepository(conn)
+    efetivos = {
+        nome: cursor.execute(f"PRAGMA {nome}").fetchone()[0]
+        for nome in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+    }
+
+    commits_insercao = []
+    inicio = time.perf_counter()
+    for i in range(linhas):
+        repository.record_exits("area_1", 26051 + i % 10, 1, _timestamp(i), commit=False)
+        marca = time.perf_counter()
+        conn.commit()
+        commits_insercao.append(time.perf_counter() - marca)
+    duracao_insercao = time.perf_counter() - inicio
+
+    commits_permanencia = []
+    inicio = time.perf_counter()
+    for i in range(linhas):
+        repository.record_dwell("area_1", 26051 + i % 10, _timestamp(i), float(i % 300), commit=False)
+        marca = time.perf_counter()
+        conn.commit()
+        commits_permanencia.append(time.perf_counter() - marca)
+    duracao_permanencia = time.perf_counter() - inicio
+    conn.close()
+
+    return {
+        "pragmas": efetivos,
+        "insercao": {
+            "ops_s": round(linhas / duracao_insercao, 1),
+            "commit": resumir_tempos(commits_insercao),
+        },
+        "permanencia": {
+            "ops_s": round(linhas / duracao_permanencia, 1),
+            "commit": resumir_tempos(commits_permanencia),
+        },
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de gravacao no SQLite por perfil de PRAGMAs.")
+    parser.add_argument("--linhas", type=int, default=5000, help="Eventos gravados por cenario.")
+    parser.add_argument("--perfis", nargs="+", choices=sorted(PERFIS_PRAGMAS), default=["legado", "camera"], help="Perfis comparados (o primeiro e a referencia).")
+    parser.add_argument("--dir", type=str, default=None, help="Diretorio dos bancos temporarios (use o disco do yolo8.db).")
+    parser.add_argument("--saida", type=str, default=None, help="Grava o resultado em JSON.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    diretorio = args.dir or tempfile.mkdtemp(prefix="bench_pragmas_")
+    os.makedirs(diretorio, exist_ok=True)
+
+    resultados = {}
+    try:
+        for perfil in args.perfis:
+            resultados[perfil] = medir_perfil(perfil, diretorio, args.linhas)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(diretorio, ignore_errors=True)
+        else:
+            for perfil in args.perfis:
+                for sufixo in ("", "-wal", "-shm"):
+                    caminho = os.path.join(diretorio, f"bench_{perfil}.db{sufixo}")
+                    if os.path.exists(caminho):
+                        os.remove(caminho)
+
+    referencia = resultados[args.perfis[0]]
+    print(f"Eventos por cenario: {args.linhas} | diretorio: {args.dir or '(temporario)'}")
+    print(f"{'perfil':<10} {'cenario':<12} {'ops/s':>10} {'commit p50':>12} {'commit p99':>12} {'ganho':>8}")
+    for perfil, resultado in resultados.items():
+        for cenario in ("insercao", "permanencia"):
+            dados = resultado[cenario]
+            ganho = dados["ops_s"] / referencia[cenario]["ops_s"]
+            print(
+                f"{perfil:<10} {cenario:<12} {dados['ops_s']:>10.1f} "
+                f"{dados['commit']['p50_ms']:>10.3f}ms {dados['commit']['p99_ms']:>10.3f}ms {ganho:>7.2f}x"
+            )
+        pragmas = ", ".join(f"{nome}={valor}" for nome, valor in resultado["pragmas"].items())
+        print(f"{'':<10} {pragmas}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"commit": commit_atual(), "linhas": args.linhas, "perfis": resultados}, arquivo, indent=2)
+        print(f"Resultado gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
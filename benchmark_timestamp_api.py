@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da normalizacao dos timestamps enviados para a API de
+permanencia, sobre um banco com formatos misturados (padrao: 100 mil
+registros, ~70% ja em "YYYY-MM-DD HH:MM:SS", o resto ISO com 'T', 'Z',
+offset, fracoes de segundo e alguns invalidos).
+
+Compara:
+
+- legado: le (id, timestamp) e chama normalizar_timestamp em cada registro
+  (replace/split, strptime e fromisoformat), como enviar_dados fazia;
+- sql: o timestamp ja sai normalizado da consulta (sql_timestamp_api, a mesma
+  expressao de buscar_dados e do daemon); so os registros que o SQL nao
+  resolve (NULL) passam por normalizar_timestamp;
+- migrado: depois de migrar_timestamps (custo informado a parte), a leitura
+  direta da coluna, sem normalizacao nenhuma.
+
+Confere que os tres modos entregam exatamente os mesmos timestamps.
+
+Exemplos:
+    python benchmark_timestamp_api.py
+    python benchmark_timestamp_api.py --registros 500000 --saida timestamps.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from api_tempopermanencia import migrar_timestamps, normalizar_timestamp, sql_timestamp_api
+from benchmark_pipeline import commit_atual
+from conexao_db import abrir_escrita, abrir_leitura
+from vehicle_counts_repository import VehicleCountsRepository
+
+FORMATOS = (
+    (0.70, lambda t: t.strftime("%Y-%m-%d %H:%M:%S")),
+    (0.10, lambda t: t.strftime("%Y-%m-%dT%H:%M:%S-03:00")),
+    (0.06, lambda t: t.strftime("%Y-%m-%dT%H:%M:%SZ")),
+    (0.06, lambda t: t.strftime("%Y-%m-%dT%H:%M:%S.%f")),
+    (0.04, lambda t: t.strftime("%Y-%m-%d %H:%M:%S+00:00")),
+    (0.03, lambda t: t.strftime("%Y-%m-%d %H:%M:%S.%f")),
+    (0.005, lambda t: t.strftime("%Y-02-31 %H:%M:%S")),
+    (0.005, lambda t: t.strftime("%Y-02-30T%H:%M:%S-03:00")),
+)
+
+
+def criar_banco(db_path: str, registros: int) -> None:
+    random.seed(48)
+    pesos = [peso for peso, _ in FORMATOS]
+    inicio = datetime(2024, 1, 1)
+    linhas = []
+    for i in range(registros):
+        instante = inicio + timedelta(seconds=random.randint(0, 90 * 86400), microseconds=random.randint(0, 999999))
+        formato = random.choices(FORMATOS, pesos)[0][1]
+        linhas.append(("area_1", 26051 + i % 10, 0, 1, formato(instante), 10.0 + i % 300))
+    conn = abrir_escrita(db_path)
+    VehicleCountsRepository(conn).ensure_schema()
+    conn.executemany(
+        "INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado) "
+        "VALUES (?, ?, ?, ?, ?, ?, 0)", linhas
+    )
+    conn.commit()
+    conn.close()
+
+
+def ler_legado(db_path: str) -> list[str]:
+    conn = abrir_leitura(db_path)
+    linhas = conn.execute("SELECT id, timestamp FROM vehicle_counts ORDER BY id").fetchall()
+    conn.close()
+    return [normalizar_timestamp(timestamp) for _, timestamp in linhas]
+
+
+def ler_sql(db_path: str) -> list[str]:
+    conn = abrir_leitura(db_path)
+    linhas = conn.execute(f"SELECT id, timestamp, {sql_timestamp_api()} FROM vehicle_counts ORDER BY id").fetchall()
+    conn.close()
+    return [normalizar_timestamp(timestamp) if timestamp_api is None else timestamp_api
+            for _, timestamp, timestamp_api in linhas]
+
+
+def ler_migrado(db_path: str) -> list[str]:
+    conn = abrir_leitura(db_path)
+    linhas = conn.execute("SELECT id, timestamp FROM vehicle_counts ORDER BY id").fetchall()
+    conn.close()
+    return [timestamp for _, timestamp in linhas]
+
+
+def medir(funcao, db_path: str, repeticoes: int) -> tuple[float, list[str]]:
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(db_path)
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Micro-benchmark da normalizacao dos timestamps da API de permanencia.")
+    parser.add_argument("--registros", type=int, default=100_000, help="Registros no banco de teste.")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repeticoes de cada modo (vale a melhor).")
+    parser.add_argument("--saida", type=str, default=None, help="Grava o resultado em JSON.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    diretorio = tempfile.mkdtemp(prefix="bench_timestamp_")
+    try:
+        db_path = os.path.join(diretorio, "timestamps.db")
+        criar_banco(db_path, args.registros)
+
+        resultados = {}
+        saidas = {}
+        for modo, funcao in (("legado", ler_legado), ("sql", ler_sql)):
+            resultados[modo], saidas[modo] = medir(funcao, db_path, args.repeticoes)
+        inicio = time.perf_counter()
+        convertidos, sem_formato = migrar_timestamps(db_path)
+        migracao = time.perf_counter() - inicio
+        resultados["migrado"], saidas["migrado"] = medir(ler_migrado, db_path, args.repeticoes)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    referencia = resultados["legado"]
+    print(f"{args.registros} registros | migracao: {convertidos} convertidos, {sem_formato} sem formato "
+          f"reconhecido em {migracao:.3f}s")
+    print(f"{'modo':<9} {'segundos':>9} {'registros/s':>12} {'ganho':>8}")
+    for modo, duracao in resultados.items():
+        print(f"{modo:<9} {duracao:>9.3f} {args.registros / duracao:>12.0f} {referencia / duracao:>7.2f}x")
+    mesmos = saidas["sql"] == saidas["legado"] and saidas["migrado"] == saidas["legado"]
+    print(f"Mesmos timestamps em todos os modos: {'sim' if mesmos else 'NAO'}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"commit": commit_atual(), "registros": args.registros, "segundos": resultados,
+                       "migracao_segundos": round(migracao, 3), "convertidos": convertidos,
+                       "sem_formato": sem_formato, "mesmos_timestamps": mesmos}, arquivo, indent=2)
+        print(f"Resultado gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import logging
+import os
+import threading
+import time
+
+from conexao_db import abrir_escrita
+
+logger = logging.getLogger("checkpoint_wal")
+
+# Valor padrão do SQLite, restaurado na conexão da câmera se a thread de checkpoint parar
+AUTOCHECKPOINT_PADRAO = 1000
+
+
+def _travar(caminho):
+    """
+    Tenta o lock exclusivo (sem esperar) de um arquivo entre processos. Retorna o
+    arquivo aberto (mantenha-o aberto enquanto quiser o lock) ou None se outro
+    processo já o detém. O sistema libera o lock se o processo morrer.
+    """
+    arquivo = open(caminho, 'a+b')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+class CheckpointWAL:
+    def __init__(self, db_path, intervalo=30.0, ciclos_quietos=2, limite_wal_mb=64,
+                 espera_lock=0.5, relatorio_a_cada=20, coordenar=True):
+        """
+        Checkpoints do WAL em uma thread própria, fora do loop de inferência. As
+        conexões das câmeras devem desligar o auto-checkpoint
+        (PRAGMA wal_autocheckpoint=0) para que o checkpoint aconteça só aqui, e
+        religá-lo (AUTOCHECKPOINT_PADRAO) se ativo() passar a retornar False:
+        sem a thread, nada mais impediria o -wal de crescer.
+
+        Várias câmeras compartilham o mesmo banco e cada uma roda seu agendador.
+        Com coordenar=True só o processo que detém o lock de arquivo
+        <db_path>-checkpoint.lock faz os checkpoints (um checkpoint cobre o WAL
+        inteiro, de todos os escritores); os demais tentam o lock a cada ciclo e
+        assumem se o detentor parar ou morrer.
+
+        A cada intervalo roda um checkpoint PASSIVE (não espera leitores nem
+        escritores). O modo é escalado quando é seguro ou necessário:
+        - TRUNCATE quando não houve escrita por ciclos_quietos ciclos seguidos e o
+          arquivo -wal não está vazio (zera o arquivo em períodos sem movimento);
+        - RESTART quando o -wal passou de limite_wal_mb e o PASSIVE já transferiu
+          todos os frames (o próximo escritor volta ao início do arquivo em vez de
+          continuar crescendo).
+        RESTART/TRUNCATE esperam no máximo espera_lock segundos por leitores.
+
+        :param db_path: Caminho do banco SQLite (em modo WAL)
+        :param intervalo: Segundos entre checkpoints
+        :param ciclos_quietos: Ciclos sem escrita para considerar o banco em repouso
+        :param limite_wal_mb: Tamanho do -wal (MB) a partir do qual o RESTART é tentado
+        :param espera_lock: Espera máxima (s) por lock nos modos RESTART/TRUNCATE
+        :param relatorio_a_cada: Ciclos entre relatórios no log (tamanho do WAL e latência)
+        :param coordenar: Só o detentor do lock de arquivo entre processos faz os checkpoints
+        """
+        self.db_path = db_path
+        self.caminho_wal = db_path + '-wal'
+        self.caminho_lock = db_path + '-checkpoint.lock'
+        self.coordenar = coordenar
+        self.intervalo = intervalo
+        self.ciclos_quietos = ciclos_quietos
+        self.limite_wal = limite_wal_mb * 1024 * 1024
+        self.espera_lock = espera_lock
+        self.relatorio_a_cada = relatorio_a_cada
+
+        self._parar = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._lock = None
+        self._frames_anteriores = None
+        self._ciclos_sem_escrita = 0
+
+        self.execucoes = 0
+        self.por_modo = {}
+        self.ocupados = 0
+        self.ultima_latencia = 0.0
+        self.max_latencia = 0.0
+        self._latencias_janela = []
+        self._ciclos_relatorio = 0
+
+    def tamanho_wal(self):
+        """Tamanho atual do arquivo -wal em bytes (0 se não existir)."""
+        try:
+            return os.path.getsize(self.caminho_wal)
+        except OSError:
+            return 0
+
+    def _conexao(self):
+        if self._conn is None:
+            # Autocommit: o checkpoint não pode rodar dentro de uma transação
+            self._conn = abrir_escrita(self.db_path, timeout=self.espera_lock)
+            self._conn.isolation_level = None
+        return self._conn
+
+    def checkpoint(self, modo='PASSIVE'):
+        """
+        Executa um checkpoint no modo indicado e atualiza as estatísticas.
+
+        :return: (ocupado, frames_no_wal, frames_transferidos, latencia_s)
+        """
+        inicio = time.perf_counter()
+        ocupado, frames, transferidos = self._conexao().execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        latencia = time.perf_counter() - inicio
+
+        self.execucoes += 1
+        self.por_modo[modo] = self.por_modo.get(modo, 0) + 1
+        self.ocupados += bool(ocupado)
+        self.ultima_latencia = latencia
+        self.max_latencia = max(self.max_latencia, latencia)
+        self._latencias_janela.append(latencia)
+        return ocupado, frames, transferidos, latencia
+
+    def ciclo(self):
+        """Um ciclo do agendador: PASSIVE e, se for o caso, a escalada para RESTART/TRUNCATE."""
+        ocupado, frames, transferidos, _ = self.checkpoint('PASSIVE')
+        if frames == -1:
+            raise RuntimeError(f"{self.db_path} não está em modo WAL")
+
+        # Sem frames novos desde o ciclo anterior = nenhuma escrita no intervalo
+        if frames == self._frames_anteriores:
+            self._ciclos_sem_escrita += 1
+        else:
+            self._ciclos_sem_escrita = 0
+        self._frames_anteriores = frames
+
+        tamanho = self.tamanho_wal()
+        completo = not ocupado and frames == transferidos
+        if self._ciclos_sem_escrita >= self.ciclos_quietos and tamanho > 0:
+            self._escalar('TRUNCATE')
+        elif tamanho > self.limite_wal and completo:
+            self._escalar('RESTART')
+
+        self._ciclos_relatorio += 1
+        if self.relatorio_a_cada and self._ciclos_relatorio >= self.relatorio_a_cada:
+            self.relatar()
+
+    def _escalar(self, modo):
+        ocupado, _, _, latencia = self.checkpoint(modo)
+        if ocupado:
+            logger.info(f"Checkpoint {modo} adiado: leitores/escritores ativos ({latencia * 1000:.0f} ms)")
+        else:
+            # Depois de RESTART/TRUNCATE o WAL recomeça: a comparação de frames reinicia
+            self._frames_anteriores = None
+            self._ciclos_sem_escrita = 0
+
+    def relatar(self):
+        """Registra no log o tamanho do WAL e a latência dos checkpoints desde o último relatório."""
+        janela = self._latencias_janela
+        media = sum(janela) / len(janela) if janela else 0.0
+        modos = ', '.join(f"{modo}={qtd}" for modo, qtd in sorted(self.por_modo.items()))
+        logger.info(
+            f"WAL {self.tamanho_wal() / (1024 * 1024):.1f} MB | checkpoints: {modos} | "
+            f"ocupados={self.ocupados} | latência média {media * 1000:.1f} ms, máx {max(janela, default=0.0) * 1000:.1f} ms "
+            f"(máx geral {self.max_latencia * 1000:.1f} ms)"
+        )
+        self._latencias_janela = []
+        self._ciclos_relatorio = 0
+
+    def ativo(self):
+        """True enquanto a thread de checkpoint estiver rodando."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def detem_lock(self):
+        """
+        True se este processo deve fazer os checkpoints: detém (ou acabou de obter)
+        o lock entre processos, ou a coordenação está desligada/indisponível.
+        """
+        if not self.coordenar or self._lock is not None:
+            return True
+        try:
+            self._lock = _travar(self.caminho_lock)
+        except OSError as e:
+            logger.error(f"Lock de checkpoint {self.caminho_lock} indisponível ({e}); checkpoints sem coordenação")
+            self.coordenar = False
+            return True
+        if self._lock is not None:
+            logger.info(f"Checkpoints do WAL de {self.db_path} assumidos por este processo (pid {os.getpid()})")
+        return self._lock is not None
+
+    def _liberar_lock(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _fechar_conexao(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _executar(self):
+        try:
+            while not self._parar.wait(self.intervalo):
+                try:
+                    # Outro processo detém o lock e faz os checkpoints do banco compartilhado
+                    if self.detem_lock():
+                        self.ciclo()
+                except RuntimeError as e:
+                    logger.error(str(e))
+                    return
+                except Exception as e:
+                    logger.error(f"Erro no checkpoint do WAL de {self.db_path}: {e}")
+        finally:
+            # A conexão pertence à thread que a criou; o lock fica livre para outra câmera
+            self._fechar_conexao()
+            self._liberar_lock()
+            if not self._parar.is_set():
+                logger.error(f"Thread de checkpoint do WAL de {self.db_path} encerrada; "
+                             f"o auto-checkpoint deve ser religado na conexão da câmera")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._executar, name="checkpoint_wal", daemon=True)
+        self._thread.start()
+        logger.info(f"Checkpoint do WAL de {self.db_path} a cada {self.intervalo:.0f}s")
+
+    def stop(self, truncar=True):
+        """
+        Para a thread e, opcionalmente, faz um TRUNCATE final (sem escritores, ao
+        encerrar) se este processo detiver o lock; depois libera o lock.
+        """
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            if truncar and self.detem_lock():
+                self.checkpoint('TRUNCATE')
+            self.relatar()
+        except Exception as e:
+            logger.error(f"Erro no checkpoint final do WAL de {self.db_path}: {e}")
+        finally:
+            self._fechar_conexao()
+            self._liberar_lock()
@@ -0,0 +1,132 @@
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+# Cache de páginas e janela de mmap dos leitores (MB). Relatórios varrem a
+# tabela inteira: um cache maior evita reler páginas do disco entre consultas
+# e o mmap lê o arquivo sem copiar cada página para o cache do SQLite.
+CACHE_LEITURA_MB = 64
+MMAP_LEITURA_MB = 256
+
+# Linhas por página das leituras paginadas (ler_em_paginas)
+TAMANHO_PAGINA = 5000
+
+# Espera máxima (s) por um lock de escrita antes de "database is locked"
+TIMEOUT_ESCRITA = 10
+
+# Perfis de PRAGMAs das conexões de escrita, aplicados na ordem abaixo.
+# 'camera': WAL com synchronous=NORMAL (fsync só no checkpoint, não a cada
+# commit; um commit pode se perder numa queda de energia, o banco não
+# corrompe), cache de 16 MB, mmap de 128 MB, tabelas temporárias em memória
+# e busy_timeout: o próprio SQLite espera o lock em vez de "database is locked".
+# 'legado': configuração anterior (apenas WAL; synchronous=FULL, cache de 2 MB
+# e tabelas temporárias em disco, padrões do SQLite), referência do benchmark.
+PERFIS_PRAGMAS = {
+    'camera': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16 * 1024,
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': TIMEOUT_ESCRITA * 1000,
+    },
+    'legado': {
+        'journal_mode': 'WAL',
+    },
+}
+PERFIL_PADRAO = 'camera'
+
+
+def aplicar_pragmas(conn, perfil=PERFIL_PADRAO):
+    """
+    Aplica um perfil de PRAGMAs à conexão.
+
+    :param conn: Conexão SQLite
+    :param perfil: Nome de um perfil de PERFIS_PRAGMAS ou dict {pragma: valor}
+    :return: dict {pragma: valor} efetivamente aplicado
+    """
+    pragmas = PERFIS_PRAGMAS[perfil] if isinstance(perfil, str) else perfil
+    for nome, valor in pragmas.items():
+        conn.execute(f"PRAGMA {nome} = {valor}")
+    return dict(pragmas)
+
+
+def abrir_leitura(db_path, cache_mb=CACHE_LEITURA_MB, mmap_mb=MMAP_LEITURA_MB):
+    """
+    Abre o banco somente para leitura (URI mode=ro): não cria o arquivo se o
+    caminho estiver errado e nunca pega lock de escrita. A conexão fica em
+    autocommit, então cada consulta enxerga o snapshot WAL do momento e o
+    libera ao terminar; para várias consultas no mesmo snapshot use
+    snapshot_leitura(). Assim relatórios longos não seguram o checkpoint do
+    WAL feito pelas câmeras.
+
+    :param db_path: Caminho do banco SQLite
+    :param cache_mb: Tamanho do cache de páginas da conexão (MB)
+    :param mmap_mb: Janela de leitura via mmap (MB, 0 desativa)
+    :raises sqlite3.OperationalError: Se o banco não existir ou não puder ser aberto
+    """
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, isolation_level=None)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = {-int(cache_mb * 1024)}")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_mb * 1024 * 1024)}")
+    return conn
+
+
+@contextmanager
+def snapshot_leitura(conn):
+    """
+    Transação de leitura explícita numa conexão de abrir_leitura(): todas as
+    consultas dentro do bloco enxergam o mesmo snapshot. O snapshot é liberado
+    ao sair do bloco; mantenha-o apenas pelo tempo das consultas.
+    """
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.execute("ROLLBACK")
+
+
+def ler_em_paginas(conn, consulta, params=(), tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Lê uma consulta em páginas de tamanho fixo por keyset no id: a consulta
+    tem o id como primeira coluna e termina em "id > ? ORDER BY id LIMIT ?"
+    (preenchidos aqui com o último id lido e o tamanho da página). Cada página
+    é uma busca curta pela chave primária a partir de onde a anterior parou,
+    sem OFFSET e sem carregar o resultado inteiro: a memória fica constante.
+    Numa conexão em autocommit nenhum snapshot fica aberto entre as páginas;
+    dentro de snapshot_leitura() todas as páginas vêm do mesmo snapshot.
+
+    :param conn: Conexão SQLite
+    :param consulta: SELECT id, ... WHERE ... AND id > ? ORDER BY id LIMIT ?
+    :param params: Parâmetros da consulta antes do id e do LIMIT
+    :param tamanho_pagina: Linhas por página
+    :return: Gerador de listas de linhas (cada página)
+    """
+    ultimo_id = 0  # ids AUTOINCREMENT começam em 1
+    while True:
+        pagina = conn.execute(consulta, (*params, ultimo_id, tamanho_pagina)).fetchall()
+        if pagina:
+            yield pagina
+        if len(pagina) < tamanho_pagina:
+            return
+        ultimo_id = pagina[-1][0]
+
+
+def abrir_escrita(db_path, timeout=TIMEOUT_ESCRITA, perfil=PERFIL_PADRAO):
+    """
+    Abre o banco para escrita com o perfil de PRAGMAs (padrão 'camera'),
+    esperando até timeout segundos pelo lock dos outros escritores (câmeras).
+    Use apenas onde o script de fato grava, e feche logo após o commit.
+
+    :param db_path: Caminho do banco SQLite
+    :param timeout: Espera máxima pelo lock de escrita (s)
+    :param perfil: Perfil de PERFIS_PRAGMAS (ou dict de PRAGMAs) aplicado na abertura
+    """
+    pragmas = dict(PERFIS_PRAGMAS[perfil] if isinstance(perfil, str) else perfil)
+    if 'busy_timeout' in pragmas:
+        # O timeout pedido na abertura prevalece sobre o do perfil
+        pragmas['busy_timeout'] = int(timeout * 1000)
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    aplicar_pragmas(conn, pragmas)
+    return conn
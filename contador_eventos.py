@@ -0,0 +1,116 @@
+import logging
+from collections import namedtuple
+
+bug_logger = logging.getLogger("bug_vehicle_code")
+
+# Travessia(s) de uma linha de contagem: quantidade > 1 quando vários veículos do
+# mesmo tipo cruzam no mesmo frame
+EventoTravessia = namedtuple('EventoTravessia', 'evento_id area vehicle_type direcao quantidade')
+
+DIRECOES = ('in', 'out')
+
+
+class ContadorEventos:
+    def __init__(self, counter, repository, fonte):
+        """
+        Fluxo de eventos de travessia numerados a partir do ObjectCounter4.
+
+        O ObjectCounter4 só expõe contagens acumuladas (area_counts). Logo após cada
+        start_counting, apenas os contadores da área recém-contada são comparados com
+        o quanto já foi consumido (offset por área/tipo/direção), e cada avanço vira
+        um EventoTravessia com id sequencial. Os offsets e o último id são gravados
+        na mesma transação das linhas de vehicle_counts
+        (VehicleCountsRepository.save_counter_offsets): um commit que falha não
+        grava nem linhas nem offsets, e as linhas são reenviadas no frame seguinte.
+
+        No reinício os offsets do último commit são recarregados e, no
+        ObjectCounter4 recém-criado (caso do yolo16_v4.py), viram os totais
+        iniciais (area_counts[area]['types'][tipo][direção]) e a base do que já foi
+        consumido: o contador continua exatamente de onde o banco parou, nada já
+        gravado é contado de novo e a numeração dos eventos continua. Só as
+        travessias ainda sem commit no momento da queda se perdem, junto com o
+        estado em memória do processo. A base de cada chave:
+        - contador sem total para a chave (novo): recebe o offset gravado;
+        - contador que já traz totais: só o que passar do offset gravado é novo
+          (se vier abaixo do offset, o excedente já está no banco);
+        - queda de um contador durante a execução (reset, inclusive um contador
+          que descarta os totais restaurados): conta a partir do zero.
+
+        :param counter: ObjectCounter4 (ou objeto com start_counting e area_counts)
+        :param repository: VehicleCountsRepository da conexão da câmera
+        :param fonte: Identificador da câmera (os offsets são por fonte no banco compartilhado)
+        """
+        self.counter = counter
+        self.fonte = fonte
+        offsets, self._ultimo_por_chave = repository.load_counter_offsets(fonte)
+        self.ultimo_evento_id = max(self._ultimo_por_chave.values(), default=0)
+        iniciais = {
+            (area, vehicle_type, direcao): type_counts[direcao]
+            for area, counts in counter.area_counts.items()
+            for vehicle_type, type_counts in counts.get('types', {}).items()
+            for direcao in DIRECOES
+        }
+        for chave, offset in offsets.items():
+            if not iniciais.get(chave):
+                self._restaurar(chave, offset)
+                iniciais[chave] = offset
+        self._consumido = {chave: min(offset, iniciais[chave]) for chave, offset in offsets.items() if chave in iniciais}
+        self._alteradas = {chave for chave, valor in self._consumido.items() if valor != offsets[chave]}
+        self._pendentes = []
+        # Incrementada a cada offset alterado (evento ou reset): quem grava compara com a
+        # versão já persistida e, nos frames sem travessia, não faz mais nada
+        self.versao = len(self._alteradas)
+
+    def _restaurar(self, chave, valor):
+        """Define no contador o total de area/tipo/direção gravado no último commit."""
+        area, vehicle_type, direcao = chave
+        counts = self.counter.area_counts.setdefault(area, {'in': 0, 'out': 0, 'types': {}})
+        type_counts = counts.setdefault('types', {}).setdefault(vehicle_type, {d: 0 for d in DIRECOES})
+        anterior = type_counts.get(direcao, 0)
+        type_counts[direcao] = valor
+        # Total da área (se o contador mantiver um) acompanha os tipos
+        if isinstance(counts.get(direcao), int):
+            counts[direcao] += valor - anterior
+
+    def start_counting(self, im0, tracks, region_points, area, fps):
+        """Repassa ao ObjectCounter4 e registra os eventos de travessia da área."""
+        im0 = self.counter.start_counting(im0, tracks, region_points, area, fps=fps)
+        self._coletar(area)
+        return im0
+
+    def _coletar(self, area):
+        for vehicle_type, type_counts in self.counter.area_counts.get(area, {}).get('types', {}).items():
+            for direcao in DIRECOES:
+                chave = (area, vehicle_type, direcao)
+                valor = type_counts[direcao]
+                consumido = self._consumido.get(chave, 0)
+                if valor < consumido:
+                    bug_logger.info(f'RESET de {direcao} detectado (area {area}, tipo {vehicle_type}): {consumido} -> {valor}')
+                    consumido = 0
+
+                if valor > consumido:
+                    self.ultimo_evento_id += 1
+                    self._pendentes.append(EventoTravessia(self.ultimo_evento_id, area, vehicle_type, direcao, valor - consumido))
+                    self._ultimo_por_chave[chave] = self.ultimo_evento_id
+                if valor != self._consumido.get(chave):
+                    self._consumido[chave] = valor
+                    self._alteradas.add(chave)
+                    self.versao += 1
+
+    def consumir(self):
+        """Retorna e remove os eventos ainda não consumidos, em ordem de id."""
+        eventos, self._pendentes = self._pendentes, []
+        return eventos
+
+    def offsets_alterados(self):
+        """
+        Retorna e limpa os offsets alterados desde a última chamada, para gravação.
+
+        :return: Lista de (area, vehicle_type, direcao, consumido, ultimo_evento_id)
+        """
+        offsets = [
+            (*chave, self._consumido[chave], self._ultimo_por_chave.get(chave, 0))
+            for chave in sorted(self._alteradas)
+        ]
+        self._alteradas.clear()
+        return offsets
@@ -8,14 +8,29 @@ Estrategia:
    da mesma area + vehicle_code com tempo preenchido e timestamp proximo.
 2. Se nao encontrar, utiliza a media das permanencias da area em uma janela
    configuravel.
+
+Modos:
+- lote (padrao): uma unica leitura das saidas, correspondencias e medias
+  resolvidas em memoria (busca binaria por area + vehicle_code e somas
+  acumuladas por area) e todas as atualizacoes em um unico executemany.
+- linha: modo original, duas consultas por registro.
+
+Os dois modos produzem o mesmo resultado: no modo lote, cada registro
+corrigido tambem passa a servir de referencia para os seguintes, como
+acontece no modo linha.
 """
 
 from __future__ import annotations
 
 import sqlite3
 import argparse
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
 from datetime import datetime
 
+from conexao_db import abrir_escrita
+
 
 def fetch_null_records(cursor: sqlite3.Cursor, limit: int | None) -> list[tuple]:
     query = """
@@ -91,7 +106,7 @@ def process_database(
     average_window: int,
 ) -> None:
     try:
-        conn = sqlite3.connect(db_path)
+        conn = abrir_escrita(db_path)
         cursor = conn.cursor()
 
         cursor.execute(
@@ -139,6 +154,184 @@ def process_database(
         print(f"ERRO ao processar banco de dados: {err}")
 
 
+class _SomaAcumulada:
+    """Arvore de Fenwick: soma por prefixo com atualizacao pontual em O(log n)."""
+
+    def __init__(self, n: int) -> None:
+        self.arvore = [0.0] * (n + 1)
+
+    def adicionar(self, posicao: int, valor: float) -> None:
+        posicao += 1
+        while posicao < len(self.arvore):
+            self.arvore[posicao] += valor
+            posicao += posicao & -posicao
+
+    def prefixo(self, fim: int) -> float:
+        """Soma das posicoes [0, fim)."""
+        total = 0.0
+        while fim > 0:
+            total += self.arvore[fim]
+            fim -= fim & -fim
+        return total
+
+
+class _MediasArea:
+    """Media de tempo_permanencia (entre 1 e 300s) por area em uma janela de tempo."""
+
+    def __init__(self, epochs: list[int]) -> None:
+        self.epochs = sorted(epochs)
+        self.somas = _SomaAcumulada(len(self.epochs))
+        self.contagens = _SomaAcumulada(len(self.epochs))
+        self._ocupadas: dict[int, int] = defaultdict(int)
+
+    def adicionar(self, epoch: int, tempo: float) -> None:
+        if not 1 <= tempo <= 300:
+            return
+        # Registros no mesmo segundo ocupam posicoes consecutivas do array ordenado
+        posicao = bisect_left(self.epochs, epoch) + self._ocupadas[epoch]
+        self._ocupadas[epoch] += 1
+        self.somas.adicionar(posicao, tempo)
+        self.contagens.adicionar(posicao, 1)
+
+    def media(self, epoch: int, janela: int) -> float | None:
+        a = bisect_left(self.epochs, epoch - janela)
+        b = bisect_right(self.epochs, epoch + janela)
+        quantidade = self.contagens.prefixo(b) - self.contagens.prefixo(a)
+        if not quantidade:
+            return None
+        return (self.somas.prefixo(b) - self.somas.prefixo(a)) / quantidade
+
+
+class _ReferenciasCodigo:
+    """Saidas com tempo preenchido de uma area + vehicle_code, ordenadas por epoch."""
+
+    def __init__(self) -> None:
+        self.epochs: list[int] = []
+        self.por_epoch: dict[int, tuple[int, float]] = {}
+
+    def adicionar(self, epoch: int, rec_id: int, tempo: float) -> None:
+        atual = self.por_epoch.get(epoch)
+        if atual is None:
+            insort(self.epochs, epoch)
+        elif atual[0] < rec_id:
+            return
+        # No mesmo segundo vale o menor id, como na varredura da consulta original
+        self.por_epoch[epoch] = (rec_id, tempo)
+
+    def mais_proxima(self, epoch: int, janela: int) -> float | None:
+        i = bisect_left(self.epochs, epoch)
+        melhor = None
+        for j in (i - 1, i):
+            if 0 <= j < len(self.epochs):
+                distancia = abs(self.epochs[j] - epoch)
+                if distancia > janela:
+                    continue
+                rec_id, tempo = self.por_epoch[self.epochs[j]]
+                chave = (distancia, rec_id)
+                if melhor is None or chave < melhor[0]:
+                    melhor = (chave, tempo)
+        return melhor[1] if melhor else None
+
+
+def process_database_lote(
+    db_path: str,
+    limit: int | None,
+    match_window: int,
+    average_window: int,
+) -> None:
+    try:
+        inicio = time.perf_counter()
+        conn = abrir_escrita(db_path)
+        cursor = conn.cursor()
+
+        # Unica leitura: todas as saidas, com e sem tempo. O epoch sai do proprio
+        # strftime('%s', ...) das consultas do modo linha (offsets, 'T', 'Z', datas
+        # normalizadas e NULL para o que o SQLite nao interpreta)
+        cursor.execute(
+            """
+            SELECT id, area, vehicle_code, CAST(strftime('%s', timestamp) AS INTEGER), tempo_permanencia
+            FROM vehicle_counts
+            WHERE count_out = 1
+            """
+        )
+        saidas = cursor.fetchall()
+        nulos = sorted((row for row in saidas if row[4] is None), key=lambda row: row[0], reverse=True)
+        total_null = len(nulos)
+        if total_null == 0:
+            print("Nenhum registro com tempo_permanencia NULL encontrado.")
+            return
+
+        print(f"Encontrados {total_null} registros de saida com tempo_permanencia NULL.")
+        registros = nulos[:int(limit)] if limit else nulos
+        print(f"Processando {len(registros)} registros...")
+
+        epochs_por_area: dict[str, list[int]] = defaultdict(list)
+        preenchidos = []
+        for rec_id, area, vehicle_code, epoch, tempo in saidas:
+            if epoch is None or area is None:
+                continue
+            epochs_por_area[area].append(epoch)
+            if tempo is not None:
+                preenchidos.append((epoch, rec_id, area, vehicle_code, float(tempo)))
+
+        medias = {area: _MediasArea(epochs) for area, epochs in epochs_por_area.items()}
+        referencias: dict[tuple, _ReferenciasCodigo] = defaultdict(_ReferenciasCodigo)
+        for epoch, rec_id, area, vehicle_code, tempo in sorted(preenchidos):
+            if vehicle_code is not None:
+                referencias[(area, vehicle_code)].adicionar(epoch, rec_id, tempo)
+            medias[area].adicionar(epoch, tempo)
+
+        atualizacoes = []
+        via_media = 0
+        for rec_id, area, vehicle_code, epoch, _ in registros:
+            # area/vehicle_code NULL nunca satisfazem a igualdade das consultas do modo linha
+            if epoch is None or area is None:
+                continue
+
+            tempo = None
+            if vehicle_code is not None:
+                tempo = referencias[(area, vehicle_code)].mais_proxima(epoch, match_window)
+            if tempo is None:
+                tempo = medias[area].media(epoch, average_window)
+                if tempo is None:
+                    continue
+                via_media += 1
+
+            atualizacoes.append((tempo, rec_id))
+            # O registro corrigido passa a ser referencia para os seguintes (mesmo efeito do modo linha)
+            if vehicle_code is not None:
+                referencias[(area, vehicle_code)].adicionar(epoch, rec_id, tempo)
+            medias[area].adicionar(epoch, tempo)
+
+        with conn:
+            cursor.executemany(
+                """
+                UPDATE vehicle_counts
+                SET tempo_permanencia = ?, enviado = 0
+                WHERE id = ?
+                """,
+                atualizacoes,
+            )
+        duracao = time.perf_counter() - inicio
+
+        atualizados = len(atualizacoes)
+        print("\nRESULTADO DA CORRECAO")
+        print(f"  Total atualizados.........: {atualizados}")
+        print(f"  Via correspondencia exata.: {atualizados - via_media}")
+        print(f"  Via media por area........: {via_media}")
+        print(f"  Tempo total...............: {duracao:.2f}s ({len(registros) / duracao:.0f} registros/s)")
+
+        cursor.execute(
+            "SELECT COUNT(*) FROM vehicle_counts WHERE tempo_permanencia IS NULL AND count_out = 1"
+        )
+        restantes = cursor.fetchone()[0]
+        print(f"  Registros ainda NULL......: {restantes}")
+        conn.close()
+
+    except sqlite3.Error as err:
+        print(f"ERRO ao processar banco de dados: {err}")
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Corrige tempos de permanencia NULL em vehicle_counts."
@@ -167,6 +360,12 @@ def parse_args() -> argparse.Namespace:
         default=1800,
         help="Janela (em segundos) para calcular media por area. Padrao: 1800s.",
     )
+    parser.add_argument(
+        "--modo",
+        choices=["lote", "linha"],
+        default="lote",
+        help="lote: uma leitura e um executemany (padrao); linha: duas consultas por registro (modo original).",
+    )
     return parser.parse_args()
 
 
@@ -175,7 +374,11 @@ def main() -> None:
     print("CORRECAO DE REGISTROS COM TEMPO_PERMANENCIA NULL")
     print("=" * 60)
     print(f"Banco........: {args.db_path}")
-    process_database(args.db_path, args.limit, args.match_window, args.average_window)
+    print(f"Modo.........: {args.modo}")
+    if args.modo == "lote":
+        process_database_lote(args.db_path, args.limit, args.match_window, args.average_window)
+    else:
+        process_database(args.db_path, args.limit, args.match_window, args.average_window)
 
 
 if __name__ == "__main__":
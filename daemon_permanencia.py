@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Daemon de entrega dos tempos de permanencia para a API (alternativa de longa
+duracao ao api_tempopermanencia.py, que tenta cada registro uma vez por execucao).
+
+Os registros a enviar continuam sendo os de vehicle_counts com enviado = 0,
+tempo_permanencia preenchido e vehicle_code != -1. A tabela outbox_permanencia
+guarda, por registro que falhou, tentativas, proxima_tentativa e ultimo_erro:
+
+- backoff exponencial com jitter por registro (--backoff_inicial dobrando ate
+  --backoff_max, espera sorteada entre 50% e 100% do valor), persistido:
+  reiniciar o daemon nao reenvia antes da hora;
+- disjuntor (circuit breaker): apos --limiar_falhas falhas consecutivas de
+  rede/servidor os envios param por --pausa_inicial segundos (dobrando ate
+  --pausa_max a cada reabertura); depois um unico envio de teste decide se o
+  fluxo volta ao normal;
+- no maximo --max_em_voo requisicoes simultaneas (sessao HTTP por thread);
+- resultados gravados em lote (um commit por ciclo), o que permite drenar um
+  backlog grande assim que o servidor volta;
+- registros recusados pela API (status fora de STATUS_TEMPORARIO, ex.: 400)
+  sao tentados no maximo --max_tentativas_recusado vezes e depois ficam na
+  outbox com morto = 1: nao sao mais enviados nem seguram o --drenar. Para
+  reenvia-los (ex.: apos corrigir a API): UPDATE outbox_permanencia SET morto = 0.
+
+Exemplos:
+    python daemon_permanencia.py --db_path yolo8.db
+    python daemon_permanencia.py --db_path yolo8.db --max_em_voo 16 --drenar
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+import api_tempopermanencia
+from api_tempopermanencia import garantir_coluna_enviado, montar_dados_envio, normalizar_timestamp, sql_timestamp_api
+from conexao_db import abrir_escrita
+
+logger = logging.getLogger("daemon_permanencia")
+
+# Respostas que indicam problema no servidor/link (contam para o disjuntor e sao repetidas)
+STATUS_TEMPORARIO = {408, 429, 500, 502, 503, 504}
+
+_CRIAR_OUTBOX = """CREATE TABLE IF NOT EXISTS outbox_permanencia (
+                      record_id INTEGER PRIMARY KEY,
+                      tentativas INTEGER NOT NULL,
+                      proxima_tentativa REAL NOT NULL,
+                      ultimo_erro TEXT,
+                      morto INTEGER NOT NULL DEFAULT 0)"""
+# Indice parcial: so os registros de permanencia ainda nao enviados (as linhas
+# de contagem, sem tempo, ficam fora)
+_CRIAR_INDICE_PENDENTES = """CREATE INDEX IF NOT EXISTS idx_vehicle_counts_envio_pendente
+                             ON vehicle_counts (timestamp)
+                             WHERE enviado = 0 AND tempo_permanencia IS NOT NULL"""
+# O timestamp ja sai normalizado da consulta (NULL so nos formatos raros)
+_PROXIMOS = f"""SELECT v.id, v.timestamp, v.vehicle_code, v.tempo_permanencia, COALESCE(o.tentativas, 0),
+                       {sql_timestamp_api('v.timestamp')}
+                FROM vehicle_counts v
+                LEFT JOIN outbox_permanencia o ON o.record_id = v.id
+                WHERE v.enviado = 0 AND v.tempo_permanencia IS NOT NULL AND v.vehicle_code != -1
+                  AND (o.proxima_tentativa IS NULL OR (o.proxima_tentativa <= ? AND o.morto = 0))
+                ORDER BY v.timestamp
+                LIMIT ?"""
+_PROXIMA_AGENDADA = """SELECT MIN(o.proxima_tentativa)
+                       FROM outbox_permanencia o JOIN vehicle_counts v ON v.id = o.record_id
+                       WHERE v.enviado = 0 AND o.morto = 0"""
+_MARCAR_ENVIADO = "UPDATE vehicle_counts SET enviado = 1 WHERE id = ?"
+_REMOVER_OUTBOX = "DELETE FROM outbox_permanencia WHERE record_id = ?"
+_REGISTRAR_FALHA = """INSERT OR REPLACE INTO outbox_permanencia (record_id, tentativas, proxima_tentativa, ultimo_erro, morto)
+                      VALUES (?, ?, ?, ?, ?)"""
+
+
+class Disjuntor:
+    def __init__(self, limiar_falhas=5, pausa_inicial=5.0, pausa_max=300.0):
+        """
+        Circuit breaker dos envios: fechado (envia normalmente), aberto (nao envia
+        ate o fim da pausa) e meio-aberto (um envio de teste).
+
+        :param limiar_falhas: Falhas consecutivas que abrem o disjuntor
+        :param pausa_inicial: Pausa (s) da primeira abertura
+        :param pausa_max: Pausa maxima (s); a pausa dobra a cada reabertura sem sucesso
+        """
+        self.limiar_falhas = limiar_falhas
+        self.pausa_inicial = pausa_inicial
+        self.pausa_max = pausa_max
+        self.falhas_consecutivas = 0
+        self.aberturas = 0
+        self.reabrir_em = None  # None: fechado
+        self._pausa = pausa_inicial
+
+    def estado(self, agora):
+        if self.reabrir_em is None:
+            return "fechado"
+        return "aberto" if agora < self.reabrir_em else "meio-aberto"
+
+    def sucesso(self):
+        if self.reabrir_em is not None:
+            logger.info("Disjuntor fechado: servidor respondendo novamente")
+        self.falhas_consecutivas = 0
+        self.reabrir_em = None
+        self._pausa = self.pausa_inicial
+
+    def falha(self, agora):
+        self.falhas_consecutivas += 1
+        meio_aberto = self.reabrir_em is not None and agora >= self.reabrir_em
+        if meio_aberto or (self.reabrir_em is None and self.falhas_consecutivas >= self.limiar_falhas):
+            if meio_aberto:
+                self._pausa = min(self.pausa_max, self._pausa * 2)
+            self.reabrir_em = agora + self._pausa
+            self.aberturas += 1
+            logger.warning(f"Disjuntor aberto por {self._pausa:.1f}s apos {self.falhas_consecutivas} falha(s) consecutiva(s)")
+
+
+class DaemonPermanencia:
+    def __init__(self, db_path, url=None, auth=None, max_em_voo=8, lote=500, backoff_inicial=2.0,
+                 backoff_max=600.0, intervalo=5.0, timeout=30.0, disjuntor=None, max_tentativas_recusado=5):
+        """
+        :param db_path: Caminho do banco SQLite da camera
+        :param url: Endereco da API (padrao: api_tempopermanencia.url)
+        :param auth: (usuario, senha) da autenticacao basica (padrao: o do api_tempopermanencia)
+        :param max_em_voo: Maximo de requisicoes simultaneas
+        :param lote: Registros buscados por ciclo
+        :param backoff_inicial: Espera (s) apos a primeira falha de um registro; dobra a cada falha
+        :param backoff_max: Espera maxima (s) entre tentativas de um registro
+        :param intervalo: Espera (s) entre ciclos sem nada a enviar
+        :param timeout: Timeout (s) de cada requisicao
+        :param disjuntor: Disjuntor (padrao: Disjuntor())
+        :param max_tentativas_recusado: Tentativas de um registro recusado pela API (status nao temporario)
+            antes de ficar morto na outbox
+        """
+        self.db_path = db_path
+        self.url = url or api_tempopermanencia.url
+        self.auth = auth or (api_tempopermanencia.username, api_tempopermanencia.password)
+        self.max_em_voo = max_em_voo
+        self.lote = lote
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.disjuntor = disjuntor or Disjuntor()
+        self.max_tentativas_recusado = max_tentativas_recusado
+        self.enviados = 0
+        self.falhas = 0
+        self.descartados = 0
+
+        garantir_coluna_enviado(db_path)
+        self.conn = abrir_escrita(db_path)
+        self.conn.execute(_CRIAR_OUTBOX)
+        colunas = {coluna[1] for coluna in self.conn.execute("PRAGMA table_info(outbox_permanencia)")}
+        if "morto" not in colunas:
+            # Outbox criada antes dos registros mortos
+            self.conn.execute("ALTER TABLE outbox_permanencia ADD COLUMN morto INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute(_CRIAR_INDICE_PENDENTES)
+        self.conn.commit()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_em_voo, thread_name_prefix="daemon_permanencia")
+        self._sessoes = threading.local()
+        self._parar = threading.Event()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+    def stop(self):
+        self._parar.set()
+
+    # ------------------------------------------------------------------ #
+    # Envio (threads do pool)
+    # ------------------------------------------------------------------ #
+    def _sessao(self):
+        sessao = getattr(self._sessoes, "sessao", None)
+        if sessao is None:
+            sessao = requests.Session()
+            sessao.auth = HTTPBasicAuth(*self.auth)
+            self._sessoes.sessao = sessao
+        return sessao
+
+    def _enviar(self, timestamp, vehicle_code, tempo_permanencia, timestamp_api=None):
+        """
+        Envia um registro.
+
+        :return: (entregue, erro, temporario) - temporario indica falha de rede/servidor
+        """
+        if timestamp_api is None:
+            timestamp_api = normalizar_timestamp(timestamp)
+        dados_envio = montar_dados_envio(timestamp_api, vehicle_code, tempo_permanencia)
+        try:
+            resposta = self._sessao().post(self.url, json=dados_envio, timeout=self.timeout)
+        except requests.RequestException as e:
+            return False, f"{type(e).__name__}: {e}", True
+        if resposta.status_code == 204:
+            return True, None, False
+        erro = f"Status Code: {resposta.status_code} {resposta.text[:200]}"
+        return False, erro, resposta.status_code in STATUS_TEMPORARIO
+
+    def espera(self, tentativas):
+        """Espera (s) ate a proxima tentativa de um registro com tentativas falhas (com jitter)."""
+        limite = min(self.backoff_max, self.backoff_inicial * 2 ** (tentativas - 1))
+        return random.uniform(limite / 2, limite)
+
+    # ------------------------------------------------------------------ #
+    # Ciclo
+    # ------------------------------------------------------------------ #
+    def ciclo(self):
+        """
+        Envia os registros vencidos (ate lote) e grava os resultados em um commit.
+
+        :return: Quantidade de registros tentados
+        """
+        agora = time.time()
+        estado = self.disjuntor.estado(agora)
+        if estado == "aberto":
+            return 0
+        # Meio-aberto: um unico envio de teste
+        limite = 1 if estado == "meio-aberto" else self.lote
+        registros = self.conn.execute(_PROXIMOS, (agora, limite)).fetchall()
+        if not registros:
+            return 0
+
+        sucessos, falhas = [], []
+        pendentes = {}
+        # Mantem no maximo max_em_voo requisicoes submetidas; se o disjuntor abrir,
+        # os registros ainda nao submetidos ficam para depois sem contar tentativa
+        for registro in registros:
+            pendentes[self._executor.submit(self._enviar, *registro[1:4], registro[5])] = registro
+            if len(pendentes) < self.max_em_voo:
+                continue
+            concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                self._resultado(pendentes.pop(futuro), futuro.result(), sucessos, falhas)
+            if self.disjuntor.estado(time.time()) != "fechado":
+                break
+        for futuro in list(pendentes):
+            self._resultado(pendentes.pop(futuro), futuro.result(), sucessos, falhas)
+
+        with self.conn:
+            self.conn.executemany(_MARCAR_ENVIADO, [(record_id,) for record_id in sucessos])
+            self.conn.executemany(_REMOVER_OUTBOX, [(record_id,) for record_id in sucessos])
+            self.conn.executemany(_REGISTRAR_FALHA, falhas)
+        self.enviados += len(sucessos)
+        self.falhas += len(falhas)
+        if falhas:
+            logger.warning(f"{len(falhas)} envio(s) com falha neste ciclo; ultimo erro: {falhas[-1][3]}")
+        return len(sucessos) + len(falhas)
+
+    def _resultado(self, registro, resultado, sucessos, falhas):
+        record_id, _, vehicle_code, _, tentativas, _ = registro
+        entregue, erro, temporario = resultado
+        agora = time.time()
+        if entregue:
+            sucessos.append(record_id)
+            self.disjuntor.sucesso()
+            return
+        if temporario:
+            self.disjuntor.falha(agora)
+        tentativas += 1
+        morto = not temporario and tentativas >= self.max_tentativas_recusado
+        falhas.append((record_id, tentativas, agora + self.espera(tentativas), erro, int(morto)))
+        if morto:
+            self.descartados += 1
+            logger.error(f"Registro ID {record_id} (codigo {vehicle_code}) recusado {tentativas} vez(es); "
+                         f"nao sera mais enviado: {erro}")
+        else:
+            logger.debug(f"Falha no registro ID {record_id} (codigo {vehicle_code}, tentativa {tentativas}): {erro}")
+
+    def pendentes_agendados(self):
+        """Instante (time.time()) da proxima tentativa agendada, ou None se nao houver."""
+        return self.conn.execute(_PROXIMA_AGENDADA).fetchone()[0]
+
+    def executar(self, drenar=False, relatorio_a_cada=60.0):
+        """
+        Executa ciclos ate stop() (ou, com drenar, ate nao restar registro a enviar nem agendado;
+        os registros mortos na outbox nao contam).
+        """
+        inicio = time.perf_counter()
+        proximo_relatorio = inicio + relatorio_a_cada
+        while not self._parar.is_set():
+            tentados = self.ciclo()
+            if time.perf_counter() >= proximo_relatorio:
+                self.relatar(inicio)
+                proximo_relatorio = time.perf_counter() + relatorio_a_cada
+            if tentados:
+                continue
+            if drenar and self.disjuntor.estado(time.time()) == "fechado" and self.pendentes_agendados() is None:
+                break
+            # Nada vencido: espera o intervalo, o fim da pausa do disjuntor ou a proxima tentativa agendada
+            esperas = [self.intervalo]
+            if self.disjuntor.reabrir_em is not None:
+                esperas.append(self.disjuntor.reabrir_em - time.time())
+            agendada = self.pendentes_agendados()
+            if agendada is not None:
+                esperas.append(agendada - time.time())
+            self._parar.wait(max(0.05, min(esperas)))
+        self.relatar(inicio)
+
+    def relatar(self, inicio):
+        duracao = time.perf_counter() - inicio
+        mensagem = (f"{self.enviados} registro(s) enviado(s), {self.falhas} falha(s), "
+                    f"{self.descartados} recusado(s) sem nova tentativa em {duracao:.1f}s "
+                    f"({self.enviados / max(duracao, 1e-9):.1f} registros/s), disjuntor "
+                    f"{self.disjuntor.estado(time.time())} ({self.disjuntor.aberturas} abertura(s))")
+        logger.info(mensagem)
+        print(mensagem)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Daemon de entrega dos tempos de permanencia para a API.")
+    parser.add_argument("--db_path", type=str, default="yolo8.db", help="Caminho para o banco de dados SQLite.")
+    parser.add_argument("--url", type=str, default=None, help="Endereco da API (padrao: o do api_tempopermanencia.py).")
+    parser.add_argument("--max_em_voo", type=int, default=8, help="Maximo de requisicoes simultaneas.")
+    parser.add_argument("--lote", type=int, default=500, help="Registros buscados por ciclo.")
+    parser.add_argument("--backoff_inicial", type=float, default=2.0, help="Espera (s) apos a primeira falha de um registro.")
+    parser.add_argument("--backoff_max", type=float, default=600.0, help="Espera maxima (s) entre tentativas de um registro.")
+    parser.add_argument("--limiar_falhas", type=int, default=5, help="Falhas consecutivas que abrem o disjuntor.")
+    parser.add_argument("--pausa_inicial", type=float, default=5.0, help="Pausa (s) do disjuntor na primeira abertura.")
+    parser.add_argument("--pausa_max", type=float, default=300.0, help="Pausa maxima (s) do disjuntor.")
+    parser.add_argument("--intervalo", type=float, default=5.0, help="Espera (s) entre ciclos sem nada a enviar.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout (s) de cada requisicao.")
+    parser.add_argument("--max_tentativas_recusado", type=int, default=5, help="Tentativas de um registro recusado pela API (ex.: 400) antes de desistir dele.")
+    parser.add_argument("--drenar", action="store_true", help="Encerra quando nao restar nada a enviar.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    api_tempopermanencia.configurar_log()
+
+    disjuntor = Disjuntor(args.limiar_falhas, args.pausa_inicial, args.pausa_max)
+    daemon = DaemonPermanencia(args.db_path, args.url, max_em_voo=args.max_em_voo, lote=args.lote,
+                               backoff_inicial=args.backoff_inicial, backoff_max=args.backoff_max,
+                               intervalo=args.intervalo, timeout=args.timeout, disjuntor=disjuntor,
+                               max_tentativas_recusado=args.max_tentativas_recusado)
+    try:
+        daemon.executar(drenar=args.drenar)
+    except KeyboardInterrupt:
+        print("Interrompido.")
+    finally:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
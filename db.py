@@ -1,7 +1,33 @@
 import os
-import sqlite3
 # Adição de argumentos via terminal
 import argparse
+import hashlib
+import locale
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from conexao_db import abrir_escrita
+
+# Uma linha de dados é identificada pelos quatro campos: reimportar o mesmo
+# arquivo (ou outro com as mesmas linhas) não duplica nada
+INSERIR_DADO = """
+    INSERT OR IGNORE INTO dados (codigo_veiculo, data_hora, entradas, saidas)
+    VALUES (?, ?, ?, ?)
+"""
+REGISTRAR_ARQUIVO = """
+    INSERT INTO arquivos_processados (nome_arquivo, hash, tamanho, mtime) VALUES (?, ?, ?, ?)
+    ON CONFLICT(nome_arquivo) DO UPDATE SET hash = excluded.hash, tamanho = excluded.tamanho, mtime = excluded.mtime
+"""
+PREFIXOS_CABECALHO = ("<", "empresa=", "fonte=", "servidor=")
+
+# Arquivos por commit do escritor, arquivos por tarefa enviada aos workers e
+# intervalo (s) entre as linhas de progresso
+ARQUIVOS_POR_TRANSACAO = 200
+CHUNK_LEITURA = 16
+INTERVALO_RELATORIO = 5
+
 
 def criar_tabela_dados(conexao):
     conexao.execute("""
@@ -13,99 +39,280 @@ def criar_tabela_dados(conexao):
         saidas INTEGER
     )
     """)
+    indice = conexao.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_dados_unico'").fetchone()
+    if indice is None:
+        # Bancos antigos: remove repetições (mantém a primeira) antes de criar o índice único
+        removidos = conexao.execute("""
+            DELETE FROM dados WHERE id NOT IN (
+                SELECT MIN(id) FROM dados GROUP BY codigo_veiculo, data_hora, entradas, saidas
+            )
+        """).rowcount
+        if removidos:
+            print(f"{removidos} registro(s) repetido(s) removido(s) de dados.")
+        conexao.execute("""
+        CREATE UNIQUE INDEX idx_dados_unico ON dados (codigo_veiculo, data_hora, entradas, saidas)
+        """)
     conexao.commit()
 
-def registrar_arquivo_processado(conexao, nome_arquivo):
-    cursor = conexao.cursor()
-    cursor.execute("INSERT INTO arquivos_processados (nome_arquivo) VALUES (?)", (nome_arquivo,))
+def criar_tabela_manifesto(conexao):
+    """Tabela dos arquivos importados: nome, hash SHA-256, tamanho e mtime de quando foi lido."""
+    conexao.execute("""
+    CREATE TABLE IF NOT EXISTS arquivos_processados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome_arquivo TEXT UNIQUE
+    )
+    """)
+    existentes = {coluna[1] for coluna in conexao.execute("PRAGMA table_info(arquivos_processados)").fetchall()}
+    for coluna, tipo in (("hash", "TEXT"), ("tamanho", "INTEGER"), ("mtime", "REAL")):
+        if coluna not in existentes:
+            conexao.execute(f"ALTER TABLE arquivos_processados ADD COLUMN {coluna} {tipo}")
     conexao.commit()
 
-def ja_processado(conexao, nome_arquivo):
-    cursor = conexao.cursor()
-    cursor.execute("SELECT 1 FROM arquivos_processados WHERE nome_arquivo = ?", (nome_arquivo,))
-    return cursor.fetchone() is not None
-
-def processar_arquivos_pasta(pasta, conexao):
-    arquivos_txt = [f for f in os.listdir(pasta) if f.endswith('.txt')]
-    
-    for arquivo in arquivos_txt:
-        if ja_processado(conexao, arquivo):
-            print(f"Arquivo já processado: {arquivo}")
-            continue
-        
-        caminho_arquivo = os.path.join(pasta, arquivo)
-        processar_arquivo(caminho_arquivo, conexao)
-        
-        # Registrar que o arquivo foi processado
-        registrar_arquivo_processado(conexao, arquivo)
-
-def processar_arquivo(caminho_arquivo, conexao):
-    with open(caminho_arquivo, 'r') as file:
-        linhas = file.readlines()
-    
-    for linha in linhas:
+def carregar_manifesto(conexao):
+    """Retorna {nome_arquivo: (hash, tamanho, mtime)} em uma única consulta."""
+    cursor = conexao.execute("SELECT nome_arquivo, hash, tamanho, mtime FROM arquivos_processados")
+    return {nome: (file_hash, tamanho, mtime) for nome, file_hash, tamanho, mtime in cursor}
+
+def ler_linhas_dados(conteudo):
+    """
+    Converte o conteúdo de um TXT de exportação em tuplas (codigo, data_hora, entradas, saidas).
+
+    :return: (registros, linhas com erro de formato)
+    """
+    registros = []
+    erros = []
+    for linha in conteudo.splitlines():
         linha = linha.strip()
-        
-        if linha.startswith("<") or linha.startswith("empresa=") or linha.startswith("fonte=") or linha.startswith("servidor="):
-            print(f"Ignorando linha de cabeçalho: {linha}")
+        if linha.startswith(PREFIXOS_CABECALHO):
             continue
-        
-        linha = linha.rstrip(';')
-        valores = linha.split(';')
-        
+
+        valores = linha.rstrip(';').split(';')
         if len(valores) == 4:
-            codigo_veiculo = valores[0]
-            data_hora = valores[1]
-            entradas = valores[2]
-            saidas = valores[3]
-            
-            cursor = conexao.cursor()
-            
-            # Verificar se o registro já existe
-            cursor.execute("""
-                SELECT 1 FROM dados WHERE codigo_veiculo = ? AND data_hora = ? AND entradas = ? AND saidas = ?
-            """, (codigo_veiculo, data_hora, entradas, saidas))
-            
-            if cursor.fetchone() is None:
-                cursor.execute("""
-                    INSERT INTO dados (codigo_veiculo, data_hora, entradas, saidas) 
-                    VALUES (?, ?, ?, ?)
-                """, (codigo_veiculo, data_hora, entradas, saidas))
-                conexao.commit()
-                print(f"Inserido: Codigo Veiculo = {codigo_veiculo}, Data/Hora = {data_hora}, Entradas = {entradas}, Saídas = {saidas}")
-            else:
-                print(f"Registro já existe: Codigo Veiculo = {codigo_veiculo}, Data/Hora = {data_hora}")
+            registros.append(tuple(valores))
         else:
-            print(f"Erro de formato na linha: {linha}")
+            erros.append(linha)
+    return registros, erros
+
+def ler_arquivo(arquivo):
+    """
+    Tarefa dos workers: lê, calcula o hash e interpreta um arquivo.
+
+    O texto é decodificado com a codificação do sistema, como o open(..., 'r')
+    fazia antes do pool; bytes inválidos viram caractere de substituição em vez
+    de derrubar a importação. Um arquivo que não pode ser lido volta com o erro
+    preenchido (sem hash nem registros) e não entra no manifesto.
+
+    :param arquivo: (caminho, nome, tamanho, mtime)
+    :return: (nome, hash, tamanho, mtime, registros, erros, erro de leitura ou None)
+    """
+    caminho, nome_arquivo, tamanho, mtime = arquivo
+    try:
+        with open(caminho, 'rb') as file:
+            conteudo = file.read()
+        file_hash = hashlib.sha256(conteudo).hexdigest().upper()
+        registros, erros = ler_linhas_dados(conteudo.decode(locale.getpreferredencoding(False), errors='replace'))
+    except Exception as e:
+        return nome_arquivo, None, tamanho, mtime, [], [], f"{type(e).__name__}: {e}"
+    return nome_arquivo, file_hash, tamanho, mtime, registros, erros, None
+
+def selecionar_arquivos(pasta, manifesto):
+    """
+    Lista os .txt da pasta que não constam no manifesto ou mudaram desde a
+    importação. O tamanho e o mtime vêm da própria varredura (os.scandir), sem
+    abrir os arquivos inalterados; arquivos registrados antes do manifesto
+    guardar esses dados continuam sendo considerados processados.
+
+    :return: ([(caminho, nome, tamanho, mtime)], quantidade de arquivos inalterados)
+    """
+    with os.scandir(pasta) as entradas:
+        arquivos = sorted(
+            (entrada for entrada in entradas if entrada.name.endswith('.txt') and entrada.is_file()),
+            key=lambda entrada: entrada.name,
+        )
+
+    pendentes = []
+    ignorados = 0
+    for entrada in arquivos:
+        info = entrada.stat()
+        registrado = manifesto.get(entrada.name)
+        if registrado is not None:
+            file_hash, tamanho, mtime = registrado
+            if file_hash is None or (tamanho == info.st_size and mtime == info.st_mtime):
+                ignorados += 1
+                continue
+        pendentes.append((entrada.path, entrada.name, info.st_size, info.st_mtime))
+    return pendentes, ignorados
+
+
+class EscritorDados(threading.Thread):
+    def __init__(self, banco, total_arquivos, arquivos_por_transacao=ARQUIVOS_POR_TRANSACAO,
+                 intervalo_relatorio=INTERVALO_RELATORIO):
+        """
+        Única thread que grava no banco: recebe arquivos já interpretados pela
+        fila e grava as linhas (executemany + INSERT OR IGNORE) e o manifesto de
+        vários arquivos por transação. Se uma transação falhar, os arquivos dela
+        não entram no manifesto e são importados de novo na próxima execução;
+        o mesmo vale para os arquivos que os workers não conseguiram ler. Se a
+        própria thread parar (ex.: banco travado ao abrir a conexão), o erro fica
+        em self.erro e enviar() passa a recusar itens, para o produtor não travar
+        na fila cheia.
+
+        :param banco: Caminho do banco SQLite (a conexão é aberta na própria thread)
+        :param total_arquivos: Arquivos a importar (para o progresso)
+        :param arquivos_por_transacao: Arquivos gravados em cada commit
+        :param intervalo_relatorio: Intervalo (s) entre as linhas de progresso
+        """
+        super().__init__(name="escritor_dados", daemon=True)
+        self.banco = banco
+        self.total_arquivos = total_arquivos
+        self.arquivos_por_transacao = arquivos_por_transacao
+        self.intervalo_relatorio = intervalo_relatorio
+        self.fila = queue.Queue(maxsize=arquivos_por_transacao * 4)
+        self.arquivos = 0
+        self.linhas_lidas = 0
+        self.linhas_inseridas = 0
+        self.falhas = 0
+        self.erro = None
+        self.inicio = None
+
+    def linhas_por_segundo(self):
+        return self.linhas_lidas / max(time.perf_counter() - self.inicio, 1e-9)
+
+    def _gravar(self, conexao, lote):
+        inseridas = 0
+        try:
+            with conexao:
+                for nome_arquivo, file_hash, tamanho, mtime, registros, _, _ in lote:
+                    antes = conexao.total_changes
+                    conexao.executemany(INSERIR_DADO, registros)
+                    inseridas += conexao.total_changes - antes
+                    conexao.execute(REGISTRAR_ARQUIVO, (nome_arquivo, file_hash, tamanho, mtime))
+        except Exception as e:
+            self.falhas += len(lote)
+            print(f"Erro ao gravar {len(lote)} arquivo(s) ({lote[0][0]} ... {lote[-1][0]}): {e}")
+            return
+        self.arquivos += len(lote)
+        self.linhas_lidas += sum(len(item[4]) for item in lote)
+        self.linhas_inseridas += inseridas
+
+    def enviar(self, item, timeout=1.0):
+        """
+        Entrega um arquivo interpretado (ou None, fim) ao escritor.
+
+        :return: False se a thread do escritor terminou e o item não será gravado
+        """
+        while self.is_alive():
+            try:
+                self.fila.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        self.inicio = time.perf_counter()
+        proximo_relatorio = self.inicio + self.intervalo_relatorio
+        conexao = None
+        try:
+            conexao = abrir_escrita(self.banco)
+            lote = []
+            while True:
+                item = self.fila.get()
+                if item is not None and item[6] is not None:
+                    # Arquivo que o worker não conseguiu ler: fica fora do manifesto
+                    self.falhas += 1
+                elif item is not None:
+                    lote.append(item)
+                if lote and (item is None or len(lote) >= self.arquivos_por_transacao):
+                    self._gravar(conexao, lote)
+                    lote = []
+                if item is None:
+                    break
+                if time.perf_counter() >= proximo_relatorio:
+                    self.relatar()
+                    proximo_relatorio = time.perf_counter() + self.intervalo_relatorio
+        except Exception as e:
+            self.erro = e
+            # Os arquivos ainda não gravados ficam fora do manifesto
+            self.falhas = self.total_arquivos - self.arquivos
+            print(f"Erro no escritor do banco {self.banco}; importação interrompida: {e}")
+        finally:
+            # A conexão pertence à thread que a criou
+            if conexao is not None:
+                conexao.close()
+
+    def relatar(self):
+        print(f"Progresso: {self.arquivos}/{self.total_arquivos} arquivo(s), "
+              f"{self.linhas_inseridas} linha(s) inserida(s), {self.linhas_por_segundo():.0f} linha(s)/s")
+
 
+def processar_arquivos_pasta(pasta, banco, workers=None, arquivos_por_transacao=ARQUIVOS_POR_TRANSACAO,
+                             intervalo_relatorio=INTERVALO_RELATORIO):
+    """
+    Importa a pasta em pipeline: um pool de processos lê e interpreta os
+    arquivos pendentes e uma única thread (EscritorDados) grava no banco.
 
+    :param pasta: Pasta com os TXT de exportação
+    :param banco: Caminho do banco SQLite
+    :param workers: Processos de leitura (padrão: os.cpu_count())
+    :param arquivos_por_transacao: Arquivos gravados em cada commit
+    :param intervalo_relatorio: Intervalo (s) entre as linhas de progresso
+    :return: EscritorDados com os totais da importação
+    """
+    conexao = abrir_escrita(banco)
+    try:
+        # Criar a tabela para registrar os arquivos processados e a tabela dados, se não existirem
+        criar_tabela_manifesto(conexao)
+        criar_tabela_dados(conexao)
+        manifesto = carregar_manifesto(conexao)
+    finally:
+        conexao.close()
 
-# Argumentos do terminal
-parser = argparse.ArgumentParser(description='Processa arquivos TXT e armazena os dados em um banco de dados SQLite.')
-parser.add_argument('--pasta', type=str, required=True, help='Caminho da pasta onde os arquivos .txt estão localizados.')
-parser.add_argument('--banco', type=str, required=True, help='Nome do arquivo de banco de dados SQLite de saída.')
-args = parser.parse_args()
+    pendentes, ignorados = selecionar_arquivos(pasta, manifesto)
+    print(f"{len(pendentes)} arquivo(s) a importar, {ignorados} já processado(s) e inalterado(s).")
 
-# Usar os caminhos fornecidos como argumentos
-pasta = args.pasta
+    escritor = EscritorDados(banco, len(pendentes), arquivos_por_transacao, intervalo_relatorio)
+    escritor.start()
+    try:
+        if pendentes:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Resultados na ordem dos arquivos; a fila limitada segura os workers se o escritor atrasar
+                for resultado in pool.map(ler_arquivo, pendentes, chunksize=CHUNK_LEITURA):
+                    if resultado[6] is not None:
+                        print(f"Erro ao ler {resultado[0]}: {resultado[6]}")
+                    for linha in resultado[5]:
+                        print(f"Erro de formato na linha ({resultado[0]}): {linha}")
+                    if not escritor.enviar(resultado):
+                        # Escritor parou: descarta a leitura dos arquivos restantes
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        break
+    finally:
+        escritor.enviar(None)
+        escritor.join()
 
-# Conectar ao banco de dados SQLite
-conexao = sqlite3.connect(args.banco)
+    duracao = time.perf_counter() - escritor.inicio
+    print(f"{escritor.arquivos} arquivo(s) importado(s) em {duracao:.1f}s, {escritor.linhas_inseridas} de "
+          f"{escritor.linhas_lidas} linha(s) inserida(s) ({escritor.linhas_por_segundo():.0f} linha(s)/s), "
+          f"{ignorados} arquivo(s) já processado(s) e inalterado(s).")
+    if escritor.falhas:
+        print(f"{escritor.falhas} arquivo(s) não gravado(s): serão importados na próxima execução.")
+    return escritor
 
 
-# Criar a tabela para registrar os arquivos processados, se ela não existir
-conexao.execute("""
-CREATE TABLE IF NOT EXISTS arquivos_processados (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome_arquivo TEXT UNIQUE
-)
-""")
+def main():
+    # Argumentos do terminal
+    parser = argparse.ArgumentParser(description='Processa arquivos TXT e armazena os dados em um banco de dados SQLite.')
+    parser.add_argument('--pasta', type=str, required=True, help='Caminho da pasta onde os arquivos .txt estão localizados.')
+    parser.add_argument('--banco', type=str, required=True, help='Nome do arquivo de banco de dados SQLite de saída.')
+    parser.add_argument('--workers', type=int, default=None, help='Processos de leitura dos arquivos (padrão: número de CPUs).')
+    parser.add_argument('--arquivos_por_transacao', type=int, default=ARQUIVOS_POR_TRANSACAO, help='Arquivos gravados em cada commit.')
+    parser.add_argument('--intervalo_relatorio', type=float, default=INTERVALO_RELATORIO, help='Intervalo (s) entre as linhas de progresso.')
+    args = parser.parse_args()
 
-# Criar a tabela dados, se ela não existir
-criar_tabela_dados(conexao)
+    escritor = processar_arquivos_pasta(args.pasta, args.banco, args.workers, args.arquivos_por_transacao, args.intervalo_relatorio)
+    if escritor.falhas:
+        raise SystemExit(1)
 
-# Chama a função para processar os arquivos da pasta
-processar_arquivos_pasta(pasta, conexao)
 
-# Fechar a conexão com o banco de dados
-conexao.close()
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,14 @@
 import os
-import sqlite3
+import json
+import time
 import pandas as pd
 import argparse
-import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
+from arquivo_txt import gravar_txt_com_hash, montar_txt
+from conexao_db import TAMANHO_PAGINA, abrir_leitura, ler_em_paginas, snapshot_leitura
 
-# Função para gerar o hash do nome do arquivo .txt
-def generate_hash_from_file(filepath):
-    """Gera um hash SHA-256 a partir do conteúdo de um arquivo."""
-    hash_sha256 = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        for block in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(block)
-    return hash_sha256.hexdigest().upper()
 
 def floor_timestamp_to_half_hour(timestamp_str):
     """Round a timestamp to the nearest half-hour interval."""
@@ -31,56 +26,95 @@ def floor_timestamp_to_half_hour(timestamp_str):
 
     return timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
-def get_data_from_db(db_path, start_time=None, end_time=None):
-    """Obtém dados do banco SQLite dentro do intervalo especificado ou desde o último export_log."""
-    if not os.path.exists(db_path):
-        print(f"Erro: Banco de dados {db_path} não encontrado!")
-        return None
+def arredondar_meia_hora(timestamps):
+    """
+    Versão vetorizada de floor_timestamp_to_half_hour para uma coluna datetime:
+    leva ao fim da meia hora (:30 ou hora cheia seguinte) e 00:00:SS vira 23:59:SS
+    do dia anterior.
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    :param timestamps: Série datetime64
+    :return: Série datetime64 com o horário arredondado
+    """
+    # Os timestamps eram lidos por strftime: frações de segundo eram descartadas
+    timestamps = timestamps.dt.floor('s')
+    arredondado = timestamps.dt.floor('30min') + pd.Timedelta(minutes=30)
+    meia_noite = (timestamps.dt.hour == 0) & (timestamps.dt.minute == 0)
+    return arredondado.mask(meia_noite, timestamps - pd.Timedelta(minutes=1))
+
+# Páginas por keyset no id (conexao_db.ler_em_paginas): sem índice em timestamp,
+# cada página é uma busca pela chave primária a partir do último id lido
+_COLUNAS_PAGINA = ['id', 'area', 'vehicle_code', 'count_in', 'count_out', 'timestamp']
+_CONSULTA_PERIODO = """
+    SELECT id, area, vehicle_code, count_in, count_out, timestamp
+    FROM vehicle_counts
+    WHERE timestamp BETWEEN ? AND ? AND id > ?
+    ORDER BY id
+    LIMIT ?;
+"""
+_CONSULTA_DESDE = """
+    SELECT id, area, vehicle_code, count_in, count_out, timestamp
+    FROM vehicle_counts
+    WHERE timestamp > ? AND id > ?
+    ORDER BY id
+    LIMIT ?;
+"""
+
+def ler_paginas_db(conn, start_time=None, end_time=None, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Lê os registros do intervalo especificado (ou desde o último export_log) em
+    páginas de tamanho fixo, cada uma como um DataFrame. Use dentro de
+    snapshot_leitura(conn): o export_log e todas as páginas vêm do mesmo snapshot.
+    """
     if start_time and end_time:
-        query = """
-            SELECT 
-                area, 
-                vehicle_code, 
-                count_in, 
-                count_out, 
-                timestamp
-            FROM vehicle_counts
-            WHERE timestamp BETWEEN ? AND ?
-            ORDER BY timestamp;
-        """
-        params = (start_time, end_time)
+        consulta, params = _CONSULTA_PERIODO, (start_time, end_time)
         print(f"Executando consulta ao banco de dados de {start_time} até {end_time}...")
     else:
-        cursor.execute("SELECT last_export FROM export_log ORDER BY id DESC LIMIT 1")
-        result = cursor.fetchone()
+        result = conn.execute("SELECT last_export FROM export_log ORDER BY id DESC LIMIT 1").fetchone()
         last_export_time = result[0] if result else '1970-01-01 00:00:00'
-        query = """
-            SELECT 
-                area, 
-                vehicle_code, 
-                count_in, 
-                count_out, 
-                timestamp
-            FROM vehicle_counts
-            WHERE timestamp > ?
-            ORDER BY timestamp;
-        """
-        params = (last_export_time,)
+        consulta, params = _CONSULTA_DESDE, (last_export_time,)
         print(f"Executando consulta ao banco de dados desde {last_export_time}...")
-    
-    data = pd.read_sql_query(query, conn, params=params)
-    conn.close()
 
-    if data.empty:
+    for pagina in ler_em_paginas(conn, consulta, params, tamanho_pagina):
+        yield pd.DataFrame.from_records(pagina, columns=_COLUNAS_PAGINA)
+
+def somar_periodo(db_path, start_time=None, end_time=None, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Lê o período em páginas e soma por veículo/intervalo conforme lê: em memória
+    ficam só a página atual e as somas (veículos x intervalos), não o período inteiro.
+
+    :return: (somas ou None se não houver dados, códigos de veículo na ordem de
+             aparição por timestamp, registros lidos), ou None se o banco não existir
+    """
+    if not os.path.exists(db_path):
+        print(f"Erro: Banco de dados {db_path} não encontrado!")
+        return None
+
+    somas = None
+    primeiros = {}  # código -> (timestamp, id) da primeira ocorrência
+    registros = 0
+    conn = abrir_leitura(db_path)
+    try:
+        with snapshot_leitura(conn):
+            for pagina in ler_paginas_db(conn, start_time, end_time, tamanho_pagina):
+                registros += len(pagina)
+                # As páginas vêm por id: a ordem dos códigos no arquivo continua sendo a de
+                # aparição por timestamp (como no ORDER BY timestamp da leitura única)
+                for codigo, timestamp, id_ in (pagina.sort_values(['timestamp', 'id'])
+                                               .drop_duplicates('vehicle_code')[['vehicle_code', 'timestamp', 'id']]
+                                               .itertuples(index=False)):
+                    if codigo not in primeiros or (timestamp, id_) < primeiros[codigo]:
+                        primeiros[codigo] = (timestamp, id_)
+                parcial = somar_por_intervalo(pagina)
+                # Um intervalo pode aparecer em várias páginas: soma as chaves repetidas
+                somas = parcial if somas is None else pd.concat([somas, parcial]).groupby(level=['vehicle_code', 'rounded_time']).sum()
+    finally:
+        conn.close()
+
+    if registros == 0:
         print("Nenhum dado encontrado.")
     else:
-        print(f"{len(data)} registros encontrados.")
-    
-    return data
+        print(f"{registros} registros encontrados.")
+    return somas, sorted(primeiros, key=primeiros.get), registros
 
 # função para gerar o range de 48 meias-hora (de 00:30 à 23:59) para todos os dias informados nos parâmetros
 def build_time_range(start_time, end_time):
@@ -121,12 +155,20 @@ def build_time_range(start_time, end_time):
 
     return pd.DatetimeIndex(full_time_ranges)
 
-def aggregate_data(data, start_time, end_time):
-    """Agrupa os dados por área, veículo e intervalo de 30 minutos e preenche lacunas."""
+def somar_por_intervalo(data):
+    """Soma entradas/saídas por veículo e intervalo de 30 minutos (sem preencher lacunas)."""
     data['timestamp'] = pd.to_datetime(data['timestamp'])
-    data['rounded_time'] = data['timestamp'].apply(lambda x: floor_timestamp_to_half_hour(x.strftime("%Y-%m-%d %H:%M:%S")))
-    data['rounded_time'] = pd.to_datetime(data['rounded_time'])
-    
+    data['rounded_time'] = arredondar_meia_hora(data['timestamp'])
+    return (
+        data.groupby(['vehicle_code', 'rounded_time'])
+            .agg(
+                total_in=('count_in', 'sum'),
+                total_out=('count_out', 'sum')
+            )
+    )
+
+def preencher_intervalos(somas, all_vehicle_codes, start_time, end_time):
+    """Completa as somas com zero para todos os veículos x intervalos do período."""
     # transforma a variável start_time de string para datetime e troca o primeiro registro para 30min
     start_time = (datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
         .replace(minute=30, second=0)
@@ -136,70 +178,175 @@ def aggregate_data(data, start_time, end_time):
     # --- Gera range fixo com base no intervalo informado ---
     time_range = build_time_range(start_time, end_time)
     
-    all_vehicle_codes = data['vehicle_code'].unique()
     full_index = pd.MultiIndex.from_product(
         [all_vehicle_codes, time_range], 
         names=['vehicle_code', 'rounded_time']
     )
     
-    aggregated_data = (
-        data.groupby(['vehicle_code', 'rounded_time'])
-            .agg(
-                total_in=('count_in', 'sum'),
-                total_out=('count_out', 'sum')
-            )
-            .reindex(full_index, fill_value=0)
-            .reset_index()
-    )
+    aggregated_data = somas.reindex(full_index, fill_value=0).reset_index()
     
     print(f"{len(aggregated_data)} registros agregados por intervalos de 30 minutos.")
     return aggregated_data
 
+def aggregate_data(data, start_time, end_time):
+    """Agrupa os dados por área, veículo e intervalo de 30 minutos e preenche lacunas."""
+    return preencher_intervalos(somar_por_intervalo(data), data['vehicle_code'].unique(), start_time, end_time)
+
 def save_consolidated_file(aggregated_data, client_code, output_directory):
     """Gera um arquivo TXT consolidado com os dados agregados."""
-    if not os.path.exists(output_directory):
-        os.makedirs(output_directory)
-    
-    temp_filename = f"{client_code}_{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
-    temp_file_path = os.path.join(output_directory, temp_filename)
-    
-    with open(temp_file_path, 'w') as file:
-        file.write("<inicio cabecalho>\n")
-        file.write(f"empresa={client_code}\n")
-        file.write("fonte=pixforce\n")
-        file.write("servidor=servidor\n")
-        file.write("<fim cabecalho>\n")
-        file.write("<inicio dados>\n")
-        
-        for _, row in aggregated_data.iterrows():
-            timestamp_str = row['rounded_time'].strftime("%Y-%m-%d %H:%M:%S")
-            file.write(f"{row['vehicle_code']};{timestamp_str};{row['total_in']};{row['total_out']};\n")
-        
-        file.write("<fim dados>\n")
+    linhas = [
+        f"{vehicle_code};{timestamp_str};{total_in};{total_out};"
+        for vehicle_code, timestamp_str, total_in, total_out in zip(
+            aggregated_data['vehicle_code'],
+            aggregated_data['rounded_time'].dt.strftime("%Y-%m-%d %H:%M:%S"),
+            aggregated_data['total_in'],
+            aggregated_data['total_out'],
+        )
+    ]
     
-    file_hash = generate_hash_from_file(temp_file_path)
-    final_filename = f"{client_code}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{file_hash}.txt"
-    final_file_path = os.path.join(output_directory, final_filename)
-    os.rename(temp_file_path, final_file_path)
+    # Hash calculado em memória e arquivo criado direto com o nome final
+    prefixo = f"{client_code}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    final_file_path = gravar_txt_com_hash(output_directory, prefixo, montar_txt(client_code, linhas))
     
-    print(f"Arquivo consolidado salvo como {final_filename}")
+    print(f"Arquivo consolidado salvo como {os.path.basename(final_file_path)}")
+    return final_file_path
+
+# ---------------------------------------------------------------------------
+# Modo lote: vários (cliente, banco, período) em um pool de processos
+# ---------------------------------------------------------------------------
+
+def dividir_por_dia(start_time, end_time):
+    """Divide [start_time, end_time] (inclusivo, como o BETWEEN da consulta) em intervalos de um dia."""
+    inicio = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
+    fim = datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S')
+    intervalos = []
+    while inicio <= fim:
+        fim_dia = min(fim, inicio.replace(hour=23, minute=59, second=59))
+        intervalos.append((inicio.strftime('%Y-%m-%d %H:%M:%S'), fim_dia.strftime('%Y-%m-%d %H:%M:%S')))
+        inicio = fim_dia.replace(hour=0, minute=0, second=0) + timedelta(days=1)
+    return intervalos
+
+def somar_dia(db_path, start_time, end_time, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Tarefa do pool: lê um dia do banco em páginas e soma por veículo/intervalo.
+
+    :return: (somas, códigos de veículo na ordem de aparição, registros lidos)
+    """
+    resultado = somar_periodo(db_path, start_time, end_time, tamanho_pagina)
+    if resultado is None:
+        return None, [], 0
+    return resultado
+
+def salvar_job(somas_dias, codigos, job):
+    """
+    Tarefa do pool: junta as somas dos dias de um job e grava o arquivo consolidado,
+    com o mesmo conteúdo de uma execução única sobre o período inteiro.
+    """
+    # Um 00:00 lido no dia seguinte cai no 23:59 do dia anterior: soma as chaves repetidas
+    somas = pd.concat(somas_dias).groupby(level=['vehicle_code', 'rounded_time']).sum()
+    aggregated_data = preencher_intervalos(somas, codigos, job['start_time'], job['end_time'])
+    return save_consolidated_file(aggregated_data, job['client_code'], job['output_directory'])
+
+def carregar_jobs(jobs_path, output_directory=None):
+    """
+    Lê a lista de jobs (JSON): [{"client_code", "db_path", "start_time", "end_time",
+    "output_directory" (opcional, padrão --output_directory)}].
+    """
+    with open(jobs_path, 'r', encoding='utf-8') as f:
+        jobs = json.load(f)
+    for i, job in enumerate(jobs):
+        job.setdefault('output_directory', output_directory)
+        faltando = [campo for campo in ('client_code', 'db_path', 'start_time', 'end_time', 'output_directory') if not job.get(campo)]
+        if faltando:
+            raise ValueError(f"Job {i} sem {', '.join(faltando)}")
+        job['client_code'] = str(job['client_code'])
+    return jobs
+
+def executar_lote(jobs, workers=None, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Processa os jobs em um pool de processos: cada job é dividido por dia, os dias
+    são lidos e agregados em paralelo e os arquivos são gravados em paralelo.
+
+    :param jobs: Lista de jobs (carregar_jobs)
+    :param workers: Número de processos (padrão: os.cpu_count())
+    :param tamanho_pagina: Registros por página na leitura de cada dia
+    :return: Lista com o resumo de cada job
+    """
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros_dias = [
+            [pool.submit(somar_dia, job['db_path'], dia_inicio, dia_fim, tamanho_pagina) for dia_inicio, dia_fim in dividir_por_dia(job['start_time'], job['end_time'])]
+            for job in jobs
+        ]
+
+        resumo = []
+        futuros_arquivos = []
+        for job, futuros in zip(jobs, futuros_dias):
+            somas_dias, codigos, registros, erro = [], [], 0, None
+            for futuro in futuros:
+                try:
+                    somas, codigos_dia, lidos = futuro.result()
+                except Exception as e:
+                    erro = f"falha na leitura: {e}"
+                    break
+                if somas is not None:
+                    somas_dias.append(somas)
+                    codigos.extend(codigo for codigo in codigos_dia if codigo not in codigos)
+                    registros += lidos
+            resumo.append({'client_code': job['client_code'], 'db_path': job['db_path'],
+                           'start_time': job['start_time'], 'end_time': job['end_time'],
+                           'dias': len(futuros), 'registros': registros, 'arquivo': None, 'erro': erro})
+            if erro is None and somas_dias:
+                futuros_arquivos.append((resumo[-1], pool.submit(salvar_job, somas_dias, codigos, job)))
+
+        for item, futuro in futuros_arquivos:
+            try:
+                item['arquivo'] = futuro.result()
+            except Exception as e:
+                item['erro'] = f"falha na gravação: {e}"
+
+    duracao = time.perf_counter() - inicio
+    print(f"\nResumo do lote ({len(jobs)} job(s) em {duracao:.1f}s):")
+    for item in resumo:
+        if item['erro']:
+            situacao = f"ERRO - {item['erro']}"
+        elif item['arquivo']:
+            situacao = os.path.basename(item['arquivo'])
+        else:
+            situacao = "sem dados, arquivo não gerado"
+        print(f"  cliente {item['client_code']} | {item['start_time']} a {item['end_time']} | "
+              f"{item['dias']} dia(s) | {item['registros']} registros | {situacao}")
+    return resumo
 
 def main():
     parser = argparse.ArgumentParser(description='Consolida dados de contagem de veículos.')
-    parser.add_argument('--client_code', type=str, required=True, help='Código do cliente.')
-    parser.add_argument('--db_path', type=str, required=True, help='Caminho do banco de dados.')
-    parser.add_argument('--output_directory', type=str, required=True, help='Diretório de saída.')
+    parser.add_argument('--client_code', type=str, help='Código do cliente.')
+    parser.add_argument('--db_path', type=str, help='Caminho do banco de dados.')
+    parser.add_argument('--output_directory', type=str, help='Diretório de saída (padrão dos jobs no modo lote).')
     parser.add_argument('--start_time', type=str, help='(Opcional) Data e hora inicial no formato "YYYY-MM-DD HH:MM:SS".')
     parser.add_argument('--end_time', type=str, help='(Opcional) Data e hora final no formato "YYYY-MM-DD HH:MM:SS".')
+    parser.add_argument('--jobs', type=str, help='Modo lote: JSON com a lista de jobs (client_code, db_path, start_time, end_time, output_directory).')
+    parser.add_argument('--workers', type=int, default=None, help='Modo lote: número de processos (padrão: número de CPUs).')
+    parser.add_argument('--tamanho_pagina', type=int, default=TAMANHO_PAGINA, help='Registros lidos do banco por página.')
     
     args = parser.parse_args()
     
-    data = get_data_from_db(args.db_path, args.start_time, args.end_time)
-    if data is None or data.empty:
+    if args.jobs:
+        resumo = executar_lote(carregar_jobs(args.jobs, args.output_directory), args.workers, args.tamanho_pagina)
+        if any(item['erro'] for item in resumo):
+            raise SystemExit(1)
+        return
+    
+    if not (args.client_code and args.db_path and args.output_directory):
+        parser.error('--client_code, --db_path e --output_directory são obrigatórios sem --jobs')
+    
+    resultado = somar_periodo(args.db_path, args.start_time, args.end_time, args.tamanho_pagina)
+    if resultado is None or resultado[0] is None:
         print("Nenhum dado encontrado. Arquivo não será gerado.")
         return
     
-    aggregated_data = aggregate_data(data, args.start_time, args.end_time)
+    somas, codigos, _ = resultado
+    aggregated_data = preencher_intervalos(somas, codigos, args.start_time, args.end_time)
     save_consolidated_file(aggregated_data, args.client_code, args.output_directory)
 
 if __name__ == "__main__":
@@ -1,11 +1,23 @@
 import os
 import json
 import argparse
-import sqlite3
 import pandas as pd
-import hashlib
 from datetime import datetime, timedelta
 
+from arquivo_txt import gravar_txt_com_hash, montar_txt
+from conexao_db import TAMANHO_PAGINA, abrir_escrita, abrir_leitura, ler_em_paginas, snapshot_leitura
+
+# Registros desde o último export, lidos em páginas por keyset no id
+# (conexao_db.ler_em_paginas): cada página é uma busca pela chave primária
+COLUNAS_PAGINA = ['id', 'area', 'vehicle_code', 'count_in', 'count_out', 'timestamp']
+CONSULTA_PAGINA = """
+SELECT id, area, vehicle_code, count_in, count_out, timestamp
+FROM vehicle_counts
+WHERE timestamp > ? AND id > ?
+ORDER BY id
+LIMIT ?;
+"""
+
 # Função para arredondar timestamps para o intervalo de meia hora mais próximo
 def round_timestamp_to_nearest_half_hour(timestamp_str):
     """Round a timestamp to the nearest half-hour interval."""
@@ -25,67 +37,49 @@ def round_timestamp_to_nearest_half_hour(timestamp_str):
     return timestamp.strftime("%Y-%m-%d %H:%M:%S")
 
 
-# Função para gerar o nome do arquivo sem o hash, mas seguindo o padrão YYYYMMDDHHMMSS
-def generate_filename_without_hash(client_code, timestamp):
-    """Generate the filename with client code and timestamp, without hash."""
-    time_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-    formatted_time = time_obj.strftime("%Y%m%d%H%M%S")  # Usando o formato YYYYMMDDHHMMSS
-    return f"{client_code}_{formatted_time}.txt"
-
-# Função para gerar o hash baseado no conteúdo do arquivo
-def generate_hash_from_file(filepath):
-    """Generate a SHA-256 hash from the content of a file."""
-    hash_sha256 = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        # Leitura em blocos para arquivos grandes
-        for block in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(block)
-    return hash_sha256.hexdigest().upper()
-
-
-def get_data_from_db(db_path):
-    """Fetch vehicle data from the database since the last export time."""
+def get_data_from_db(db_path, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Fetch vehicle data from the database since the last export time, page by
+    page, and return it already aggregated by 30-minute intervals.
+    """
     if not os.path.exists(db_path):
         print(f"Erro: Banco de dados {db_path} não encontrado!")
         return None, None
 
-    conn = sqlite3.connect(db_path)
-
-    # Obter o último horário de exportação
-    cursor = conn.cursor()
-    cursor.execute("SELECT last_export FROM export_log ORDER BY id DESC LIMIT 1")
-    result = cursor.fetchone()
-    if result:
-        """
-        if result[0].split(' ', 1)[1] == '23:30:00':
-            last_export_time = f"{result[0].split(' ', 1)[0]} 00:00:00"
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO export_log (last_export) VALUES (?)", (last_export_time,))
-            conn.commit()
+    conn = abrir_leitura(db_path)
+
+    # O último horário de exportação e os dados vêm do mesmo snapshot
+    with snapshot_leitura(conn):
+        # Obter o último horário de exportação
+        cursor = conn.cursor()
+        cursor.execute("SELECT last_export FROM export_log ORDER BY id DESC LIMIT 1")
+        result = cursor.fetchone()
+        if result:
+            """
+            if result[0].split(' ', 1)[1] == '23:30:00':
+                last_export_time = f"{result[0].split(' ', 1)[0]} 00:00:00"
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO export_log (last_export) VALUES (?)", (last_export_time,))
+                conn.commit()
+            else:
+            """
+            last_export_time = result[0]
         else:
-        """
-        last_export_time = result[0]
-    else:
-        last_export_time = '1970-01-01 00:00:00'
+            last_export_time = '1970-01-01 00:00:00'
 
-    query = """
-    SELECT area, vehicle_code, count_in, count_out, timestamp
-    FROM vehicle_counts
-    WHERE timestamp > ?
-    ORDER BY timestamp;
-    """
-    print(f"Executando consulta ao banco de dados desde {last_export_time}...")
-    data = pd.read_sql_query(query, conn, params=(last_export_time,))
+        print(f"Executando consulta ao banco de dados desde {last_export_time}...")
+        aggregated_data, registros = agregar_paginas(conn, last_export_time, tamanho_pagina)
     
     cursor.close()
     conn.close()
 
-    if data.empty:
+    if registros == 0:
         print(f"Nenhum dado encontrado no banco de dados depois de {last_export_time}")
     else:
-        print(f"{len(data)} registros encontrados no banco de dados.")
+        print(f"{registros} registros encontrados no banco de dados.")
+        print(f"{len(aggregated_data)} registros agregados por intervalos de 30 minutos.")
     
-    return data, last_export_time
+    return aggregated_data, last_export_time
 
 
 def format_content(aggregated_data, client_code):
@@ -116,17 +110,38 @@ def aggregate_data(data):
         total_out=('count_out', 'sum')
     ).reset_index()
 
-    print(f"{len(aggregated_data)} registros agregados por intervalos de 30 minutos.")
     return aggregated_data
 
+def agregar_paginas(conn, last_export_time, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Lê os registros posteriores a last_export_time em páginas (keyset no id) e
+    agrega cada página conforme lê: em memória ficam só a página atual e os
+    totais por área/veículo/intervalo.
+
+    :return: (dados agregados, registros lidos)
+    """
+    aggregated_data = pd.DataFrame(columns=['area', 'vehicle_code', 'rounded_time', 'total_in', 'total_out'])
+    registros = 0
+    for pagina in ler_em_paginas(conn, CONSULTA_PAGINA, (last_export_time,), tamanho_pagina):
+        registros += len(pagina)
+        parcial = aggregate_data(pd.DataFrame.from_records(pagina, columns=COLUNAS_PAGINA))
+        if aggregated_data.empty:
+            aggregated_data = parcial
+        else:
+            # Um intervalo pode aparecer em várias páginas: soma as chaves repetidas
+            aggregated_data = (pd.concat([aggregated_data, parcial])
+                               .groupby(['area', 'vehicle_code', 'rounded_time'], as_index=False).sum())
+    return aggregated_data, registros
+
 def save_files_per_interval(aggregated_data, client_code, output_directory, db_path):
     """Save the aggregated data into separate files for each 30-minute interval and handle empty data."""
-    conn = sqlite3.connect(db_path)
+    conn = abrir_leitura(db_path)
     cursor = conn.cursor()
 
     # Obter todos os códigos de veículos do banco de dados e garantir ordenação consistente
     cursor.execute("SELECT DISTINCT vehicle_code FROM vehicle_counts ORDER BY vehicle_code")
     all_vehicle_codes = [row[0] for row in cursor.fetchall()]
+    conn.close()
 
     if aggregated_data.empty:
         print("Nenhum dado encontrado. Gerando arquivo com valores zerados.")
@@ -162,38 +177,21 @@ def save_files_per_interval(aggregated_data, client_code, output_directory, db_p
             }
 
         # Gerar o conteúdo do arquivo com os pontos
-        formatted_content = "\n".join(
-            [f"{code};{rounded_time};{counts['total_in']};{counts['total_out']};"
-             for code, counts in counts_dict.items()]
-        )
-
-        # Gera o nome do arquivo sem o hash inicialmente
-        file_name = generate_filename_without_hash(client_code, rounded_time)
-        file_path = os.path.join(output_directory, file_name)
-
-        # Verifica se o diretório existe, caso contrário, cria
-        if not os.path.exists(output_directory):
-            os.makedirs(output_directory)
-
-        # Salva o arquivo
-        with open(file_path, 'w') as file:
-            file.write("<inicio cabecalho>\n")
-            file.write(f"empresa={client_code}\n")
-            file.write("fonte=pixforce\n")
-            file.write("servidor=servidor\n")
-            file.write("<fim cabecalho>\n")
-            file.write("<inicio dados>\n")
-            file.write(formatted_content + "\n")
-            file.write("<fim dados>\n")
-
-        # Gerar o hash e renomear o arquivo
-        file_hash = generate_hash_from_file(file_path)
-        new_file_name = f"{client_code}_{interval.strftime('%Y%m%d%H%M%S')}_{file_hash}.txt"
-        os.rename(file_path, os.path.join(output_directory, new_file_name))
-
-        print(f"Arquivo salvo e renomeado: {new_file_name}")
-
-    # Atualizar o last_export_time na tabela export_log
+        formatted_content = [
+            f"{code};{rounded_time};{counts['total_in']};{counts['total_out']};"
+            for code, counts in counts_dict.items()
+        ]
+
+        # Hash calculado em memória e arquivo criado direto com o nome final
+        prefixo = f"{client_code}_{interval.strftime('%Y%m%d%H%M%S')}"
+        # Sem nenhum código no banco o bloco de dados continua com uma linha vazia, como antes
+        file_path = gravar_txt_com_hash(output_directory, prefixo, montar_txt(client_code, formatted_content or [""]))
+
+        print(f"Arquivo salvo: {os.path.basename(file_path)}")
+
+    # Atualizar o last_export_time na tabela export_log (escrita só depois de gerar os arquivos)
+    conn = abrir_escrita(db_path)
+    cursor = conn.cursor()
     cursor.execute("INSERT INTO export_log (last_export) VALUES (?)", (end_time.strftime("%Y-%m-%d %H:%M:%S"),))
     conn.commit()
     conn.close()
@@ -207,7 +205,7 @@ def delete_old_records(db_path, days_to_keep):
         print(f"Erro: Banco de dados {db_path} não encontrado!")
         return
     
-    conn = sqlite3.connect(db_path)
+    conn = abrir_escrita(db_path)
     cursor = conn.cursor()
 
     # Calcular a data limite com base no número de dias
@@ -231,19 +229,17 @@ def main():
     parser.add_argument('--db_path', type=str, required=True, help='Path to the SQLite database file.')
     parser.add_argument('--output_directory', type=str, required=True, help='Directory to save the formatted TXT files.')
     parser.add_argument('--days_to_keep', type=int, default=90, help='Number of days to keep in the database. Older records will be deleted.')
+    parser.add_argument('--tamanho_pagina', type=int, default=TAMANHO_PAGINA, help='Records read from the database per page.')
 
     args = parser.parse_args()
 
     # Deleta registros mais antigos que "days_to_keep"
     delete_old_records(args.db_path, args.days_to_keep)
-    # Busca os dados no banco
-    data, last_export_time = get_data_from_db(args.db_path)
-    if data is None or len(data) == 0:
+    # Busca os dados no banco em páginas, já agregados por intervalos de 30 minutos
+    aggregated_data, last_export_time = get_data_from_db(args.db_path, args.tamanho_pagina)
+    if aggregated_data is None or aggregated_data.empty:
         print("Nenhum dado encontrado. Gerando arquivo com valores zerados.")
         aggregated_data = pd.DataFrame(columns=['area', 'vehicle_code', 'rounded_time', 'total_in', 'total_out'])
-    else:
-        # Agrega os dados por intervalos de 30 minutos
-        aggregated_data = aggregate_data(data)
 
     # Salva os dados em arquivos separados por intervalo de 30 minutos
     save_files_per_interval(aggregated_data, args.client_code, args.output_directory, args.db_path)
@@ -0,0 +1,145 @@
+import numpy as np
+
+# Classes do modelo de produção (mesma ordem de classes_to_count em yolo16_v4.py)
+NOMES_CLASSES_PADRAO = {0: 'bus', 1: 'cars', 2: 'motorcycle', 3: 'truck', 4: 'vuc'}
+
+
+class TensorNumpy:
+    """
+    Imita a parte da interface de torch.Tensor usada pelo pipeline
+    (cpu, numpy, item, tolist, int, iteração e indexação) sobre um array NumPy.
+    """
+
+    def __init__(self, valores):
+        self.valores = np.asarray(valores)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.valores
+
+    def item(self):
+        return self.valores.item()
+
+    def tolist(self):
+        return self.valores.tolist()
+
+    def int(self):
+        return TensorNumpy(self.valores.astype(np.int64))
+
+    def __iter__(self):
+        return (TensorNumpy(valor) for valor in self.valores)
+
+    def __getitem__(self, indice):
+        return TensorNumpy(self.valores[indice])
+
+    def __len__(self):
+        return len(self.valores)
+
+    def __float__(self):
+        return float(self.valores)
+
+    def __int__(self):
+        return int(self.valores)
+
+    def __add__(self, outro):
+        return TensorNumpy(self.valores + np.asarray(outro))
+
+    __radd__ = __add__
+
+    def __truediv__(self, outro):
+        return TensorNumpy(self.valores / np.asarray(outro))
+
+
+class BoxesNumpy:
+    """Equivalente ao Boxes do ultralytics (xyxy, id, cls e conf) sobre arrays NumPy."""
+
+    def __init__(self, xyxy, ids, cls, conf=None):
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.xyxy = TensorNumpy(xyxy)
+        self.id = TensorNumpy(np.asarray(ids, dtype=np.float32)) if len(xyxy) else None
+        self.cls = TensorNumpy(np.asarray(cls, dtype=np.float32))
+        if conf is None:
+            conf = np.ones(len(xyxy), dtype=np.float32)
+        self.conf = TensorNumpy(np.asarray(conf, dtype=np.float32))
+        self.is_track = self.id is not None
+
+    @property
+    def data(self):
+        """Mesmo layout de Boxes.data do ultralytics: x1, y1, x2, y2, id, conf, cls."""
+        if self.id is None:
+            return TensorNumpy(np.zeros((0, 7), dtype=np.float32))
+        return TensorNumpy(np.column_stack([
+            self.xyxy.valores, self.id.valores, self.conf.valores, self.cls.valores
+        ]))
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class ResultadoDeteccao:
+    """Equivalente mínimo ao Results do ultralytics para um frame rastreado."""
+
+    def __init__(self, boxes, names, orig_img=None):
+        self.boxes = boxes
+        self.names = names
+        self.orig_img = orig_img
+
+
+def resultado_de_arrays(xyxy, ids, cls, names, conf=None, orig_img=None):
+    """Monta a lista de resultados (como list(model.track(...))) a partir de arrays."""
+    return [ResultadoDeteccao(BoxesNumpy(xyxy, ids, cls, conf), names, orig_img)]
+
+
+class DetectorSintetico:
+    def __init__(self, largura, altura, n_veiculos=12, names=None, semente=0, passo=8.0):
+        """
+        Detector determinístico para benchmark: veículos sintéticos atravessam o
+        frame de cima para baixo com velocidade e faixa horizontal sorteadas por
+        uma semente fixa; ao sair do frame cada veículo reaparece com um novo id.
+
+        :param largura: Largura do frame em pixels
+        :param altura: Altura do frame em pixels
+        :param n_veiculos: Quantidade de veículos simultâneos
+        :param names: Nomes das classes ({id: nome}); padrão: NOMES_CLASSES_PADRAO
+        :param semente: Semente do gerador (mesma semente = mesma sequência de detecções)
+        :param passo: Deslocamento vertical médio por frame em pixels
+        """
+        self.largura = largura
+        self.altura = altura
+        self.names = dict(names or NOMES_CLASSES_PADRAO)
+        self.rng = np.random.default_rng(semente)
+        self.passo = passo
+
+        self._ids = np.arange(1, n_veiculos + 1, dtype=np.int64)
+        self._proximo_id = n_veiculos + 1
+        self._x = self.rng.uniform(0.05, 0.95, n_veiculos) * largura
+        self._y = self.rng.uniform(-0.5, 1.0, n_veiculos) * altura
+        self._vel = self.rng.uniform(0.5, 1.5, n_veiculos) * passo
+        self._cls = self.rng.choice(list(self.names), n_veiculos)
+        self._meia_largura = self.rng.uniform(20, 60, n_veiculos)
+        self._meia_altura = self._meia_largura * self.rng.uniform(0.8, 1.6, n_veiculos)
+
+    def track(self, im0=None, **kwargs):
+        """Avança um frame e retorna as detecções visíveis (mesma forma de list(model.track(...)))."""
+        self._y += self._vel
+
+        saiu = self._y - self._meia_altura > self.altura
+        n_saiu = int(saiu.sum())
+        if n_saiu:
+            self._ids[saiu] = np.arange(self._proximo_id, self._proximo_id + n_saiu)
+            self._proximo_id += n_saiu
+            self._x[saiu] = self.rng.uniform(0.05, 0.95, n_saiu) * self.largura
+            self._y[saiu] = -self._meia_altura[saiu]
+            self._vel[saiu] = self.rng.uniform(0.5, 1.5, n_saiu) * self.passo
+            self._cls[saiu] = self.rng.choice(list(self.names), n_saiu)
+
+        visivel = (self._y + self._meia_altura > 0) & (self._y - self._meia_altura < self.altura)
+        xyxy = np.column_stack([
+            self._x - self._meia_largura, self._y - self._meia_altura,
+            self._x + self._meia_largura, self._y + self._meia_altura,
+        ])[visivel]
+        np.clip(xyxy[:, 0::2], 0, self.largura - 1, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, self.altura - 1, out=xyxy[:, 1::2])
+        return resultado_de_arrays(xyxy, self._ids[visivel], self._cls[visivel], self.names, orig_img=im0)
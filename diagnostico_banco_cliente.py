@@ -6,40 +6,37 @@ DIAGNOSTICO DO BANCO LOCAL (vehicle_counts)
 Gera um relatorio completo com a saude dos registros gravados localmente,
 incluindo verificacoes de estrutura, duplicidades, tempos invalidados e
 status de envio para a MFWeb.
+
+As metricas sao calculadas em uma unica leitura de vehicle_counts, por uma
+conexao somente leitura (metricas_vehicle_counts.py).
 """
 
 import sqlite3
 import argparse
 from datetime import datetime, timedelta
 
+from conexao_db import abrir_leitura
+from metricas_vehicle_counts import MetricasVehicleCounts, coletar_metricas
+
 
 def conectar_banco(db_path: str) -> sqlite3.Connection | None:
     try:
-        return sqlite3.connect(db_path)
+        return abrir_leitura(db_path)
     except sqlite3.Error as err:
         print(f"ERRO ao conectar no banco {db_path}: {err}")
         return None
 
 
-def listar_tabelas(conn: sqlite3.Connection) -> list[str]:
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    return [t[0] for t in cursor.fetchall()]
-
-
-def verificar_estrutura(conn: sqlite3.Connection) -> None:
-    cursor = conn.cursor()
-
+def verificar_estrutura(metricas: MetricasVehicleCounts) -> None:
     print("=" * 60)
     print("ESTRUTURA DO BANCO")
     print("=" * 60)
 
-    tabelas = listar_tabelas(conn)
+    tabelas = metricas.tabelas
     print(f"Tabelas: {tabelas}")
 
     if "vehicle_counts" in tabelas:
-        cursor.execute("PRAGMA table_info(vehicle_counts)")
-        colunas = cursor.fetchall()
+        colunas = metricas.colunas["vehicle_counts"]
         print("\nColunas de vehicle_counts:")
         for col in colunas:
             default = f" DEFAULT {col[4]}" if col[4] else ""
@@ -53,8 +50,7 @@ def verificar_estrutura(conn: sqlite3.Connection) -> None:
         print("ERRO: tabela vehicle_counts nao encontrada!")
 
     if "export_log" in tabelas:
-        cursor.execute("PRAGMA table_info(export_log)")
-        colunas = cursor.fetchall()
+        colunas = metricas.colunas["export_log"]
         print("\nColunas de export_log:")
         for col in colunas:
             print(f"  {col[1]} {col[2]}")
@@ -63,72 +59,30 @@ def verificar_estrutura(conn: sqlite3.Connection) -> None:
         print("\nOBS: tabela legada vehicle_permanence ainda existe (nao utilizada).")
 
 
-def contagem_detalhada(conn: sqlite3.Connection) -> None:
-    cursor = conn.cursor()
-
+def contagem_detalhada(metricas: MetricasVehicleCounts) -> None:
     print("\n" + "=" * 60)
     print("CONTAGEM DETALHADA")
     print("=" * 60)
 
-    try:
-        cursor.execute("SELECT COUNT(*) FROM vehicle_counts")
-        total = cursor.fetchone()[0]
-        print(f"Total de linhas em vehicle_counts: {total:,}")
+    print(f"Total de linhas em vehicle_counts: {metricas.total:,}")
+    print(f"Saidas com tempo registrado: {metricas.saidas_com_tempo:,}")
+    print(f"Saidas sem tempo (pendentes do tracker): {metricas.saidas_sem_tempo:,}")
 
-        cursor.execute(
-            """
-            SELECT COUNT(*) FROM vehicle_counts
-            WHERE count_out = 1 AND tempo_permanencia IS NOT NULL
-            """
-        )
-        total_saidas = cursor.fetchone()[0]
-        print(f"Saidas com tempo registrado: {total_saidas:,}")
+    por_enviado = sorted(metricas.por_enviado.items(), key=lambda item: (item[0] is not None, item[0] or 0))
+    if por_enviado:
+        print("\nDistribuicao por status de envio:")
+        for enviado, qtd in por_enviado:
+            label = "Nao enviado" if enviado == 0 else "Enviado"
+            print(f"  {label:<12}: {qtd:,}")
 
-        cursor.execute(
-            """
-            SELECT COUNT(*) FROM vehicle_counts
-            WHERE count_out = 1 AND tempo_permanencia IS NULL
-            """
-        )
-        total_pendentes = cursor.fetchone()[0]
-        print(f"Saidas sem tempo (pendentes do tracker): {total_pendentes:,}")
-
-        cursor.execute(
-            """
-            SELECT enviado, COUNT(*) FROM vehicle_counts
-            WHERE count_out = 1 AND tempo_permanencia IS NOT NULL
-            GROUP BY enviado
-            ORDER BY enviado
-            """
-        )
-        por_enviado = cursor.fetchall()
-        if por_enviado:
-            print("\nDistribuicao por status de envio:")
-            for enviado, qtd in por_enviado:
-                label = "Nao enviado" if enviado == 0 else "Enviado"
-                print(f"  {label:<12}: {qtd:,}")
-
-        cursor.execute(
-            """
-            SELECT vehicle_code, COUNT(*) FROM vehicle_counts
-            WHERE count_out = 1 AND tempo_permanencia IS NOT NULL
-            GROUP BY vehicle_code
-            ORDER BY COUNT(*) DESC
-            LIMIT 10
-            """
-        )
-        top_codes = cursor.fetchall()
-        if top_codes:
-            print("\nTop 10 vehicle_code (saidas):")
-            for code, qtd in top_codes:
-                print(f"  {code}: {qtd:,}")
+    top_codes = metricas.top_vehicle_codes(10)
+    if top_codes:
+        print("\nTop 10 vehicle_code (saidas):")
+        for code, qtd in top_codes:
+            print(f"  {code}: {qtd:,}")
 
-    except sqlite3.Error as err:
-        print(f"ERRO na contagem detalhada: {err}")
 
-
-def detectar_problemas(conn: sqlite3.Connection) -> list[str]:
-    cursor = conn.cursor()
+def detectar_problemas(metricas: MetricasVehicleCounts) -> list[str]:
     problemas: list[str] = []
 
     print("\n" + "=" * 60)
@@ -136,18 +90,7 @@ def detectar_problemas(conn: sqlite3.Connection) -> list[str]:
     print("=" * 60)
 
     # Duplicados
-    cursor.execute(
-        """
-        SELECT COUNT(*) FROM (
-            SELECT timestamp, vehicle_code, tempo_permanencia
-            FROM vehicle_counts
-            WHERE count_out = 1 AND tempo_permanencia IS NOT NULL
-            GROUP BY timestamp, vehicle_code, tempo_permanencia
-            HAVING COUNT(*) > 1
-        )
-        """
-    )
-    duplicados = cursor.fetchone()[0]
+    duplicados = metricas.grupos_duplicados
     if duplicados:
         problemas.append(f"Registros duplicados de saida: {duplicados}")
         print(f"  DUPLICADOS: {duplicados} grupos encontrados.")
@@ -155,14 +98,7 @@ def detectar_problemas(conn: sqlite3.Connection) -> list[str]:
         print("  DUPLICADOS: nenhum grupo encontrado.")
 
     # Vehicle codes invalidos
-    cursor.execute(
-        """
-        SELECT COUNT(*) FROM vehicle_counts
-        WHERE count_out = 1
-          AND (vehicle_code IS NULL OR vehicle_code <= 0)
-        """
-    )
-    invalidos = cursor.fetchone()[0]
+    invalidos = metricas.vehicle_code_invalido_saidas
     if invalidos:
         problemas.append(f"Vehicle_code invalido em saidas: {invalidos}")
         print(f"  VEHICLE_CODE: {invalidos} registros invalidos.")
@@ -170,30 +106,14 @@ def detectar_problemas(conn: sqlite3.Connection) -> list[str]:
         print("  VEHICLE_CODE: ok.")
 
     # Tempos extremos
-    cursor.execute(
-        """
-        SELECT COUNT(*) FROM vehicle_counts
-        WHERE count_out = 1
-          AND tempo_permanencia IS NOT NULL
-          AND tempo_permanencia < 1
-        """
-    )
-    tempos_baixos = cursor.fetchone()[0]
+    tempos_baixos = metricas.tempos_baixos
     if tempos_baixos:
         problemas.append(f"Tempos abaixo de 1 segundo: {tempos_baixos}")
         print(f"  TEMPOS BAIXOS: {tempos_baixos} registros.")
     else:
         print("  TEMPOS BAIXOS: ok.")
 
-    cursor.execute(
-        """
-        SELECT COUNT(*) FROM vehicle_counts
-        WHERE count_out = 1
-          AND tempo_permanencia IS NOT NULL
-          AND tempo_permanencia >= 3600
-        """
-    )
-    tempos_altos = cursor.fetchone()[0]
+    tempos_altos = metricas.tempos_altos
     if tempos_altos:
         problemas.append(f"Tempos acima de 1h: {tempos_altos}")
         print(f"  TEMPOS ALTOS: {tempos_altos} registros.")
@@ -201,13 +121,7 @@ def detectar_problemas(conn: sqlite3.Connection) -> list[str]:
         print("  TEMPOS ALTOS: ok.")
 
     # Timestamp
-    cursor.execute(
-        """
-        SELECT COUNT(*) FROM vehicle_counts
-        WHERE timestamp IS NULL OR timestamp = ''
-        """
-    )
-    ts_invalidos = cursor.fetchone()[0]
+    ts_invalidos = metricas.timestamps_vazios
     if ts_invalidos:
         problemas.append(f"Timestamps vazios: {ts_invalidos}")
         print(f"  TIMESTAMP: {ts_invalidos} registros sem data/hora.")
@@ -217,61 +131,38 @@ def detectar_problemas(conn: sqlite3.Connection) -> list[str]:
     return problemas
 
 
-def analise_periodo_recente(conn: sqlite3.Connection, dias: int) -> None:
-    cursor = conn.cursor()
-
+def analise_periodo_recente(metricas: MetricasVehicleCounts, dias: int) -> None:
     print("\n" + "=" * 60)
     print(f"ANALISE DOS ULTIMOS {dias} DIAS")
     print("=" * 60)
 
-    try:
-        data_limite = (datetime.now() - timedelta(days=dias - 1)).strftime("%Y-%m-%d")
-        cursor.execute(
-            """
-            SELECT DATE(timestamp) as data,
-                   COUNT(*) as total,
-                   COUNT(DISTINCT vehicle_code) as codigos,
-                   MIN(tempo_permanencia),
-                   MAX(tempo_permanencia),
-                   AVG(tempo_permanencia)
-            FROM vehicle_counts
-            WHERE count_out = 1
-              AND tempo_permanencia IS NOT NULL
-              AND DATE(timestamp) >= ?
-            GROUP BY DATE(timestamp)
-            ORDER BY data DESC
-            """,
-            (data_limite,),
-        )
-        linhas = cursor.fetchall()
+    data_limite = (datetime.now() - timedelta(days=dias - 1)).strftime("%Y-%m-%d")
+    linhas = metricas.dias_desc(data_limite)
 
-        if not linhas:
-            print("Sem registros no periodo informado.")
-            return
+    if not linhas:
+        print("Sem registros no periodo informado.")
+        return
+
+    for data, resumo in linhas:
+        print(
+            f"  {data}: {resumo.total} registros, {len(resumo.codigos)} codigos unicos, "
+            f"tempo {resumo.minimo:.1f}s - {resumo.maximo:.1f}s (media {resumo.media:.1f}s)"
+        )
 
-        for data, total, codigos, min_t, max_t, avg_t in linhas:
-            print(
-                f"  {data}: {total} registros, {codigos} codigos unicos, "
-                f"tempo {min_t:.1f}s - {max_t:.1f}s (media {avg_t:.1f}s)"
-            )
-
-        # procurar lacunas
-        datas_observadas = {linha[0] for linha in linhas}
-        lacunas = []
-        for i in range(dias):
-            dia = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-            if dia < data_limite:
-                break
-            if dia not in datas_observadas:
-                lacunas.append(dia)
-
-        if lacunas:
-            print("\nATENCAO: dias sem registros de saida:")
-            for dia in sorted(lacunas):
-                print(f"  - {dia}")
+    # procurar lacunas
+    datas_observadas = {linha[0] for linha in linhas}
+    lacunas = []
+    for i in range(dias):
+        dia = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
+        if dia < data_limite:
+            break
+        if dia not in datas_observadas:
+            lacunas.append(dia)
 
-    except sqlite3.Error as err:
-        print(f"ERRO na analise do periodo recente: {err}")
+    if lacunas:
+        print("\nATENCAO: dias sem registros de saida:")
+        for dia in sorted(lacunas):
+            print(f"  - {dia}")
 
 
 def gerar_comandos_limpeza(problemas: list[str]) -> None:
@@ -350,10 +241,18 @@ def main() -> None:
         return
 
     try:
-        verificar_estrutura(conn)
-        contagem_detalhada(conn)
-        problemas = detectar_problemas(conn)
-        analise_periodo_recente(conn, args.dias)
+        try:
+            metricas = coletar_metricas(conn)
+        except sqlite3.Error as err:
+            print(f"ERRO ao ler vehicle_counts: {err}")
+            return
+
+        verificar_estrutura(metricas)
+        if "vehicle_counts" not in metricas.tabelas:
+            return
+        contagem_detalhada(metricas)
+        problemas = detectar_problemas(metricas)
+        analise_periodo_recente(metricas, args.dias)
 
         print("\n" + "=" * 60)
         print("RESUMO DOS PROBLEMAS")
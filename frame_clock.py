@@ -0,0 +1,81 @@
+import time
+from datetime import datetime
+
+
+class FrameClock:
+    def __init__(self, wall_anchor=None, mono_anchor=None, intervalo_reancoragem=None):
+        """
+        Relógio do caminho de tracking. Os timestamps que circulam entre o loop
+        principal, o tracker e o label_manager são floats de time.monotonic()
+        (imunes a ajustes de NTP, então as durações de permanência também são);
+        a conversão para data/hora de parede é feita apenas na gravação, a
+        partir de uma âncora (wall, mono).
+
+        A âncora é recapturada periodicamente em tick(): depois de uma correção
+        do relógio (NTP ou manual) os horários gravados voltam a acompanhar o
+        relógio de parede em até intervalo_reancoragem segundos, sem alterar as
+        durações já medidas.
+
+        :param wall_anchor: Epoch (time.time()) correspondente a mono_anchor
+        :param mono_anchor: Valor monotônico correspondente a wall_anchor
+        :param intervalo_reancoragem: Segundos entre recapturas da âncora (0 desativa). Padrão:
+            60, ou 0 quando as âncoras são informadas (replay/benchmark reproduzem um mapeamento fixo)
+        """
+        anchors_fixas = wall_anchor is not None or mono_anchor is not None
+        self.mono_anchor = time.monotonic() if mono_anchor is None else mono_anchor
+        self.wall_anchor = time.time() if wall_anchor is None else wall_anchor
+        self.frame_ts = self.mono_anchor
+        if intervalo_reancoragem is None:
+            intervalo_reancoragem = 0 if anchors_fixas else 60.0
+        self.intervalo_reancoragem = intervalo_reancoragem
+
+        self._cached_second = None
+        self._cached_str = None
+
+    def now(self):
+        """Timestamp monotônico atual."""
+        return time.monotonic()
+
+    def tick(self, mono=None):
+        """
+        Registra o timestamp do frame atual (um por frame processado) e o retorna.
+
+        :param mono: Timestamp explícito (usado no replay); padrão: time.monotonic()
+        """
+        self.frame_ts = time.monotonic() if mono is None else mono
+        if self.intervalo_reancoragem and self.frame_ts - self.mono_anchor >= self.intervalo_reancoragem:
+            self.reancorar()
+        return self.frame_ts
+
+    def reancorar(self, wall_anchor=None, mono_anchor=None):
+        """
+        Recaptura a âncora de parede (após um ajuste de relógio os horários gravados voltam ao correto).
+
+        :param wall_anchor: Âncora explícita (replay aplica as âncoras da gravação); padrão: time.time()
+        :param mono_anchor: Âncora monotônica explícita; padrão: time.monotonic()
+        """
+        self.mono_anchor = time.monotonic() if mono_anchor is None else mono_anchor
+        self.wall_anchor = time.time() if wall_anchor is None else wall_anchor
+
+    def to_epoch(self, mono):
+        """Converte um timestamp monotônico em epoch de parede."""
+        return self.wall_anchor + (mono - self.mono_anchor)
+
+    def from_datetime(self, dt):
+        """Converte um datetime de parede para a escala monotônica do relógio."""
+        return self.mono_anchor + (dt.timestamp() - self.wall_anchor)
+
+    def to_datetime(self, mono):
+        """Converte um timestamp monotônico em datetime de parede."""
+        return datetime.fromtimestamp(self.to_epoch(mono))
+
+    def format(self, mono):
+        """
+        Formata um timestamp monotônico como 'YYYY-MM-DD HH:MM:SS' (formato gravado no banco).
+        A string é reaproveitada enquanto o segundo não muda.
+        """
+        second = int(self.to_epoch(mono))
+        if second != self._cached_second:
+            self._cached_second = second
+            self._cached_str = datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+        return self._cached_str
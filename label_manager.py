@@ -1,15 +1,15 @@
 import cv2
 from ultralytics.utils.plotting import Annotator
-from datetime import datetime
 
-def draw_labels(im0, tracks, permanence_data, model_names):
+def draw_labels(im0, tracks, tracker, model_names, now=None):
     """
     Desenha rótulos nos objetos detectados, incluindo informações sobre o tempo de permanência.
 
     :param im0: Frame atual do vídeo.
     :param tracks: Lista de objetos rastreados pelo modelo.
-    :param permanence_data: Dados de permanência atualizados pelo tracker.
+    :param tracker: PermanenceTracker com os dados de permanência atualizados.
     :param model_names: Lista de nomes das classes do modelo.
+    :param now: Timestamp monotônico do frame (padrão: timestamp do frame atual do tracker).
     :return: Frame atualizado com os rótulos desenhados.
     """
     annotator = Annotator(im0, line_width=2, example=str(model_names))
@@ -33,11 +33,8 @@ def draw_labels(im0, tracks, permanence_data, model_names):
             label = f"{class_name} ID:{track_id}"
 
             # Adicionar informações de permanência, se disponíveis
-            for area_name, area_data in permanence_data.items():
-                if track_id in area_data['timestamps']:
-                    entry_time = area_data['timestamps'][track_id]
-                    tempo_permanencia = (datetime.now() - entry_time).total_seconds()
-                    label += f" {area_name}: {tempo_permanencia:.1f}s"
+            for area_name, tempo_permanencia in tracker.get_permanence_time(track_id, now).items():
+                label += f" {area_name}: {tempo_permanencia:.1f}s"
 
             # Desenhar o rótulo e a bounding box
             annotator.box_label((x1, y1, x2, y2), label, color=(255, 0, 0))
@@ -0,0 +1,213 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+FORMATO_PADRAO = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Destino padrão (arquivo, nível) de cada logger usado pela aplicação.
+# '' é o logger raiz: recebe tudo que não tiver destino próprio.
+DESTINOS_PADRAO = {
+    '': ("error_log.txt", logging.ERROR),
+    'busca_erro': ("busca_erro.log", logging.INFO),
+    'bug_vehicle_code': ("bug_vehicle_code.log", logging.INFO),
+    'permanence_tracker.log': ("permanence_tracker.log", logging.INFO),
+    'checkpoint_wal': ("checkpoint_wal.log", logging.INFO),
+}
+
+# Limites de taxa padrão por logger (0 = sem limite). As linhas do bug_vehicle_code
+# ("SALVA(S)", "ENTRADA AUTORIZADA") são a trilha de auditoria usada para conferir
+# contagens contestadas e nunca são suprimidas.
+LIMITES_PADRAO = {
+    'bug_vehicle_code': 0,
+}
+
+
+def destinos_em_diretorio(diretorio, destinos=None):
+    """Mesmos loggers/níveis de DESTINOS_PADRAO (ou destinos), com os arquivos dentro de diretorio (criado se preciso)."""
+    os.makedirs(diretorio, exist_ok=True)
+    return {nome: (os.path.join(diretorio, arquivo), nivel)
+            for nome, (arquivo, nivel) in (destinos or DESTINOS_PADRAO).items()}
+
+
+def destinos_da_camera(camera, destinos=None):
+    """
+    Mesmos loggers/níveis de DESTINOS_PADRAO (ou destinos), com o nome da câmera
+    no nome de cada arquivo (busca_erro.log -> busca_erro_camera1.log). Os
+    processos das câmeras rodam no mesmo diretório: com arquivos compartilhados,
+    a rotação (rename de um arquivo aberto por outro processo) falha no Windows
+    e o log deixa de ser gravado para todas as câmeras.
+    """
+    resultado = {}
+    for nome, (arquivo, nivel) in (destinos or DESTINOS_PADRAO).items():
+        base, extensao = os.path.splitext(arquivo)
+        resultado[nome] = (f"{base}_{camera}{extensao}", nivel)
+    return resultado
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limite=10, janela=60.0, amostragem=0, limites_por_logger=None, nivel_isento=logging.ERROR):
+        """
+        Limita a quantidade de mensagens por ponto de log (logger + arquivo + linha)
+        dentro de uma janela de tempo. Depois do limite, as mensagens são suprimidas
+        (ou amostradas 1 a cada N) e a primeira mensagem da janela seguinte informa
+        quantas foram suprimidas.
+
+        :param limite: Máximo de mensagens por ponto de log por janela (0 desativa o limite)
+        :param janela: Duração da janela em segundos
+        :param amostragem: Após o limite, deixa passar 1 a cada N mensagens (0 = suprime todas)
+        :param limites_por_logger: {nome_logger: limite} sobrescrevendo o limite padrão
+        :param nivel_isento: Mensagens deste nível ou acima nunca são suprimidas
+        """
+        super().__init__()
+        self.limite = limite
+        self.janela = janela
+        self.amostragem = amostragem
+        self.limites_por_logger = dict(limites_por_logger or {})
+        self.nivel_isento = nivel_isento
+        self._estado = {}  # chave -> [inicio_janela, emitidas, suprimidas]
+
+    def filter(self, record):
+        if record.levelno >= self.nivel_isento:
+            return True
+
+        limite = self.limites_por_logger.get(record.name, self.limite)
+        if not limite:
+            return True
+
+        chave = (record.name, record.pathname, record.lineno)
+        agora = time.monotonic()
+        estado = self._estado.get(chave)
+        if estado is None or agora - estado[0] >= self.janela:
+            suprimidas = estado[2] if estado else 0
+            self._estado[chave] = [agora, 1, 0]
+            if suprimidas:
+                record.msg = f"{record.getMessage()} (+{suprimidas} mensagens suprimidas nos últimos {self.janela:.0f}s)"
+                record.args = None
+            return True
+
+        estado[1] += 1
+        if estado[1] <= limite:
+            return True
+        if self.amostragem and (estado[1] - limite) % self.amostragem == 0:
+            return True
+        estado[2] += 1
+        return False
+
+
+class _RoteadorHandler(logging.Handler):
+    """
+    Entrega cada registro ao arquivo do seu logger (ou do ancestral mais próximo com
+    destino). Registros de nível ERROR ou acima também vão para o arquivo do logger raiz.
+    """
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+
+    def _destino(self, nome):
+        while nome:
+            if nome in self.handlers:
+                return self.handlers[nome]
+            nome = nome.rpartition('.')[0]
+        return self.handlers['']
+
+    def handle(self, record):
+        destino = self._destino(record.name)
+        destino.handle(record)
+        if record.levelno >= logging.ERROR and destino is not self.handlers['']:
+            self.handlers[''].handle(record)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+def parse_niveis(specs):
+    """
+    Converte especificações 'LOGGER=NIVEL[:LIMITE]' da linha de comando em
+    ({logger: nivel}, {logger: limite}). Use 'root' para o logger raiz.
+    """
+    niveis, limites = {}, {}
+    for spec in specs or []:
+        nome, _, valor = spec.partition('=')
+        if not valor:
+            raise ValueError(f"Especificação de log inválida: '{spec}' (use LOGGER=NIVEL[:LIMITE])")
+        nome = '' if nome == 'root' else nome
+        nivel, _, limite = valor.partition(':')
+        niveis[nome] = logging.getLevelName(nivel.upper())
+        if not isinstance(niveis[nome], int):
+            raise ValueError(f"Nível de log inválido em '{spec}'")
+        if limite:
+            limites[nome] = int(limite)
+    return niveis, limites
+
+
+def configurar_logging(niveis=None, limites=None, max_bytes=50 * 1024 * 1024, backups=5,
+                       limite=10, janela=60.0, amostragem=0, destinos=None):
+    """
+    Configura o logging assíncrono: os loggers da aplicação apenas enfileiram os
+    registros (QueueHandler, com limite de taxa aplicado antes de enfileirar) e uma
+    thread QueueListener grava nos arquivos com rotação por tamanho.
+
+    :param niveis: {logger: nivel} sobrescrevendo os níveis de DESTINOS_PADRAO
+    :param limites: {logger: limite} de mensagens por ponto de log por janela (sobre LIMITES_PADRAO)
+    :param max_bytes: Tamanho máximo de cada arquivo antes da rotação
+    :param backups: Quantidade de arquivos rotacionados mantidos
+    :param limite: Limite padrão de mensagens por ponto de log por janela (0 desativa)
+    :param janela: Janela do limite de taxa em segundos
+    :param amostragem: Após o limite, registra 1 a cada N mensagens (0 = suprime)
+    :param destinos: {logger: (arquivo, nivel)} (padrão: DESTINOS_PADRAO)
+    :return: QueueListener em execução (parado automaticamente na saída do processo)
+    """
+    destinos = dict(destinos or DESTINOS_PADRAO)
+    niveis = niveis or {}
+    formatter = logging.Formatter(FORMATO_PADRAO)
+
+    handlers = {}
+    for nome, (arquivo, nivel_padrao) in destinos.items():
+        handler = logging.handlers.RotatingFileHandler(
+            arquivo, maxBytes=int(max_bytes), backupCount=backups, encoding='utf-8', delay=True
+        )
+        handler.setFormatter(formatter)
+        handlers[nome] = handler
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(limite, janela, amostragem, {**LIMITES_PADRAO, **(limites or {})}))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    for nome, (arquivo, nivel_padrao) in destinos.items():
+        logger = logging.getLogger(nome) if nome else root
+        logger.setLevel(niveis.get(nome, nivel_padrao))
+        if nome:
+            # Remove handlers síncronos configurados anteriormente; os registros sobem até a fila do raiz
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            logger.propagate = True
+
+    for nome, nivel in niveis.items():
+        if nome not in destinos:
+            logging.getLogger(nome).setLevel(nivel)
+
+    listener = logging.handlers.QueueListener(log_queue, _RoteadorHandler(handlers))
+    listener.start()
+    atexit.register(_parar_listener, listener)
+    return listener
+
+
+def _parar_listener(listener):
+    """Descarrega a fila na saída do processo (ignora se o listener já foi parado)."""
+    if listener._thread is not None:
+        listener.stop()
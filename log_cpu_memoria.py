@@ -1,121 +1,577 @@
-import psutil
-import time
+#!/usr/bin/env python3
+"""
+Monitor de recursos das cameras: amostra cada processo yolo16_v4.py em
+execucao (CPU, RSS, threads, arquivos abertos e bytes de I/O) junto com os
+eventos do contador de cada camera (contador_offsets da propria camera), e
+a maquina (CPU, memoria e bytes de rede enviados/recebidos).
+
+vehicle_counts nao guarda a camera e o banco costuma ser compartilhado
+(yolo8.db), entao as linhas gravadas sao amostradas por banco, na linha
+'banco <caminho>', e nao atribuidas a uma camera.
+
+- As amostras ficam num buffer circular em memoria e sao gravadas em lote
+  (um commit a cada --intervalo_gravacao) no SQLite --db; se o banco ficar
+  indisponivel o buffer descarta as mais antigas em vez de crescer.
+- Retencao com reducao de resolucao: amostras brutas por RETENCAO_BRUTA,
+  agregadas por minuto e por hora (NIVEIS) por mais tempo.
+- CPU do processo e do sistema sem bloquear (psutil.cpu_percent(None) entre
+  amostras); a GPU (GPUtil, opcional) e consultada a cada --intervalo_gpu.
+- Alertas com limite de taxa: um aviso quando a condicao comeca, um lembrete
+  a cada --intervalo_alerta enquanto ela durar e um aviso quando normaliza.
+- Resumo sob demanda (--resumo MINUTOS) lido do banco, sem parar o monitor.
+
+Exemplos:
+    python log_cpu_memoria.py
+    python log_cpu_memoria.py --intervalo 5 --db metricas_consumo.db
+    python log_cpu_memoria.py --resumo 60
+"""
+
+from __future__ import annotations
+
+import argparse
 import logging
+import os
+import sqlite3
+import time
+from collections import deque, namedtuple
 from datetime import datetime
-import GPUtil
-
-# Configuração do logging
-logging.basicConfig(filename='consumo.log', level=logging.INFO, format='%(message)s')
-
-def get_system_usage():
-    # Uso de CPU em porcentagem
-    cpu_percent = psutil.cpu_percent(interval=1)
-
-    # Uso de memória
-    mem = psutil.virtual_memory()
-    mem_total = mem.total / (1024 ** 3)  # Convertendo para GB
-    mem_used = mem.used / (1024 ** 3)
-    mem_percent = mem.percent
-
-    # Uso de disco
-    disk = psutil.disk_usage('/')
-    disk_total = disk.total / (1024 ** 3)  # Convertendo para GB
-    disk_used = disk.used / (1024 ** 3)
-    disk_percent = disk.percent
-
-    # Uso de rede
-    net = psutil.net_io_counters()
-    net_sent = net.bytes_sent / (1024 ** 2)  # Convertendo para MB
-    net_recv = net.bytes_recv / (1024 ** 2)
-
-    # Uso de GPU
-    gpus = GPUtil.getGPUs()
-    if gpus:
-        gpu = gpus[0]  # Monitorando a primeira GPU
-        gpu_load = gpu.load * 100  # Uso da GPU em porcentagem
-        gpu_mem_total = gpu.memoryTotal / 1024  # Convertendo para GB
-        gpu_mem_used = gpu.memoryUsed / 1024
-        gpu_mem_percent = gpu.memoryUtil * 100  # Uso de memória da GPU em porcentagem
+
+import psutil
+
+try:
+    import GPUtil
+except ImportError:  # GPU opcional: sem GPUtil o monitor segue sem as metricas de GPU
+    GPUtil = None
+
+from conexao_db import abrir_escrita, abrir_leitura
+from log_config import configurar_logging
+
+logger = logging.getLogger("consumo")
+
+SCRIPT_CAMERA = "yolo16_v4.py"
+MB = 1024 ** 2
+
+# Retencao (s) das amostras brutas e niveis agregados (resolucao s, retencao s)
+RETENCAO_BRUTA = 6 * 3600
+NIVEIS = ((60, 7 * 86400), (3600, 400 * 86400))
+
+# pid 0 / camera 'sistema': CPU total, memoria usada e rede (MB acumulados) da maquina
+# pid 0 / camera 'banco <caminho>': maior id de vehicle_counts (linhas), de todas as cameras do banco
+# demais: processos das cameras (eventos = ultimo evento do contador da camera)
+Amostra = namedtuple("Amostra", "ts pid camera cpu rss_mb threads arquivos leitura_mb escrita_mb linhas eventos "
+                                "rede_enviada_mb rede_recebida_mb")
+PREFIXO_BANCO = "banco "
+
+_CRIAR_AMOSTRAS = """CREATE TABLE IF NOT EXISTS amostras (
+                         ts REAL NOT NULL,
+                         pid INTEGER NOT NULL,
+                         camera TEXT NOT NULL,
+                         cpu REAL,
+                         rss_mb REAL,
+                         threads INTEGER,
+                         arquivos INTEGER,
+                         leitura_mb REAL,
+                         escrita_mb REAL,
+                         linhas INTEGER,
+                         eventos INTEGER,
+                         rede_enviada_mb REAL,
+                         rede_recebida_mb REAL)"""
+_CRIAR_INDICE_AMOSTRAS = "CREATE INDEX IF NOT EXISTS idx_amostras_ts ON amostras (ts)"
+# Por intervalo: cpu media e maxima, maximos de rss/threads/arquivos e o ultimo
+# valor dos acumulados (I/O, linhas, eventos, rede)
+_CRIAR_AGREGADAS = """CREATE TABLE IF NOT EXISTS amostras_agregadas (
+                          resolucao INTEGER NOT NULL,
+                          inicio REAL NOT NULL,
+                          pid INTEGER NOT NULL,
+                          camera TEXT NOT NULL,
+                          n INTEGER NOT NULL,
+                          cpu REAL,
+                          cpu_max REAL,
+                          rss_mb REAL,
+                          threads INTEGER,
+                          arquivos INTEGER,
+                          leitura_mb REAL,
+                          escrita_mb REAL,
+                          linhas INTEGER,
+                          eventos INTEGER,
+                          rede_enviada_mb REAL,
+                          rede_recebida_mb REAL,
+                          PRIMARY KEY (resolucao, inicio, pid, camera)) WITHOUT ROWID"""
+_INSERIR_AMOSTRA = "INSERT INTO amostras VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+# Colunas adicionadas depois da criacao original das tabelas (no fim: os INSERT sao posicionais)
+_COLUNAS_REDE = (("rede_enviada_mb", "REAL"), ("rede_recebida_mb", "REAL"))
+# Reagrega os intervalos recentes (INSERT OR REPLACE: o intervalo em aberto e refeito a cada compactacao)
+_AGREGAR_BRUTAS = """INSERT OR REPLACE INTO amostras_agregadas
+                     SELECT ?, CAST(ts / ? AS INTEGER) * ? AS inicio, pid, camera, COUNT(*), AVG(cpu), MAX(cpu),
+                            MAX(rss_mb), MAX(threads), MAX(arquivos), MAX(leitura_mb), MAX(escrita_mb),
+                            MAX(linhas), MAX(eventos), MAX(rede_enviada_mb), MAX(rede_recebida_mb)
+                     FROM amostras WHERE ts >= ? GROUP BY inicio, pid, camera"""
+_AGREGAR_NIVEL = """INSERT OR REPLACE INTO amostras_agregadas
+                    SELECT ?, CAST(inicio / ? AS INTEGER) * ? AS novo_inicio, pid, camera, SUM(n),
+                           SUM(cpu * n) / SUM(n), MAX(cpu_max), MAX(rss_mb), MAX(threads), MAX(arquivos),
+                           MAX(leitura_mb), MAX(escrita_mb), MAX(linhas), MAX(eventos),
+                           MAX(rede_enviada_mb), MAX(rede_recebida_mb)
+                    FROM amostras_agregadas WHERE resolucao = ? AND inicio >= ? GROUP BY novo_inicio, pid, camera"""
+_RESUMO_BRUTAS = """SELECT camera, pid, COUNT(*), SUM(cpu), MAX(cpu), MAX(rss_mb), MAX(threads), MAX(arquivos),
+                           MAX(leitura_mb) - MIN(leitura_mb), MAX(escrita_mb) - MIN(escrita_mb),
+                           MAX(linhas) - MIN(linhas), MAX(eventos) - MIN(eventos),
+                           MAX(rede_enviada_mb) - MIN(rede_enviada_mb), MAX(rede_recebida_mb) - MIN(rede_recebida_mb),
+                           MIN(ts), MAX(ts)
+                    FROM amostras WHERE ts >= ? GROUP BY camera, pid"""
+# Nos niveis agregados o acumulado de cada intervalo e o ultimo valor dele: a
+# diferenca ignora o que aconteceu dentro do primeiro intervalo da janela
+_RESUMO_AGREGADAS = """SELECT camera, pid, SUM(n), SUM(cpu * n), MAX(cpu_max), MAX(rss_mb), MAX(threads), MAX(arquivos),
+                              MAX(leitura_mb) - MIN(leitura_mb), MAX(escrita_mb) - MIN(escrita_mb),
+                              MAX(linhas) - MIN(linhas), MAX(eventos) - MIN(eventos),
+                              MAX(rede_enviada_mb) - MIN(rede_enviada_mb), MAX(rede_recebida_mb) - MIN(rede_recebida_mb),
+                              MIN(inicio), MAX(inicio) + resolucao
+                       FROM amostras_agregadas WHERE resolucao = ? AND inicio >= ? GROUP BY camera, pid"""
+
+
+def criar_tabelas(conn: sqlite3.Connection) -> None:
+    conn.execute(_CRIAR_AMOSTRAS)
+    conn.execute(_CRIAR_INDICE_AMOSTRAS)
+    conn.execute(_CRIAR_AGREGADAS)
+    for tabela in ("amostras", "amostras_agregadas"):
+        existentes = {coluna[1] for coluna in conn.execute(f"PRAGMA table_info({tabela})")}
+        for coluna, tipo in _COLUNAS_REDE:
+            if coluna not in existentes:
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    conn.commit()
+
+
+def compactar(conn: sqlite3.Connection, agora: float) -> None:
+    """
+    Agrega as amostras recentes em cada nivel de NIVEIS (cada nivel a partir do
+    anterior) e apaga o que passou da retencao. Precisa rodar ao menos uma vez
+    por menor resolucao: os dois ultimos intervalos de cada nivel sao refeitos.
+    """
+    with conn:
+        anterior = None
+        for resolucao, retencao in NIVEIS:
+            desde = (agora - 2 * resolucao) // resolucao * resolucao
+            if anterior is None:
+                conn.execute(_AGREGAR_BRUTAS, (resolucao, resolucao, resolucao, desde))
+            else:
+                conn.execute(_AGREGAR_NIVEL, (resolucao, resolucao, resolucao, anterior, desde))
+            conn.execute("DELETE FROM amostras_agregadas WHERE resolucao = ? AND inicio < ?", (resolucao, agora - retencao))
+            anterior = resolucao
+        conn.execute("DELETE FROM amostras WHERE ts < ?", (agora - RETENCAO_BRUTA,))
+
+
+def resumo(conn: sqlite3.Connection, janela: float, agora: float | None = None) -> list[dict]:
+    """
+    Resumo por camera das ultimas janela segundos, do nivel mais fino que ainda
+    cobre a janela: CPU media/maxima, maximos de RSS/threads/arquivos, taxas de
+    I/O e de rede (MB/s), de eventos do contador da camera e de linhas do banco
+    (por minuto, so nas linhas 'banco ...') e quantos processos (pids) a
+    camera teve na janela (reinicios).
+    """
+    agora = time.time() if agora is None else agora
+    desde = agora - janela
+    if janela <= RETENCAO_BRUTA:
+        linhas = conn.execute(_RESUMO_BRUTAS, (desde,)).fetchall()
     else:
-        gpu_load = None
-        gpu_mem_total = None
-        gpu_mem_used = None
-        gpu_mem_percent = None
-
-    # Timestamp atual
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    # Criar um dicionário com as informações
-    usage = {
-        'timestamp': timestamp,
-        'cpu_percent': cpu_percent,
-        'mem_total_gb': mem_total,
-        'mem_used_gb': mem_used,
-        'mem_percent': mem_percent,
-        'disk_total_gb': disk_total,
-        'disk_used_gb': disk_used,
-        'disk_percent': disk_percent,
-        'net_sent_mb': net_sent,
-        'net_recv_mb': net_recv,
-        'gpu_load': gpu_load,
-        'gpu_mem_total_gb': gpu_mem_total,
-        'gpu_mem_used_gb': gpu_mem_used,
-        'gpu_mem_percent': gpu_mem_percent
-    }
-
-    return usage
-
-def log_usage(usage):
-    # Formatar a mensagem de log
-    log_message = (
-        f"{usage['timestamp']}, "
-        f"CPU: {usage['cpu_percent']}%, "
-        f"Memória: {usage['mem_used_gb']:.2f}GB/{usage['mem_total_gb']:.2f}GB ({usage['mem_percent']}%), "
-        f"Disco: {usage['disk_used_gb']:.2f}GB/{usage['disk_total_gb']:.2f}GB ({usage['disk_percent']}%), "
-        f"Rede Enviada: {usage['net_sent_mb']:.2f}MB, "
-        f"Rede Recebida: {usage['net_recv_mb']:.2f}MB"
-    )
-
-    # Incluir informações da GPU se disponíveis
-    if usage['gpu_load'] is not None:
-        gpu_message = (
-            f", GPU: {usage['gpu_load']:.1f}%, "
-            f"Memória GPU: {usage['gpu_mem_used_gb']:.2f}GB/{usage['gpu_mem_total_gb']:.2f}GB ({usage['gpu_mem_percent']:.1f}%)"
-        )
-        log_message += gpu_message
-
-    # Verificar se algum recurso excede 85%
-    alerts = []
-    if usage['cpu_percent'] > 85:
-        alerts.append("ALERTA: CPU acima de 85%")
-    if usage['mem_percent'] > 85:
-        alerts.append("ALERTA: Memória acima de 85%")
-    if usage['disk_percent'] > 85:
-        alerts.append("ALERTA: Disco acima de 85%")
-    if usage['gpu_load'] is not None and usage['gpu_load'] > 85:
-        alerts.append("ALERTA: GPU acima de 85%")
-    if usage['gpu_mem_percent'] is not None and usage['gpu_mem_percent'] > 85:
-        alerts.append("ALERTA: Memória da GPU acima de 85%")
-
-    # Se houver alertas, adicionar à mensagem
-    if alerts:
-        alert_message = "\n" + "\n".join(alerts)
-        # Tornar o alerta mais chamativo
-        alert_message = f"\n{'!'*50}{alert_message}\n{'!'*50}"
-        log_message += alert_message
-
-    # Registrar a mensagem
-    logging.info(log_message)
-    print(log_message)  # Opcional: imprimir no console
-
-def main():
+        resolucao = next((res for res, retencao in NIVEIS if janela <= retencao), NIVEIS[-1][0])
+        linhas = conn.execute(_RESUMO_AGREGADAS, (resolucao, desde)).fetchall()
+
+    cameras = {}
+    for (camera, _, n, soma_cpu, cpu_max, rss, threads, arquivos, leitura, escrita, linhas_db, eventos,
+         rede_enviada, rede_recebida, inicio, fim) in linhas:
+        item = cameras.setdefault(camera, {"camera": camera, "processos": 0, "amostras": 0, "soma_cpu": 0.0,
+                                           "cpu_max": 0.0, "rss_mb": 0.0, "threads": 0, "arquivos": 0,
+                                           "leitura_mb": 0.0, "escrita_mb": 0.0, "linhas": 0, "eventos": 0,
+                                           "rede_enviada_mb": 0.0, "rede_recebida_mb": 0.0,
+                                           "inicio": inicio, "fim": fim})
+        item["processos"] += 1
+        item["amostras"] += n
+        item["soma_cpu"] += soma_cpu or 0.0
+        item["cpu_max"] = max(item["cpu_max"], cpu_max or 0.0)
+        item["rss_mb"] = max(item["rss_mb"], rss or 0.0)
+        item["threads"] = max(item["threads"], threads or 0)
+        item["arquivos"] = max(item["arquivos"], arquivos or 0)
+        item["leitura_mb"] += leitura or 0.0
+        item["escrita_mb"] += escrita or 0.0
+        item["linhas"] += linhas_db or 0
+        item["eventos"] += eventos or 0
+        item["rede_enviada_mb"] += rede_enviada or 0.0
+        item["rede_recebida_mb"] += rede_recebida or 0.0
+        item["inicio"] = min(item["inicio"], inicio)
+        item["fim"] = max(item["fim"], fim)
+
+    resultado = []
+    for item in sorted(cameras.values(), key=lambda c: c["camera"]):
+        duracao = max(item.pop("fim") - item.pop("inicio"), 1e-9)
+        item["cpu"] = item.pop("soma_cpu") / max(item["amostras"], 1)
+        item["leitura_mb_s"] = item.pop("leitura_mb") / duracao
+        item["escrita_mb_s"] = item.pop("escrita_mb") / duracao
+        item["rede_enviada_mb_s"] = item.pop("rede_enviada_mb") / duracao
+        item["rede_recebida_mb_s"] = item.pop("rede_recebida_mb") / duracao
+        item["linhas_min"] = item.pop("linhas") * 60 / duracao
+        item["eventos_min"] = item.pop("eventos") * 60 / duracao
+        resultado.append(item)
+    return resultado
+
+
+def imprimir_resumo(itens: list[dict], janela: float) -> None:
+    print(f"Resumo dos ultimos {janela / 60:.0f} min:")
+    print(f"{'camera':<16} {'proc':>4} {'cpu%':>6} {'max%':>6} {'rss MB':>8} {'thr':>4} {'arq':>5} "
+          f"{'leit MB/s':>9} {'escr MB/s':>9} {'rede env MB/s':>13} {'rede rec MB/s':>13} "
+          f"{'linhas/min':>10} {'eventos/min':>11}")
+    for item in itens:
+        print(f"{item['camera']:<16} {item['processos']:>4} {item['cpu']:>6.1f} {item['cpu_max']:>6.1f} "
+              f"{item['rss_mb']:>8.1f} {item['threads']:>4} {item['arquivos']:>5} {item['leitura_mb_s']:>9.3f} "
+              f"{item['escrita_mb_s']:>9.3f} {item['rede_enviada_mb_s']:>13.3f} {item['rede_recebida_mb_s']:>13.3f} "
+              f"{item['linhas_min']:>10.1f} {item['eventos_min']:>11.1f}")
+    if not itens:
+        print("(sem amostras na janela)")
+    elif any(item["camera"].startswith(PREFIXO_BANCO) for item in itens):
+        print("linhas/min: gravadas no banco por todas as cameras dele (vehicle_counts nao guarda a camera)")
+
+
+def _argumento(cmdline: list[str], nome: str) -> str | None:
+    """Valor de --nome (ou --nome=valor) numa linha de comando."""
+    for i, parte in enumerate(cmdline):
+        if parte == nome and i + 1 < len(cmdline):
+            return cmdline[i + 1]
+        if parte.startswith(nome + "="):
+            return parte.split("=", 1)[1]
+    return None
+
+
+def _caminho_banco(proc: psutil.Process, db_path: str | None) -> str | None:
+    """--db_path da camera como caminho absoluto (relativo ao diretorio de trabalho dela)."""
+    if not db_path or os.path.isabs(db_path):
+        return db_path
+    try:
+        return os.path.normpath(os.path.join(proc.cwd(), db_path))
+    except (psutil.AccessDenied, psutil.NoSuchProcess, psutil.ZombieProcess):
+        return os.path.abspath(db_path)
+
+
+class LimitadorAlertas:
+    def __init__(self, intervalo: float = 300.0):
+        """
+        Alertas com limite de taxa por chave (camera + tipo): avisa quando a
+        condicao comeca, lembra a cada intervalo segundos enquanto ela durar
+        (com quantas amostras seguiram em alerta) e avisa quando normaliza.
+
+        :param intervalo: Tempo minimo (s) entre dois avisos da mesma chave
+        """
+        self.intervalo = intervalo
+        self._ativos = {}  # chave -> [ultimo_aviso, amostras desde o aviso]
+
+    def avaliar(self, chave: tuple, ativo: bool, mensagem: str, agora: float) -> str | None:
+        """:return: Mensagem a registrar agora, ou None"""
+        estado = self._ativos.get(chave)
+        if not ativo:
+            if estado is None:
+                return None
+            del self._ativos[chave]
+            return f"NORMALIZADO: {' '.join(map(str, chave))}"
+        if estado is None:
+            self._ativos[chave] = [agora, 0]
+            return f"ALERTA: {mensagem}"
+        estado[1] += 1
+        if agora - estado[0] < self.intervalo:
+            return None
+        persistente = estado[1]
+        self._ativos[chave] = [agora, 0]
+        return f"ALERTA: {mensagem} (continua; {persistente} amostra(s) em alerta desde o ultimo aviso)"
+
+
+class AmostradorProcessos:
+    def __init__(self, script: str = SCRIPT_CAMERA, intervalo_descoberta: float = 10.0):
+        """
+        Amostra os processos da camera (linha de comando com script). Os objetos
+        psutil.Process ficam em cache: o cpu_percent de cada um mede desde a
+        amostra anterior, sem bloquear. A lista de processos e refeita a cada
+        intervalo_descoberta segundos (process_iter e o passo mais caro).
+
+        :param script: Nome do script da camera na linha de comando
+        :param intervalo_descoberta: Intervalo (s) entre varreduras de processos novos
+        """
+        self.script = script
+        self.intervalo_descoberta = intervalo_descoberta
+        self.cpus = psutil.cpu_count() or 1
+        self._processos = {}  # pid -> (Process, camera, db_path)
+        self._bancos = {}  # db_path -> conexao de leitura
+        self._proxima_descoberta = 0.0
+        self.iniciados = []
+        self.encerrados = []
+        psutil.cpu_percent(None)
+
+    def descobrir(self) -> None:
+        vistos = set()
+        for proc in psutil.process_iter(["pid", "cmdline"]):
+            cmdline = proc.info["cmdline"] or []
+            if not any(os.path.basename(parte) == self.script for parte in cmdline):
+                continue
+            vistos.add(proc.pid)
+            if proc.pid in self._processos:
+                continue
+            config = _argumento(cmdline, "--config_path")
+            # Mesmo nome de camera usado pelo yolo16_v4.py (fonte dos contadores)
+            camera = os.path.splitext(os.path.basename(config))[0].replace("_config", "") if config else f"pid{proc.pid}"
+            self._processos[proc.pid] = (proc, camera, _caminho_banco(proc, _argumento(cmdline, "--db_path")))
+            proc.cpu_percent(None)
+            self.iniciados.append((proc.pid, camera))
+        for pid in set(self._processos) - vistos:
+            self._remover(pid)
+
+    def _remover(self, pid: int) -> None:
+        _, camera, db_path = self._processos.pop(pid)
+        self.encerrados.append((pid, camera))
+        if db_path and not any(outro[2] == db_path for outro in self._processos.values()):
+            conexao = self._bancos.pop(db_path, None)
+            if conexao is not None:
+                conexao.close()
+
+    def _consultar(self, db_path: str | None, sql: str, parametros: tuple = ()):
+        """Primeiro valor da consulta no banco de uma camera, ou None (banco ausente/ocupado/antigo)."""
+        if not db_path:
+            return None
+        try:
+            conexao = self._bancos.get(db_path)
+            if conexao is None:
+                conexao = self._bancos[db_path] = abrir_leitura(db_path, cache_mb=1, mmap_mb=0)
+            return conexao.execute(sql, parametros).fetchone()[0]
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return None  # banco anterior aos offsets do contador
+            erro = e
+        except sqlite3.Error as e:
+            erro = e
+        logger.debug(f"Falha ao ler {db_path}: {erro}")
+        conexao = self._bancos.pop(db_path, None)
+        if conexao is not None:
+            conexao.close()
+        return None
+
+    def eventos_camera(self, db_path: str | None, camera: str) -> int | None:
+        """Ultimo evento do contador da camera (contador_offsets.fonte = camera) gravado no banco dela."""
+        return self._consultar(db_path, "SELECT MAX(ultimo_evento_id) FROM contador_offsets WHERE fonte = ?", (camera,))
+
+    def linhas_banco(self, db_path: str) -> int | None:
+        """Maior id de vehicle_counts: linhas gravadas por todas as cameras que usam o banco."""
+        return self._consultar(db_path, "SELECT MAX(id) FROM vehicle_counts")
+
+    def amostrar(self, agora: float) -> list[Amostra]:
+        if agora >= self._proxima_descoberta:
+            self.descobrir()
+            self._proxima_descoberta = agora + self.intervalo_descoberta
+
+        rede = psutil.net_io_counters()
+        amostras = [Amostra(agora, 0, "sistema", psutil.cpu_percent(None), psutil.virtual_memory().used / MB,
+                            None, None, None, None, None, None,
+                            rede.bytes_sent / MB if rede else None, rede.bytes_recv / MB if rede else None)]
+        for pid, (proc, camera, db_path) in list(self._processos.items()):
+            try:
+                with proc.oneshot():
+                    # % da maquina inteira (como o CPU do sistema), nao de um nucleo
+                    cpu = proc.cpu_percent(None) / self.cpus
+                    rss = proc.memory_info().rss / MB
+                    threads = proc.num_threads()
+                    arquivos = proc.num_handles() if psutil.WINDOWS else proc.num_fds()
+                    try:
+                        io = proc.io_counters()
+                        leitura, escrita = io.read_bytes / MB, io.write_bytes / MB
+                    except (AttributeError, psutil.AccessDenied):
+                        leitura = escrita = None
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self._remover(pid)
+                continue
+            except psutil.AccessDenied:
+                continue
+            eventos = self.eventos_camera(db_path, camera)
+            amostras.append(Amostra(agora, pid, camera, cpu, rss, threads, arquivos, leitura, escrita, None, eventos,
+                                    None, None))
+        for db_path in sorted({processo[2] for processo in self._processos.values() if processo[2]}):
+            amostras.append(Amostra(agora, 0, PREFIXO_BANCO + db_path, None, None, None, None, None, None,
+                                    self.linhas_banco(db_path), None, None, None))
+        return amostras
+
+    def close(self) -> None:
+        for conexao in self._bancos.values():
+            conexao.close()
+        self._bancos.clear()
+
+
+class MonitorRecursos:
+    def __init__(self, db_path: str, intervalo: float = 2.0, intervalo_gravacao: float = 30.0,
+                 limite_alerta: float = 85.0, intervalo_alerta: float = 300.0, intervalo_gpu: float = 60.0,
+                 intervalo_status: float = 60.0, script: str = SCRIPT_CAMERA, tamanho_buffer: int = 10000):
+        """
+        :param db_path: Banco SQLite das amostras
+        :param intervalo: Intervalo (s) entre amostras
+        :param intervalo_gravacao: Intervalo (s) entre gravacoes do buffer (um commit cada)
+        :param limite_alerta: Percentual de CPU/memoria/disco/GPU que dispara alerta
+        :param intervalo_alerta: Tempo minimo (s) entre avisos do mesmo alerta
+        :param intervalo_gpu: Intervalo (s) entre consultas a GPU (GPUtil chama o nvidia-smi)
+        :param intervalo_status: Intervalo (s) entre as linhas de status no console/log
+        :param script: Nome do script da camera na linha de comando
+        :param tamanho_buffer: Amostras mantidas em memoria ate a gravacao
+        """
+        self.intervalo = intervalo
+        self.intervalo_gravacao = intervalo_gravacao
+        self.limite_alerta = limite_alerta
+        self.intervalo_gpu = intervalo_gpu
+        self.intervalo_status = intervalo_status
+        self.conn = abrir_escrita(db_path)
+        criar_tabelas(self.conn)
+        self.amostrador = AmostradorProcessos(script)
+        self.alertas = LimitadorAlertas(intervalo_alerta)
+        self.buffer = deque(maxlen=tamanho_buffer)
+        self.descartadas = 0
+        self._gpu = None
+        self._proxima_gpu = 0.0
+        self._proxima_gravacao = time.time() + intervalo_gravacao
+        self._proxima_compactacao = time.time() + min(NIVEIS[0][0], intervalo_gravacao)
+        self._proximo_status = 0.0
+
+    def _consultar_gpu(self, agora: float):
+        if GPUtil is None or agora < self._proxima_gpu:
+            return self._gpu
+        self._proxima_gpu = agora + self.intervalo_gpu
+        try:
+            gpus = GPUtil.getGPUs()
+        except Exception as e:
+            logger.warning(f"Falha ao consultar a GPU: {e}")
+            gpus = []
+        self._gpu = (gpus[0].load * 100, gpus[0].memoryUtil * 100) if gpus else None
+        return self._gpu
+
+    def _avaliar_alertas(self, amostras: list[Amostra], agora: float) -> None:
+        limite = self.limite_alerta
+        sistema = amostras[0]
+        memoria = psutil.virtual_memory().percent
+        disco = psutil.disk_usage(os.path.abspath(os.sep)).percent
+        verificacoes = [
+            (("sistema", "cpu"), sistema.cpu > limite, f"CPU do sistema em {sistema.cpu:.0f}% (limite {limite:.0f}%)"),
+            (("sistema", "memoria"), memoria > limite, f"Memoria do sistema em {memoria:.0f}%"),
+            (("sistema", "disco"), disco > limite, f"Disco em {disco:.0f}%"),
+        ]
+        gpu = self._consultar_gpu(agora)
+        if gpu is not None:
+            verificacoes.append((("sistema", "gpu"), gpu[0] > limite, f"GPU em {gpu[0]:.0f}%"))
+            verificacoes.append((("sistema", "memoria_gpu"), gpu[1] > limite, f"Memoria da GPU em {gpu[1]:.0f}%"))
+        for amostra in amostras[1:]:
+            if not amostra.pid:
+                continue  # linhas dos bancos
+            verificacoes.append(((amostra.camera, "cpu"), amostra.cpu > limite,
+                                 f"Camera {amostra.camera} (pid {amostra.pid}) com CPU em {amostra.cpu:.0f}% da maquina"))
+
+        for chave, ativo, mensagem in verificacoes:
+            texto = self.alertas.avaliar(chave, ativo, mensagem, agora)
+            if texto:
+                logger.warning(texto)
+                print(texto)
+        for pid, camera in self.amostrador.iniciados:
+            logger.info(f"Camera {camera} em execucao (pid {pid})")
+        for pid, camera in self.amostrador.encerrados:
+            logger.warning(f"Camera {camera} encerrada (pid {pid})")
+            print(f"AVISO: camera {camera} encerrada (pid {pid})")
+        self.amostrador.iniciados.clear()
+        self.amostrador.encerrados.clear()
+
+    def _status(self, amostras: list[Amostra]) -> None:
+        sistema = amostras[0]
+        partes = [f"CPU {sistema.cpu:.0f}%, memoria {sistema.rss_mb / 1024:.2f}GB"]
+        if sistema.rede_enviada_mb is not None:
+            partes[0] += f", rede enviada {sistema.rede_enviada_mb:.2f}MB, recebida {sistema.rede_recebida_mb:.2f}MB"
+        for amostra in amostras[1:]:
+            if amostra.pid:
+                partes.append(f"{amostra.camera}: {amostra.cpu:.0f}% {amostra.rss_mb:.0f}MB {amostra.threads}thr")
+            else:
+                partes.append(f"{amostra.camera}: {amostra.linhas} linha(s)")
+        mensagem = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, " + " | ".join(partes)
+        logger.info(mensagem)
+        print(mensagem)
+
+    def ciclo(self, agora: float | None = None) -> list[Amostra]:
+        agora = time.time() if agora is None else agora
+        amostras = self.amostrador.amostrar(agora)
+        if len(self.buffer) + len(amostras) > self.buffer.maxlen:
+            self.descartadas += len(self.buffer) + len(amostras) - self.buffer.maxlen
+        self.buffer.extend(amostras)
+        self._avaliar_alertas(amostras, agora)
+        if agora >= self._proximo_status:
+            self._status(amostras)
+            self._proximo_status = agora + self.intervalo_status
+        if agora >= self._proxima_gravacao:
+            self.gravar()
+            self._proxima_gravacao = agora + self.intervalo_gravacao
+        if agora >= self._proxima_compactacao:
+            self.gravar()
+            compactar(self.conn, agora)
+            self._proxima_compactacao = agora + min(NIVEIS[0][0], self.intervalo_gravacao)
+        return amostras
+
+    def gravar(self) -> None:
+        """Grava o buffer em uma transacao; se o banco estiver ocupado, tenta de novo na proxima vez."""
+        if not self.buffer:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(_INSERIR_AMOSTRA, self.buffer)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Falha ao gravar {len(self.buffer)} amostra(s): {e}")
+            return
+        self.buffer.clear()
+        if self.descartadas:
+            logger.warning(f"{self.descartadas} amostra(s) descartada(s) por buffer cheio")
+            self.descartadas = 0
+
+    def executar(self) -> None:
+        proxima = time.monotonic()
+        try:
+            while True:
+                self.ciclo()
+                proxima += self.intervalo
+                time.sleep(max(0.0, proxima - time.monotonic()))
+        except KeyboardInterrupt:
+            print("Monitoramento interrompido pelo usuario.")
+        finally:
+            self.gravar()
+
+    def close(self) -> None:
+        self.amostrador.close()
+        self.conn.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Monitor de CPU/memoria/I/O dos processos das cameras e de rede da maquina.")
+    parser.add_argument("--db", type=str, default="metricas_consumo.db", help="Banco SQLite das amostras.")
+    parser.add_argument("--log", type=str, default="consumo.log", help="Arquivo de log (status e alertas).")
+    parser.add_argument("--intervalo", type=float, default=2.0, help="Intervalo (s) entre amostras.")
+    parser.add_argument("--intervalo_gravacao", type=float, default=30.0, help="Intervalo (s) entre gravacoes no banco.")
+    parser.add_argument("--intervalo_status", type=float, default=60.0, help="Intervalo (s) entre linhas de status.")
+    parser.add_argument("--intervalo_gpu", type=float, default=60.0, help="Intervalo (s) entre consultas a GPU.")
+    parser.add_argument("--limite_alerta", type=float, default=85.0, help="Percentual que dispara alerta.")
+    parser.add_argument("--intervalo_alerta", type=float, default=300.0, help="Tempo minimo (s) entre avisos do mesmo alerta.")
+    parser.add_argument("--script", type=str, default=SCRIPT_CAMERA, help="Script das cameras na linha de comando.")
+    parser.add_argument("--resumo", type=float, default=None, metavar="MINUTOS",
+                        help="Imprime o resumo por camera dos ultimos MINUTOS (lido do --db) e sai.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.resumo is not None:
+        conn = abrir_leitura(args.db)
+        janela = args.resumo * 60
+        imprimir_resumo(resumo(conn, janela), janela)
+        conn.close()
+        return
+
+    configurar_logging(destinos={"": (args.log, logging.INFO)}, limite=0)
+    monitor = MonitorRecursos(args.db, args.intervalo, args.intervalo_gravacao, args.limite_alerta,
+                              args.intervalo_alerta, args.intervalo_gpu, args.intervalo_status, args.script)
     try:
-        while True:
-            usage = get_system_usage()
-            log_usage(usage)
-            time.sleep(1)  # Intervalo de 1 segundo entre as medições
-    except KeyboardInterrupt:
-        print("Monitoramento interrompido pelo usuário.")
-
-if __name__ == '__main__':
+        monitor.executar()
+    finally:
+        monitor.close()
+
+
+if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("metricas_camera")
+
+# Limites (segundos) dos histogramas de latência
+LIMITES_INFERENCIA = (0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+LIMITES_GRAVACAO_DB = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histograma:
+    def __init__(self, limites):
+        """
+        Histograma de latências com um único escritor (o loop de inferência). A
+        observação só incrementa posições de uma lista; a leitura do scrape não
+        usa lock e calcula a contagem a partir dos próprios buckets, então a
+        saída é sempre cumulativa e consistente (+Inf == _count) mesmo que uma
+        observação aconteça no meio da leitura.
+
+        :param limites: Limites superiores dos buckets, em ordem crescente
+        """
+        self.limites = tuple(limites)
+        self.buckets = [0] * (len(self.limites) + 1)  # último = acima do maior limite
+        self.soma = 0.0
+
+    def observar(self, valor):
+        self.buckets[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+
+    def linhas(self, nome, rotulos):
+        """Linhas do formato texto do Prometheus (_bucket, _sum e _count)."""
+        buckets = list(self.buckets)
+        soma = self.soma
+        saida = []
+        acumulado = 0
+        for limite, quantidade in zip(self.limites + ("+Inf",), buckets):
+            acumulado += quantidade
+            saida.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+        saida.append(f"{nome}_sum{{{rotulos}}} {soma:.6f}")
+        saida.append(f"{nome}_count{{{rotulos}}} {acumulado}")
+        return saida
+
+
+class MetricasCamera:
+    def __init__(self, camera, janela_taxas=5.0):
+        """
+        Métricas do processo de uma câmera (yolo16_v4.py) para um endpoint HTTP
+        no formato texto do Prometheus.
+
+        Contadores e histogramas são atualizados apenas pelo loop de inferência
+        (um único escritor, incrementos simples); o scrape roda na thread do
+        servidor e só lê esses valores, sem lock. Medidores que dependem de
+        outros objetos (filas, tracks ativos) são funções registradas com
+        registrar_medidor e chamadas apenas no scrape; elas também não devem
+        pegar locks do loop (ex.: len(fila.queue) em vez de fila.qsize()).
+
+        :param camera: Nome da câmera (rótulo camera de todas as séries)
+        :param janela_taxas: Janela (segundos) das taxas calculadas no loop (fps e eventos/s)
+        """
+        self.camera = camera
+        self.janela_taxas = janela_taxas
+        self.inferencia = Histograma(LIMITES_INFERENCIA)
+        self.gravacao_db = Histograma(LIMITES_GRAVACAO_DB)
+        self.frames = 0
+        self.eventos_permanencia = 0
+        self.falhas_gravacao_db = 0
+        self.reconexoes = 0
+        self.fps = 0.0
+        self.eventos_por_segundo = 0.0
+        self.inicio = time.time()
+        self._medidores = []
+
+        self._marca_janela = time.monotonic()
+        self._frames_janela = 0
+        self._eventos_janela = 0
+
+    def registrar_medidor(self, nome, ajuda, funcao, rotulo=None):
+        """
+        Registra um medidor lido no scrape.
+
+        :param nome: Nome da série (sem o prefixo camera_)
+        :param ajuda: Texto do HELP
+        :param funcao: Função sem argumentos; retorna um número ou, com rotulo, um dicionário {valor_do_rotulo: número}
+        :param rotulo: Nome do rótulo extra quando a função retorna um dicionário
+        """
+        self._medidores.append((nome, ajuda, funcao, rotulo))
+
+    def registrar_frame(self, duracao_inferencia):
+        """Chamado pelo loop a cada frame inferido: latência da inferência e taxas da janela."""
+        self.frames += 1
+        self.inferencia.observar(duracao_inferencia)
+        agora = time.monotonic()
+        decorrido = agora - self._marca_janela
+        if decorrido >= self.janela_taxas:
+            self.fps = (self.frames - self._frames_janela) / decorrido
+            self.eventos_por_segundo = (self.eventos_permanencia - self._eventos_janela) / decorrido
+            self._marca_janela = agora
+            self._frames_janela = self.frames
+            self._eventos_janela = self.eventos_permanencia
+
+    def registrar_gravacao_db(self, duracao, ok=True):
+        """Latência de uma gravação no banco (commit das contagens ou de uma permanência)."""
+        self.gravacao_db.observar(duracao)
+        if not ok:
+            self.falhas_gravacao_db += 1
+
+    def registrar_permanencia(self):
+        """Um evento de permanência (saída de um veículo de uma área) gravado."""
+        self.eventos_permanencia += 1
+
+    def registrar_reconexao(self):
+        self.reconexoes += 1
+
+    def texto(self):
+        """Todas as séries no formato texto do Prometheus (chamado pela thread do servidor)."""
+        rotulos = f'camera="{_escapar(self.camera)}"'
+        linhas = []
+
+        def serie(nome, tipo, ajuda, valor):
+            linhas.append(f"# HELP camera_{nome} {ajuda}")
+            linhas.append(f"# TYPE camera_{nome} {tipo}")
+            linhas.append(f"camera_{nome}{{{rotulos}}} {valor}")
+
+        serie("inicio_segundos", "gauge", "Instante (epoch) do início do processo.", f"{self.inicio:.0f}")
+        serie("frames_total", "counter", "Frames inferidos.", self.frames)
+        serie("fps", "gauge", f"Frames inferidos por segundo na última janela de {self.janela_taxas:g}s.",
+              f"{self.fps:.3f}")
+        serie("eventos_permanencia_total", "counter", "Eventos de permanência gravados.", self.eventos_permanencia)
+        serie("eventos_permanencia_por_segundo", "gauge",
+              f"Eventos de permanência por segundo na última janela de {self.janela_taxas:g}s.",
+              f"{self.eventos_por_segundo:.3f}")
+        serie("falhas_gravacao_db_total", "counter", "Gravações no banco que falharam.", self.falhas_gravacao_db)
+        serie("reconexoes_total", "counter", "Reconexões do vídeo/stream.", self.reconexoes)
+
+        for nome, ajuda, histograma in (
+            ("inferencia_segundos", "Latência da inferência (model.track) por frame.", self.inferencia),
+            ("gravacao_db_segundos", "Latência das gravações no banco.", self.gravacao_db),
+        ):
+            linhas.append(f"# HELP camera_{nome} {ajuda}")
+            linhas.append(f"# TYPE camera_{nome} histogram")
+            linhas.extend(histograma.linhas(f"camera_{nome}", rotulos))
+
+        for nome, ajuda, funcao, rotulo in self._medidores:
+            try:
+                valor = funcao()
+            except Exception as e:
+                logger.warning(f"Falha ao ler o medidor {nome}: {e}")
+                continue
+            linhas.append(f"# HELP camera_{nome} {ajuda}")
+            linhas.append(f"# TYPE camera_{nome} gauge")
+            if rotulo is None:
+                linhas.append(f"camera_{nome}{{{rotulos}}} {valor}")
+            else:
+                for chave, quantidade in sorted(valor.items()):
+                    linhas.append(f'camera_{nome}{{{rotulos},{rotulo}="{_escapar(chave)}"}} {quantidade}')
+        return "\n".join(linhas) + "\n"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    metricas = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corpo = self.metricas.texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTEUDO)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        # Cada scrape iria para o stderr da câmera
+        logger.debug(formato % args)
+
+
+class ServidorMetricas:
+    def __init__(self, metricas, porta, host="127.0.0.1"):
+        """
+        Servidor HTTP (GET /metrics) em uma thread própria, fora do loop de
+        inferência. Só lê as métricas; nada é calculado ou agregado no scrape
+        além da formatação do texto.
+
+        :param metricas: MetricasCamera exposta
+        :param porta: Porta TCP (0 escolhe uma porta livre; ver self.porta)
+        :param host: Endereço de escuta (padrão: apenas local)
+        """
+        self.metricas = metricas
+        handler = type("HandlerMetricas", (_Handler,), {"metricas": metricas})
+        self._servidor = ThreadingHTTPServer((host, porta), handler)
+        self._servidor.daemon_threads = True
+        self.host = host
+        self.porta = self._servidor.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="metricas_camera", daemon=True)
+        self._thread.start()
+        logger.info(f"Métricas da câmera {self.metricas.camera} em http://{self.host}:{self.porta}/metrics")
+
+    def stop(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
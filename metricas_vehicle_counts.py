@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MOTOR DE METRICAS DO vehicle_counts
+
+Calcula, por uma conexao somente leitura (conexao_db.abrir_leitura) e dentro
+de uma unica transacao de leitura (mesmo snapshot), todas as metricas usadas por
+diagnostico_banco_cliente.py e analisar_diferencas_contagem.py: totais,
+saidas com/sem tempo, status de envio, distribuicao por dia/area/
+vehicle_code, duplicados, vehicle_code invalido, tempos extremos e
+timestamps vazios. Os relatorios sao montados a partir dos agregados
+coletados, sem novas consultas a tabela.
+
+Sao tres varreduras de vehicle_counts, todas executadas pelo SQLite:
+1. uma consulta composta com todos os contadores (sem ordenacao);
+2. a distribuicao das saidas com tempo por (dia, area, vehicle_code, enviado),
+   da qual saem os resumos por dia, area, codigo e status de envio;
+3. os grupos duplicados.
+Os dois relatorios faziam antes de 9 a 11 varreduras completas cada.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from collections import Counter
+from dataclasses import dataclass, field
+
+from conexao_db import snapshot_leitura
+
+# Grupos duplicados mais recentes mantidos para exibicao
+MAX_DUPLICADOS_EXIBIDOS = 10
+
+
+@dataclass
+class ResumoDia:
+    total: int = 0
+    codigos: set = field(default_factory=set)
+    minimo: float | None = None
+    maximo: float | None = None
+    soma: float = 0.0
+
+    @property
+    def media(self) -> float | None:
+        return self.soma / self.total if self.total else None
+
+
+@dataclass
+class MetricasVehicleCounts:
+    tabelas: list[str] = field(default_factory=list)
+    colunas: dict[str, list[tuple]] = field(default_factory=dict)
+
+    total: int = 0
+    saidas_com_tempo: int = 0
+    saidas_sem_tempo: int = 0
+    por_enviado: Counter = field(default_factory=Counter)
+    por_vehicle_code: Counter = field(default_factory=Counter)
+    por_area: Counter = field(default_factory=Counter)
+    por_dia: dict[str | None, ResumoDia] = field(default_factory=dict)
+
+    grupos_duplicados: int = 0
+    registros_duplicados_extras: int = 0
+    duplicados_recentes: list[tuple] = field(default_factory=list)  # mais recentes primeiro
+
+    vehicle_code_invalido: int = 0
+    vehicle_code_invalido_saidas: int = 0
+    tempos_baixos: int = 0
+    tempos_altos: int = 0
+    timestamps_vazios: int = 0
+
+    def top_vehicle_codes(self, limite: int | None = None, incluir_nulo: bool = True) -> list[tuple]:
+        """vehicle_code das saidas com tempo, do mais para o menos frequente."""
+        itens = [(code, qtd) for code, qtd in self.por_vehicle_code.most_common() if incluir_nulo or code is not None]
+        return itens[:limite] if limite else itens
+
+    def dias_desc(self, data_limite: str | None = None, limite: int | None = None) -> list[tuple[str | None, ResumoDia]]:
+        """Dias com saidas (mais recentes primeiro, dia NULL por ultimo), opcionalmente a partir de data_limite."""
+        dias = sorted((d for d in self.por_dia if d is not None), reverse=True)
+        if data_limite is not None:
+            dias = [d for d in dias if d >= data_limite]
+        elif None in self.por_dia:
+            dias.append(None)
+        itens = [(d, self.por_dia[d]) for d in dias]
+        return itens[:limite] if limite else itens
+
+
+def coletar_metricas(conn: sqlite3.Connection) -> MetricasVehicleCounts:
+    """Le vehicle_counts (tres varreduras em um unico snapshot) e retorna todas as metricas agregadas."""
+    metricas = MetricasVehicleCounts()
+    metricas.tabelas = [t[0] for t in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
+    for tabela in ("vehicle_counts", "export_log"):
+        if tabela in metricas.tabelas:
+            metricas.colunas[tabela] = conn.execute(f"PRAGMA table_info({tabela})").fetchall()
+    if "vehicle_counts" not in metricas.tabelas:
+        return metricas
+
+    # Bancos antigos podem nao ter as colunas adicionadas depois
+    disponiveis = {col[1] for col in metricas.colunas["vehicle_counts"]}
+    tempo = "tempo_permanencia" if "tempo_permanencia" in disponiveis else "NULL"
+    enviado = "enviado" if "enviado" in disponiveis else "NULL"
+    saida_com_tempo = f"count_out = 1 AND {tempo} IS NOT NULL"
+    codigo_invalido = "(vehicle_code IS NULL OR vehicle_code <= 0)"
+
+    # As tres consultas enxergam o mesmo snapshot
+    with snapshot_leitura(conn):
+        (
+            metricas.total,
+            metricas.saidas_com_tempo,
+            metricas.saidas_sem_tempo,
+            metricas.vehicle_code_invalido,
+            metricas.vehicle_code_invalido_saidas,
+            metricas.tempos_baixos,
+            metricas.tempos_altos,
+            metricas.timestamps_vazios,
+        ) = (valor or 0 for valor in conn.execute(
+            f"""
+            SELECT COUNT(*),
+                   SUM({saida_com_tempo}),
+                   SUM(count_out = 1 AND {tempo} IS NULL),
+                   SUM({codigo_invalido}),
+                   SUM(count_out = 1 AND {codigo_invalido}),
+                   SUM({saida_com_tempo} AND {tempo} < 1),
+                   SUM({saida_com_tempo} AND {tempo} >= 3600),
+                   SUM(timestamp IS NULL OR timestamp = '')
+            FROM vehicle_counts
+            """
+        ).fetchone())
+
+        for dia, area, vehicle_code, status, qtd, minimo, maximo, soma in conn.execute(
+            f"""
+            SELECT DATE(timestamp), area, vehicle_code, {enviado}, COUNT(*),
+                   MIN({tempo}), MAX({tempo}), SUM({tempo})
+            FROM vehicle_counts
+            WHERE {saida_com_tempo}
+            GROUP BY 1, 2, 3, 4
+            """
+        ):
+            metricas.por_enviado[status] += qtd
+            metricas.por_vehicle_code[vehicle_code] += qtd
+            metricas.por_area[area] += qtd
+
+            resumo = metricas.por_dia.get(dia)
+            if resumo is None:
+                resumo = metricas.por_dia[dia] = ResumoDia()
+            resumo.total += qtd
+            if vehicle_code is not None:  # COUNT(DISTINCT) ignora NULL
+                resumo.codigos.add(vehicle_code)
+            resumo.soma += soma
+            resumo.minimo = minimo if resumo.minimo is None else min(resumo.minimo, minimo)
+            resumo.maximo = maximo if resumo.maximo is None else max(resumo.maximo, maximo)
+
+        for grupo in conn.execute(
+            f"""
+            SELECT timestamp, vehicle_code, {tempo}, COUNT(*), GROUP_CONCAT(id)
+            FROM vehicle_counts
+            WHERE {saida_com_tempo}
+            GROUP BY timestamp, vehicle_code, {tempo}
+            HAVING COUNT(*) > 1
+            ORDER BY timestamp DESC
+            """
+        ):
+            metricas.grupos_duplicados += 1
+            metricas.registros_duplicados_extras += grupo[3] - 1
+            if len(metricas.duplicados_recentes) < MAX_DUPLICADOS_EXIBIDOS:
+                metricas.duplicados_recentes.append(grupo)
+
+    return metricas
@@ -1,28 +1,38 @@
 import sqlite3
 import logging
+import time
+import numpy as np
 from shapely.geometry import Polygon, Point
-from datetime import datetime, timedelta
+from datetime import datetime
+from frame_clock import FrameClock
+from vehicle_counts_repository import VehicleCountsRepository
 
-# Configurar o logger
+try:
+    from shapely import contains_xy  # shapely >= 2.0 (teste vetorizado de pontos)
+except ImportError:
+    contains_xy = None
+
+# Logger do tracker (arquivo, nível e limite de taxa definidos por log_config.configurar_logging)
 logger = logging.getLogger("permanence_tracker.log")
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
 
 class PermanenceTracker:
-    def __init__(self, cursor, conn, client_code, config):
+    def __init__(self, cursor, conn, client_code, config, clock=None, metricas=None):
         """
         Inicializa o tracker para calcular o tempo de permanência de veículos.
 
         :param db_path: Caminho para o banco de dados SQLite
         :param client_code: Código do cliente para identificar os registros
         :param config: Configurações das áreas monitoradas
+        :param clock: FrameClock usado para converter os timestamps monotônicos na gravação
+        :param metricas: MetricasCamera que recebe os eventos de permanência e a latência das gravações (opcional)
         """
         self.cursor = cursor
         self.conn = conn
+        self.repository = VehicleCountsRepository(conn)
         self.client_code = client_code
         self.config = config
+        self.clock = clock or FrameClock()
+        self.metricas = metricas
 
         self.permanence_data = {
              area_name: {
@@ -38,36 +48,17 @@ class PermanenceTracker:
 
     def _initialize_db(self):
         """Garante estrutura necessária na tabela vehicle_counts."""
-        # Criar tabela vehicle_counts caso não exista (estrutura mínima)
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS vehicle_counts (
-                              id INTEGER PRIMARY KEY AUTOINCREMENT,
-                              area TEXT,
-                              vehicle_code INTEGER,
-                              count_in INTEGER,
-                              count_out INTEGER,
-                              timestamp TEXT,
-                              tempo_permanencia FLOAT)''')
-        self.conn.commit()
-
-        # Garantir colunas necessárias em vehicle_counts
-        self.cursor.execute("PRAGMA table_info(vehicle_counts)")
-        columns_vc = [column[1] for column in self.cursor.fetchall()]
-        if 'tempo_permanencia' not in columns_vc:
-            self.cursor.execute('''ALTER TABLE vehicle_counts ADD COLUMN tempo_permanencia FLOAT''')
-            self.conn.commit()
-            logger.info("Coluna 'tempo_permanencia' adicionada à tabela 'vehicle_counts'.")
-        if 'enviado' not in columns_vc:
-            self.cursor.execute('''ALTER TABLE vehicle_counts ADD COLUMN enviado INTEGER DEFAULT 0''')
-            self.conn.commit()
-            logger.info("Coluna 'enviado' adicionada à tabela 'vehicle_counts'.")
+        for coluna in self.repository.ensure_schema():
+            logger.info(f"Coluna '{coluna}' adicionada à tabela 'vehicle_counts'.")
 
     def calculate_permanence(self, tracks, current_timestamp):
         """
         Atualiza os tempos de permanência dos veículos nas áreas monitoradas.
 
         :param tracks: Lista de objetos rastreados pelo modelo
-        :param current_timestamp: Timestamp atual do frame processado
+        :param current_timestamp: Timestamp monotônico do frame processado (FrameClock.tick())
         """
+        current_timestamp = self._to_mono(current_timestamp)
         for area_name, area_info in self.config.items():
             polygon_area = Polygon(area_info['coordenadas'])
             timeout = area_info.get('timeout', 3)
@@ -89,7 +80,7 @@ class PermanenceTracker:
                         # Se o veículo entra na área pela primeira vez
                         if track_id not in self.permanence_data[area_name]['timestamps']:
                             self.permanence_data[area_name]['timestamps'][track_id] = current_timestamp
-                            logger.info(f"Track ID {track_id} entrou na área {area_name} em {current_timestamp}")
+                            logger.info(f"Track ID {track_id} entrou na área {area_name} em {self.clock.format(current_timestamp)}")
 
                         # Atualiza o último momento visto dentro da área
                         self.permanence_data[area_name]['last_seen'][track_id] = current_timestamp
@@ -98,18 +89,22 @@ class PermanenceTracker:
             # Processar veículos que não foram vistos recentemente
             self._process_exited_vehicles(area_name, current_timestamp, timeout)
 
+    def _to_mono(self, timestamp):
+        """Aceita também datetime (chamadores antigos) e converte para a escala monotônica."""
+        return self.clock.from_datetime(timestamp) if isinstance(timestamp, datetime) else float(timestamp)
+
     def _process_exited_vehicles(self, area_name, current_timestamp, timeout):
         """
         Processa veículos que saíram da área e salva o tempo de permanência.
 
         :param area_name: Nome da área monitorada
-        :param current_timestamp: Timestamp atual
+        :param current_timestamp: Timestamp monotônico atual
         :param timeout: Tempo limite para considerar que o veículo saiu
         """
         expired_tracks = []
         for track_id, last_seen in self.permanence_data[area_name]['last_seen'].items():
             # Verifica se o veículo não foi visto dentro do tempo limite
-            if (current_timestamp - last_seen).total_seconds() > timeout:
+            if current_timestamp - last_seen > timeout:
                 expired_tracks.append(track_id)
 
         for track_id in expired_tracks:
@@ -119,8 +114,9 @@ class PermanenceTracker:
                 continue
 
             entry_time = self.permanence_data[area_name]['timestamps'].pop(track_id, None)
-            if entry_time:
-                tempo_permanencia = (last_seen - entry_time).total_seconds()
+            if entry_time is not None:
+                last_seen = self.permanence_data[area_name]['last_seen'][track_id]
+                tempo_permanencia = last_seen - entry_time
                 if tempo_permanencia > 1:  # Somente salva se o tempo for maior que 1 segundo
                     self._save_permanence_to_db(track_id, area_name, last_seen, tempo_permanencia)
                     self.permanence_data[area_name]['processed'].add(track_id)  # Marca como processado
@@ -141,24 +137,46 @@ class PermanenceTracker:
 
 
 
-    def get_permanence_time(self, track_id):
+    def get_permanence_time(self, track_id, now=None):
         """
         Retorna o tempo de permanência de um track_id em qualquer área.
 
         :param track_id: ID do objeto rastreado
+        :param now: Timestamp monotônico de referência (padrão: timestamp do frame atual do clock)
         :return: Dicionário {area_name: tempo_permanencia} ou {} se não encontrado
         """
         tempos = {}
-        current_timestamp = datetime.now()
-        
+        current_timestamp = self.clock.frame_ts if now is None else now
+
         for area_name, area_data in self.permanence_data.items():
             if track_id in area_data['timestamps']:
                 entry_time = area_data['timestamps'][track_id]
-                tempo_permanencia = (current_timestamp - entry_time).total_seconds()
+                tempo_permanencia = current_timestamp - entry_time
                 tempos[area_name] = tempo_permanencia
 
         return tempos if tempos else {}  # Retorna um dicionário vazio ao invés de None
 
+    def tracks_por_area(self):
+        """
+        Quantidade de tracks ativos em cada área. Pode ser chamado de outra thread
+        (scrape de métricas): só lê tamanhos, sem lock.
+        """
+        return {area_name: len(area_data['timestamps']) for area_name, area_data in list(self.permanence_data.items())}
+
+    def get_vehicle_code(self, track_id, area_name):
+        """
+        Retorna o vehicle_code associado ao track_id na área, ou None se ainda não definido.
+        """
+        return self.permanence_data.get(area_name, {}).get('vehicle_codes', {}).get(track_id)
+
+    def set_vehicle_code(self, track_id, area_name, vehicle_code):
+        """
+        Associa um vehicle_code ao track_id na área (usado ao salvar a permanência).
+        """
+        area_data = self.permanence_data.setdefault(
+            area_name, {"timestamps": {}, "last_seen": {}, "processed": set(), "vehicle_codes": {}}
+        )
+        area_data.setdefault('vehicle_codes', {})[track_id] = vehicle_code
 
 
     def _save_permanence_to_db(self, track_id, area_name, last_seen, tempo_permanencia):
@@ -167,44 +185,32 @@ class PermanenceTracker:
 
         :param track_id: ID do veículo rastreado
         :param area_name: Nome da área
-        :param last_seen: Último timestamp visto
+        :param last_seen: Último timestamp monotônico visto
         :param tempo_permanencia: Tempo de permanência calculado
         """
         try:
-            # Obtem o vehicle_code armazenado no dicionário (ou usa track_id se não existir)
-            vehicle_code = self.permanence_data[area_name]['vehicle_codes'].get(track_id, -1)
-            timestamp_str = last_seen.strftime('%Y-%m-%d %H:%M:%S')
-
-            # CORREÇÃO 1.3: Aumentar janela de busca de 600s (10min) para 1800s (30min)
-            # Isso evita duplicações em situações de trânsito lento ou processamento atrasado
-            self.cursor.execute(
-                '''SELECT id FROM vehicle_counts
-                   WHERE area = ? AND vehicle_code = ? AND count_out = 1
-                     AND tempo_permanencia IS NULL
-                     AND datetime(timestamp) >= datetime(?, '-1800 seconds')
-                   ORDER BY id DESC LIMIT 1''',
-                (area_name, vehicle_code, timestamp_str)
-            )
-            row = self.cursor.fetchone()
-            if row:
-                rec_id = row[0]
-                self.cursor.execute(
-                    '''UPDATE vehicle_counts 
-                       SET tempo_permanencia = ?, timestamp = ?, enviado = 0 
-                       WHERE id = ?''',
-                    (tempo_permanencia, timestamp_str, rec_id)
-                )
+            # Obtem o vehicle_code armazenado para o track (ou -1 se não existir)
+            vehicle_code = self.get_vehicle_code(track_id, area_name)
+            if vehicle_code is None:
+                vehicle_code = -1
+            timestamp_str = self.clock.format(last_seen)
+
+            # Completa a saída sem tempo registrada pela contagem (janela de 30 min) ou insere uma nova
+            inicio = time.perf_counter()
+            try:
+                rec_id, atualizado = self.repository.record_dwell(area_name, vehicle_code, timestamp_str, tempo_permanencia)
+            except sqlite3.Error:
+                if self.metricas is not None:
+                    self.metricas.registrar_gravacao_db(time.perf_counter() - inicio, ok=False)
+                raise
+            if self.metricas is not None:
+                self.metricas.registrar_gravacao_db(time.perf_counter() - inicio)
+                self.metricas.registrar_permanencia()
+            if atualizado:
                 logger.info(f"ATUALIZADO vehicle_counts ID={rec_id}: Tempo {tempo_permanencia:.2f}s (area {area_name})")
             else:
-                # Se não houver registro de saída prévio, insere um novo
-                self.cursor.execute(
-                    '''INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado)
-                       VALUES (?, ?, 0, 1, ?, ?, 0)''',
-                    (area_name, vehicle_code, timestamp_str, tempo_permanencia)
-                )
                 logger.info(f"INSERIDO em vehicle_counts: Track {track_id}, Area {area_name}, Tempo {tempo_permanencia:.2f}s (enviado=0)")
-            
-            self.conn.commit()
+
             logger.info(f"Veiculo {track_id} saiu da area {area_name} com tempo {tempo_permanencia:.2f}s - SALVO EM AMBAS AS TABELAS!")
             logger.info(f"CENARIO: Veiculo pode ter aparecido na area SEM cruzar linha de contagem - tempo registrado independentemente")
             
@@ -214,3 +220,300 @@ class PermanenceTracker:
     def close(self):
         """Fecha a conexão com o banco de dados."""
         self.conn.close()
+
+
+# Valor usado nos arrays para indicar que o track ainda não tem vehicle_code definido
+SEM_CODIGO = np.iinfo(np.int32).min
+
+
+class ArrayPermanenceTracker(PermanenceTracker):
+    """
+    Variante do PermanenceTracker que guarda o estado dos tracks ativos em arrays
+    NumPy pré-alocados (um slot por track_id) em vez de dicionários de datetime.
+
+    Cada slot guarda o track_id, o timestamp de entrada e o último timestamp visto
+    (float monotônico do FrameClock) por área, uma máscara de bits com as áreas em que o track está
+    presente e o vehicle_code por área. Slots liberados voltam para uma free list.
+    A expiração por timeout vira uma única comparação vetorizada por frame.
+
+    Mantém os mesmos métodos públicos e a mesma semântica do PermanenceTracker:
+    as áreas já gravadas e os vehicle_codes de um track_id sobrevivem à liberação
+    do slot (um track que reentra depois do timeout não é gravado de novo) e
+    set_vehicle_code guarda o código mesmo antes do track aparecer. Diferença
+    conhecida: no tracker de dicionários um track já gravado que reentra fica
+    marcado como presente indefinidamente; aqui ele sai da área no timeout.
+    """
+
+    def __init__(self, cursor, conn, client_code, config, clock=None, capacity=256, metricas=None):
+        """
+        :param cursor: Cursor do banco de dados SQLite
+        :param conn: Conexão com o banco de dados SQLite
+        :param client_code: Código do cliente para identificar os registros
+        :param config: Configurações das áreas monitoradas
+        :param clock: FrameClock usado para converter os timestamps monotônicos na gravação
+        :param capacity: Número inicial de slots (cresce automaticamente se necessário)
+        :param metricas: MetricasCamera que recebe os eventos de permanência e a latência das gravações (opcional)
+        """
+        self.cursor = cursor
+        self.conn = conn
+        self.repository = VehicleCountsRepository(conn)
+        self.client_code = client_code
+        self.config = config
+        self.clock = clock or FrameClock()
+        self.metricas = metricas
+
+        self.area_names = list(config.keys())
+        if len(self.area_names) > 32:
+            raise ValueError("ArrayPermanenceTracker suporta no máximo 32 áreas.")
+        self._area_index = {name: idx for idx, name in enumerate(self.area_names)}
+        self._area_bits = np.array([1 << idx for idx in range(len(self.area_names))], dtype=np.uint32)
+        self._polygons = [Polygon(info['coordenadas']) for info in config.values()]
+        self._timeouts = np.array([info.get('timeout', 3) for info in config.values()], dtype=np.float64)
+
+        n_areas = len(self.area_names)
+        self._track_ids = np.full(capacity, -1, dtype=np.int64)
+        self._entry_ts = np.zeros((capacity, n_areas), dtype=np.float64)
+        self._last_seen = np.zeros((capacity, n_areas), dtype=np.float64)
+        self._area_mask = np.zeros(capacity, dtype=np.uint32)
+        self._processed_mask = np.zeros(capacity, dtype=np.uint32)
+        self._vehicle_codes = np.full((capacity, n_areas), SEM_CODIGO, dtype=np.int32)
+
+        self._slots = {}  # track_id -> slot
+        self._free = list(range(capacity - 1, -1, -1))  # pop() devolve o menor slot livre
+        self._high_water = 0  # maior slot já utilizado + 1 (limita as varreduras)
+
+        # Estado dos track_ids sem slot (como os sets/dicts nunca limpos do PermanenceTracker)
+        self._processados = {}  # track_id -> máscara das áreas já gravadas
+        self._codigos = {}  # track_id -> {area_idx: vehicle_code}
+
+        self._initialize_db()
+
+    # ------------------------------------------------------------------ #
+    # Slots
+    # ------------------------------------------------------------------ #
+    def _grow(self):
+        """Dobra a capacidade dos arrays quando a free list esgota."""
+        old = len(self._track_ids)
+        new = old * 2
+        n_areas = len(self.area_names)
+
+        self._track_ids = np.concatenate([self._track_ids, np.full(old, -1, dtype=np.int64)])
+        self._entry_ts = np.concatenate([self._entry_ts, np.zeros((old, n_areas), dtype=np.float64)])
+        self._last_seen = np.concatenate([self._last_seen, np.zeros((old, n_areas), dtype=np.float64)])
+        self._area_mask = np.concatenate([self._area_mask, np.zeros(old, dtype=np.uint32)])
+        self._processed_mask = np.concatenate([self._processed_mask, np.zeros(old, dtype=np.uint32)])
+        self._vehicle_codes = np.concatenate(
+            [self._vehicle_codes, np.full((old, n_areas), SEM_CODIGO, dtype=np.int32)]
+        )
+        self._free.extend(range(new - 1, old - 1, -1))
+        logger.info(f"ArrayPermanenceTracker: capacidade ampliada de {old} para {new} slots.")
+
+    def _slot_for(self, track_id):
+        """Retorna o slot do track_id, alocando um novo se necessário."""
+        slot = self._slots.get(track_id)
+        if slot is not None:
+            return slot
+
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._slots[track_id] = slot
+        self._track_ids[slot] = track_id
+        self._high_water = max(self._high_water, slot + 1)
+        # Track que já passou por aqui (ou com código definido antes de aparecer)
+        self._processed_mask[slot] = self._processados.pop(track_id, 0)
+        for area_idx, code in self._codigos.pop(track_id, {}).items():
+            self._vehicle_codes[slot, area_idx] = code
+        return slot
+
+    def _release(self, slot):
+        """Devolve o slot para a free list; áreas gravadas e códigos do track ficam guardados."""
+        track_id = int(self._track_ids[slot])
+        del self._slots[track_id]
+        if self._processed_mask[slot]:
+            self._processados[track_id] = int(self._processed_mask[slot])
+        codigos = {idx: int(code) for idx, code in enumerate(self._vehicle_codes[slot]) if code != SEM_CODIGO}
+        if codigos:
+            self._codigos[track_id] = codigos
+        self._track_ids[slot] = -1
+        self._area_mask[slot] = 0
+        self._processed_mask[slot] = 0
+        self._vehicle_codes[slot] = SEM_CODIGO
+        self._free.append(slot)
+
+    # ------------------------------------------------------------------ #
+    # Cálculo de permanência
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _extract_centers(tracks):
+        """Extrai track_ids e centros das boxes de todos os tracks do frame."""
+        ids_list, xyxy_list = [], []
+        for track in tracks:
+            if not hasattr(track, 'boxes') or track.boxes is None:
+                continue
+            if track.boxes.id is None or track.boxes.xyxy is None:
+                continue
+            xyxy_list.append(np.asarray(track.boxes.xyxy.cpu().numpy()).reshape(-1, 4))
+            ids_list.append(np.asarray(track.boxes.id.cpu().numpy()).reshape(-1).astype(np.int64))
+
+        if not ids_list:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+        xyxy = np.concatenate(xyxy_list)
+        ids = np.concatenate(ids_list)
+        return ids, (xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2
+
+    def _points_in_areas(self, xs, ys):
+        """Retorna matriz booleana (n_pontos x n_areas) indicando em quais áreas cada ponto está."""
+        inside = np.zeros((len(xs), len(self._polygons)), dtype=bool)
+        xs = xs.astype(np.float64)
+        ys = ys.astype(np.float64)
+        for idx, polygon in enumerate(self._polygons):
+            if contains_xy is not None:
+                inside[:, idx] = contains_xy(polygon, xs, ys)
+            else:
+                inside[:, idx] = [polygon.contains(Point(x, y)) for x, y in zip(xs, ys)]
+        return inside
+
+    def calculate_permanence(self, tracks, current_timestamp):
+        """
+        Atualiza os tempos de permanência dos veículos nas áreas monitoradas.
+
+        :param tracks: Lista de objetos rastreados pelo modelo
+        :param current_timestamp: Timestamp monotônico do frame processado (FrameClock.tick())
+        """
+        now = self._to_mono(current_timestamp)
+        ids, xs, ys = self._extract_centers(tracks)
+
+        if ids.size:
+            inside = self._points_in_areas(xs, ys)
+            in_any = inside.any(axis=1)
+            if in_any.any():
+                inside = inside[in_any]
+                rows = np.fromiter((self._slot_for(int(t)) for t in ids[in_any]), dtype=np.intp, count=len(inside))
+
+                present = (self._area_mask[rows, None] & self._area_bits) != 0
+                entering = inside & ~present
+
+                self._entry_ts[rows] = np.where(entering, now, self._entry_ts[rows])
+                self._last_seen[rows] = np.where(inside, now, self._last_seen[rows])
+                self._area_mask[rows] |= np.bitwise_or.reduce(
+                    np.where(inside, self._area_bits, np.uint32(0)), axis=1
+                ).astype(np.uint32)
+
+                for row_idx, area_idx in zip(*np.nonzero(entering)):
+                    logger.info(
+                        f"Track ID {int(self._track_ids[rows[row_idx]])} entrou na área "
+                        f"{self.area_names[area_idx]} em {self.clock.format(now)}"
+                    )
+
+        # Processar veículos que não foram vistos recentemente
+        self._process_exited_vehicles(now)
+
+    def _process_exited_vehicles(self, now):
+        """
+        Processa veículos que saíram das áreas (todas de uma vez) e salva o tempo de permanência.
+
+        :param now: Timestamp monotônico atual
+        """
+        hw = self._high_water
+        if hw == 0:
+            return
+
+        active = (self._area_mask[:hw, None] & self._area_bits) != 0
+        expired = active & ((now - self._last_seen[:hw]) > self._timeouts)
+        if not expired.any():
+            return
+
+        for slot, area_idx in zip(*np.nonzero(expired)):
+            slot = int(slot)
+            bit = np.uint32(self._area_bits[area_idx])
+            area_name = self.area_names[area_idx]
+            track_id = int(self._track_ids[slot])
+
+            if self._processed_mask[slot] & bit:
+                # Evita salvar múltiplos registros para o mesmo veículo
+                logger.debug(f"Track ID {track_id} já processado para a área {area_name}.")
+            else:
+                last_seen = float(self._last_seen[slot, area_idx])
+                tempo_permanencia = last_seen - float(self._entry_ts[slot, area_idx])
+                if tempo_permanencia > 1:  # Somente salva se o tempo for maior que 1 segundo
+                    self._save_permanence_to_db(track_id, area_name, last_seen, tempo_permanencia)
+                    self._processed_mask[slot] |= bit
+
+            self._area_mask[slot] &= ~bit
+            if self._area_mask[slot] == 0:
+                self._release(slot)
+
+    # ------------------------------------------------------------------ #
+    # Consultas
+    # ------------------------------------------------------------------ #
+    def has_vehicle_left(self, track_id, area_name):
+        """
+        Verifica se o veículo saiu da área.
+        Retorna True se o veículo saiu da área monitorada.
+        """
+        area_idx = self._area_index.get(area_name)
+        if area_idx is None:
+            return False  # Retorna False se a área não existe no tracker
+
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return True
+        return not (self._area_mask[slot] & self._area_bits[area_idx])
+
+    def get_permanence_time(self, track_id, now=None):
+        """
+        Retorna o tempo de permanência de um track_id em qualquer área.
+
+        :param track_id: ID do objeto rastreado
+        :param now: Timestamp monotônico de referência (padrão: timestamp do frame atual do clock)
+        :return: Dicionário {area_name: tempo_permanencia} ou {} se não encontrado
+        """
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return {}
+
+        now = self.clock.frame_ts if now is None else now
+        mask = self._area_mask[slot]
+        return {
+            area_name: now - float(self._entry_ts[slot, idx])
+            for idx, area_name in enumerate(self.area_names)
+            if mask & self._area_bits[idx]
+        }
+
+    def tracks_por_area(self):
+        """
+        Quantidade de tracks ativos em cada área (bits das máscaras). Pode ser
+        chamado de outra thread (scrape de métricas): lê os arrays atuais sem lock.
+        """
+        mascaras = self._area_mask[:self._high_water]
+        presentes = ((mascaras[:, None] & self._area_bits) != 0).sum(axis=0)
+        return {area_name: int(presentes[idx]) for idx, area_name in enumerate(self.area_names)}
+
+    def get_vehicle_code(self, track_id, area_name):
+        """
+        Retorna o vehicle_code associado ao track_id na área, ou None se ainda não definido.
+        """
+        slot = self._slots.get(track_id)
+        area_idx = self._area_index.get(area_name)
+        if area_idx is None:
+            return None
+        if slot is None:
+            return self._codigos.get(track_id, {}).get(area_idx)
+        code = int(self._vehicle_codes[slot, area_idx])
+        return None if code == SEM_CODIGO else code
+
+    def set_vehicle_code(self, track_id, area_name, vehicle_code):
+        """
+        Associa um vehicle_code ao track_id na área (guardado até o track ocupar um slot, se ainda não estiver ativo).
+        """
+        slot = self._slots.get(track_id)
+        area_idx = self._area_index.get(area_name)
+        if area_idx is None:
+            logger.debug(f"set_vehicle_code ignorado: área {area_name} não monitorada (Track ID {track_id}).")
+            return
+        if slot is None:
+            self._codigos.setdefault(track_id, {})[area_idx] = vehicle_code
+            return
+        self._vehicle_codes[slot, area_idx] = vehicle_code
@@ -0,0 +1,398 @@
+import logging
+import time
+
+import cv2
+import numpy as np
+from shapely.geometry import Polygon, Point
+
+from conexao_db import PERFIL_PADRAO, abrir_escrita
+from contador_eventos import ContadorEventos
+from vehicle_code_resolver import CODIGO_NAO_MAPEADO
+from vehicle_counts_repository import VehicleCountsRepository
+
+try:
+    from ultralytics.utils.plotting import Annotator
+except ImportError:  # benchmark/replay em máquinas sem ultralytics (sem desenho de rótulos)
+    Annotator = None
+
+logger = logging.getLogger("busca_erro")
+bug_logger = logging.getLogger("bug_vehicle_code")
+
+
+def init_db(db_path, perfil=PERFIL_PADRAO):
+    """
+    Abre o banco das câmeras com o perfil de PRAGMAs (WAL, synchronous=NORMAL,
+    cache/mmap, busy_timeout; ver conexao_db.PERFIS_PRAGMAS) e garante as tabelas.
+
+    :param db_path: Caminho do banco SQLite
+    :param perfil: Perfil de PRAGMAs de conexao_db.PERFIS_PRAGMAS
+    :return: (conn, cursor)
+    """
+    conn = abrir_escrita(db_path, perfil=perfil)
+    cursor = conn.cursor()
+
+    # Tabelas vehicle_counts/export_log e colunas adicionadas depois
+    VehicleCountsRepository(conn).ensure_schema()
+    return conn, cursor
+
+
+def carregar_contador(config, region_points, class_names, view_img=False):
+    """Instancia o ObjectCounter4 (fork do ultralytics) se estiver instalado; senão retorna None."""
+    try:
+        from ultralytics.solutions import object_counter4
+    except ImportError:
+        return None
+    counter = object_counter4.ObjectCounter4(config)
+    counter.set_args(view_img=view_img, reg_pts=region_points, classes_names=class_names, draw_tracks=True)
+    return counter
+
+
+class PipelineContagem:
+    def __init__(self, cursor, conn, tracker, resolver, permanencia_areas, counter=None,
+                 region_points=None, second_region_points=None, class_names=None,
+                 client_code=None, fps=25, fonte=None, metricas=None):
+        """
+        Etapas do processamento de um frame já inferido (contagem, permanência,
+        análise das boxes e gravação), compartilhadas por yolo16_v4.py, pelo
+        benchmark e pelo replay de detecções.
+
+        :param cursor: Cursor do banco de dados SQLite
+        :param conn: Conexão com o banco de dados SQLite
+        :param tracker: PermanenceTracker (ou ArrayPermanenceTracker) já inicializado
+        :param resolver: VehicleCodeResolver com a tabela área x classe -> vehicle_code
+        :param permanencia_areas: Áreas de permanência ({area: {'coordenadas': [...]}})
+        :param counter: ObjectCounter4 (None desativa a etapa de contagem)
+        :param region_points: Pontos da linha de contagem da area_1
+        :param second_region_points: Pontos da linha de contagem da area_2 (opcional)
+        :param class_names: Nomes das classes do modelo (model.names)
+        :param client_code: Código do cliente (apenas para logs)
+        :param fps: FPS do vídeo repassado ao contador
+        :param fonte: Identificador da câmera nos offsets do contador (padrão: client_code)
+        :param metricas: MetricasCamera que recebe a latência das gravações das contagens (opcional)
+        """
+        self.cursor = cursor
+        self.conn = conn
+        self.repository = VehicleCountsRepository(conn)
+        self.tracker = tracker
+        self.resolver = resolver
+        self.permanencia_areas = permanencia_areas
+        self.counter = counter
+        self.region_points = region_points
+        self.second_region_points = second_region_points
+        self.class_names = class_names if class_names is not None else resolver.class_names
+        self.client_code = client_code
+        self.fps = fps
+        self.fonte = str(fonte if fonte is not None else client_code)
+        self.metricas = metricas
+
+        # Eventos de travessia do contador, retomados dos offsets gravados no último commit
+        self.eventos = ContadorEventos(counter, self.repository, self.fonte) if counter is not None else None
+        # Linhas de eventos já consumidos cuja gravação falhou: reenviadas no próximo frame
+        self._linhas_pendentes = []
+        self._salvos_pendentes = []
+        self._offsets_pendentes = []
+        # Versão do ContadorEventos já gravada (ou pendente por falha, se diferente)
+        self._versao_gravada = 0
+
+        # Polígonos das áreas de permanência montados uma única vez
+        self._polygons = [(name, Polygon(info['coordenadas'])) for name, info in permanencia_areas.items()]
+
+        # SISTEMA DE AUTORIZAÇÃO - Apenas veículos que cruzaram linha podem ter tempo de permanência
+        self.authorized_vehicles = {
+            'vehicle_ids': set(),  # IDs autorizados
+            'recent_crossings': [],  # Lista: [(timestamp, area, vehicle_code, last_position)]
+            'lost_vehicles': {}  # Veículos perdidos: {area: [(timestamp, vehicle_code, last_position)]}
+        }
+
+    # ------------------------------------------------------------------ #
+    # SISTEMA DE AUTORIZAÇÃO - Funções de gerenciamento
+    # ------------------------------------------------------------------ #
+    def authorize_vehicle(self, track_id, area, vehicle_code, position, timestamp):
+        """
+        Autoriza um veículo que cruzou a linha de contagem.
+        """
+        self.authorized_vehicles['vehicle_ids'].add(track_id)
+        self.authorized_vehicles['recent_crossings'].append((timestamp, area, vehicle_code, position))
+
+        # Limpar crossings antigos (mais de 5 minutos)
+        self.authorized_vehicles['recent_crossings'] = [
+            crossing for crossing in self.authorized_vehicles['recent_crossings']
+            if timestamp - crossing[0] < 300
+        ]
+
+        bug_logger.info(f"AUTORIZADO -> Track {track_id} cruzou linha na {area} (codigo {vehicle_code})")
+
+    def check_vehicle_authorization(self, track_id, area, position, timestamp):
+        """
+        Verifica se um veículo está autorizado a ter tempo de permanência.
+        Retorna: (autorizado: bool, vehicle_code: int)
+        """
+        # 1. AUTORIZAÇÃO PRIMÁRIA: ID já está na lista
+        if track_id in self.authorized_vehicles['vehicle_ids']:
+            return True, None  # vehicle_code será obtido depois
+
+        # 2. FALLBACK POR PROXIMIDADE: Novo ID próximo de onde outro desapareceu
+        for lost_timestamp, lost_area, lost_vehicle_code, lost_position in self.authorized_vehicles.get('lost_vehicles', {}).get(area, []):
+            if timestamp - lost_timestamp < 30:  # Máximo 30s de diferença
+                distance = ((position[0] - lost_position[0])**2 + (position[1] - lost_position[1])**2)**0.5
+                if distance < 100:  # Máximo 100 pixels de distância
+                    # Transferir autorização
+                    self.authorized_vehicles['vehicle_ids'].add(track_id)
+                    bug_logger.info(f"AUTORIZADO POR PROXIMIDADE -> Track {track_id} (similar ao perdido na {area})")
+                    return True, lost_vehicle_code
+
+        # 3. FALLBACK TEMPORAL: Crossing recente na área
+        for crossing_timestamp, crossing_area, vehicle_code, crossing_position in self.authorized_vehicles['recent_crossings']:
+            if crossing_area == area and timestamp - crossing_timestamp < 60:  # 60s de janela
+                self.authorized_vehicles['vehicle_ids'].add(track_id)
+                bug_logger.info(f"AUTORIZADO TEMPORAL -> Track {track_id} na {area} (crossing recente)")
+                return True, vehicle_code
+
+        # 4. NÃO AUTORIZADO
+        bug_logger.warning(f"NAO AUTORIZADO -> Track {track_id} na {area} (nao cruzou linha)")
+        return False, None
+
+    def handle_lost_vehicle(self, track_id, area, vehicle_code, position, timestamp):
+        """
+        Registra um veículo autorizado que foi perdido (para matching posterior).
+        """
+        if area not in self.authorized_vehicles['lost_vehicles']:
+            self.authorized_vehicles['lost_vehicles'][area] = []
+
+        self.authorized_vehicles['lost_vehicles'][area].append((timestamp, area, vehicle_code, position))
+
+        # Limitar histórico a 10 veículos perdidos por área
+        self.authorized_vehicles['lost_vehicles'][area] = self.authorized_vehicles['lost_vehicles'][area][-10:]
+
+        bug_logger.info(f"VEICULO PERDIDO -> Track {track_id} na {area} (registrado para matching)")
+
+    def get_vehicle_code(self, area_detectada, class_id):
+        """
+        Retorna o código do veículo baseado na área detectada e no id da classe,
+        consultando a tabela pré-calculada pelo VehicleCodeResolver (-1 se não mapeado).
+        """
+        vehicle_code = self.resolver.code(area_detectada, class_id)
+        return CODIGO_NAO_MAPEADO if vehicle_code is None else vehicle_code
+
+    # ------------------------------------------------------------------ #
+    # Etapas do frame
+    # ------------------------------------------------------------------ #
+    def desenhar_areas(self, im0):
+        """Desenha as áreas de permanência no frame."""
+        for area_name, area_info in self.permanencia_areas.items():
+            area_coords = np.array(area_info['coordenadas'], np.int32)
+            area_coords = area_coords.reshape((-1, 1, 2))
+            overlay = im0.copy()
+            cv2.polylines(overlay, [area_coords], isClosed=True, color=(0, 255, 0), thickness=2)
+            cv2.addWeighted(overlay, 0.4, im0, 0.6, 0, im0)  # Ajusta transparência
+
+    def contar(self, im0, tracks):
+        """Passa os tracks pelas linhas de contagem da área 1 e área 2."""
+        if self.eventos is None:
+            return im0
+        im0 = self.eventos.start_counting(im0, tracks, self.region_points, 'area_1', fps=self.fps)
+        if self.second_region_points:
+            im0 = self.eventos.start_counting(im0, tracks, self.second_region_points, 'area_2', fps=self.fps)
+        return im0
+
+    def atualizar_permanencia(self, tracks, current_timestamp):
+        """Atualiza os tempos de permanência no tracker."""
+        self.tracker.calculate_permanence(tracks, current_timestamp)
+
+    def processar_tracks(self, tracks, current_timestamp, annotator=None):
+        """
+        Processa cada box: área de permanência, autorização, vehicle_code e
+        rótulo com o tempo de permanência (desenhado se houver annotator).
+        """
+        tracker = self.tracker
+        for track in tracks:
+            if hasattr(track, 'boxes') and track.boxes is not None:
+                if track.boxes.id is not None and track.boxes.xyxy is not None and track.boxes.cls is not None:
+                    for box, track_id_tensor, class_id_tensor in zip(
+                        track.boxes.xyxy.cpu(), track.boxes.id.cpu(), track.boxes.cls.cpu()
+                    ):
+                        x1, y1, x2, y2 = map(int, box.tolist())
+                        track_id = int(track_id_tensor.item())
+                        class_id = int(class_id_tensor.item())
+                        class_name = self.class_names[class_id]  # Nome da classe detectada (motorcycle, cars, etc.)
+
+                        vehicle_code = None   # Inicializa como None antes da busca
+
+                        # Descobrir em qual área/faixa o veículo está
+                        centro_x = float((box[0] + box[2]) / 2)
+                        centro_y = float((box[1] + box[3]) / 2)
+                        centro = Point(centro_x, centro_y)
+                        area_detectada = None
+                        for area_name, polygon_area in self._polygons:
+                            if polygon_area.contains(centro):
+                                area_detectada = area_name
+                                break  # Assim que encontrar a área, podemos sair do loop
+
+                        # 🔹 VERIFICAÇÃO: Se `area_detectada` for None, pula para o próximo track
+                        if area_detectada is None:
+                            logger.warning(f"Track ID {track_id} não está dentro de nenhuma área válida. Pulando para o próximo veículo.")
+                            continue  # Ignora esse veículo e passa para o próximo
+
+                        # CORREÇÃO 2.1: Relaxar autorização (conservadora) - permite tempo de permanência mesmo sem crossing
+                        # Mantém o sistema de autorização para tracking, mas não descarta veículos não autorizados
+                        # Isso resolve o problema de contagens baixas causadas por veículos descartados
+                        center_position = (centro_x, centro_y)
+                        is_authorized, fallback_vehicle_code = self.check_vehicle_authorization(track_id, area_detectada, center_position, current_timestamp)
+
+                        if not is_authorized:
+                            # MUDANÇA: Ao invés de descartar, apenas loga e continua processando
+                            logger.info(f"Track ID {track_id} na {area_detectada} sem autorização formal - mas permitindo tempo de permanência")
+                            # NÃO descarta mais: permite que o veículo seja rastreado para permanência
+
+                        # Se o veículo ainda não tiver um código armazenado, buscamos um novo
+                        # (classes sem mapeamento retornam -1 e já foram reportadas na inicialização)
+                        if tracker.get_vehicle_code(track_id, area_detectada) is None:
+                            vehicle_code = self.get_vehicle_code(area_detectada, class_id)
+                            tracker.set_vehicle_code(track_id, area_detectada, vehicle_code)
+                            logger.info(f"Veículo {track_id} identificado como {class_name} na {area_detectada} com código {vehicle_code}.")
+
+                        # Obter tempos de permanência
+                        tempos_permanencia = tracker.get_permanence_time(track_id, current_timestamp)
+
+                        # Se não encontrou tempo de permanência, loga e continua para o próximo track_id
+                        if not tempos_permanencia:
+                            logger.warning(f"Track ID {track_id} não encontrado em nenhuma área.")
+                            continue
+
+                        # Construir o rótulo personalizado
+                        label = f"{class_name} ID:{track_id}"
+
+                        for area, tempo in tempos_permanencia.items():
+                            label += f" {area}: {tempo:.1f}s"
+
+                        # 🚗 Salvar tempo de permanência quando o veículo sair
+                        if tracker.has_vehicle_left(track_id, area_detectada):
+                            vehicle_code = self.get_vehicle_code(area_detectada, class_id)
+
+                            bug_logger.info(f"VEICULO SAIU -> Cliente: {self.client_code}, Area: {area_detectada}, Veiculo: {track_id}, Codigo: {vehicle_code}, Tempo: {tempo:.2f}s")
+
+                            # A gravação na tabela vehicle_counts é feita pelo PermanenceTracker
+                            # Nenhum insert manual aqui (vehicle_permanence descontinuada)
+
+                        # Desenhar o rótulo e a bounding box no frame
+                        if annotator is not None:
+                            annotator.box_label((x1, y1, x2, y2), label)
+
+    def salvar_contagens(self, current_timestamp):
+        """
+        Consome os eventos de travessia do frame e grava uma linha por veículo em
+        vehicle_counts junto com os offsets do contador, na mesma transação: após
+        um reinício o contador é restaurado desses offsets (ver ContadorEventos).
+        Se a gravação falhar, as linhas ficam pendentes e voltam no próximo frame.
+
+        Frames sem travessia (nenhum offset alterado e nada pendente) param na
+        comparação da versão do contador.
+        """
+        if self.eventos is None or self.eventos.versao == self._versao_gravada:
+            return
+
+        versao = self.eventos.versao
+        eventos = self.eventos.consumir()
+        if eventos:
+            # Timestamp monotônico do frame convertido uma única vez
+            ts_now = self.tracker.clock.format(current_timestamp)
+            for evento in eventos:
+                self._consumir_evento(evento, ts_now, current_timestamp)
+        self._offsets_pendentes.extend(self.eventos.offsets_alterados())
+
+        inicio = time.perf_counter()
+        try:
+            # A espera por lock de outros escritores fica com o busy_timeout da conexão
+            self.repository.record_events(self._linhas_pendentes, commit=False)
+            self.repository.save_counter_offsets(self.fonte, self._offsets_pendentes, commit=False)
+            self.repository.commit()
+        except Exception as e:
+            self.conn.rollback()
+            if self.metricas is not None:
+                self.metricas.registrar_gravacao_db(time.perf_counter() - inicio, ok=False)
+            for tipo, area, vehicle_code, _, evento_id in self._salvos_pendentes:
+                logger.error(f'Falha ao salvar {tipo} em vehicle_counts (Area: {area}, Codigo: {vehicle_code}, Evento: {evento_id}): {e}')
+            return
+
+        if self.metricas is not None:
+            self.metricas.registrar_gravacao_db(time.perf_counter() - inicio)
+        for tipo, area, vehicle_code, quantidade, evento_id in self._salvos_pendentes:
+            bug_logger.info(f'{tipo}(S) SALVA(S) -> Area: {area}, Codigo: {vehicle_code}, Qtde: {quantidade}, Evento: {evento_id}')
+        self._linhas_pendentes = []
+        self._salvos_pendentes = []
+        self._offsets_pendentes = []
+        self._versao_gravada = versao
+
+    def linhas_pendentes(self):
+        """Linhas de vehicle_counts aguardando gravação (falha no último commit); lido sem lock pelas métricas."""
+        return len(self._linhas_pendentes)
+
+    def _consumir_evento(self, evento, ts_now, current_timestamp):
+        """Converte um EventoTravessia em linhas pendentes de vehicle_counts (autoriza as entradas)."""
+        if evento.area not in self.resolver.area_index:
+            logger.warning(f'Faixa nao encontrada para a area {evento.area}')
+            return
+        # Classes sem mapeamento já foram reportadas pelo VehicleCodeResolver na inicialização;
+        # classes mapeadas para 0 (ou vazio) também não são gravadas
+        vehicle_code = self.resolver.code_by_name(evento.area, evento.vehicle_type)
+        if not vehicle_code or vehicle_code == CODIGO_NAO_MAPEADO:
+            return
+
+        if evento.direcao == 'in':
+            self.authorize_vehicle('CROSSING_EVENT', evento.area, vehicle_code, (0, 0), current_timestamp)
+            bug_logger.info(f'ENTRADA AUTORIZADA -> Area: {evento.area}, Codigo: {vehicle_code}, Evento: {evento.evento_id}')
+            self._linhas_pendentes.extend([(evento.area, vehicle_code, 1, 0, ts_now)] * evento.quantidade)
+            self._salvos_pendentes.append(('ENTRADA', evento.area, vehicle_code, evento.quantidade, evento.evento_id))
+        else:
+            self._linhas_pendentes.extend([(evento.area, vehicle_code, 0, 1, ts_now)] * evento.quantidade)
+            self._salvos_pendentes.append(('SAIDA', evento.area, vehicle_code, evento.quantidade, evento.evento_id))
+
+    def processar_frame(self, im0, tracks, current_timestamp, desenhar=True, tempos=None):
+        """
+        Executa todas as etapas sobre um frame já inferido e retorna o frame anotado.
+
+        :param im0: Frame atual (pode ser None se desenhar=False e não houver contador)
+        :param tracks: Resultado de model.track() convertido em lista
+        :param current_timestamp: Timestamp monotônico do frame (FrameClock.tick())
+        :param desenhar: Desenha áreas e rótulos no frame
+        :param tempos: Dicionário {etapa: [duracoes]} que recebe a duração de cada etapa (benchmark)
+        """
+        marca = time.perf_counter() if tempos is not None else None
+
+        # Criar um único Annotator para desenhar rótulos personalizados
+        annotator = None
+        if desenhar and Annotator is not None:
+            annotator = Annotator(im0, line_width=2, example=str(self.class_names))
+        if desenhar:
+            # Desenhar as áreas de permanência
+            self.desenhar_areas(im0)
+        marca = _medir(tempos, 'desenho_areas', marca)
+
+        # Desenhar as linhas de contagem para área 1 e área 2
+        im0 = self.contar(im0, tracks)
+        marca = _medir(tempos, 'contagem', marca)
+
+        # Atualizar os tempos de permanência no tracker
+        self.atualizar_permanencia(tracks, current_timestamp)
+        marca = _medir(tempos, 'permanencia', marca)
+
+        # Processar cada track e adicionar rótulos personalizados com tempo de permanência
+        self.processar_tracks(tracks, current_timestamp, annotator)
+
+        # Atualizar o frame com o Annotator
+        if annotator is not None:
+            im0 = annotator.result()
+        marca = _medir(tempos, 'boxes_rotulos', marca)
+
+        self.salvar_contagens(current_timestamp)
+        _medir(tempos, 'gravacao_contagens', marca)
+        return im0
+
+
+def _medir(tempos, etapa, marca):
+    """Acumula em tempos[etapa] o tempo desde marca e retorna a nova marca (nada a fazer sem tempos)."""
+    if tempos is None:
+        return None
+    agora = time.perf_counter()
+    tempos.setdefault(etapa, []).append(agora - marca)
+    return agora
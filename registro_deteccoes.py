@@ -0,0 +1,236 @@
+import glob
+import json
+import os
+import re
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from deteccoes import resultado_de_arrays
+
+# Cabeçalho do arquivo: assinatura + tamanho do JSON de metadados
+MAGIC_ARQUIVO = b'DETLOG01'
+# Cabeçalho de cada bloco: assinatura, frames, detecções, bytes comprimidos, crc32
+MAGIC_BLOCO = b'BLK1'
+FORMATO_BLOCO = '<4sIIII'
+TAMANHO_BLOCO = struct.calcsize(FORMATO_BLOCO)
+
+# Colunas por frame e por detecção, na ordem em que são gravadas em cada bloco. A
+# partir da versão 2 cada frame leva a âncora do FrameClock usada na conversão do
+# horário (o relógio ao vivo é reancorado periodicamente); na versão 1 a âncora
+# é a dos metadados
+VERSAO = 2
+COLUNAS_FRAME_V1 = (('frame', np.int64), ('ts', np.float64), ('n_det', np.uint32))
+COLUNAS_FRAME = COLUNAS_FRAME_V1 + (('wall_anchor', np.float64), ('mono_anchor', np.float64))
+COLUNAS_DETECCAO = (('track_id', np.int32), ('cls', np.int16), ('conf', np.float16), ('xyxy', np.float32))
+
+# Sufixo de cada segmento (uma execução do yolo16_v4.py): _AAAAMMDD_HHMMSS_pid[_n]
+PADRAO_SEGMENTO = re.compile(r'_\d{8}_\d{6}_\d+(_\d+)?$')
+
+
+def caminho_segmento(caminho, instante=None, pid=None, sequencia=0):
+    """
+    Nome do segmento desta execução: caminho com _AAAAMMDD_HHMMSS_pid antes da
+    extensão (deteccoes_camera1.detlog -> deteccoes_camera1_20240115_100000_4242.detlog);
+    sequencia > 0 acrescenta _n (segmento repetido no mesmo segundo e processo).
+    """
+    base, extensao = os.path.splitext(caminho)
+    carimbo = time.strftime('%Y%m%d_%H%M%S', time.localtime(instante))
+    sufixo = f"_{sequencia}" if sequencia else ""
+    return f"{base}_{carimbo}_{os.getpid() if pid is None else pid}{sufixo}{extensao}"
+
+
+def segmentos_deteccoes(caminho):
+    """
+    Segmentos de um log de detecções em ordem de gravação: o próprio arquivo, se
+    existir, ou todos os segmentos gravados com --record caminho (um por execução).
+    """
+    if os.path.isfile(caminho):
+        return [caminho]
+    base, extensao = os.path.splitext(caminho)
+    segmentos = []
+    for candidato in glob.glob(f"{glob.escape(base)}_*{extensao}"):
+        sufixo = os.path.splitext(candidato)[0][len(base):]
+        if PADRAO_SEGMENTO.fullmatch(sufixo):
+            # Data, hora, pid e sequência como números (ordem de gravação)
+            segmentos.append(([int(parte) for parte in sufixo.split('_')[1:]], candidato))
+    return [candidato for _, candidato in sorted(segmentos)]
+
+
+def extrair_deteccoes(tracks):
+    """
+    Extrai (xyxy, track_id, cls, conf) de list(model.track(...)) como arrays NumPy.
+    Boxes sem id de rastreamento são ignoradas, como no restante do pipeline.
+    """
+    xyxy, ids, cls, conf = [], [], [], []
+    for track in tracks:
+        boxes = getattr(track, 'boxes', None)
+        if boxes is None or boxes.id is None or boxes.xyxy is None or boxes.cls is None:
+            continue
+        xyxy.append(np.asarray(boxes.xyxy.cpu().numpy(), dtype=np.float32).reshape(-1, 4))
+        ids.append(np.asarray(boxes.id.cpu().numpy(), dtype=np.int32))
+        cls.append(np.asarray(boxes.cls.cpu().numpy(), dtype=np.int16))
+        if getattr(boxes, 'conf', None) is not None:
+            conf.append(np.asarray(boxes.conf.cpu().numpy(), dtype=np.float16))
+        else:
+            conf.append(np.ones(len(ids[-1]), dtype=np.float16))
+    if not ids:
+        return (np.zeros((0, 4), np.float32), np.zeros(0, np.int32), np.zeros(0, np.int16), np.zeros(0, np.float16))
+    return np.concatenate(xyxy), np.concatenate(ids), np.concatenate(cls), np.concatenate(conf)
+
+
+class GravadorDeteccoes:
+    def __init__(self, caminho, names, clock, fps=None, frame_shape=None, frames_por_bloco=256, extras=None):
+        """
+        Grava as detecções de cada frame processado em um log binário colunar:
+        os frames são agrupados em blocos e, dentro do bloco, cada campo
+        (timestamp, track_id, classe, confiança, xyxy) é gravado como um array
+        contíguo comprimido com zlib. Frames sem detecção também são registrados,
+        pois os timeouts de permanência dependem do tempo entre frames.
+
+        O processo da câmera é reiniciado pelo .bat com o mesmo --record a cada
+        queda: cada execução grava um segmento próprio (caminho_segmento) e um
+        arquivo existente nunca é sobrescrito. O caminho efetivo fica em self.caminho.
+
+        :param caminho: Caminho base do log (o segmento recebe data/hora e pid no nome)
+        :param names: Nomes das classes do modelo (model.names)
+        :param clock: FrameClock do loop; as âncoras (inicial e a de cada frame) são gravadas para reconstruir os horários
+        :param fps: FPS do vídeo (repassado ao contador no replay)
+        :param frame_shape: (altura, largura) do frame processado
+        :param frames_por_bloco: Frames acumulados em memória antes de gravar um bloco
+        :param extras: Metadados adicionais (ex.: arquivos de configuração usados)
+        """
+        self.frames_por_bloco = frames_por_bloco
+        self.clock = clock
+        self._frames = []
+        self._deteccoes = []
+        self._frame = 0
+
+        metadados = {
+            'versao': VERSAO,
+            'names': {int(k): v for k, v in dict(names).items()},
+            'wall_anchor': clock.wall_anchor,
+            'mono_anchor': clock.mono_anchor,
+            'fps': fps,
+            'frame_shape': list(frame_shape) if frame_shape is not None else None,
+        }
+        metadados.update(extras or {})
+        bruto = json.dumps(metadados, ensure_ascii=False).encode('utf-8')
+
+        instante = time.time()
+        sequencia = 0
+        while True:
+            self.caminho = caminho_segmento(caminho, instante, sequencia=sequencia)
+            try:
+                self._arquivo = open(self.caminho, 'xb')
+                break
+            except FileExistsError:
+                sequencia += 1
+        self._arquivo.write(MAGIC_ARQUIVO + struct.pack('<I', len(bruto)) + bruto)
+
+    def registrar(self, current_timestamp, tracks):
+        """Registra as detecções rastreadas de um frame (timestamp monotônico do FrameClock)."""
+        self._frame += 1
+        xyxy, ids, cls, conf = extrair_deteccoes(tracks)
+        self._frames.append((self._frame, current_timestamp, len(ids), self.clock.wall_anchor, self.clock.mono_anchor))
+        self._deteccoes.append((ids, cls, conf, xyxy))
+        if len(self._frames) >= self.frames_por_bloco:
+            self.flush()
+
+    def flush(self):
+        """Grava o bloco pendente no arquivo."""
+        if not self._frames:
+            return
+        frames = np.array(self._frames, dtype=[(nome, tipo) for nome, tipo in COLUNAS_FRAME])
+        colunas = [np.ascontiguousarray(frames[nome]).tobytes() for nome, _ in COLUNAS_FRAME]
+        for indice, (nome, tipo) in enumerate(COLUNAS_DETECCAO):
+            colunas.append(np.concatenate([det[indice] for det in self._deteccoes]).astype(tipo, copy=False).tobytes())
+        payload = zlib.compress(b''.join(colunas), 1)
+
+        n_det = int(frames['n_det'].sum())
+        self._arquivo.write(struct.pack(FORMATO_BLOCO, MAGIC_BLOCO, len(frames), n_det, len(payload), zlib.crc32(payload)))
+        self._arquivo.write(payload)
+        self._arquivo.flush()
+        self._frames.clear()
+        self._deteccoes.clear()
+
+    def close(self):
+        self.flush()
+        self._arquivo.close()
+
+
+class LeitorDeteccoes:
+    def __init__(self, caminho):
+        """
+        Lê um log gravado por GravadorDeteccoes. Um bloco final truncado (processo
+        interrompido durante a gravação) é ignorado.
+
+        :param caminho: Arquivo de log de detecções
+        """
+        self.caminho = caminho
+        with open(caminho, 'rb') as f:
+            if f.read(len(MAGIC_ARQUIVO)) != MAGIC_ARQUIVO:
+                raise ValueError(f"{caminho} não é um log de detecções")
+            (tamanho,) = struct.unpack('<I', f.read(4))
+            self.metadados = json.loads(f.read(tamanho).decode('utf-8'))
+            self._inicio_blocos = f.tell()
+        self.names = {int(k): v for k, v in self.metadados['names'].items()}
+        self._colunas_frame = COLUNAS_FRAME if self.metadados.get('versao', 1) >= 2 else COLUNAS_FRAME_V1
+
+    def blocos(self):
+        """Gera (frames, colunas) por bloco: frames é um array estruturado e colunas um dict de arrays."""
+        with open(self.caminho, 'rb') as f:
+            f.seek(self._inicio_blocos)
+            while True:
+                cabecalho = f.read(TAMANHO_BLOCO)
+                if len(cabecalho) < TAMANHO_BLOCO:
+                    return
+                magic, n_frames, n_det, tamanho, crc = struct.unpack(FORMATO_BLOCO, cabecalho)
+                payload = f.read(tamanho)
+                if magic != MAGIC_BLOCO or len(payload) < tamanho or zlib.crc32(payload) != crc:
+                    return
+                bruto = zlib.decompress(payload)
+
+                offset = 0
+                colunas = {}
+                for nome, tipo in self._colunas_frame:
+                    colunas[nome] = np.frombuffer(bruto, dtype=tipo, count=n_frames, offset=offset)
+                    offset += n_frames * np.dtype(tipo).itemsize
+                for nome, tipo in COLUNAS_DETECCAO:
+                    largura = 4 if nome == 'xyxy' else 1
+                    coluna = np.frombuffer(bruto, dtype=tipo, count=n_det * largura, offset=offset)
+                    colunas[nome] = coluna.reshape(-1, 4) if largura == 4 else coluna
+                    offset += n_det * largura * np.dtype(tipo).itemsize
+                yield colunas
+
+    def _frames_com_ancora(self):
+        for colunas in self.blocos():
+            fim = np.cumsum(colunas['n_det'], dtype=np.int64)
+            inicio = fim - colunas['n_det']
+            ancoras = colunas.get('wall_anchor'), colunas.get('mono_anchor')
+            for i in range(len(colunas['frame'])):
+                fatia = slice(inicio[i], fim[i])
+                ancora = None if ancoras[0] is None else (float(ancoras[0][i]), float(ancoras[1][i]))
+                yield (int(colunas['frame'][i]), float(colunas['ts'][i]), colunas['xyxy'][fatia],
+                       colunas['track_id'][fatia], colunas['cls'][fatia], colunas['conf'][fatia], ancora)
+
+    def frames(self):
+        """Gera (frame, ts, xyxy, track_id, cls, conf) para cada frame registrado."""
+        for *frame, _ in self._frames_com_ancora():
+            yield tuple(frame)
+
+    def resultados(self, clock=None):
+        """
+        Gera (ts, tracks) no mesmo formato de list(model.track(...)) para alimentar o pipeline.
+
+        :param clock: FrameClock do replay: recebe, antes de cada frame, a âncora gravada
+            com ele, de modo que os horários de parede saiam iguais aos da execução ao vivo
+        """
+        anterior = None
+        for frame, ts, xyxy, ids, cls, conf, ancora in self._frames_com_ancora():
+            if clock is not None and ancora is not None and ancora != anterior:
+                clock.reancorar(*ancora)
+                anterior = ancora
+            yield ts, resultado_de_arrays(xyxy, ids, cls, self.names, conf=conf)
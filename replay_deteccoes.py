@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Reprocessa um log de deteccoes gravado pelo yolo16_v4.py (--record) sem
+inferencia: as deteccoes de cada frame passam pelo ObjectCounter4 (se
+instalado), PermanenceTracker e PipelineContagem exatamente como no loop
+principal, usando o mesmo relogio do momento da gravacao (inclusive as
+reancoragens do FrameClock ao vivo, gravadas a cada frame).
+
+Serve para recalcular contagens e permanencias contestadas com novas areas
+(JSON) ou novos timeouts em segundos, em vez de rodar o YOLO de novo sobre
+horas de video.
+
+--log aceita um segmento ou o caminho base usado em --record: nesse caso todos
+os segmentos (um por execucao da camera) sao reprocessados em ordem, cada um
+com tracker e contador novos, como o processo reiniciado fazia ao vivo.
+
+Exemplo:
+    python replay_deteccoes.py --log deteccoes_camera1.detlog --db_path replay.db \\
+        --permanencia_config_path area/camera1_area_tp.json --timeout 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from frame_clock import FrameClock
+from log_config import configurar_logging, destinos_em_diretorio
+from permanence_tracker import ArrayPermanenceTracker, PermanenceTracker
+from pipeline_contagem import PipelineContagem, carregar_contador, init_db
+from registro_deteccoes import LeitorDeteccoes, segmentos_deteccoes
+from vehicle_code_resolver import VehicleCodeResolver
+
+AREA_TO_FAIXA = {'area_1': 'faixa1', 'area_2': 'faixa2'}
+
+
+def load_config(file_path: str) -> dict:
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def aplicar_timeout(permanencia_config: dict, timeout: float | None) -> dict:
+    """Sobrescreve o timeout de saida de todas as areas de permanencia."""
+    if timeout is None:
+        return permanencia_config
+    return {area: dict(info, timeout=timeout) for area, info in permanencia_config.items()}
+
+
+def reprocessar(args: argparse.Namespace) -> dict:
+    segmentos = segmentos_deteccoes(args.log)
+    if not segmentos:
+        raise SystemExit(f"Nenhum log de deteccoes encontrado em {args.log}")
+    leitores = [LeitorDeteccoes(segmento) for segmento in segmentos]
+    meta = leitores[0].metadados
+
+    config_path = args.config_path or meta.get('config_path')
+    area_config_path = args.area_config_path or meta.get('area_config_path')
+    permanencia_config_path = args.permanencia_config_path or meta.get('permanencia_config_path')
+    for nome, valor in (('--config_path', config_path), ('--area_config_path', area_config_path),
+                        ('--permanencia_config_path', permanencia_config_path)):
+        if not valor:
+            raise SystemExit(f"{nome} nao informado e ausente nos metadados do log")
+
+    config = load_config(config_path)
+    area_config = load_config(area_config_path)
+    region_points = area_config['area_1']
+    second_region_points = area_config.get('area_2', None)
+    permanencia_config = aplicar_timeout(load_config(permanencia_config_path), args.timeout)
+    tracker_cls = ArrayPermanenceTracker if args.track_store == 'array' else PermanenceTracker
+
+    conn, cursor = init_db(args.db_path)
+
+    frames = 0
+    primeiro_frame = ultimo_frame = None
+    contagem_disponivel = True
+    inicio = time.perf_counter()
+    for leitor in leitores:
+        meta = leitor.metadados
+        # Cada segmento e uma execucao da camera: estado novo, relogio da propria gravacao
+        # (os timestamps gravados sao monotonicos; a ancora de cada frame vem do log)
+        clock = FrameClock(wall_anchor=meta['wall_anchor'], mono_anchor=meta['mono_anchor'])
+        resolver = VehicleCodeResolver(config, leitor.names, AREA_TO_FAIXA, classes=meta.get('classes'))
+        counter = carregar_contador(config, region_points, leitor.names)
+        contagem_disponivel = contagem_disponivel and counter is not None
+        tracker = tracker_cls(cursor, conn, config['codigocliente'], permanencia_config, clock=clock)
+
+        pipeline = PipelineContagem(cursor, conn, tracker, resolver, permanencia_config, counter=counter,
+                                    region_points=region_points, second_region_points=second_region_points,
+                                    class_names=leitor.names, client_code=config['codigocliente'],
+                                    fps=meta.get('fps') or 25)
+
+        # O contador desenha sobre o frame; no replay um unico frame em branco e reutilizado
+        altura, largura = meta.get('frame_shape') or (720, 1280)
+        im0 = np.zeros((altura, largura, 3), dtype=np.uint8) if counter is not None else None
+
+        frames_segmento = 0
+        for ts, tracks in leitor.resultados(clock):
+            current_timestamp = clock.tick(ts)
+            if primeiro_frame is None:
+                primeiro_frame = clock.format(current_timestamp)
+            pipeline.processar_frame(im0, tracks, current_timestamp, desenhar=False)
+            frames_segmento += 1
+        frames += frames_segmento
+
+        if frames_segmento:
+            ultimo_frame = clock.format(clock.frame_ts)
+            # Encerra as permanencias ainda abertas como se o video tivesse parado aqui
+            if args.encerrar:
+                fim = clock.frame_ts + max(info.get('timeout', 3) for info in permanencia_config.values()) + 1
+                tracker.calculate_permanence([], fim)
+    duracao = time.perf_counter() - inicio
+
+    total = cursor.execute("SELECT COUNT(*) FROM vehicle_counts").fetchone()[0]
+    conn.close()
+    return {
+        'segmentos': len(leitores),
+        'frames': frames,
+        'duracao_s': round(duracao, 3),
+        'fps': round(frames / duracao, 1) if duracao else None,
+        'contagem_disponivel': contagem_disponivel,
+        'linhas_vehicle_counts': total,
+        'primeiro_frame': primeiro_frame,
+        'ultimo_frame': ultimo_frame,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Reprocessa um log de deteccoes (yolo16_v4.py --record) sem inferencia."
+    )
+    parser.add_argument("--log", type=str, required=True, help="Segmento do log de deteccoes ou o caminho usado em --record (todos os segmentos).")
+    parser.add_argument("--db_path", type=str, required=True, help="Banco SQLite de saida (use um arquivo novo).")
+    parser.add_argument("--config_path", type=str, default=None, help="Configuracao do cliente (padrao: a usada na gravacao).")
+    parser.add_argument("--area_config_path", type=str, default=None, help="Linhas de contagem (padrao: as usadas na gravacao).")
+    parser.add_argument("--permanencia_config_path", type=str, default=None, help="Areas de permanencia (padrao: as usadas na gravacao).")
+    parser.add_argument("--timeout", type=float, default=None, help="Sobrescreve o timeout (s) de saida de todas as areas.")
+    parser.add_argument("--track_store", choices=["dict", "array"], default="dict", help="Armazenamento dos tracks ativos.")
+    parser.add_argument("--encerrar", action="store_true", help="Grava as permanencias ainda abertas no fim de cada segmento.")
+    parser.add_argument("--log_dir", type=str, default=None, help="Diretorio dos logs do reprocessamento (padrao: temporario).")
+    parser.add_argument("--force", action="store_true", help="Permite gravar em um banco ja existente.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if os.path.exists(args.db_path) and not args.force:
+        print(f"{args.db_path} ja existe; use outro arquivo ou --force.")
+        sys.exit(1)
+
+    print("REPROCESSAMENTO DE DETECCOES")
+    print("=" * 60)
+    print(f"Log..........: {args.log}")
+    print(f"Banco........: {args.db_path}")
+    with tempfile.TemporaryDirectory(prefix="replay_") as tmp:
+        listener = configurar_logging(destinos=destinos_em_diretorio(args.log_dir or tmp))
+        try:
+            resultado = reprocessar(args)
+        finally:
+            listener.stop()
+    if not resultado['contagem_disponivel']:
+        print("Contagem.....: ObjectCounter4 indisponivel; apenas permanencias foram recalculadas")
+    for chave, valor in resultado.items():
+        print(f"{chave:<22}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
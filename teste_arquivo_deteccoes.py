@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO ARQUIVO DE DETECCOES MAPEADO EM MEMORIA
+
+Grava deteccoes sinteticas com ArquivoDeteccoes (incluindo reabertura do dia
+e virada de dia) e confere as consultas por intervalo e por track_id contra
+um filtro direto sobre todos os registros; com o relogio de parede voltando
+(correcao de NTP ou reancoragem), os horarios gravados nao diminuem e nenhum
+registro some das consultas.
+"""
+
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from arquivo_deteccoes import ArquivoDeteccoes, LeitorArquivoDeteccoes, consultar
+from deteccoes import resultado_de_arrays
+from frame_clock import FrameClock
+
+NAMES = {0: "bus", 1: "cars"}
+INICIO = datetime(2024, 1, 15, 23, 50, 0)
+FPS = 5.0
+
+
+def _frame(i):
+    """Frame i: de 0 a 3 deteccoes; os frames multiplos de 7 ficam vazios."""
+    n = 0 if i % 7 == 0 else 1 + i % 3
+    ids = (np.arange(n) + i // 20) % 9
+    xyxy = np.tile([10.0 + i, 20.0, 30.0 + i, 40.0], (n, 1))
+    return resultado_de_arrays(xyxy, ids, ids % 2, NAMES)
+
+
+class TesteArquivoDeteccoes:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_consultas(self) -> None:
+        diretorio = tempfile.mkdtemp(prefix="teste_arquivo_")
+        try:
+            clock = FrameClock(wall_anchor=INICIO.timestamp(), mono_anchor=0.0)
+            # 20 minutos a 5 fps, atravessando a meia-noite; o arquivo e reaberto no meio
+            total_frames = int(20 * 60 * FPS)
+            esperado = []
+            for parte in (range(total_frames // 3), range(total_frames // 3, total_frames)):
+                arquivo = ArquivoDeteccoes(diretorio, "camera1", clock, flush_a_cada=50)
+                for i in parte:
+                    ts = i / FPS
+                    tracks = _frame(i)
+                    arquivo.registrar(ts, tracks)
+                    boxes = tracks[0].boxes
+                    for track_id in (boxes.id.valores if boxes.id is not None else []):
+                        esperado.append((clock.to_epoch(ts), int(track_id)))
+                arquivo.close()
+
+            esperado_ts = np.array([e[0] for e in esperado])
+            esperado_ids = np.array([e[1] for e in esperado])
+
+            dia1 = LeitorArquivoDeteccoes(diretorio, "camera1", INICIO)
+            dia2 = LeitorArquivoDeteccoes(diretorio, "camera1", INICIO + timedelta(days=1))
+            if dia1.total + dia2.total != len(esperado):
+                raise RuntimeError(f"Total gravado {dia1.total + dia2.total} != {len(esperado)}")
+
+            inicio = INICIO + timedelta(minutes=3, seconds=12.5)
+            fim = INICIO + timedelta(minutes=7, seconds=1)
+            fatia = dia1.intervalo(inicio, fim)
+            mascara = (esperado_ts >= inicio.timestamp()) & (esperado_ts < fim.timestamp())
+            if len(fatia) != mascara.sum() or not np.array_equal(fatia["track_id"], esperado_ids[mascara]):
+                raise RuntimeError("Intervalo divergente do filtro direto")
+            if not np.shares_memory(fatia, dia1.registros):
+                raise RuntimeError("Fatia por intervalo nao e uma view do mmap")
+
+            fim_total = INICIO + timedelta(minutes=20)
+            por_track = np.concatenate(list(consultar(diretorio, "camera1", inicio, fim_total, track_id=4)))
+            mascara = (esperado_ts >= inicio.timestamp()) & (esperado_ts < fim_total.timestamp()) & (esperado_ids == 4)
+            if not np.array_equal(por_track["ts"], esperado_ts[mascara]):
+                raise RuntimeError("Consulta por track_id atravessando a meia-noite divergente")
+
+            self.log_ok("Consultas por intervalo e track_id (reabertura e virada de dia)")
+        except Exception as err:
+            self.log_fail("Consultas por intervalo e track_id (reabertura e virada de dia)", err)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def teste_relogio_volta(self) -> None:
+        diretorio = tempfile.mkdtemp(prefix="teste_arquivo_")
+        try:
+            meio_dia = datetime(2024, 1, 15, 12, 0, 0)
+            clock = FrameClock(wall_anchor=meio_dia.timestamp(), mono_anchor=0.0)
+            arquivo = ArquivoDeteccoes(diretorio, "camera1", clock)
+            caixa = np.array([[10.0, 20.0, 30.0, 40.0]])
+            # 12:00:00 e 12:00:10; o relogio volta 10s: 12:00:05 e 12:00:06
+            for ts, track_id in ((0.0, 1), (10.0, 2)):
+                arquivo.registrar(ts, resultado_de_arrays(caixa, [track_id], [1], NAMES))
+            clock.wall_anchor -= 10
+            for ts, track_id in ((15.0, 3), (16.0, 4)):
+                arquivo.registrar(ts, resultado_de_arrays(caixa, [track_id], [1], NAMES))
+            arquivo.close()
+            # Reabertura com o relogio ainda atrasado
+            arquivo = ArquivoDeteccoes(diretorio, "camera1", FrameClock(wall_anchor=meio_dia.timestamp(), mono_anchor=0.0))
+            arquivo.registrar(7.0, resultado_de_arrays(caixa, [5], [1], NAMES))
+            arquivo.close()
+
+            leitor = LeitorArquivoDeteccoes(diretorio, "camera1", meio_dia)
+            ts = leitor.registros["ts"]
+            if list(leitor.registros["track_id"]) != [1, 2, 3, 4, 5] or np.any(np.diff(ts) < 0):
+                raise RuntimeError(f"Registros fora de ordem: {list(zip(leitor.registros['track_id'], ts))}")
+            base = meio_dia.timestamp()
+            if list(leitor.intervalo(base + 9, base + 11)["track_id"]) != [2, 3, 4, 5]:
+                raise RuntimeError("Frames gravados apos a volta do relogio nao aparecem no intervalo")
+            for inicio in range(0, 12):
+                for fim in range(inicio, 13):
+                    fatia = leitor.intervalo(base + inicio, base + fim)
+                    mascara = (ts >= base + inicio) & (ts < base + fim)
+                    if not np.array_equal(fatia["track_id"], leitor.registros["track_id"][mascara]):
+                        raise RuntimeError(f"Intervalo [{inicio}, {fim}) divergente do filtro direto")
+            self.log_ok("Relogio voltando: horarios gravados nao diminuem e as consultas acham todos os tracks")
+        except Exception as err:
+            self.log_fail("Relogio de parede voltando durante a gravacao", err)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO ARQUIVO DE DETECCOES")
+        print("=" * 60)
+
+        self.teste_consultas()
+        self.teste_relogio_volta()
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteArquivoDeteccoes().executar()
+
+
+if __name__ == "__main__":
+    main()
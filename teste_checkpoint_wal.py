@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO AGENDADOR DE CHECKPOINT DO WAL
+
+Grava em um banco WAL com o auto-checkpoint desligado (como as cameras) e
+confere a escalada do CheckpointWAL: PASSIVE enquanto ha escrita, RESTART
+quando o -wal passa do limite, TRUNCATE em repouso (adiado enquanto um
+leitor segura o snapshot) e o TRUNCATE final ao parar a thread; com varios
+agendadores no mesmo banco, so o detentor do lock faz checkpoints, o lock
+passa para outro quando ele para e uma thread que morre libera o lock.
+"""
+
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from checkpoint_wal import CheckpointWAL
+
+
+def _abrir_escritor(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute("CREATE TABLE IF NOT EXISTS vehicle_counts (id INTEGER PRIMARY KEY, area TEXT, timestamp TEXT)")
+    conn.commit()
+    return conn
+
+
+def _gravar(conn, n):
+    for i in range(n):
+        conn.execute("INSERT INTO vehicle_counts (area, timestamp) VALUES (?, ?)", ("area_1", f"2024-01-15 10:00:{i % 60:02d}"))
+        conn.commit()
+
+
+class TesteCheckpointWAL:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_escalada(self, diretorio: str) -> None:
+        try:
+            db_path = os.path.join(diretorio, "escalada.db")
+            escritor = _abrir_escritor(db_path)
+            checkpoint = CheckpointWAL(db_path, ciclos_quietos=2, limite_wal_mb=0.05, relatorio_a_cada=0)
+
+            # Escrita continua com o -wal acima do limite: PASSIVE completo vira RESTART
+            _gravar(escritor, 200)
+            checkpoint.ciclo()
+            _gravar(escritor, 50)
+            checkpoint.ciclo()
+            if not checkpoint.por_modo.get("RESTART"):
+                raise RuntimeError(f"RESTART esperado acima do limite: {checkpoint.por_modo}")
+            if checkpoint.tamanho_wal() == 0:
+                raise RuntimeError("RESTART nao deve truncar o arquivo -wal")
+
+            # Repouso com um leitor segurando o snapshot: TRUNCATE adiado, sem erro
+            leitor = sqlite3.connect(db_path, isolation_level=None)
+            leitor.execute("BEGIN")
+            leitor.execute("SELECT COUNT(*) FROM vehicle_counts").fetchone()
+            _gravar(escritor, 10)
+            for _ in range(3):
+                checkpoint.ciclo()
+            if not checkpoint.ocupados or checkpoint.tamanho_wal() == 0:
+                raise RuntimeError("TRUNCATE deveria ter sido adiado pelo leitor")
+
+            # Leitor liberado: o proximo ciclo em repouso zera o -wal
+            leitor.execute("ROLLBACK")
+            leitor.close()
+            checkpoint.ciclo()
+            if checkpoint.tamanho_wal() != 0:
+                raise RuntimeError(f"-wal com {checkpoint.tamanho_wal()} bytes apos o repouso")
+
+            total = escritor.execute("SELECT COUNT(*) FROM vehicle_counts").fetchone()[0]
+            if total != 260:
+                raise RuntimeError(f"{total} registros != 260")
+            checkpoint.stop()
+            escritor.close()
+            self.log_ok("Escalada PASSIVE -> RESTART -> TRUNCATE (adiado com leitor ativo)")
+        except Exception as err:
+            self.log_fail("Escalada PASSIVE -> RESTART -> TRUNCATE (adiado com leitor ativo)", err)
+
+    def teste_thread(self, diretorio: str) -> None:
+        try:
+            db_path = os.path.join(diretorio, "thread.db")
+            escritor = _abrir_escritor(db_path)
+            checkpoint = CheckpointWAL(db_path, intervalo=0.05, relatorio_a_cada=5)
+            checkpoint.start()
+            for _ in range(10):
+                _gravar(escritor, 20)
+                time.sleep(0.02)
+            time.sleep(0.2)
+            checkpoint.stop()
+
+            if not checkpoint.por_modo.get("PASSIVE"):
+                raise RuntimeError("Nenhum PASSIVE executado pela thread")
+            if checkpoint.tamanho_wal() != 0:
+                raise RuntimeError("TRUNCATE final nao zerou o -wal")
+            escritor.close()
+            self.log_ok(f"Thread de checkpoint ({checkpoint.execucoes} checkpoints, max {checkpoint.max_latencia * 1000:.1f} ms)")
+        except Exception as err:
+            self.log_fail("Thread de checkpoint", err)
+
+    def teste_coordenacao(self, diretorio: str) -> None:
+        try:
+            db_path = os.path.join(diretorio, "coordenacao.db")
+            escritor = _abrir_escritor(db_path)
+            cameras = [CheckpointWAL(db_path, intervalo=0.05, relatorio_a_cada=0) for _ in range(3)]
+            for camera in cameras:
+                camera.start()
+            for _ in range(10):
+                _gravar(escritor, 20)
+                time.sleep(0.03)
+            ativos = [camera for camera in cameras if camera.execucoes]
+            if len(ativos) != 1:
+                raise RuntimeError(f"{len(ativos)} agendadores fizeram checkpoints (esperado 1)")
+
+            # O detentor para: outro assume o lock e continua os checkpoints
+            detentor = ativos[0]
+            detentor.stop(truncar=False)
+            restantes = [camera for camera in cameras if camera is not detentor]
+            antes = [camera.execucoes for camera in restantes]
+            _gravar(escritor, 20)
+            time.sleep(0.3)
+            assumiram = [camera for camera, n in zip(restantes, antes) if camera.execucoes > n]
+            if len(assumiram) != 1:
+                raise RuntimeError(f"{len(assumiram)} agendadores assumiram apos a parada do detentor")
+            for camera in restantes:
+                camera.stop()
+            escritor.close()
+
+            # Erro fatal no ciclo (ex.: banco fora do modo WAL): a thread morre, ativo()
+            # avisa a camera para religar o auto-checkpoint e o lock fica livre
+            morta = CheckpointWAL(db_path, intervalo=0.02, relatorio_a_cada=0)
+
+            def ciclo_fatal():
+                raise RuntimeError(f"{db_path} não está em modo WAL")
+
+            morta.ciclo = ciclo_fatal
+            morta.start()
+            time.sleep(0.3)
+            if morta.ativo():
+                raise RuntimeError("Thread deveria ter parado apos o erro fatal")
+            outra = CheckpointWAL(db_path, relatorio_a_cada=0)
+            if not outra.detem_lock():
+                raise RuntimeError("Lock nao foi liberado pela thread encerrada")
+            outra._liberar_lock()
+            self.log_ok(f"Um unico agendador por banco ({detentor.execucoes} checkpoints), troca de detentor e thread encerrada")
+        except Exception as err:
+            self.log_fail("Coordenacao entre agendadores", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO CHECKPOINT DO WAL")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_checkpoint_")
+        try:
+            self.teste_escalada(diretorio)
+            self.teste_thread(diretorio)
+            self.teste_coordenacao(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    TesteCheckpointWAL().executar()
+
+
+if __name__ == "__main__":
+    main()
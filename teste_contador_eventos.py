@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO FLUXO DE EVENTOS DO CONTADOR
+
+Simula as contagens acumuladas do ObjectCounter4 e confere as linhas gravadas
+em vehicle_counts pelo PipelineContagem: reinicio do processo com o contador
+ja com totais ou novo (restaurado dos offsets gravados, sem duplicar nem
+perder; tambem quando o contador descarta os totais restaurados), reset durante a execucao,
+frames sem travessia (nada e gravado), classes mapeadas para o codigo 0 (nao
+gravadas) e nova tentativa apos falha de gravacao.
+"""
+
+import os
+import shutil
+import tempfile
+
+from deteccoes import DetectorSintetico
+from frame_clock import FrameClock
+from permanence_tracker import PermanenceTracker
+from pipeline_contagem import PipelineContagem, init_db
+from vehicle_code_resolver import VehicleCodeResolver
+
+CONFIG = {
+    "codigocliente": 1724,
+    "cameras": {"camera1": {"faixas": {
+        "faixa1": {"bus": 1, "cars": 2, "motorcycle": 3, "truck": 4, "vuc": 5},
+        "faixa2": {"bus": 6, "cars": 7, "motorcycle": 8, "truck": 9, "vuc": 10},
+    }}},
+}
+PERMANENCIA_CONFIG = {
+    "area_1": {"coordenadas": [[0, 0], [320, 0], [320, 480], [0, 480]], "timeout": 2},
+    "area_2": {"coordenadas": [[320, 0], [640, 0], [640, 480], [320, 480]], "timeout": 2},
+}
+
+
+class ContadorFalso:
+    """Contador com a interface do ObjectCounter4: cada frame define os totais acumulados."""
+
+    def __init__(self, totais=None):
+        self.area_counts = {}
+        self.proximos = {}
+        for area, tipos in (totais or {}).items():
+            self._definir(area, tipos)
+
+    def _definir(self, area, tipos):
+        self.area_counts[area] = {"types": {
+            tipo: {"in": entradas, "out": saidas} for tipo, (entradas, saidas) in tipos.items()
+        }}
+
+    def start_counting(self, im0, tracks, region_points, area, fps=25):
+        if area in self.proximos:
+            self._definir(area, self.proximos.pop(area))
+        return im0
+
+
+class Camera:
+    """Um processo da camera: banco aberto, pipeline e contador."""
+
+    def __init__(self, db_path, contador, config=CONFIG):
+        self.clock = FrameClock(wall_anchor=1705312800.0, mono_anchor=0.0)
+        self.conn, cursor = init_db(db_path)
+        self.tracker = PermanenceTracker(cursor, self.conn, 1724, PERMANENCIA_CONFIG, clock=self.clock)
+        resolver = VehicleCodeResolver(config, DetectorSintetico(640, 480).names)
+        self.contador = contador
+        self.pipeline = PipelineContagem(cursor, self.conn, self.tracker, resolver, PERMANENCIA_CONFIG,
+                                         counter=contador, region_points=[(0, 240), (640, 240)],
+                                         second_region_points=[(320, 0), (320, 480)], fonte="camera1")
+        self.frame = 0
+
+    def frame_com(self, **areas):
+        self.contador.proximos.update(areas)
+        self.frame += 1
+        self.pipeline.processar_frame(None, [], self.clock.tick(self.frame / 10), desenhar=False)
+
+    def totais(self):
+        return self.conn.execute(
+            "SELECT area, vehicle_code, SUM(count_in), SUM(count_out) FROM vehicle_counts "
+            "GROUP BY area, vehicle_code ORDER BY area, vehicle_code"
+        ).fetchall()
+
+    def fechar(self):
+        """Encerra o processo (o tracker fecha a conexao) e retorna os totais gravados."""
+        totais = self.totais()
+        self.tracker.close()
+        return totais
+
+
+class TesteContadorEventos:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_reinicio(self, diretorio: str) -> None:
+        try:
+            db_path = os.path.join(diretorio, "reinicio.db")
+            camera = Camera(db_path, ContadorFalso())
+            camera.frame_com(area_1={"cars": (1, 0)})
+            camera.frame_com(area_1={"cars": (2, 1)}, area_2={"bus": (0, 1)})
+            camera.fechar()
+
+            # Reinicio com o contador restaurado nos mesmos totais: nada e regravado
+            camera = Camera(db_path, ContadorFalso({"area_1": {"cars": (2, 1)}, "area_2": {"bus": (0, 1)}}))
+            camera.frame_com(area_1={"cars": (2, 1)}, area_2={"bus": (0, 1)})
+            camera.frame_com(area_1={"cars": (3, 1)})
+            totais = camera.fechar()
+            esperado = [("area_1", 2, 3, 1), ("area_2", 6, 0, 1)]
+            if totais != esperado:
+                raise RuntimeError(f"Contador restaurado: {totais} != {esperado}")
+
+            # Reinicio com um contador novo: recebe os totais do ultimo commit e continua deles
+            contador = ContadorFalso()
+            camera = Camera(db_path, contador)
+            restaurado = {area: {tipo: (c["in"], c["out"]) for tipo, c in counts["types"].items()}
+                          for area, counts in contador.area_counts.items()}
+            if restaurado != {"area_1": {"cars": (3, 1)}, "area_2": {"bus": (0, 1)}}:
+                raise RuntimeError(f"Totais restaurados no contador: {restaurado}")
+            camera.frame_com(area_1={"cars": (4, 1)}, area_2={"bus": (0, 2)})
+            ultimo = camera.conn.execute(
+                "SELECT MAX(ultimo_evento_id) FROM contador_offsets WHERE fonte = 'camera1'"
+            ).fetchone()[0]
+            totais = camera.fechar()
+            esperado = [("area_1", 2, 4, 1), ("area_2", 6, 0, 2)]
+            if totais != esperado:
+                raise RuntimeError(f"Contador novo: {totais} != {esperado}")
+            if ultimo != 7:
+                raise RuntimeError(f"Ultimo evento gravado inesperado: {ultimo}")
+
+            # Contador que descarta os totais restaurados (volta a contar do zero): reset, sem regravar
+            camera = Camera(db_path, ContadorFalso())
+            camera.frame_com(area_1={"cars": (1, 0)})
+            totais = camera.fechar()
+            esperado = [("area_1", 2, 5, 1), ("area_2", 6, 0, 2)]
+            if totais != esperado:
+                raise RuntimeError(f"Contador que descarta os totais: {totais} != {esperado}")
+            self.log_ok("Reinicio: contador com totais nao regrava, contador novo e restaurado do ultimo commit")
+        except Exception as err:
+            self.log_fail("Reinicio com contador com totais e novo", err)
+
+    def teste_reset(self, diretorio: str) -> None:
+        try:
+            camera = Camera(os.path.join(diretorio, "reset.db"), ContadorFalso())
+            camera.frame_com(area_1={"cars": (5, 2)})
+            camera.frame_com(area_1={"cars": (1, 0)})
+            camera.frame_com(area_1={"cars": (2, 1)})
+            totais = camera.fechar()
+            if totais != [("area_1", 2, 7, 3)]:
+                raise RuntimeError(f"Totais apos reset: {totais}")
+            self.log_ok("Reset do contador durante a execucao conta a partir do zero")
+        except Exception as err:
+            self.log_fail("Reset do contador durante a execucao conta a partir do zero", err)
+
+    def teste_frame_sem_travessia(self, diretorio: str) -> None:
+        try:
+            camera = Camera(os.path.join(diretorio, "sem_travessia.db"), ContadorFalso())
+            camera.frame_com(area_1={"cars": (1, 0)})
+            versao = camera.pipeline.eventos.versao
+
+            def proibido(*args, **kwargs):
+                raise AssertionError("frame sem travessia chegou ao repositorio")
+
+            camera.pipeline.repository.record_events = proibido
+            camera.pipeline.eventos.consumir = proibido
+            for _ in range(3):
+                camera.frame_com()
+            if camera.pipeline.eventos.versao != versao:
+                raise RuntimeError("Versao mudou sem travessia")
+            camera.fechar()
+            self.log_ok("Frame sem travessia para na comparacao da versao do contador")
+        except Exception as err:
+            self.log_fail("Frame sem travessia para na comparacao da versao do contador", err)
+
+    def teste_codigo_zero(self, diretorio: str) -> None:
+        try:
+            config = {"cameras": {"camera1": {"faixas": {
+                "faixa1": {"bus": 1, "cars": 0, "motorcycle": "", "truck": 4, "vuc": 5},
+                "faixa2": {"bus": 6, "cars": 7, "motorcycle": 8, "truck": 9, "vuc": 10},
+            }}}}
+            camera = Camera(os.path.join(diretorio, "codigo_zero.db"), ContadorFalso(), config)
+            camera.frame_com(area_1={"cars": (2, 1), "motorcycle": (1, 0), "truck": (1, 0)},
+                             area_2={"cars": (1, 0)})
+            totais = camera.fechar()
+            if totais != [("area_1", 4, 1, 0), ("area_2", 7, 1, 0)]:
+                raise RuntimeError(f"Totais com classes mapeadas para 0/vazio: {totais}")
+            self.log_ok("Classes mapeadas para o codigo 0 (ou vazio) nao sao gravadas")
+        except Exception as err:
+            self.log_fail("Classes mapeadas para o codigo 0 (ou vazio) nao sao gravadas", err)
+
+    def teste_falha_gravacao(self, diretorio: str) -> None:
+        try:
+            db_path = os.path.join(diretorio, "falha.db")
+            camera = Camera(db_path, ContadorFalso())
+            repository = camera.pipeline.repository
+            gravar = repository.save_counter_offsets
+
+            def falhar(*args, **kwargs):
+                raise RuntimeError("database is locked")
+
+            repository.save_counter_offsets = falhar
+            camera.frame_com(area_1={"cars": (1, 0)})
+            if camera.totais() != []:
+                raise RuntimeError("Gravacao com falha deveria ser desfeita")
+            repository.save_counter_offsets = gravar
+            camera.frame_com(area_1={"cars": (2, 0)})
+            camera.fechar()
+
+            camera = Camera(db_path, ContadorFalso({"area_1": {"cars": (2, 0)}}))
+            camera.frame_com(area_1={"cars": (2, 0)})
+            totais = camera.fechar()
+            if totais != [("area_1", 2, 2, 0)]:
+                raise RuntimeError(f"Totais apos nova tentativa: {totais}")
+            self.log_ok("Eventos de uma gravacao com falha sao regravados no frame seguinte")
+        except Exception as err:
+            self.log_fail("Eventos de uma gravacao com falha sao regravados no frame seguinte", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO FLUXO DE EVENTOS DO CONTADOR")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_contador_")
+        try:
+            self.teste_reinicio(diretorio)
+            self.teste_reset(diretorio)
+            self.teste_frame_sem_travessia(diretorio)
+            self.teste_codigo_zero(diretorio)
+            self.teste_falha_gravacao(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteContadorEventos().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DOS MODOS DO corrigir_nulls_tempo
+
+Confere que o modo lote (uma leitura, resolucao em memoria) corrige os
+mesmos registros com os mesmos tempos do modo linha (consultas com
+strftime('%s', ...) do SQLite), inclusive em timestamps ISO com offset,
+'T', 'Z', fracoes de segundo e datas que o SQLite normaliza.
+"""
+
+import contextlib
+import io
+import math
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+
+from corrigir_nulls_tempo import process_database, process_database_lote
+from pipeline_contagem import init_db
+
+FORMATOS = (
+    "2025-08-28 {h:02d}:{m:02d}:{s:02d}",
+    "2025-08-28T{h:02d}:{m:02d}:{s:02d}",
+    "2025-08-28T{h:02d}:{m:02d}:{s:02d}-03:00",
+    "2025-08-28T{h:02d}:{m:02d}:{s:02d}Z",
+    "2025-08-28 {h:02d}:{m:02d}:{s:02d}.250",
+    "2025-02-31 {h:02d}:{m:02d}:{s:02d}",
+    "invalido",
+)
+
+
+def _criar_banco(db_path: str) -> None:
+    random.seed(33)
+    conn, _ = init_db(db_path)
+    linhas = [
+        # Saida sem tempo com offset: 23:57:51-03:00 = 02:57:51 UTC do dia 29. A referencia
+        # correta (mesmo instante) e a das 02:57:00; a das 23:57:00 so casaria ignorando o offset
+        ("area_1", 26051, "2025-08-28T23:57:51-03:00", None),
+        ("area_1", 26051, "2025-08-29 02:57:00", 40.0),
+        ("area_1", 26051, "2025-08-28 23:57:00", 90.0),
+    ]
+    for _ in range(600):
+        formato = random.choice(FORMATOS)
+        ts = formato.format(h=random.randint(0, 23), m=random.randint(0, 59), s=random.randint(0, 59))
+        tempo = None if random.random() < 0.4 else round(random.uniform(5, 300), 1)
+        linhas.append((random.choice(["area_1", "area_2", None]), random.choice([26051, 26052, None]), ts, tempo))
+    conn.executemany(
+        "INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado) "
+        "VALUES (?, ?, 0, 1, ?, ?, 1)", linhas
+    )
+    conn.commit()
+    conn.close()
+
+
+def _corrigir(funcao, origem: str, destino: str) -> list[tuple]:
+    shutil.copy(origem, destino)
+    with contextlib.redirect_stdout(io.StringIO()):
+        funcao(destino, None, 600, 1800)
+    conn = sqlite3.connect(destino)
+    linhas = conn.execute("SELECT id, tempo_permanencia, enviado FROM vehicle_counts ORDER BY id").fetchall()
+    conn.close()
+    return linhas
+
+
+class TesteCorrigirNullsTempo:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_modos_iguais(self, diretorio: str) -> None:
+        try:
+            origem = os.path.join(diretorio, "origem.db")
+            _criar_banco(origem)
+            linha = _corrigir(process_database, origem, os.path.join(diretorio, "linha.db"))
+            lote = _corrigir(process_database_lote, origem, os.path.join(diretorio, "lote.db"))
+
+            if linha[0][1] != 40.0:
+                raise RuntimeError(f"Modo linha nao usou a referencia do mesmo instante UTC: {linha[0]}")
+            # As medias do modo lote saem de somas acumuladas: iguais ate o arredondamento do float
+            diferentes = [(a, b) for a, b in zip(linha, lote)
+                          if a[0] != b[0] or a[2] != b[2] or (a[1] is None) != (b[1] is None)
+                          or (a[1] is not None and not math.isclose(a[1], b[1], rel_tol=1e-9))]
+            if diferentes:
+                raise RuntimeError(f"{len(diferentes)} registro(s) diferentes (linha, lote), ex.: {diferentes[:3]}")
+            corrigidos = sum(1 for _, tempo, enviado in linha if tempo is not None and enviado == 0)
+            self.log_ok(f"Modo lote igual ao modo linha em {len(linha)} saidas ({corrigidos} corrigidas, com offsets)")
+        except Exception as err:
+            self.log_fail("Modo lote igual ao modo linha", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO corrigir_nulls_tempo")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_nulls_")
+        try:
+            self.teste_modos_iguais(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteCorrigirNullsTempo().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO DAEMON DE ENTREGA DE PERMANENCIA
+
+Sobe um servidor HTTP local (stub) que fica fora do ar (503) no inicio e
+confere o daemon_permanencia.DaemonPermanencia: abertura do disjuntor durante
+a queda, drenagem do backlog depois da volta do servidor (cada registro
+entregue uma unica vez, sem passar de max_em_voo requisicoes simultaneas) e
+backoff persistido na outbox (registro recusado nao e reenviado antes da hora
+por uma nova instancia do daemon) e o registro sempre recusado (400), que fica
+morto na outbox apos max_tentativas_recusado sem segurar o --drenar.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from daemon_permanencia import DaemonPermanencia, Disjuntor
+from pipeline_contagem import init_db
+
+
+class ServidorStub:
+    """API local: responde 'status' (503 simula queda) e conta as entregas com 204."""
+
+    def __init__(self, status=204):
+        self.status = status
+        self.entregues = Counter()
+        self.recusados = set()
+        self.requisicoes = 0
+        self.simultaneos = 0
+        self.max_simultaneos = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                with stub._lock:
+                    stub.simultaneos += 1
+                    stub.max_simultaneos = max(stub.max_simultaneos, stub.simultaneos)
+                    stub.requisicoes += 1
+                try:
+                    dados = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                    (codigo, valores), = dados["dwelltime"].items()
+                    chave = (dados["datetime"], codigo, valores["mean_secs"])
+                    status = 400 if chave in stub.recusados else stub.status
+                    if status == 204:
+                        with stub._lock:
+                            stub.entregues[chave] += 1
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                finally:
+                    with stub._lock:
+                        stub.simultaneos -= 1
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/dwell/"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def _criar_backlog(db_path, quantidade):
+    """Registros de permanencia nao enviados (mais linhas de contagem, que nao devem ser enviadas)."""
+    conn, _ = init_db(db_path)
+    linhas = [
+        ("area_1", 26051 + i % 10, 0, 1, f"2024-01-{1 + i // 2000:02d} {i // 100 % 20:02d}:{i % 60:02d}:{i // 60 % 60:02d}", 10 + i)
+        for i in range(quantidade)
+    ]
+    conn.executemany(
+        "INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado) "
+        "VALUES (?, ?, ?, ?, ?, ?, 0)", linhas
+    )
+    conn.executemany(
+        "INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado) "
+        "VALUES ('area_1', 26051, 1, 0, '2024-01-01 10:00:00', NULL, 0)", [()] * 100
+    )
+    conn.commit()
+    conn.close()
+    return {(ts, str(codigo), tempo) for _, codigo, _, _, ts, tempo in linhas}
+
+
+class TesteDaemonPermanencia:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_queda_e_drenagem(self, diretorio: str) -> None:
+        servidor = ServidorStub(status=503)
+        try:
+            db_path = os.path.join(diretorio, "backlog.db")
+            esperados = _criar_backlog(db_path, 5000)
+            disjuntor = Disjuntor(limiar_falhas=5, pausa_inicial=0.2, pausa_max=0.4)
+
+            def rodar():
+                # A conexao SQLite do daemon pertence a thread que o cria
+                daemon = DaemonPermanencia(db_path, servidor.url, auth=("u", "s"), max_em_voo=8, backoff_inicial=0.05,
+                                           backoff_max=0.2, intervalo=0.05, disjuntor=disjuntor)
+                try:
+                    daemon.executar(drenar=True, relatorio_a_cada=3600)
+                finally:
+                    daemon.close()
+
+            thread = threading.Thread(target=rodar)
+            thread.start()
+
+            limite = time.time() + 10
+            while disjuntor.aberturas < 2 and time.time() < limite:
+                time.sleep(0.01)
+            requisicoes_na_queda = servidor.requisicoes
+            servidor.status = 204
+            inicio = time.perf_counter()
+            thread.join(timeout=120)
+            duracao = time.perf_counter() - inicio
+
+            if thread.is_alive():
+                raise RuntimeError("Daemon nao drenou o backlog")
+            if disjuntor.aberturas < 2:
+                raise RuntimeError("Disjuntor nao abriu durante a queda")
+            if requisicoes_na_queda > 100:
+                raise RuntimeError(f"{requisicoes_na_queda} requisicoes durante a queda: o disjuntor nao segurou os envios")
+            if set(servidor.entregues) != esperados or max(servidor.entregues.values()) != 1:
+                raise RuntimeError("Cada registro deveria ser entregue exatamente uma vez")
+            if servidor.max_simultaneos > 8:
+                raise RuntimeError(f"{servidor.max_simultaneos} requisicoes simultaneas com max_em_voo=8")
+
+            conn = sqlite3.connect(db_path)
+            restantes = conn.execute(
+                "SELECT COUNT(*) FROM vehicle_counts WHERE enviado = 0 AND tempo_permanencia IS NOT NULL"
+            ).fetchone()[0]
+            outbox = conn.execute("SELECT COUNT(*) FROM outbox_permanencia").fetchone()[0]
+            conn.close()
+            if restantes or outbox:
+                raise RuntimeError(f"{restantes} registro(s) nao enviado(s), {outbox} na outbox")
+            self.log_ok(f"Disjuntor abriu na queda ({requisicoes_na_queda} requisicoes) e drenou {len(esperados)} "
+                        f"registros apos a volta ({len(esperados) / duracao:.0f} registros/s)")
+        except Exception as err:
+            self.log_fail("Disjuntor na queda e drenagem apos a volta do servidor", err)
+        finally:
+            servidor.parar()
+
+    def teste_backoff_persistido(self, diretorio: str) -> None:
+        servidor = ServidorStub()
+        try:
+            db_path = os.path.join(diretorio, "recusado.db")
+            esperados = _criar_backlog(db_path, 3)
+            recusado = min(esperados)
+            servidor.recusados.add(recusado)
+
+            daemon = DaemonPermanencia(db_path, servidor.url, auth=("u", "s"), backoff_inicial=60, backoff_max=600)
+            daemon.ciclo()
+            daemon.close()
+            conn = sqlite3.connect(db_path)
+            outbox = conn.execute("SELECT tentativas, proxima_tentativa, ultimo_erro FROM outbox_permanencia").fetchall()
+            conn.close()
+            if len(outbox) != 1 or outbox[0][0] != 1 or not outbox[0][1] > time.time() + 25 or "400" not in outbox[0][2]:
+                raise RuntimeError(f"Outbox inesperada: {outbox}")
+
+            # Nova instancia (reinicio): o registro recusado so volta apos o backoff gravado
+            requisicoes = servidor.requisicoes
+            daemon = DaemonPermanencia(db_path, servidor.url, auth=("u", "s"))
+            tentados = daemon.ciclo()
+            daemon.close()
+            if tentados or servidor.requisicoes != requisicoes:
+                raise RuntimeError("Registro recusado reenviado antes da proxima tentativa")
+            if set(servidor.entregues) != esperados - {recusado}:
+                raise RuntimeError("Registros aceitos nao foram entregues")
+            self.log_ok("Backoff do registro recusado fica na outbox e vale apos reinicio")
+        except Exception as err:
+            self.log_fail("Backoff do registro recusado fica na outbox e vale apos reinicio", err)
+        finally:
+            servidor.parar()
+
+    def teste_recusado_descartado(self, diretorio: str) -> None:
+        servidor = ServidorStub()
+        daemon = None
+        try:
+            db_path = os.path.join(diretorio, "descartado.db")
+            esperados = _criar_backlog(db_path, 3)
+            recusado = min(esperados)
+            servidor.recusados.add(recusado)
+
+            def rodar():
+                nonlocal daemon
+                daemon = DaemonPermanencia(db_path, servidor.url, auth=("u", "s"), backoff_inicial=0.02,
+                                           backoff_max=0.05, intervalo=0.02, max_tentativas_recusado=3)
+                try:
+                    daemon.executar(drenar=True, relatorio_a_cada=3600)
+                finally:
+                    daemon.close()
+
+            thread = threading.Thread(target=rodar)
+            thread.start()
+            thread.join(timeout=10)
+            if thread.is_alive():
+                daemon.stop()
+                thread.join()
+                raise RuntimeError("--drenar nao terminou com um registro sempre recusado (400)")
+
+            conn = sqlite3.connect(db_path)
+            outbox = conn.execute("SELECT tentativas, morto, ultimo_erro FROM outbox_permanencia").fetchall()
+            conn.close()
+            if len(outbox) != 1 or outbox[0][:2] != (3, 1) or "400" not in outbox[0][2]:
+                raise RuntimeError(f"Outbox inesperada: {outbox}")
+            if servidor.requisicoes != 5 or set(servidor.entregues) != esperados - {recusado}:
+                raise RuntimeError(f"{servidor.requisicoes} requisicoes; entregues {set(servidor.entregues)}")
+            if daemon.descartados != 1 or daemon.disjuntor.aberturas:
+                raise RuntimeError(f"{daemon.descartados} descartado(s), {daemon.disjuntor.aberturas} abertura(s)")
+
+            # Nova instancia: o registro morto nao e reenviado nem agendado
+            daemon = DaemonPermanencia(db_path, servidor.url, auth=("u", "s"))
+            tentados = daemon.ciclo()
+            agendado = daemon.pendentes_agendados()
+            daemon.close()
+            if tentados or agendado is not None:
+                raise RuntimeError(f"Registro morto voltou: {tentados} tentado(s), agendado {agendado}")
+            self.log_ok("Registro recusado 3 vezes fica morto na outbox e --drenar termina")
+        except Exception as err:
+            self.log_fail("Registro sempre recusado nao segura o --drenar", err)
+        finally:
+            servidor.parar()
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO DAEMON DE ENTREGA DE PERMANENCIA")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_daemon_")
+        try:
+            self.teste_queda_e_drenagem(diretorio)
+            self.teste_backoff_persistido(diretorio)
+            self.teste_recusado_descartado(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteDaemonPermanencia().executar()
+
+
+if __name__ == "__main__":
+    main()
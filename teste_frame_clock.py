@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO FRAMECLOCK (frame_clock.py)
+
+Confere a reancoragem periodica do relogio do tracking: com ancoras fixas
+(replay/benchmark) o mapeamento nunca muda; sem elas a ancora e recapturada
+depois de intervalo_reancoragem e os horarios gravados voltam a acompanhar um
+relogio de parede corrigido, sem alterar as duracoes medidas nos timestamps
+monotonicos; format() continua correto atraves da reancoragem (cache por segundo).
+"""
+
+from datetime import datetime
+
+import frame_clock
+from frame_clock import FrameClock
+
+INICIO = datetime(2024, 1, 15, 12, 0, 0).timestamp()
+
+
+class _Tempo:
+    """Substitui o modulo time dentro de frame_clock: relogio monotonico e de parede controlados."""
+
+    def __init__(self, mono, wall) -> None:
+        self.mono = mono
+        self.wall = wall
+
+    def monotonic(self) -> float:
+        return self.mono
+
+    def time(self) -> float:
+        return self.wall
+
+    def avancar(self, segundos) -> None:
+        self.mono += segundos
+        self.wall += segundos
+
+
+class TesteFrameClock:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_ancoras_fixas(self) -> None:
+        tempo = _Tempo(500.0, INICIO + 3600)
+        original = frame_clock.time
+        frame_clock.time = tempo
+        try:
+            clock = FrameClock(wall_anchor=INICIO, mono_anchor=0.0)
+            if clock.intervalo_reancoragem != 0:
+                raise RuntimeError(f"Intervalo padrao com ancoras fixas: {clock.intervalo_reancoragem}")
+            for i in range(0, 7200, 7):
+                clock.tick(float(i))
+            if (clock.wall_anchor, clock.mono_anchor) != (INICIO, 0.0) or clock.to_epoch(7000.0) != INICIO + 7000:
+                raise RuntimeError(f"Ancora mudou: {(clock.wall_anchor, clock.mono_anchor)}")
+            self.log_ok("Ancoras fixas: nenhuma reancoragem em 2h de ticks explicitos")
+        except Exception as err:
+            self.log_fail("Ancoras fixas", err)
+        finally:
+            frame_clock.time = original
+
+    def teste_reancoragem(self) -> None:
+        tempo = _Tempo(100.0, INICIO)
+        original = frame_clock.time
+        frame_clock.time = tempo
+        try:
+            clock = FrameClock(intervalo_reancoragem=60)
+            entrada = clock.tick()
+            # O relogio de parede e corrigido (NTP) 30s para tras logo apos a entrada
+            tempo.wall -= 30
+            tempo.avancar(59)
+            antes = clock.tick()
+            if clock.mono_anchor != 100.0 or clock.to_epoch(antes) != INICIO + 59:
+                raise RuntimeError("Reancorou antes do intervalo")
+            tempo.avancar(1)
+            saida = clock.tick()
+            if clock.mono_anchor != 160.0 or clock.wall_anchor != INICIO + 30:
+                raise RuntimeError(f"Nao reancorou apos o intervalo: {(clock.wall_anchor, clock.mono_anchor)}")
+            if clock.to_epoch(saida) != tempo.wall:
+                raise RuntimeError("Horario gravado nao acompanha o relogio corrigido")
+            # Duracao medida nos timestamps monotonicos: a correcao de 30s nao entra
+            if saida - entrada != 60.0:
+                raise RuntimeError(f"Duracao afetada pela reancoragem: {saida - entrada}")
+
+            semfim = FrameClock(intervalo_reancoragem=0)
+            tempo.avancar(3600)
+            semfim.tick()
+            if semfim.mono_anchor != 160.0:
+                raise RuntimeError("intervalo_reancoragem=0 deveria desativar a reancoragem")
+            self.log_ok("Reancoragem apos intervalo_reancoragem; duracoes monotonicas preservadas")
+        except Exception as err:
+            self.log_fail("Reancoragem periodica", err)
+        finally:
+            frame_clock.time = original
+
+    def teste_format(self) -> None:
+        tempo = _Tempo(0.0, INICIO)
+        original = frame_clock.time
+        frame_clock.time = tempo
+        try:
+            clock = FrameClock(intervalo_reancoragem=60)
+            formatados = []
+            for i in range(0, 1200):
+                ts = clock.tick()
+                formatados.append((clock.format(ts), clock.to_epoch(ts)))
+                tempo.avancar(0.1)
+                if i == 300:
+                    # Relogio corrigido 1h para tras: aparece a partir da proxima reancoragem
+                    tempo.wall -= 3600
+            for texto, epoch in formatados:
+                if texto != datetime.fromtimestamp(int(epoch)).strftime('%Y-%m-%d %H:%M:%S'):
+                    raise RuntimeError(f"format() divergente: {texto} para {epoch}")
+            textos = [texto for texto, _ in formatados]
+            if textos[0] != "2024-01-15 12:00:00" or textos[-1] != "2024-01-15 11:01:59":
+                raise RuntimeError(f"Horarios inesperados: {textos[0]} .. {textos[-1]}")
+            # Mesmo segundo de parede antes e depois da reancoragem: a string do cache continua valida
+            clock = FrameClock(wall_anchor=INICIO, mono_anchor=0.0)
+            primeiro = clock.format(10.2)
+            clock.reancorar(INICIO + 10.5, 10.5)
+            if clock.format(10.7) is not primeiro:
+                raise RuntimeError("Mesmo segundo deveria reaproveitar a string")
+            clock.reancorar(INICIO - 50, 10.7)
+            if clock.format(10.8) != "2024-01-15 11:59:10":
+                raise RuntimeError(f"Cache nao invalidado na reancoragem: {clock.format(10.8)}")
+            self.log_ok("format() correto atraves da reancoragem (cache por segundo)")
+        except Exception as err:
+            self.log_fail("format() atraves da reancoragem", err)
+        finally:
+            frame_clock.time = original
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO FRAMECLOCK")
+        print("=" * 60)
+
+        self.teste_ancoras_fixas()
+        self.teste_reancoragem()
+        self.teste_format()
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteFrameClock().executar()
+
+
+if __name__ == "__main__":
+    main()
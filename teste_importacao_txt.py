@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DA IMPORTACAO DE TXT (db.py)
+
+Confere a importacao de uma pasta de TXT de exportacao: arquivos com bytes
+fora da codificacao do sistema (ex.: Latin-1) sao importados em vez de
+derrubar a pasta inteira, um arquivo que nao pode ser lido volta do worker
+como falha (contada em falhas, fora do manifesto), uma segunda execucao nao
+reimporta nada e um escritor que nao consegue abrir o banco interrompe a
+importacao em vez de travar o produtor na fila cheia.
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import db
+from db import EscritorDados, ler_arquivo, processar_arquivos_pasta
+
+
+def _criar_pasta(pasta: str) -> None:
+    with open(os.path.join(pasta, "utf8.txt"), "w", encoding="utf-8") as f:
+        f.write("empresa=Praça Sé\n26051;2025-08-28 10:00:00;1;0;\n26052;2025-08-28 10:00:00;0;1;\n")
+    with open(os.path.join(pasta, "latin1.txt"), "w", encoding="latin-1") as f:
+        f.write("empresa=Avenida São João\n26051;2025-08-28 10:30:00;2;0;\nlinha inválida\n")
+
+
+class TesteImportacaoTxt:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_codificacao(self, diretorio: str) -> None:
+        try:
+            pasta = os.path.join(diretorio, "txt")
+            os.makedirs(pasta)
+            _criar_pasta(pasta)
+            banco = os.path.join(diretorio, "dados.db")
+
+            saida = io.StringIO()
+            with contextlib.redirect_stdout(saida):
+                escritor = processar_arquivos_pasta(pasta, banco, workers=2)
+            if escritor.falhas or escritor.arquivos != 2 or escritor.linhas_inseridas != 3:
+                raise RuntimeError(f"{escritor.arquivos} arquivo(s), {escritor.falhas} falha(s), "
+                                   f"{escritor.linhas_inseridas} linha(s): {saida.getvalue()}")
+            if "linha inv" not in saida.getvalue():
+                raise RuntimeError("Linha com erro de formato do arquivo Latin-1 nao relatada")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                segunda = processar_arquivos_pasta(pasta, banco, workers=2)
+            conn = sqlite3.connect(banco)
+            linhas = conn.execute("SELECT COUNT(*) FROM dados").fetchone()[0]
+            arquivos = conn.execute("SELECT COUNT(*) FROM arquivos_processados").fetchone()[0]
+            conn.close()
+            if segunda.total_arquivos or linhas != 3 or arquivos != 2:
+                raise RuntimeError(f"Segunda execucao: {segunda.total_arquivos} arquivo(s); banco com "
+                                   f"{linhas} linha(s) e {arquivos} arquivo(s) no manifesto")
+            self.log_ok("Arquivo Latin-1 importado junto com o UTF-8; segunda execucao nao reimporta")
+        except Exception as err:
+            self.log_fail("Importacao com arquivo fora da codificacao do sistema", err)
+
+    def teste_falha_leitura(self, diretorio: str) -> None:
+        try:
+            ausente = os.path.join(diretorio, "ausente.txt")
+            resultado = ler_arquivo((ausente, "ausente.txt", 10, 0.0))
+            if resultado[1] is not None or resultado[4] or "FileNotFoundError" not in (resultado[6] or ""):
+                raise RuntimeError(f"Resultado inesperado para arquivo ausente: {resultado}")
+
+            banco = os.path.join(diretorio, "falha.db")
+            pasta = os.path.join(diretorio, "falha")
+            os.makedirs(pasta)
+            _criar_pasta(pasta)
+            # Cria as tabelas; a pasta ja fica importada
+            with contextlib.redirect_stdout(io.StringIO()):
+                processar_arquivos_pasta(pasta, banco, workers=1)
+            bom = ler_arquivo((os.path.join(pasta, "utf8.txt"), "novo.txt", 1, 1.0))
+
+            escritor = EscritorDados(banco, 2, intervalo_relatorio=3600)
+            escritor.start()
+            escritor.fila.put(resultado)
+            escritor.fila.put(bom)
+            escritor.fila.put(None)
+            escritor.join()
+
+            conn = sqlite3.connect(banco)
+            nomes = {nome for (nome,) in conn.execute("SELECT nome_arquivo FROM arquivos_processados")}
+            conn.close()
+            if escritor.falhas != 1 or escritor.arquivos != 1 or "ausente.txt" in nomes or "novo.txt" not in nomes:
+                raise RuntimeError(f"{escritor.falhas} falha(s), {escritor.arquivos} arquivo(s), manifesto {nomes}")
+            self.log_ok("Arquivo ilegivel volta do worker como falha e fica fora do manifesto")
+        except Exception as err:
+            self.log_fail("Falha de leitura de um arquivo", err)
+
+    def teste_escritor_sem_banco(self, diretorio: str) -> None:
+        original = db.abrir_escrita
+        try:
+            pasta = os.path.join(diretorio, "travado")
+            os.makedirs(pasta)
+            for i in range(40):
+                with open(os.path.join(pasta, f"{i:03d}.txt"), "w", encoding="utf-8") as f:
+                    f.write(f"26051;2025-08-28 10:{i % 60:02d}:00;1;0;\n")
+            banco = os.path.join(diretorio, "travado.db")
+            chamadas = []
+
+            def abrir(caminho):
+                # A primeira abertura (tabelas e manifesto) funciona; a do escritor encontra o banco travado
+                chamadas.append(caminho)
+                if len(chamadas) > 1:
+                    raise sqlite3.OperationalError("database is locked")
+                return original(caminho)
+
+            db.abrir_escrita = abrir
+            resultado = {}
+
+            def importar():
+                resultado["escritor"] = processar_arquivos_pasta(pasta, banco, workers=1, arquivos_por_transacao=1)
+
+            # A saida e redirecionada nesta thread: se a importacao travar, o print do erro nao se perde
+            thread = threading.Thread(target=importar, daemon=True)
+            with contextlib.redirect_stdout(io.StringIO()) as saida:
+                thread.start()
+                thread.join(timeout=60)
+            if thread.is_alive():
+                raise RuntimeError("Importacao travou com o escritor parado")
+            escritor = resultado["escritor"]
+            if not isinstance(escritor.erro, sqlite3.OperationalError) or escritor.falhas != 40 or escritor.arquivos:
+                raise RuntimeError(f"erro {escritor.erro!r}, {escritor.falhas} falha(s), {escritor.arquivos} arquivo(s)")
+            if "database is locked" not in saida.getvalue():
+                raise RuntimeError(f"Erro do escritor nao relatado: {saida.getvalue()}")
+            self.log_ok("Escritor sem banco interrompe a importacao e conta os 40 arquivos como falha")
+        except Exception as err:
+            self.log_fail("Escritor que nao abre o banco", err)
+        finally:
+            db.abrir_escrita = original
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DA IMPORTACAO DE TXT")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_importacao_")
+        try:
+            self.teste_codificacao(diretorio)
+            self.teste_falha_leitura(diretorio)
+            self.teste_escritor_sem_banco(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteImportacaoTxt().executar()
+
+
+if __name__ == "__main__":
+    main()
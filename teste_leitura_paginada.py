@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DA LEITURA PAGINADA (KEYSET)
+
+Confere conexao_db.ler_em_paginas (todas as linhas uma unica vez, em paginas
+de tamanho fixo, inclusive com o total multiplo do tamanho da pagina e com
+registros marcados durante a leitura) e que a agregacao por paginas dos
+exportadores da o mesmo resultado da leitura unica.
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+import dbexport_consolidate
+import dbexport_halfhour
+from api_tempopermanencia import buscar_dados
+from conexao_db import abrir_leitura, ler_em_paginas
+from pipeline_contagem import init_db
+
+CONSULTA_TODOS = "SELECT id, vehicle_code FROM vehicle_counts WHERE id > ? ORDER BY id LIMIT ?"
+
+
+def _criar_banco(db_path, quantidade):
+    random.seed(3)
+    conn, _ = init_db(db_path)
+    linhas = []
+    for _ in range(quantidade):
+        permanencia = random.random() < 0.3
+        linhas.append((
+            random.choice(["area_1", "area_2"]), random.choice([26051, 26052, 26053, 26060]),
+            0 if permanencia else random.randint(0, 1), 1 if permanencia else random.randint(0, 1),
+            f"2024-01-{random.randint(1, 3):02d} {random.randint(0, 23):02d}:{random.randint(0, 59):02d}:{random.randint(0, 59):02d}",
+            random.uniform(5, 300) if permanencia else None,
+        ))
+    conn.executemany(
+        "INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado) "
+        "VALUES (?, ?, ?, ?, ?, ?, 0)", linhas
+    )
+    conn.commit()
+    conn.close()
+
+
+class TesteLeituraPaginada:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_paginas(self, db_path: str) -> None:
+        try:
+            conn = abrir_leitura(db_path)
+            esperado = conn.execute("SELECT id, vehicle_code FROM vehicle_counts ORDER BY id").fetchall()
+            for tamanho in (1, 7, 250, len(esperado), len(esperado) + 1):
+                paginas = list(ler_em_paginas(conn, CONSULTA_TODOS, tamanho_pagina=tamanho))
+                if [linha for pagina in paginas for linha in pagina] != esperado:
+                    raise RuntimeError(f"Linhas diferentes com paginas de {tamanho}")
+                if any(len(pagina) > tamanho for pagina in paginas) or not all(paginas):
+                    raise RuntimeError(f"Pagina vazia ou maior que {tamanho}")
+            conn.close()
+
+            # Registros marcados como enviados durante a leitura nao atrapalham a paginacao
+            lidos = []
+            escrita = sqlite3.connect(db_path)
+            for registro in buscar_dados(db_path, tamanho_pagina=100):
+                lidos.append(registro[0])
+                escrita.execute("UPDATE vehicle_counts SET enviado = 1 WHERE id = ?", (registro[0],))
+                escrita.commit()
+            pendentes = escrita.execute(
+                "SELECT COUNT(*) FROM vehicle_counts WHERE enviado = 0 AND tempo_permanencia IS NOT NULL"
+            ).fetchone()[0]
+            escrita.execute("UPDATE vehicle_counts SET enviado = 0")
+            escrita.commit()
+            escrita.close()
+            if pendentes or len(lidos) != len(set(lidos)) or lidos != sorted(lidos):
+                raise RuntimeError(f"{pendentes} pendente(s), {len(lidos)} lido(s) ({len(set(lidos))} distintos)")
+            self.log_ok(f"{len(esperado)} linhas lidas uma unica vez em paginas de varios tamanhos")
+        except Exception as err:
+            self.log_fail("Leitura em paginas por keyset", err)
+
+    def teste_agregacao(self, db_path: str) -> None:
+        try:
+            conn = abrir_leitura(db_path)
+            data = pd.read_sql_query(
+                "SELECT area, vehicle_code, count_in, count_out, timestamp FROM vehicle_counts ORDER BY timestamp", conn
+            )
+            unica = dbexport_halfhour.aggregate_data(data.copy())
+            paginada, registros = dbexport_halfhour.agregar_paginas(conn, "1970-01-01 00:00:00", tamanho_pagina=97)
+            conn.close()
+            if registros != len(data) or not paginada.equals(unica):
+                raise RuntimeError("Agregacao por paginas (halfhour) diferente da leitura unica")
+
+            inicio, fim = "2024-01-01 00:00:00", "2024-01-03 23:59:59"
+            unica = dbexport_consolidate.aggregate_data(data.copy(), inicio, fim)
+            somas, codigos, _ = dbexport_consolidate.somar_periodo(db_path, inicio, fim, tamanho_pagina=97)
+            paginada = dbexport_consolidate.preencher_intervalos(somas, codigos, inicio, fim)
+            if not paginada.equals(unica):
+                raise RuntimeError("Agregacao por paginas (consolidate) diferente da leitura unica")
+            self.log_ok("Agregacao por paginas igual a leitura unica nos exportadores")
+        except Exception as err:
+            self.log_fail("Agregacao por paginas nos exportadores", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DA LEITURA PAGINADA")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_paginas_")
+        try:
+            db_path = os.path.join(diretorio, "paginas.db")
+            _criar_banco(db_path, 3000)
+            self.teste_paginas(db_path)
+            self.teste_agregacao(db_path)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteLeituraPaginada().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO LIMITE DE TAXA DOS LOGS (log_config.py)
+
+Confere o RateLimitFilter (limite por ponto de log, aviso das mensagens
+suprimidas na janela seguinte, mensagens ERROR ou acima nunca suprimidas e
+amostragem 1 a cada N de --log_sample) e o configurar_logging de ponta a
+ponta: o limite vale para os loggers comuns, mas as linhas do
+bug_vehicle_code (trilha de auditoria das contagens) sao todas gravadas.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+
+import log_config
+from log_config import RateLimitFilter, configurar_logging, destinos_em_diretorio, parse_niveis
+
+
+class _Relogio:
+    """Substitui o modulo time dentro de log_config (so monotonic() e usado pelo filtro)."""
+
+    def __init__(self) -> None:
+        self.agora = 1000.0
+
+    def monotonic(self) -> float:
+        return self.agora
+
+
+def _registro(linha, nivel=logging.INFO, nome="busca_erro", mensagem="mensagem %d", args=(0,)):
+    return logging.LogRecord(nome, nivel, "/app/yolo16_v4.py", linha, mensagem, args, None)
+
+
+def _passaram(filtro, registros):
+    return [r for r in registros if filtro.filter(r)]
+
+
+class TesteLogConfig:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_limite_por_ponto(self) -> None:
+        relogio = _Relogio()
+        original = log_config.time
+        log_config.time = relogio
+        try:
+            filtro = RateLimitFilter(limite=3, janela=60.0)
+            # Duas linhas intercaladas e um segundo logger na mesma linha: limites independentes
+            registros = [_registro(linha, nome=nome, args=(i,))
+                         for i in range(10) for linha, nome in ((100, "busca_erro"), (200, "busca_erro"), (100, "outro"))]
+            passaram = _passaram(filtro, registros)
+            por_ponto = {}
+            for r in passaram:
+                por_ponto[(r.name, r.lineno)] = por_ponto.get((r.name, r.lineno), 0) + 1
+            if por_ponto != {("busca_erro", 100): 3, ("busca_erro", 200): 3, ("outro", 100): 3}:
+                raise RuntimeError(f"Mensagens por ponto de log: {por_ponto}")
+
+            # Dentro da janela continua suprimindo; depois dela a primeira mensagem informa as suprimidas
+            relogio.agora += 59
+            if filtro.filter(_registro(100)):
+                raise RuntimeError("Mensagem dentro da janela deveria ser suprimida")
+            relogio.agora += 1
+            registro = _registro(100, args=(42,))
+            if not filtro.filter(registro) or registro.getMessage() != "mensagem 42 (+8 mensagens suprimidas nos últimos 60s)":
+                raise RuntimeError(f"Primeira mensagem da nova janela: {registro.getMessage()!r}")
+            if len(_passaram(filtro, [_registro(100) for _ in range(5)])) != 2:
+                raise RuntimeError("Nova janela deveria aceitar o limite de novo")
+            self.log_ok("Limite por ponto de log (logger + arquivo + linha) e aviso das suprimidas na janela seguinte")
+        except Exception as err:
+            self.log_fail("Limite por ponto de log", err)
+        finally:
+            log_config.time = original
+
+    def teste_nivel_isento(self) -> None:
+        try:
+            filtro = RateLimitFilter(limite=2, janela=60.0)
+            erros = [_registro(300, nivel=logging.ERROR) for _ in range(20)]
+            criticos = [_registro(301, nivel=logging.CRITICAL) for _ in range(20)]
+            avisos = [_registro(302, nivel=logging.WARNING) for _ in range(20)]
+            if len(_passaram(filtro, erros + criticos)) != 40:
+                raise RuntimeError("Mensagens ERROR/CRITICAL suprimidas")
+            if len(_passaram(filtro, avisos)) != 2:
+                raise RuntimeError("Mensagens WARNING deveriam respeitar o limite")
+            self.log_ok("Mensagens ERROR ou acima nunca sao suprimidas")
+        except Exception as err:
+            self.log_fail("Mensagens ERROR ou acima", err)
+
+    def teste_amostragem(self) -> None:
+        try:
+            filtro = RateLimitFilter(limite=2, janela=60.0, amostragem=5)
+            passaram = _passaram(filtro, [_registro(400, args=(i,)) for i in range(22)])
+            indices = [r.args[0] for r in passaram]
+            # 2 dentro do limite + 1 a cada 5 das 20 seguintes
+            if indices != [0, 1, 6, 11, 16, 21]:
+                raise RuntimeError(f"Mensagens amostradas: {indices}")
+            self.log_ok("--log_sample: apos o limite registra 1 a cada N mensagens")
+        except Exception as err:
+            self.log_fail("Amostragem apos o limite", err)
+
+    def teste_configurar_logging(self, diretorio: str) -> None:
+        raiz = logging.getLogger()
+        handlers_raiz = list(raiz.handlers)
+        try:
+            niveis, limites = parse_niveis(["permanence_tracker.log=INFO:4"])
+            listener = configurar_logging(niveis=niveis, limites=limites, limite=3, janela=3600,
+                                          destinos=destinos_em_diretorio(diretorio))
+            for i in range(30):
+                logging.getLogger("bug_vehicle_code").info(f"ENTRADA(S) SALVA(S) -> Area: area_1, Codigo: 2, Qtde: {i}")
+                logging.getLogger("busca_erro").info(f"busca {i}")
+                logging.getLogger("permanence_tracker.log").info(f"permanencia {i}")
+            for i in range(5):
+                logging.getLogger("busca_erro").error(f"falha {i}")
+            listener.stop()
+
+            def linhas(arquivo):
+                with open(os.path.join(diretorio, arquivo), encoding="utf-8") as f:
+                    return f.read().splitlines()
+
+            auditoria = linhas("bug_vehicle_code.log")
+            if len(auditoria) != 30 or not auditoria[-1].endswith("Qtde: 29"):
+                raise RuntimeError(f"bug_vehicle_code com {len(auditoria)} linha(s), esperado 30")
+            busca = linhas("busca_erro.log")
+            if len(busca) != 3 + 5:
+                raise RuntimeError(f"busca_erro com {len(busca)} linha(s), esperado 3 + 5 erros")
+            if len(linhas("permanence_tracker.log")) != 4:
+                raise RuntimeError("Limite por logger de --log_level (LOGGER=NIVEL:LIMITE) nao aplicado")
+            if len(linhas("error_log.txt")) != 5:
+                raise RuntimeError("Erros do busca_erro deveriam ir tambem para o error_log")
+            self.log_ok("configurar_logging: loggers limitados, bug_vehicle_code com as 30 linhas de auditoria")
+        except Exception as err:
+            self.log_fail("configurar_logging de ponta a ponta", err)
+        finally:
+            for handler in list(raiz.handlers):
+                raiz.removeHandler(handler)
+            for handler in handlers_raiz:
+                raiz.addHandler(handler)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO LIMITE DE TAXA DOS LOGS")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_log_config_")
+        try:
+            self.teste_limite_por_ponto()
+            self.teste_nivel_isento()
+            self.teste_amostragem()
+            self.teste_configurar_logging(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteLogConfig().executar()
+
+
+if __name__ == "__main__":
+    main()
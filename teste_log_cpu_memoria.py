@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO MONITOR DE RECURSOS DAS CAMERAS
+
+Confere o log_cpu_memoria: descoberta de um processo de camera (um
+yolo16_v4.py falso com --config_path e --db_path relativo ao diretorio dele)
+com CPU, RSS, threads e os eventos do contador da camera, as linhas do banco
+numa amostra propria ('banco ...') e a rede da maquina; aviso de camera
+encerrada; reducao de resolucao (brutas -> minuto -> hora) e resumo com as
+mesmas taxas nos dois niveis; migracao das tabelas sem as colunas de rede;
+limite de taxa dos alertas.
+"""
+
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import log_cpu_memoria
+from log_cpu_memoria import Amostra, LimitadorAlertas, MonitorRecursos, compactar, criar_tabelas, resumo
+from pipeline_contagem import init_db
+
+CAMERA_FALSA = """
+import time
+fim = time.time() + 30
+while time.time() < fim:
+    sum(range(10000))
+"""
+
+
+class TesteLogCpuMemoria:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_processo_camera(self, diretorio: str) -> None:
+        processo = None
+        monitor = None
+        try:
+            db_camera = os.path.join(diretorio, "camera.db")
+            conn, _ = init_db(db_camera)
+            conn.executemany("INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp) "
+                             "VALUES ('area_1', 26051, 1, 0, '2024-01-01 10:00:00')", [()] * 42)
+            conn.executemany("INSERT INTO contador_offsets VALUES (?, 'area_1', 'car', 'in', ?, ?)",
+                             [("cam1", 10, 17), ("outra", 99, 99)])
+            conn.commit()
+            conn.close()
+
+            script = os.path.join(diretorio, "yolo16_v4.py")
+            with open(script, "w") as arquivo:
+                arquivo.write(CAMERA_FALSA)
+            processo = subprocess.Popen([sys.executable, script, "--config_path", "configs/cam1_config.json",
+                                         "--db_path", "camera.db"], cwd=diretorio)
+
+            monitor = MonitorRecursos(os.path.join(diretorio, "metricas.db"), intervalo_status=3600)
+            monitor.amostrador.intervalo_descoberta = 0
+            for _ in range(3):
+                time.sleep(0.5)
+                amostras = monitor.ciclo()
+            camera = [amostra for amostra in amostras if amostra.pid == processo.pid]
+            if not camera:
+                raise RuntimeError("Processo da camera nao encontrado")
+            camera = camera[0]
+            if camera.camera != "cam1" or camera.linhas is not None or camera.eventos != 17:
+                raise RuntimeError(f"Amostra inesperada: {camera}")
+            # Linhas de vehicle_counts sao do banco (compartilhado), nao da camera
+            banco = [amostra for amostra in amostras if amostra.camera == f"banco {os.path.realpath(db_camera)}"]
+            if len(banco) != 1 or banco[0].linhas != 42 or banco[0].pid != 0 or banco[0].cpu is not None:
+                raise RuntimeError(f"Amostra do banco inesperada: {[a for a in amostras if a.pid == 0]}")
+            sistema = amostras[0]
+            if sistema.camera != "sistema" or not sistema.rede_enviada_mb >= 0 or not sistema.rede_recebida_mb >= 0:
+                raise RuntimeError(f"Rede da maquina ausente: {sistema}")
+            if not camera.cpu > 1 or not camera.rss_mb > 1 or camera.threads < 1 or camera.arquivos is None:
+                raise RuntimeError(f"Metricas do processo inesperadas: {camera}")
+
+            processo.kill()
+            processo.wait()
+            encerrados = []
+            original = log_cpu_memoria.logger.warning
+            log_cpu_memoria.logger.warning = lambda mensagem: encerrados.append(mensagem)
+            try:
+                amostras = monitor.ciclo()
+            finally:
+                log_cpu_memoria.logger.warning = original
+            if any(amostra.pid == processo.pid or amostra.camera.startswith("banco ") for amostra in amostras) \
+                    or not any("cam1 encerrada" in m for m in encerrados):
+                raise RuntimeError(f"Encerramento da camera nao detectado: {encerrados}")
+
+            monitor.gravar()
+            gravadas = monitor.conn.execute("SELECT COUNT(*) FROM amostras WHERE camera = 'cam1'").fetchone()[0]
+            if gravadas != 3:
+                raise RuntimeError(f"{gravadas} amostras gravadas da camera, esperado 3")
+            self.log_ok(f"Camera falsa amostrada (CPU {camera.cpu:.0f}%, {camera.rss_mb:.0f} MB, "
+                        f"{camera.threads} thread(s), eventos {camera.eventos}; banco com {banco[0].linhas} linhas) "
+                        f"e encerramento avisado")
+        except Exception as err:
+            self.log_fail("Amostragem do processo da camera", err)
+        finally:
+            if processo is not None and processo.poll() is None:
+                processo.kill()
+                processo.wait()
+            if monitor is not None:
+                monitor.close()
+
+    def teste_reducao_resolucao(self, diretorio: str) -> None:
+        try:
+            conn = sqlite3.connect(os.path.join(diretorio, "historico.db"))
+            criar_tabelas(conn)
+            inicio = 1_700_000_000.0 // 3600 * 3600
+            duracao = 3 * 3600
+            # Camera com 40% de CPU, 120 eventos e 60 linhas por minuto, reiniciada no meio (novo pid)
+            for passo in range(0, duracao, 2):
+                agora = inicio + passo
+                pid = 100 if passo < duracao / 2 else 200
+                base = passo if pid == 100 else passo - duracao // 2
+                conn.execute("INSERT INTO amostras VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             Amostra(agora, pid, "cam1", 40.0, 500.0, 12, 30, base / 60, base / 30, base, base * 2,
+                                     base / 120, base / 240))
+                if passo % 60 == 58:
+                    compactar(conn, agora + 2)
+            fim = inicio + duracao
+            compactar(conn, fim)
+
+            por_minuto = conn.execute("SELECT COUNT(*), SUM(n), MIN(cpu), MAX(cpu) FROM amostras_agregadas "
+                                      "WHERE resolucao = 60").fetchone()
+            por_hora = conn.execute("SELECT COUNT(*), SUM(n) FROM amostras_agregadas WHERE resolucao = 3600").fetchone()
+            if por_minuto != (duracao // 60, duracao // 2, 40.0, 40.0):
+                raise RuntimeError(f"Nivel por minuto inesperado: {por_minuto}")
+            if por_hora[1] != duracao // 2 or por_hora[0] < 3:
+                raise RuntimeError(f"Nivel por hora inesperado: {por_hora}")
+
+            recente = resumo(conn, 3600, fim)[0]
+            if recente["processos"] != 1 or abs(recente["cpu"] - 40) > 0.01 or abs(recente["eventos_min"] - 120) > 1:
+                raise RuntimeError(f"Resumo das brutas inesperado: {recente}")
+
+            # Depois da retencao das brutas, o resumo longo sai do nivel por minuto com as mesmas taxas
+            compactar(conn, fim + log_cpu_memoria.RETENCAO_BRUTA + 60)
+            if conn.execute("SELECT COUNT(*) FROM amostras").fetchone()[0]:
+                raise RuntimeError("Amostras brutas alem da retencao nao foram apagadas")
+            depois = fim + log_cpu_memoria.RETENCAO_BRUTA + 60
+            longo = resumo(conn, depois - inicio, depois)[0]
+            if longo["processos"] != 2 or abs(longo["cpu"] - 40) > 0.01 or abs(longo["eventos_min"] - 120) > 3 \
+                    or abs(longo["linhas_min"] - 60) > 2 or abs(longo["escrita_mb_s"] - 1 / 30) > 0.002 \
+                    or abs(longo["rede_enviada_mb_s"] - 1 / 120) > 0.001 or abs(longo["rede_recebida_mb_s"] - 1 / 240) > 0.001:
+                raise RuntimeError(f"Resumo do nivel por minuto inesperado: {longo}")
+            conn.close()
+            self.log_ok(f"Brutas -> {por_minuto[0]} minutos -> {por_hora[0]} horas; resumo com "
+                        f"{longo['eventos_min']:.1f} eventos/min e {longo['processos']} processos no nivel agregado")
+        except Exception as err:
+            self.log_fail("Reducao de resolucao e resumo", err)
+
+    def teste_migracao(self, diretorio: str) -> None:
+        try:
+            conn = sqlite3.connect(os.path.join(diretorio, "antigo.db"))
+            conn.execute("CREATE TABLE amostras (ts REAL NOT NULL, pid INTEGER NOT NULL, camera TEXT NOT NULL, cpu REAL, "
+                         "rss_mb REAL, threads INTEGER, arquivos INTEGER, leitura_mb REAL, escrita_mb REAL, "
+                         "linhas INTEGER, eventos INTEGER)")
+            conn.execute("INSERT INTO amostras VALUES (1, 0, 'sistema', 10, 100, NULL, NULL, NULL, NULL, NULL, NULL)")
+            conn.commit()
+            criar_tabelas(conn)
+            criar_tabelas(conn)
+            conn.execute("INSERT INTO amostras VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         Amostra(61, 0, "sistema", 20, 100, None, None, None, None, None, None, 5.0, 7.0))
+            compactar(conn, 120)
+            agregada = conn.execute("SELECT n, rede_enviada_mb, rede_recebida_mb FROM amostras_agregadas "
+                                    "WHERE resolucao = 60 AND inicio = 60").fetchone()
+            conn.close()
+            if agregada != (1, 5.0, 7.0):
+                raise RuntimeError(f"Agregado inesperado apos a migracao: {agregada}")
+            self.log_ok("Banco de amostras antigo ganha as colunas de rede sem perder as amostras")
+        except Exception as err:
+            self.log_fail("Migracao das colunas de rede", err)
+
+    def teste_alertas(self) -> None:
+        try:
+            limitador = LimitadorAlertas(intervalo=300)
+            chave = ("cam1", "cpu")
+            avisos = [(t, limitador.avaliar(chave, t < 700, "CPU alta", t)) for t in range(0, 800, 2)]
+            emitidos = [(t, texto) for t, texto in avisos if texto]
+            tempos = [t for t, _ in emitidos]
+            if tempos != [0, 300, 600, 700] or not emitidos[-1][1].startswith("NORMALIZADO"):
+                raise RuntimeError(f"Avisos inesperados: {emitidos}")
+            if "150 amostra(s)" not in emitidos[1][1]:
+                raise RuntimeError(f"Lembrete sem a contagem de amostras: {emitidos[1][1]}")
+            self.log_ok(f"{len(emitidos)} avisos para 350 amostras em alerta (inicio, lembretes e normalizacao)")
+        except Exception as err:
+            self.log_fail("Limite de taxa dos alertas", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO MONITOR DE RECURSOS")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_consumo_")
+        try:
+            self.teste_processo_camera(diretorio)
+            self.teste_reducao_resolucao(diretorio)
+            self.teste_migracao(diretorio)
+            self.teste_alertas()
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteLogCpuMemoria().executar()
+
+
+if __name__ == "__main__":
+    main()
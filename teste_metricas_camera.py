@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DAS METRICAS DA CAMERA (ENDPOINT PROMETHEUS)
+
+Confere o metricas_camera: series expostas em GET /metrics (contadores, fps,
+histogramas cumulativos com +Inf == _count, medidores registrados e tracks
+por area), 404 fora do caminho; os eventos de permanencia e a latencia das
+gravacoes contados pelos dois trackers; e scrapes concorrentes com o loop
+escrevendo, sempre com histogramas consistentes.
+"""
+
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from metricas_camera import MetricasCamera, ServidorMetricas
+from permanence_tracker import ArrayPermanenceTracker, PermanenceTracker
+
+PERMANENCIA_CONFIG = {
+    "area_1": {"coordenadas": [[0, 0], [100, 0], [100, 100], [0, 100]], "timeout": 3},
+    "area_2": {"coordenadas": [[200, 0], [300, 0], [300, 100], [200, 100]], "timeout": 3},
+}
+
+
+class _FakeTensor:
+    def __init__(self, values) -> None:
+        self.values = np.asarray(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+class _FakeTrack:
+    def __init__(self, ids, centros) -> None:
+        self.boxes = type("Boxes", (), {})()
+        self.boxes.id = _FakeTensor(np.asarray(ids, dtype=np.float32))
+        self.boxes.xyxy = _FakeTensor(np.asarray([[x - 5, y - 5, x + 5, y + 5] for x, y in centros],
+                                                 dtype=np.float32).reshape(-1, 4))
+        self.boxes.cls = _FakeTensor(np.zeros(len(ids), dtype=np.float32))
+
+
+def _scrape(porta: int) -> dict:
+    """Le /metrics e devolve {serie_com_rotulos: valor}."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{porta}/metrics", timeout=5) as resposta:
+        tipo = resposta.headers["Content-Type"]
+        texto = resposta.read().decode("utf-8")
+    if not tipo.startswith("text/plain"):
+        raise RuntimeError(f"Content-Type inesperado: {tipo}")
+    series = {}
+    for linha in texto.splitlines():
+        if linha and not linha.startswith("#"):
+            nome, valor = linha.rsplit(" ", 1)
+            series[nome] = float(valor)
+    return series
+
+
+def _histograma(series: dict, nome: str) -> list[float]:
+    """Valores cumulativos dos buckets (na ordem) + _count; erro se nao for consistente."""
+    buckets = [valor for serie, valor in series.items() if serie.startswith(f"{nome}_bucket")]
+    contagem = series[f'{nome}_count{{camera="cam1"}}']
+    if buckets != sorted(buckets) or buckets[-1] != contagem:
+        raise RuntimeError(f"Histograma {nome} inconsistente: {buckets} / {contagem}")
+    return buckets
+
+
+class TesteMetricasCamera:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_endpoint(self) -> None:
+        servidor = None
+        try:
+            metricas = MetricasCamera("cam1", janela_taxas=0.2)
+            fila = [1, 2, 3]
+            metricas.registrar_medidor("fila_video", "Frames na fila.", lambda: len(fila))
+            metricas.registrar_medidor("tracks_ativos", "Tracks por area.", lambda: {"area_1": 2, "area_2": 0},
+                                       rotulo="area")
+            metricas.registrar_medidor("quebrado", "Medidor com erro.", lambda: 1 / 0)
+            servidor = ServidorMetricas(metricas, 0)
+            servidor.start()
+
+            for latencia in (0.02, 0.04, 0.04, 0.3, 5.0):
+                metricas.registrar_frame(latencia)
+            metricas.registrar_permanencia()
+            metricas.registrar_gravacao_db(0.002)
+            metricas.registrar_gravacao_db(0.5, ok=False)
+            metricas.registrar_reconexao()
+            time.sleep(0.25)
+            metricas.registrar_frame(0.05)
+
+            series = _scrape(servidor.porta)
+            esperado = {
+                'camera_frames_total{camera="cam1"}': 6,
+                'camera_eventos_permanencia_total{camera="cam1"}': 1,
+                'camera_falhas_gravacao_db_total{camera="cam1"}': 1,
+                'camera_reconexoes_total{camera="cam1"}': 1,
+                'camera_fila_video{camera="cam1"}': 3,
+                'camera_tracks_ativos{camera="cam1",area="area_1"}': 2,
+                'camera_tracks_ativos{camera="cam1",area="area_2"}': 0,
+                'camera_inferencia_segundos_bucket{camera="cam1",le="0.05"}': 4,
+                'camera_inferencia_segundos_bucket{camera="cam1",le="2.0"}': 5,
+                'camera_inferencia_segundos_bucket{camera="cam1",le="+Inf"}': 6,
+                'camera_gravacao_db_segundos_count{camera="cam1"}': 2,
+            }
+            diferentes = {serie: series.get(serie) for serie, valor in esperado.items() if series.get(serie) != valor}
+            if diferentes:
+                raise RuntimeError(f"Series inesperadas: {diferentes}")
+            if not series['camera_fps{camera="cam1"}'] > 0 or any("quebrado" in serie for serie in series):
+                raise RuntimeError("fps nao calculado ou medidor com erro exposto")
+            if abs(series['camera_inferencia_segundos_sum{camera="cam1"}'] - 5.45) > 1e-6:
+                raise RuntimeError("Soma do histograma de inferencia errada")
+            _histograma(series, "camera_inferencia_segundos")
+
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{servidor.porta}/outro", timeout=5)
+                raise RuntimeError("Caminho desconhecido nao devolveu 404")
+            except urllib.error.HTTPError as erro:
+                if erro.code != 404:
+                    raise
+            self.log_ok(f"{len(series)} series em /metrics (porta {servidor.porta}) com contadores, histogramas e medidores")
+        except Exception as err:
+            self.log_fail("Endpoint /metrics", err)
+        finally:
+            if servidor is not None:
+                servidor.stop()
+
+    def teste_trackers(self) -> None:
+        try:
+            resultados = {}
+            for tracker_cls in (PermanenceTracker, ArrayPermanenceTracker):
+                conn = sqlite3.connect(":memory:")
+                metricas = MetricasCamera("cam1")
+                tracker = tracker_cls(conn.cursor(), conn, 1724, PERMANENCIA_CONFIG, metricas=metricas)
+                inicio = datetime(2024, 1, 15, 10, 0, 0)
+                ativos = []
+                for i in range(40):
+                    ids, centros = [9], [(150, 150)]
+                    if i <= 10:
+                        ids.append(1)
+                        centros.append((50, 50))
+                    if 4 <= i <= 12:
+                        ids += [2, 3]
+                        centros += [(250, 50), (260, 60)]
+                    tracker.calculate_permanence([_FakeTrack(ids, centros)], inicio + timedelta(seconds=i * 0.5))
+                    ativos.append(tracker.tracks_por_area())
+                gravados = conn.execute("SELECT COUNT(*) FROM vehicle_counts WHERE tempo_permanencia IS NOT NULL").fetchone()[0]
+                conn.close()
+                if metricas.eventos_permanencia != gravados or sum(metricas.gravacao_db.buckets) != gravados:
+                    raise RuntimeError(f"{tracker_cls.__name__}: {metricas.eventos_permanencia} eventos contados, "
+                                       f"{gravados} gravados")
+                resultados[tracker_cls.__name__] = (gravados, ativos)
+            dict_, array = resultados.values()
+            if dict_ != array or dict_[0] != 3:
+                raise RuntimeError(f"Trackers divergentes ou contagem inesperada: {dict_[0]} x {array[0]}")
+            if dict_[1][8] != {"area_1": 1, "area_2": 2} or dict_[1][-1] != {"area_1": 0, "area_2": 0}:
+                raise RuntimeError(f"Tracks por area inesperados: {dict_[1][8]} / {dict_[1][-1]}")
+            self.log_ok(f"{dict_[0]} eventos de permanencia e tracks por area iguais nos dois trackers")
+        except Exception as err:
+            self.log_fail("Metricas dos trackers", err)
+
+    def teste_scrape_concorrente(self) -> None:
+        servidor = None
+        try:
+            metricas = MetricasCamera("cam1", janela_taxas=0.05)
+            servidor = ServidorMetricas(metricas, 0)
+            servidor.start()
+            parar = threading.Event()
+            frames = [0]
+
+            def loop() -> None:
+                while not parar.is_set():
+                    metricas.registrar_frame(0.001 * (frames[0] % 700))
+                    metricas.registrar_gravacao_db(0.0001 * (frames[0] % 300))
+                    frames[0] += 1
+
+            escritor = threading.Thread(target=loop)
+            escritor.start()
+            try:
+                scrapes = 0
+                anterior = 0
+                while scrapes < 50:
+                    series = _scrape(servidor.porta)
+                    total = _histograma(series, "camera_inferencia_segundos")[-1]
+                    _histograma(series, "camera_gravacao_db_segundos")
+                    if total < anterior:
+                        raise RuntimeError("Contagem do histograma diminuiu entre scrapes")
+                    anterior = total
+                    scrapes += 1
+            finally:
+                parar.set()
+                escritor.join()
+
+            inicio = time.perf_counter()
+            for i in range(100_000):
+                metricas.registrar_frame(0.05)
+            custo = (time.perf_counter() - inicio) / 100_000
+            self.log_ok(f"{scrapes} scrapes consistentes com {frames[0]} frames escritos em paralelo; "
+                        f"registrar_frame custa {custo * 1e6:.2f} us")
+        except Exception as err:
+            self.log_fail("Scrape concorrente com o loop", err)
+        finally:
+            if servidor is not None:
+                servidor.stop()
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DAS METRICAS DA CAMERA")
+        print("=" * 60)
+
+        self.teste_endpoint()
+        self.teste_trackers()
+        self.teste_scrape_concorrente()
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteMetricasCamera().executar()
+
+
+if __name__ == "__main__":
+    main()
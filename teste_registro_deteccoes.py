@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO REGISTRO E REPLAY DE DETECCOES
+
+Grava as deteccoes de um detector sintetico com GravadorDeteccoes, confere a
+leitura (inclusive frames vazios e bloco final truncado) e verifica se o
+reprocessamento do log pelo PipelineContagem grava em vehicle_counts as
+mesmas linhas da execucao original, inclusive com o relogio ao vivo
+reancorado no meio da gravacao (correcao de NTP).
+"""
+
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from deteccoes import DetectorSintetico, resultado_de_arrays
+from frame_clock import FrameClock
+from permanence_tracker import PermanenceTracker
+from pipeline_contagem import PipelineContagem, init_db
+from registro_deteccoes import GravadorDeteccoes, LeitorDeteccoes, segmentos_deteccoes
+from vehicle_code_resolver import VehicleCodeResolver
+
+CONFIG = {
+    "codigocliente": 1724,
+    "cameras": {"camera1": {"faixas": {
+        "faixa1": {"bus": 1, "cars": 2, "motorcycle": 3, "truck": 4, "vuc": 5},
+        "faixa2": {"bus": 6, "cars": 7, "motorcycle": 8, "truck": 9, "vuc": 10},
+    }}},
+}
+PERMANENCIA_CONFIG = {
+    "area_1": {"coordenadas": [[0, 0], [320, 0], [320, 480], [0, 480]], "timeout": 2},
+    "area_2": {"coordenadas": [[320, 0], [640, 0], [640, 480], [320, 480]], "timeout": 2},
+}
+FPS = 10.0
+
+
+def _executar_pipeline(db_path, clock, frames):
+    """Passa (ts, tracks) pelo PipelineContagem e retorna as linhas gravadas."""
+    conn, cursor = init_db(db_path)
+    tracker = PermanenceTracker(cursor, conn, 1724, PERMANENCIA_CONFIG, clock=clock)
+    resolver = VehicleCodeResolver(CONFIG, DetectorSintetico(640, 480).names)
+    pipeline = PipelineContagem(cursor, conn, tracker, resolver, PERMANENCIA_CONFIG)
+    for ts, tracks in frames:
+        pipeline.processar_frame(None, tracks, clock.tick(ts), desenhar=False)
+    rows = conn.execute(
+        "SELECT area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia FROM vehicle_counts ORDER BY id"
+    ).fetchall()
+    tracker.close()
+    return rows
+
+
+class TesteRegistroDeteccoes:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+        self.tmp = tempfile.mkdtemp(prefix="teste_detlog_")
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_ida_e_volta(self) -> None:
+        try:
+            caminho = os.path.join(self.tmp, "ida_volta.detlog")
+            names = {0: "bus", 1: "cars"}
+            clock = FrameClock(wall_anchor=1705312800.0, mono_anchor=0.0)
+            gravador = GravadorDeteccoes(caminho, names, clock, fps=FPS, frames_por_bloco=3)
+            caminho = gravador.caminho
+            esperado = []
+            for frame in range(1, 8):
+                n = frame % 3  # frames 3 e 6 ficam sem deteccoes
+                xyxy = np.arange(n * 4, dtype=np.float32).reshape(-1, 4) + frame
+                ids = np.arange(n) + 10 * frame
+                cls = np.arange(n) % 2
+                gravador.registrar(frame / FPS, resultado_de_arrays(xyxy, ids, cls, names))
+                esperado.append((frame, frame / FPS, xyxy, ids, cls))
+            gravador.close()
+
+            lidos = list(LeitorDeteccoes(caminho).frames())
+            if len(lidos) != len(esperado):
+                raise RuntimeError(f"Esperados {len(esperado)} frames, lidos {len(lidos)}")
+            for (frame, ts, xyxy, ids, cls), (l_frame, l_ts, l_xyxy, l_ids, l_cls, _) in zip(esperado, lidos):
+                if frame != l_frame or ts != l_ts or not np.array_equal(xyxy, l_xyxy) \
+                        or not np.array_equal(ids, l_ids) or not np.array_equal(cls, l_cls):
+                    raise RuntimeError(f"Frame {frame} divergente apos a leitura")
+
+            # Bloco final truncado (processo interrompido) deve ser ignorado
+            with open(caminho, "r+b") as f:
+                f.truncate(os.path.getsize(caminho) - 5)
+            truncados = list(LeitorDeteccoes(caminho).frames())
+            if len(truncados) != 6:
+                raise RuntimeError(f"Esperados 6 frames com o ultimo bloco truncado, lidos {len(truncados)}")
+
+            self.log_ok("Gravacao e leitura do log (frames vazios e bloco truncado)")
+        except Exception as err:
+            self.log_fail("Gravacao e leitura do log (frames vazios e bloco truncado)", err)
+
+    def teste_replay_equivalente(self) -> None:
+        try:
+            caminho = os.path.join(self.tmp, "replay.detlog")
+            detector = DetectorSintetico(640, 480, n_veiculos=6, semente=3)
+            clock = FrameClock(wall_anchor=1705312800.0, mono_anchor=0.0)
+            gravador = GravadorDeteccoes(caminho, detector.names, clock, fps=FPS)
+            caminho = gravador.caminho
+
+            def ao_vivo():
+                for frame in range(1, 601):
+                    ts = frame / FPS
+                    if frame == 300:
+                        # Correcao do relogio de parede: a reancoragem adianta os horarios em 40 min
+                        clock.reancorar(wall_anchor=clock.to_epoch(ts) + 2400, mono_anchor=ts)
+                    tracks = detector.track()
+                    gravador.registrar(ts, tracks)
+                    yield ts, tracks
+
+            rows_ao_vivo = _executar_pipeline(os.path.join(self.tmp, "ao_vivo.db"), clock, ao_vivo())
+            gravador.close()
+
+            leitor = LeitorDeteccoes(caminho)
+            clock_replay = FrameClock(wall_anchor=leitor.metadados["wall_anchor"], mono_anchor=leitor.metadados["mono_anchor"])
+            rows_replay = _executar_pipeline(os.path.join(self.tmp, "replay.db"), clock_replay,
+                                             leitor.resultados(clock_replay))
+            # So com a ancora inicial os horarios depois da correcao sairiam 40 min atrasados
+            clock_fixo = FrameClock(wall_anchor=leitor.metadados["wall_anchor"], mono_anchor=leitor.metadados["mono_anchor"])
+            rows_fixo = _executar_pipeline(os.path.join(self.tmp, "replay_fixo.db"), clock_fixo, leitor.resultados())
+
+            if not rows_ao_vivo or rows_ao_vivo == rows_fixo:
+                raise RuntimeError("Cenario nao gerou permanencias depois da reancoragem")
+            if rows_ao_vivo != rows_replay:
+                raise RuntimeError(f"Replay divergente: {len(rows_ao_vivo)} x {len(rows_replay)} linhas")
+
+            self.log_ok(f"Replay reproduz as {len(rows_ao_vivo)} linhas da execucao original (com reancoragem)")
+        except Exception as err:
+            self.log_fail("Replay reproduz as linhas da execucao original", err)
+
+    def teste_segmentos(self) -> None:
+        try:
+            # A camera reiniciada com o mesmo --record abre um segmento novo sem apagar os anteriores
+            base = os.path.join(self.tmp, "deteccoes_camera1.detlog")
+            names = {0: "bus", 1: "cars"}
+            caminhos = []
+            for execucao in range(3):
+                clock = FrameClock(wall_anchor=1705312800.0 + 3600 * execucao, mono_anchor=0.0)
+                gravador = GravadorDeteccoes(base, names, clock, fps=FPS)
+                for frame in range(1, 6 + execucao):
+                    xyxy = np.zeros((1, 4), dtype=np.float32) + frame
+                    gravador.registrar(frame / FPS, resultado_de_arrays(xyxy, np.array([execucao]), np.array([1]), names))
+                gravador.close()
+                caminhos.append(gravador.caminho)
+
+            if os.path.exists(base) or len(set(caminhos)) != 3:
+                raise RuntimeError(f"Segmentos sobrescritos ou com o nome base: {caminhos}")
+            segmentos = segmentos_deteccoes(base)
+            if segmentos != caminhos:
+                raise RuntimeError(f"Segmentos fora de ordem: {segmentos}")
+            por_segmento = [len(list(LeitorDeteccoes(segmento).frames())) for segmento in segmentos]
+            ancoras = [LeitorDeteccoes(segmento).metadados["wall_anchor"] for segmento in segmentos]
+            if por_segmento != [5, 6, 7] or ancoras != sorted(ancoras):
+                raise RuntimeError(f"Frames/ancoras por segmento inesperados: {por_segmento} {ancoras}")
+            if segmentos_deteccoes(caminhos[1]) != [caminhos[1]]:
+                raise RuntimeError("Um segmento informado diretamente deve ser lido sozinho")
+            self.log_ok(f"{len(segmentos)} execucoes com o mesmo --record em segmentos separados")
+        except Exception as err:
+            self.log_fail("Segmentos por execucao do --record", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO REGISTRO/REPLAY DE DETECCOES")
+        print("=" * 60)
+
+        self.teste_ida_e_volta()
+        self.teste_replay_equivalente()
+        self.teste_segmentos()
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    logging.disable(logging.WARNING)  # Silencia os avisos do pipeline durante o teste
+    TesteRegistroDeteccoes().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DA NORMALIZACAO DE TIMESTAMP EM SQL
+
+Confere que api_tempopermanencia.sql_timestamp_api (normalizacao feita pelo
+SQLite na consulta, com normalizar_timestamp apenas quando o SQL devolve NULL)
+entrega exatamente o mesmo timestamp que normalizar_timestamp em cada formato
+conhecido e nos casos de borda, e que migrar_timestamps regrava o banco com
+esses mesmos valores.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from api_tempopermanencia import migrar_timestamps, normalizar_timestamp, sql_timestamp_api
+from pipeline_contagem import init_db
+
+# Os oito primeiros sao os formatos gravados na pratica e devem ser resolvidos no SQL
+CASOS = [
+    "2024-01-05 10:20:30",
+    "2024-01-05T10:20:30",
+    "2024-01-05T10:20:30-03:00",
+    "2024-01-05T10:20:30+00:00",
+    "2024-01-05T10:20:30Z",
+    "2024-01-05T10:20:30.123456",
+    "2024-01-05T10:20:30.123-03:00",
+    "2024-01-05 10:20:30-03:00",
+    "2024-01-05 10:20:30.5",
+    "2024-01-05 10:20:30.123456+00:00",
+    "2024-02-29 23:59:59",
+    "2023-02-29 10:00:00",
+    "2024-02-31T10:00:00",
+    "2024-13-01 10:00:00",
+    "2024-01-05 24:00:00",
+    "0000-01-01T00:00:00",
+    "2024-1-5 10:20:30",
+    "2024-01-05",
+    "2024-01-05T10:20",
+    "05/01/2024 10:20:30",
+    "",
+    "abc",
+]
+
+
+class TesteTimestampAPI:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_mesmo_resultado(self) -> None:
+        try:
+            conn = sqlite3.connect(":memory:")
+            diferentes = []
+            no_sql = []
+            for caso in CASOS:
+                timestamp_api = conn.execute(
+                    f"WITH t(timestamp) AS (VALUES (?)) SELECT {sql_timestamp_api()} FROM t", (caso,)
+                ).fetchone()[0]
+                if timestamp_api is None:
+                    timestamp_api = normalizar_timestamp(caso)
+                else:
+                    no_sql.append(caso)
+                if timestamp_api != normalizar_timestamp(caso):
+                    diferentes.append((caso, timestamp_api, normalizar_timestamp(caso)))
+            conn.close()
+            if diferentes:
+                raise RuntimeError(f"Resultados diferentes (caso, sql, python): {diferentes}")
+            if not set(CASOS[:8]) <= set(no_sql):
+                raise RuntimeError(f"Formatos comuns nao resolvidos no SQL: {sorted(set(CASOS[:8]) - set(no_sql))}")
+            self.log_ok(f"{len(CASOS)} formatos com o mesmo resultado ({len(no_sql)} resolvidos no SQL)")
+        except Exception as err:
+            self.log_fail("Normalizacao em SQL igual a normalizar_timestamp", err)
+
+    def teste_migracao(self, diretorio: str) -> None:
+        try:
+            db_path = os.path.join(diretorio, "migracao.db")
+            conn, _ = init_db(db_path)
+            conn.executemany(
+                "INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado) "
+                "VALUES ('area_1', 26051, 0, 1, ?, 30.0, 0)", [(caso,) for caso in CASOS]
+            )
+            conn.commit()
+            conn.close()
+
+            convertidos, sem_formato = migrar_timestamps(db_path)
+            conn = sqlite3.connect(db_path)
+            migrados = [linha[0] for linha in conn.execute("SELECT timestamp FROM vehicle_counts ORDER BY id")]
+            conn.close()
+            esperados = [normalizar_timestamp(caso) for caso in CASOS]
+            if migrados != esperados:
+                raise RuntimeError(f"Banco migrado diferente do esperado: {list(zip(CASOS, migrados))}")
+            alterados = sum(caso != esperado for caso, esperado in zip(CASOS, esperados))
+            if convertidos != alterados:
+                raise RuntimeError(f"{convertidos} convertidos, esperado {alterados}")
+            if migrar_timestamps(db_path)[0] != 0:
+                raise RuntimeError("Segunda migracao converteu registros de novo")
+            self.log_ok(f"Migracao converteu {convertidos} registros ({sem_formato} sem formato reconhecido) e e idempotente")
+        except Exception as err:
+            self.log_fail("Migracao dos timestamps", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DA NORMALIZACAO DE TIMESTAMP EM SQL")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_timestamp_")
+        try:
+            self.teste_mesmo_resultado()
+            self.teste_migracao(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteTimestampAPI().executar()
+
+
+if __name__ == "__main__":
+    main()
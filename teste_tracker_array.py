@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DE EQUIVALENCIA ENTRE PermanenceTracker E ArrayPermanenceTracker
+
+Alimenta os dois trackers com a mesma sequencia sintetica de deteccoes e
+confere se as permanencias gravadas em vehicle_counts e as consultas
+publicas (has_vehicle_left, get_permanence_time) batem.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from permanence_tracker import PermanenceTracker, ArrayPermanenceTracker
+
+PERMANENCIA_CONFIG = {
+    "area_1": {"coordenadas": [[0, 0], [100, 0], [100, 100], [0, 100]], "timeout": 3},
+    "area_2": {"coordenadas": [[200, 0], [300, 0], [300, 100], [200, 100]], "timeout": 3},
+}
+
+
+class _FakeTensor:
+    """Imita o minimo da interface de tensor usada pelos trackers."""
+
+    def __init__(self, values) -> None:
+        self.values = np.asarray(values)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+class _FakeBoxes:
+    def __init__(self, ids, xyxy) -> None:
+        self.id = _FakeTensor(np.asarray(ids, dtype=np.float32)) if ids else None
+        self.xyxy = _FakeTensor(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        self.cls = _FakeTensor(np.zeros(len(ids), dtype=np.float32))
+
+
+class _FakeTrack:
+    def __init__(self, ids, xyxy) -> None:
+        self.boxes = _FakeBoxes(ids, xyxy)
+
+
+def _box(cx: float, cy: float) -> list[float]:
+    return [cx - 5, cy - 5, cx + 5, cy + 5]
+
+
+def _cenario() -> list[tuple[datetime, list]]:
+    """Track 1 passa 5s na area_1; track 2 passa 4s na area_2; track 3 fica so 1s."""
+    inicio = datetime(2024, 1, 15, 10, 0, 0)
+    frames = []
+    for i in range(40):
+        ts = inicio + timedelta(seconds=i * 0.5)
+        ids, boxes = [], []
+        if i <= 10:
+            ids.append(1)
+            boxes.append(_box(50, 50))
+        if 4 <= i <= 12:
+            ids.append(2)
+            boxes.append(_box(250, 50))
+        if 6 <= i <= 8:
+            ids.append(3)
+            boxes.append(_box(20, 20))
+        ids.append(9)  # sempre fora das areas
+        boxes.append(_box(150, 150))
+        frames.append((ts, [_FakeTrack(ids, boxes)]))
+    return frames
+
+
+class TesteTrackerArray:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    @staticmethod
+    def _executar(tracker_cls) -> tuple[list, list]:
+        conn = sqlite3.connect(":memory:")
+        tracker = tracker_cls(conn.cursor(), conn, 1724, PERMANENCIA_CONFIG)
+        consultas = []
+        for ts, tracks in _cenario():
+            tracker.calculate_permanence(tracks, ts)
+            for track_id in (1, 2, 3):
+                for area in PERMANENCIA_CONFIG:
+                    if tracker.get_vehicle_code(track_id, area) is None and not tracker.has_vehicle_left(track_id, area):
+                        tracker.set_vehicle_code(track_id, area, 26000 + track_id)
+                consultas.append(
+                    (track_id, sorted(tracker.get_permanence_time(track_id)),
+                     tracker.has_vehicle_left(track_id, "area_1"), tracker.has_vehicle_left(track_id, "area_2"))
+                )
+        rows = conn.execute(
+            "SELECT area, vehicle_code, count_out, timestamp, tempo_permanencia FROM vehicle_counts ORDER BY area, vehicle_code"
+        ).fetchall()
+        conn.close()
+        return rows, consultas
+
+    def teste_equivalencia(self) -> None:
+        try:
+            rows_dict, consultas_dict = self._executar(PermanenceTracker)
+            rows_array, consultas_array = self._executar(ArrayPermanenceTracker)
+
+            if len(rows_dict) != 2:
+                raise RuntimeError(f"Esperadas 2 permanencias no tracker dict, obtidas {rows_dict}")
+            if rows_dict != rows_array:
+                raise RuntimeError(f"Registros divergentes: dict={rows_dict} array={rows_array}")
+            if consultas_dict != consultas_array:
+                raise RuntimeError("Consultas publicas divergentes entre os trackers.")
+
+            self.log_ok("Equivalencia dict x array (vehicle_counts e consultas)")
+        except Exception as err:
+            self.log_fail("Equivalencia dict x array (vehicle_counts e consultas)", err)
+
+    @staticmethod
+    def _executar_reentrada(tracker_cls) -> tuple[list, list]:
+        """Track 1 reentra na area_1 depois do timeout; o codigo do track 4 e definido antes de ele aparecer."""
+        conn = sqlite3.connect(":memory:")
+        tracker = tracker_cls(conn.cursor(), conn, 1724, PERMANENCIA_CONFIG)
+        tracker.set_vehicle_code(4, "area_2", 26099)
+        inicio = datetime(2024, 1, 15, 10, 0, 0)
+        consultas = []
+        for i in range(50):
+            ids, boxes = [], []
+            if i <= 10 or 24 <= i <= 30:
+                ids.append(1)
+                boxes.append(_box(50, 50))
+            if 5 <= i <= 12:
+                ids.append(4)
+                boxes.append(_box(250, 50))
+            tracker.calculate_permanence([_FakeTrack(ids, boxes)] if ids else [], inicio + timedelta(seconds=i * 0.5))
+            if i == 0:
+                tracker.set_vehicle_code(1, "area_1", 26001)
+            consultas.append((tracker.get_vehicle_code(1, "area_1"), tracker.get_vehicle_code(4, "area_2"),
+                              tracker.has_vehicle_left(4, "area_2")))
+        rows = conn.execute(
+            "SELECT area, vehicle_code, tempo_permanencia FROM vehicle_counts ORDER BY area, vehicle_code"
+        ).fetchall()
+        conn.close()
+        return rows, consultas
+
+    def teste_reentrada(self) -> None:
+        try:
+            rows_dict, consultas_dict = self._executar_reentrada(PermanenceTracker)
+            rows_array, consultas_array = self._executar_reentrada(ArrayPermanenceTracker)
+
+            if [row[:2] for row in rows_dict] != [("area_1", 26001), ("area_2", 26099)]:
+                raise RuntimeError(f"Permanencias inesperadas no tracker dict: {rows_dict}")
+            if rows_dict != rows_array:
+                raise RuntimeError(f"Registros divergentes: dict={rows_dict} array={rows_array}")
+            if consultas_dict != consultas_array:
+                raise RuntimeError("Codigos/saidas divergentes entre os trackers.")
+            self.log_ok("Reentrada apos o timeout nao grava de novo e codigo definido antes do track aparecer")
+        except Exception as err:
+            self.log_fail("Reentrada e codigo antecipado (dict x array)", err)
+
+    def teste_free_list(self) -> None:
+        try:
+            conn = sqlite3.connect(":memory:")
+            tracker = ArrayPermanenceTracker(conn.cursor(), conn, 1724, PERMANENCIA_CONFIG, capacity=2)
+            inicio = datetime(2024, 1, 15, 10, 0, 0)
+
+            ids = list(range(1, 6))
+            tracker.calculate_permanence([_FakeTrack(ids, [_box(50, 50)] * len(ids))], inicio)
+            if len(tracker._track_ids) < 5:
+                raise RuntimeError("Capacidade nao foi ampliada.")
+
+            tracker.calculate_permanence([], inicio + timedelta(seconds=10))
+            if tracker._slots or len(tracker._free) != len(tracker._track_ids):
+                raise RuntimeError("Slots nao foram devolvidos para a free list apos o timeout.")
+
+            conn.close()
+            self.log_ok("Crescimento e free list do ArrayPermanenceTracker")
+        except Exception as err:
+            self.log_fail("Crescimento e free list do ArrayPermanenceTracker", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO ArrayPermanenceTracker")
+        print("=" * 60)
+
+        self.teste_equivalencia()
+        self.teste_reentrada()
+        self.teste_free_list()
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteTrackerArray().executar()
+
+
+if __name__ == "__main__":
+    main()
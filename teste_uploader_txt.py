@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO UPLOADER DE TXT
+
+Sobe um servidor HTTP local (stub) e confere o uploader_txt.UploaderTXT:
+entrega de todos os arquivos com hash (medindo arquivos/s), limite de envios
+simultaneos, reexecucao sem reenvio (estado no SQLite), novas tentativas com
+backoff em 503 e falha definitiva sem repeticao em 400.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from arquivo_txt import gravar_txt_com_hash, montar_txt
+from uploader_txt import UploaderTXT
+
+
+class ServidorStub:
+    """Servidor local que recebe os TXT e responde conforme respostas[nome] (lista consumida por envio)."""
+
+    def __init__(self, atraso=0.01):
+        self.recebidos = []
+        self.respostas = {}
+        self.simultaneos = 0
+        self.max_simultaneos = 0
+        self.hash_invalido = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                with stub._lock:
+                    stub.simultaneos += 1
+                    stub.max_simultaneos = max(stub.max_simultaneos, stub.simultaneos)
+                try:
+                    corpo = self.rfile.read(int(self.headers["Content-Length"]))
+                    mensagem = BytesParser(policy=HTTP).parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + corpo
+                    )
+                    parte = next(mensagem.iter_parts())
+                    nome = parte.get_filename()
+                    if hashlib.sha256(parte.get_payload(decode=True)).hexdigest().upper() != self.headers["X-Content-SHA256"]:
+                        stub.hash_invalido += 1
+                    time.sleep(atraso)
+                    with stub._lock:
+                        fila = stub.respostas.get(nome)
+                        status = fila.pop(0) if fila else 204
+                        stub.recebidos.append((nome, status))
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                finally:
+                    with stub._lock:
+                        stub.simultaneos -= 1
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/upload"
+        self._thread = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def _criar_arquivos(pasta, quantidade):
+    nomes = []
+    for i in range(quantidade):
+        prefixo = f"1724_202401{1 + i // 48:02d}{(i % 48) // 2:02d}{30 * (i % 2):02d}00"
+        linhas = [f"{26051 + c};2024-01-01 00:30:00;{i % 7};{c};" for c in range(10)]
+        nomes.append(os.path.basename(gravar_txt_com_hash(pasta, prefixo, montar_txt("1724", linhas), fsync=False)))
+    return nomes
+
+
+class TesteUploaderTXT:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_entrega_idempotente(self, diretorio: str) -> None:
+        servidor = ServidorStub()
+        try:
+            pasta = os.path.join(diretorio, "entrega")
+            nomes = _criar_arquivos(pasta, 96)
+            # Temporario e arquivo sem hash no nome nao sao enviados
+            open(os.path.join(pasta, ".1724_20240101003000.123.tmp"), "w").close()
+            open(os.path.join(pasta, "1724_20240101003000.txt"), "w").close()
+
+            estado = os.path.join(diretorio, "entrega.db")
+            uploader = UploaderTXT(pasta, servidor.url, estado, concorrencia=4, backoff_inicial=0.01)
+            inicio = time.perf_counter()
+            resultados = asyncio.run(uploader.executar_uma_vez())
+            duracao = time.perf_counter() - inicio
+            uploader.close()
+
+            if sorted(r.nome_arquivo for r in resultados if r.entregue) != sorted(nomes):
+                raise RuntimeError("Nem todos os arquivos com hash foram entregues")
+            if sorted(nome for nome, _ in servidor.recebidos) != sorted(nomes):
+                raise RuntimeError(f"Servidor recebeu {len(servidor.recebidos)} envio(s) para {len(nomes)} arquivo(s)")
+            if servidor.max_simultaneos > 4:
+                raise RuntimeError(f"{servidor.max_simultaneos} envios simultaneos com concorrencia 4")
+            if servidor.hash_invalido:
+                raise RuntimeError("Cabecalho X-Content-SHA256 diferente do conteudo enviado")
+
+            # Nova execucao (novo processo): nada e reenviado
+            uploader = UploaderTXT(pasta, servidor.url, estado, concorrencia=4)
+            repetidos = asyncio.run(uploader.executar_uma_vez())
+            uploader.close()
+            if repetidos or len(servidor.recebidos) != len(nomes):
+                raise RuntimeError(f"Reexecucao reenviou {len(repetidos)} arquivo(s)")
+            self.log_ok(f"Entrega de {len(nomes)} arquivos sem reenvio na reexecucao "
+                        f"({len(nomes) / duracao:.0f} arquivos/s, max {servidor.max_simultaneos} simultaneos)")
+        except Exception as err:
+            self.log_fail("Entrega de arquivos sem reenvio na reexecucao", err)
+        finally:
+            servidor.parar()
+
+    def teste_novas_tentativas(self, diretorio: str) -> None:
+        servidor = ServidorStub(atraso=0)
+        try:
+            pasta = os.path.join(diretorio, "tentativas")
+            instavel, rejeitado, normal = _criar_arquivos(pasta, 3)
+            servidor.respostas = {instavel: [503, 503], rejeitado: [400]}
+
+            estado = os.path.join(diretorio, "tentativas.db")
+            uploader = UploaderTXT(pasta, servidor.url, estado, tentativas=5, backoff_inicial=0.01)
+            resultados = {r.nome_arquivo: r for r in asyncio.run(uploader.executar_uma_vez())}
+            if not resultados[instavel].entregue or resultados[instavel].tentativas != 3:
+                raise RuntimeError(f"503 deveria ser repetido ate entregar: {resultados[instavel]}")
+            if resultados[rejeitado].entregue or resultados[rejeitado].tentativas != 1:
+                raise RuntimeError(f"400 nao deveria ser repetido: {resultados[rejeitado]}")
+            if not resultados[normal].entregue:
+                raise RuntimeError("Arquivo sem falha nao foi entregue")
+
+            # Na execucao seguinte so o arquivo nao entregue volta a ser enviado
+            reenvio = asyncio.run(uploader.executar_uma_vez())
+            estado_rejeitado = uploader.conn.execute(
+                "SELECT status, tentativas FROM entregas WHERE nome_arquivo = ?", (rejeitado,)
+            ).fetchone()
+            uploader.close()
+            if [r.nome_arquivo for r in reenvio] != [rejeitado] or not reenvio[0].entregue:
+                raise RuntimeError(f"Reexecucao deveria reenviar apenas {rejeitado}")
+            if estado_rejeitado != ("entregue", 2):
+                raise RuntimeError(f"Estado do arquivo reenviado inesperado: {estado_rejeitado}")
+            self.log_ok("503 repetido com backoff, 400 sem repeticao e reenviado na execucao seguinte")
+        except Exception as err:
+            self.log_fail("503 repetido com backoff, 400 sem repeticao e reenviado na execucao seguinte", err)
+        finally:
+            servidor.parar()
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO UPLOADER DE TXT")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_uploader_")
+        try:
+            self.teste_entrega_idempotente(diretorio)
+            self.teste_novas_tentativas(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteUploaderTXT().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO VEHICLE CODE RESOLVER
+
+Confere a tabela area x classe -> vehicle_code montada pelo VehicleCodeResolver
+a partir das faixas do arquivo de configuracao: variacoes de singular/plural,
+classes sem mapeamento (-1, reportadas uma unica vez no bug_vehicle_code),
+areas sem faixa (None) e classes mapeadas para 0 ou vazio (0).
+"""
+
+import contextlib
+import io
+import logging
+
+from vehicle_code_resolver import CODIGO_NAO_MAPEADO, VehicleCodeResolver
+
+NAMES = {0: "bus", 1: "cars", 2: "motorcycle", 3: "truck", 4: "vuc", 5: "bicycle"}
+CONFIG = {
+    "cameras": {"camera1": {"faixas": {
+        # "car" e "motorcycles": a classe do modelo so e achada por variacao
+        "faixa1": {"bus": 1, "car": 2, "motorcycles": 3, "truck": 0, "vuc": ""},
+        "faixa2": {"bus": 6, "cars": 7, "motorcycle": 8, "truck": 9, "vuc": 10},
+    }}},
+}
+
+
+class _Registros(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__(logging.DEBUG)
+        self.registros = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.registros.append(record)
+
+
+def _resolver(classes=None):
+    """Monta o resolver capturando o que foi logado no bug_vehicle_code."""
+    logger = logging.getLogger("bug_vehicle_code")
+    handler = _Registros()
+    nivel = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            resolver = VehicleCodeResolver(CONFIG, NAMES, classes=classes)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(nivel)
+    return resolver, handler.registros
+
+
+class TesteVehicleCodeResolver:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_variacoes(self) -> None:
+        try:
+            resolver, _ = _resolver()
+            esperado = {("area_1", 0): 1, ("area_1", 1): 2, ("area_1", 2): 3,
+                        ("area_2", 0): 6, ("area_2", 1): 7, ("area_2", 2): 8}
+            for (area, class_id), codigo in esperado.items():
+                if resolver.code(area, class_id) != codigo or resolver.code_by_name(area, NAMES[class_id]) != codigo:
+                    raise RuntimeError(f"{area}/{NAMES[class_id]}: {resolver.code(area, class_id)} != {codigo}")
+            self.log_ok("Variacoes de singular/plural ('cars'->'car', 'motorcycle'->'motorcycles')")
+        except Exception as err:
+            self.log_fail("Variacoes de singular/plural", err)
+
+    def teste_nao_mapeado(self) -> None:
+        try:
+            resolver, registros = _resolver()
+            if resolver.code("area_1", 5) != CODIGO_NAO_MAPEADO or resolver.code_by_name("area_2", "bicycle") != CODIGO_NAO_MAPEADO:
+                raise RuntimeError("Classe ausente das faixas deveria resolver para -1")
+            if resolver.code("area_1", 99) != CODIGO_NAO_MAPEADO or resolver.code_by_name("area_1", "trem") != CODIGO_NAO_MAPEADO:
+                raise RuntimeError("Classe desconhecida do modelo deveria resolver para -1")
+            erros = [r.getMessage() for r in registros if r.levelno == logging.ERROR]
+            if len(erros) != 2 or not all("'bicycle'" in erro for erro in erros):
+                raise RuntimeError(f"Classes sem mapeamento reportadas: {erros}")
+            # Classe fora das contadas: continua -1, mas nao e reportada
+            resolver, registros = _resolver(classes=[0, 1, 2, 3, 4])
+            if resolver.unmapped or any(r.levelno == logging.ERROR for r in registros):
+                raise RuntimeError(f"Classe nao contada reportada: {resolver.unmapped}")
+            if resolver.code("area_1", 5) != CODIGO_NAO_MAPEADO:
+                raise RuntimeError("Classe nao contada deveria resolver para -1")
+            self.log_ok("Classe sem mapeamento resolve para -1 e e reportada uma vez por area (so se contada)")
+        except Exception as err:
+            self.log_fail("Classe sem mapeamento", err)
+
+    def teste_area_sem_faixa(self) -> None:
+        try:
+            resolver, _ = _resolver()
+            if resolver.code("area_3", 1) is not None or resolver.code_by_name("area_3", "cars") is not None:
+                raise RuntimeError("Area sem faixa deveria resolver para None")
+            if resolver.code_by_name("area_3", "trem") is not None:
+                raise RuntimeError("Area sem faixa com classe desconhecida deveria resolver para None")
+            self.log_ok("Area sem faixa resolve para None")
+        except Exception as err:
+            self.log_fail("Area sem faixa", err)
+
+    def teste_codigo_zero(self) -> None:
+        try:
+            resolver, _ = _resolver()
+            if resolver.code("area_1", 3) != 0 or resolver.code_by_name("area_1", "truck") != 0:
+                raise RuntimeError(f"Classe mapeada para 0: {resolver.code('area_1', 3)}")
+            if resolver.code("area_1", 4) != 0 or resolver.code_by_name("area_1", "vuc") != 0:
+                raise RuntimeError(f"Classe mapeada para vazio: {resolver.code('area_1', 4)}")
+            if any(class_id in (3, 4) for _, _, class_id, _, _ in resolver.unmapped):
+                raise RuntimeError("Classe mapeada para 0/vazio reportada como sem mapeamento")
+            self.log_ok("Classe mapeada para 0 ou vazio resolve para 0 (nao para -1)")
+        except Exception as err:
+            self.log_fail("Classe mapeada para 0 ou vazio", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO VEHICLE CODE RESOLVER")
+        print("=" * 60)
+
+        self.teste_variacoes()
+        self.teste_nao_mapeado()
+        self.teste_area_sem_faixa()
+        self.teste_codigo_zero()
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteVehicleCodeResolver().executar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TESTE DO REPOSITORIO DE vehicle_counts
+
+Confere os ids devolvidos pelas gravacoes em lote (record_entries/record_exits/
+record_events), a regra de permanencia do record_dwell (completa a saida sem
+tempo dentro da janela ou insere uma nova) e a migracao de colunas de bancos
+antigos pelo ensure_schema.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from vehicle_counts_repository import VehicleCountsRepository
+
+
+def _linhas(conn, ids):
+    marcadores = ",".join("?" * len(ids))
+    return conn.execute(
+        f"SELECT id, area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado "
+        f"FROM vehicle_counts WHERE id IN ({marcadores}) ORDER BY id",
+        ids,
+    ).fetchall()
+
+
+class TesteVehicleCountsRepository:
+    def __init__(self) -> None:
+        self.success = 0
+        self.failures = []
+
+    def log_ok(self, mensagem: str) -> None:
+        self.success += 1
+        print(f"OK  - {mensagem}")
+
+    def log_fail(self, mensagem: str, erro: Exception) -> None:
+        self.failures.append(f"{mensagem}: {erro}")
+        print(f"ERRO - {mensagem}: {erro}")
+
+    def teste_eventos(self, diretorio: str) -> None:
+        try:
+            conn = sqlite3.connect(os.path.join(diretorio, "eventos.db"))
+            repo = VehicleCountsRepository(conn)
+            repo.ensure_schema()
+
+            ts = "2024-01-15 10:00:00"
+            entradas = repo.record_entries("area_1", 26051, 3, ts)
+            saidas = repo.record_exits("area_2", 26052, 2, ts)
+            mistos = repo.record_events([("area_1", 26053, 1, 0, ts), ("area_2", 26053, 0, 1, ts)])
+            if repo.record_events([]) != []:
+                raise RuntimeError("Lote vazio deveria devolver []")
+
+            esperado = [
+                *[(i, "area_1", 26051, 1, 0, ts, None, 0) for i in entradas],
+                *[(i, "area_2", 26052, 0, 1, ts, None, 0) for i in saidas],
+                (mistos[0], "area_1", 26053, 1, 0, ts, None, 0),
+                (mistos[1], "area_2", 26053, 0, 1, ts, None, 0),
+            ]
+            if _linhas(conn, entradas + saidas + mistos) != esperado:
+                raise RuntimeError("Linhas gravadas nao correspondem aos ids devolvidos")
+            if entradas + saidas + mistos != list(range(1, 8)):
+                raise RuntimeError(f"Ids inesperados: {entradas + saidas + mistos}")
+            conn.close()
+            self.log_ok("Gravacao em lote devolve os ids das linhas criadas")
+        except Exception as err:
+            self.log_fail("Gravacao em lote devolve os ids das linhas criadas", err)
+
+    def teste_permanencia(self, diretorio: str) -> None:
+        try:
+            conn = sqlite3.connect(os.path.join(diretorio, "permanencia.db"))
+            repo = VehicleCountsRepository(conn)
+            repo.ensure_schema()
+
+            (saida,) = repo.record_exits("area_1", 26051, 1, "2024-01-15 10:00:00")
+            # Dentro da janela: completa a saida registrada pela contagem
+            rec_id, atualizado = repo.record_dwell("area_1", 26051, "2024-01-15 10:20:00", 42.5)
+            if (rec_id, atualizado) != (saida, True):
+                raise RuntimeError(f"Esperado atualizar {saida}, obtido {(rec_id, atualizado)}")
+            # Sem saida pendente (ja preenchida): insere uma nova
+            novo, atualizado = repo.record_dwell("area_1", 26051, "2024-01-15 10:21:00", 10.0)
+            if atualizado or novo == saida:
+                raise RuntimeError("Saida ja preenchida nao deveria ser reaproveitada")
+            # Fora da janela de 1800s: insere em vez de atualizar
+            (antiga,) = repo.record_exits("area_2", 26052, 1, "2024-01-15 09:00:00")
+            fora, atualizado = repo.record_dwell("area_2", 26052, "2024-01-15 10:00:01", 5.0)
+            if atualizado or fora == antiga:
+                raise RuntimeError("Saida fora da janela nao deveria ser atualizada")
+
+            linhas = _linhas(conn, [saida, novo, antiga, fora])
+            if [linha[6] for linha in linhas] != [42.5, 10.0, None, 5.0]:
+                raise RuntimeError(f"Tempos gravados inesperados: {linhas}")
+            if linhas[0][5] != "2024-01-15 10:20:00":
+                raise RuntimeError("Timestamp da saida atualizada deveria ser o da permanencia")
+            conn.close()
+            self.log_ok("record_dwell atualiza a saida pendente na janela ou insere")
+        except Exception as err:
+            self.log_fail("record_dwell atualiza a saida pendente na janela ou insere", err)
+
+    def teste_migracao(self, diretorio: str) -> None:
+        try:
+            conn = sqlite3.connect(os.path.join(diretorio, "antigo.db"))
+            conn.execute(
+                "CREATE TABLE vehicle_counts (id INTEGER PRIMARY KEY AUTOINCREMENT, area TEXT, "
+                "vehicle_code INTEGER, count_in INTEGER, count_out INTEGER, timestamp TEXT)"
+            )
+            conn.commit()
+            repo = VehicleCountsRepository(conn)
+            adicionadas = repo.ensure_schema()
+            if adicionadas != ["tempo_permanencia", "enviado"] or repo.ensure_schema() != []:
+                raise RuntimeError(f"Colunas adicionadas inesperadas: {adicionadas}")
+            conn.close()
+            self.log_ok("ensure_schema adiciona as colunas de bancos antigos uma unica vez")
+        except Exception as err:
+            self.log_fail("ensure_schema adiciona as colunas de bancos antigos uma unica vez", err)
+
+    def executar(self) -> None:
+        print("INICIANDO TESTES DO REPOSITORIO DE vehicle_counts")
+        print("=" * 60)
+
+        diretorio = tempfile.mkdtemp(prefix="teste_repositorio_")
+        try:
+            self.teste_eventos(diretorio)
+            self.teste_permanencia(diretorio)
+            self.teste_migracao(diretorio)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+        print("\n" + "=" * 60)
+        print(f"RESULTADO: {self.success} sucesso(s), {len(self.failures)} falha(s)")
+        if self.failures:
+            print("\nFalhas encontradas:")
+            for erro in self.failures:
+                print(f"  - {erro}")
+        else:
+            print("\nTodos os testes passaram.")
+
+
+def main() -> None:
+    TesteVehicleCountsRepository().executar()
+
+
+if __name__ == "__main__":
+    main()
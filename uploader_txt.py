@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Envia ao servidor central os TXT de meia hora gerados pelo dbexport_halfhour.py.
+
+Varre o diretorio de saida (os.scandir), seleciona os arquivos ja com o nome
+final '{cliente}_{YYYYMMDDHHMMSS}_{SHA256}.txt' (temporarios e arquivos sem
+hash sao ignorados) e envia os que ainda nao foram entregues:
+
+- envio assincrono (asyncio) com no maximo --concorrencia envios simultaneos;
+  cada envio roda o requests em um pool de threads, com uma sessao HTTP
+  (conexao reaproveitada) por thread;
+- falhas de rede, HTTP 429 e 5xx sao repetidas com backoff exponencial
+  (--backoff_inicial, dobrando ate --backoff_max) ate --tentativas; outros 4xx
+  nao sao repetidos na mesma execucao;
+- o estado de cada arquivo (entregue/falha, tentativas, ultimo erro) fica em um
+  SQLite (--estado): uma nova execucao pula o que ja foi entregue e so reenvia
+  um arquivo entregue se o conteudo (hash) mudar;
+- cada envio leva o hash no cabecalho X-Content-SHA256, para o servidor
+  descartar repeticoes.
+
+Com --vigiar o diretorio e varrido de novo a cada --intervalo segundos.
+
+Exemplos:
+    python uploader_txt.py --pasta C:\\MaisFluxoLocal\\RetornoTXT --url https://servidor/upload
+    python uploader_txt.py --pasta C:\\MaisFluxoLocal\\RetornoTXT --url https://servidor/upload --vigiar --intervalo 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+
+from conexao_db import abrir_escrita
+
+logger = logging.getLogger("uploader_txt")
+
+# Nome final gerado por arquivo_txt.gravar_txt_com_hash
+PADRAO_ARQUIVO = re.compile(r"^\d+_\d{14}_(?P<hash>[0-9A-F]{64})\.txt$")
+# Respostas que valem nova tentativa (alem de erros de rede)
+STATUS_REPETIR = {408, 429, 500, 502, 503, 504}
+
+_CRIAR_ENTREGAS = """CREATE TABLE IF NOT EXISTS entregas (
+                        nome_arquivo TEXT PRIMARY KEY,
+                        hash TEXT NOT NULL,
+                        tamanho INTEGER,
+                        status TEXT NOT NULL,
+                        tentativas INTEGER NOT NULL DEFAULT 0,
+                        ultimo_erro TEXT,
+                        atualizado_em TEXT)"""
+_REGISTRAR_ENTREGA = """INSERT INTO entregas (nome_arquivo, hash, tamanho, status, tentativas, ultimo_erro, atualizado_em)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(nome_arquivo) DO UPDATE SET
+                            hash = excluded.hash, tamanho = excluded.tamanho, status = excluded.status,
+                            tentativas = entregas.tentativas + excluded.tentativas,
+                            ultimo_erro = excluded.ultimo_erro, atualizado_em = excluded.atualizado_em"""
+
+
+@dataclass
+class ResultadoEnvio:
+    nome_arquivo: str
+    entregue: bool
+    tentativas: int
+    erro: str | None = None
+
+
+class UploaderTXT:
+    def __init__(self, pasta: str, url: str, estado_path: str, concorrencia: int = 4, tentativas: int = 5,
+                 backoff_inicial: float = 1.0, backoff_max: float = 60.0, timeout: float = 30.0,
+                 auth: tuple[str, str] | None = None) -> None:
+        """
+        :param pasta: Diretorio de saida dos TXT
+        :param url: Endereco que recebe os arquivos (POST multipart, campo 'arquivo')
+        :param estado_path: Banco SQLite com o estado das entregas
+        :param concorrencia: Maximo de envios simultaneos
+        :param tentativas: Tentativas por arquivo em cada execucao
+        :param backoff_inicial: Espera (s) antes da segunda tentativa; dobra a cada nova falha
+        :param backoff_max: Espera maxima (s) entre tentativas
+        :param timeout: Timeout (s) de cada requisicao
+        :param auth: (usuario, senha) para autenticacao basica, ou None
+        """
+        self.pasta = pasta
+        self.url = url
+        self.concorrencia = concorrencia
+        self.tentativas = tentativas
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.auth = auth
+
+        # O estado e gravado apenas pela thread do loop asyncio
+        self.conn = abrir_escrita(estado_path)
+        self.conn.execute(_CRIAR_ENTREGAS)
+        self.conn.commit()
+
+        self._executor = ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="uploader_txt")
+        self._sessoes = threading.local()
+        self._em_envio: set[str] = set()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+    # ------------------------------------------------------------------ #
+    # Selecao dos arquivos
+    # ------------------------------------------------------------------ #
+    def entregues(self) -> dict[str, str]:
+        """{nome_arquivo: hash} dos arquivos ja entregues."""
+        return dict(self.conn.execute("SELECT nome_arquivo, hash FROM entregas WHERE status = 'entregue'"))
+
+    def pendentes(self) -> list[tuple[str, str, str, int]]:
+        """Arquivos com nome final e ainda nao entregues: [(nome, caminho, hash, tamanho)], em ordem de nome."""
+        entregues = self.entregues()
+        pendentes = []
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                combinacao = PADRAO_ARQUIVO.match(entrada.name)
+                if combinacao is None or not entrada.is_file() or entrada.name in self._em_envio:
+                    continue
+                if entregues.get(entrada.name) == combinacao.group("hash"):
+                    continue
+                pendentes.append((entrada.name, entrada.path, combinacao.group("hash"), entrada.stat().st_size))
+        pendentes.sort()
+        return pendentes
+
+    # ------------------------------------------------------------------ #
+    # Envio
+    # ------------------------------------------------------------------ #
+    def _sessao(self) -> requests.Session:
+        sessao = getattr(self._sessoes, "sessao", None)
+        if sessao is None:
+            sessao = requests.Session()
+            if self.auth:
+                sessao.auth = self.auth
+            self._sessoes.sessao = sessao
+        return sessao
+
+    def _postar(self, nome_arquivo: str, caminho: str, file_hash: str) -> requests.Response:
+        """Executado nas threads do pool: uma requisicao HTTP."""
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        return self._sessao().post(
+            self.url,
+            files={"arquivo": (nome_arquivo, conteudo, "text/plain")},
+            headers={"X-Content-SHA256": file_hash},
+            timeout=self.timeout,
+        )
+
+    def espera(self, tentativa: int) -> float:
+        """Espera (s) antes da tentativa seguinte a de numero tentativa (1, 2, ...)."""
+        return min(self.backoff_max, self.backoff_inicial * 2 ** (tentativa - 1))
+
+    async def enviar(self, nome_arquivo: str, caminho: str, file_hash: str, tamanho: int,
+                     semaforo: asyncio.Semaphore) -> ResultadoEnvio:
+        """Envia um arquivo com novas tentativas e registra o resultado no estado."""
+        loop = asyncio.get_running_loop()
+        erro = None
+        tentativa = 0
+        while tentativa < self.tentativas:
+            tentativa += 1
+            async with semaforo:
+                try:
+                    resposta = await loop.run_in_executor(self._executor, self._postar, nome_arquivo, caminho, file_hash)
+                except (requests.RequestException, OSError) as e:
+                    erro, repetir = f"{type(e).__name__}: {e}", True
+                else:
+                    if 200 <= resposta.status_code < 300:
+                        erro = None
+                        break
+                    erro = f"HTTP {resposta.status_code}: {resposta.text[:200]}"
+                    repetir = resposta.status_code in STATUS_REPETIR
+            if not repetir or tentativa >= self.tentativas:
+                break
+            # A espera fica fora do semaforo: nao ocupa uma vaga de envio
+            logger.warning(f"Falha ao enviar {nome_arquivo} (tentativa {tentativa}): {erro}")
+            await asyncio.sleep(self.espera(tentativa))
+
+        entregue = erro is None
+        self.conn.execute(_REGISTRAR_ENTREGA, (
+            nome_arquivo, file_hash, tamanho, "entregue" if entregue else "falha", tentativa, erro,
+            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        ))
+        self.conn.commit()
+        if entregue:
+            logger.info(f"Arquivo entregue: {nome_arquivo} ({tentativa} tentativa(s))")
+        else:
+            logger.error(f"Arquivo nao entregue: {nome_arquivo} ({tentativa} tentativa(s)): {erro}")
+        return ResultadoEnvio(nome_arquivo, entregue, tentativa, erro)
+
+    async def executar_uma_vez(self) -> list[ResultadoEnvio]:
+        """Envia todos os arquivos pendentes da pasta."""
+        pendentes = self.pendentes()
+        if not pendentes:
+            return []
+        semaforo = asyncio.Semaphore(self.concorrencia)
+        self._em_envio.update(nome for nome, *_ in pendentes)
+        try:
+            return await asyncio.gather(*(
+                self.enviar(nome, caminho, file_hash, tamanho, semaforo)
+                for nome, caminho, file_hash, tamanho in pendentes
+            ))
+        finally:
+            self._em_envio.difference_update(nome for nome, *_ in pendentes)
+
+    async def vigiar(self, intervalo: float) -> None:
+        """Varre a pasta a cada intervalo segundos e envia os arquivos novos (ate ser interrompido)."""
+        while True:
+            inicio = time.perf_counter()
+            resultados = await self.executar_uma_vez()
+            if resultados:
+                imprimir_resumo(resultados, time.perf_counter() - inicio)
+            await asyncio.sleep(intervalo)
+
+
+def imprimir_resumo(resultados: list[ResultadoEnvio], duracao: float) -> None:
+    entregues = sum(1 for r in resultados if r.entregue)
+    repetidos = sum(1 for r in resultados if r.tentativas > 1)
+    print(f"{entregues}/{len(resultados)} arquivo(s) entregue(s) em {duracao:.1f}s "
+          f"({len(resultados) / max(duracao, 1e-9):.1f} arquivos/s), {repetidos} com nova(s) tentativa(s).")
+    for r in resultados:
+        if not r.entregue:
+            print(f"  NAO ENTREGUE: {r.nome_arquivo} ({r.tentativas} tentativa(s)): {r.erro}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Envia os TXT exportados ao servidor central.")
+    parser.add_argument("--pasta", type=str, required=True, help="Diretorio de saida dos TXT (o --output_directory do dbexport_halfhour.py).")
+    parser.add_argument("--url", type=str, required=True, help="Endereco que recebe os arquivos (POST multipart, campo 'arquivo').")
+    parser.add_argument("--estado", type=str, default="uploader_txt.db", help="Banco SQLite com o estado das entregas.")
+    parser.add_argument("--usuario", type=str, default=os.getenv("UPLOAD_USUARIO"), help="Usuario da autenticacao basica (padrao: UPLOAD_USUARIO).")
+    parser.add_argument("--senha", type=str, default=os.getenv("UPLOAD_SENHA"), help="Senha da autenticacao basica (padrao: UPLOAD_SENHA).")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Maximo de envios simultaneos.")
+    parser.add_argument("--tentativas", type=int, default=5, help="Tentativas por arquivo em cada execucao.")
+    parser.add_argument("--backoff_inicial", type=float, default=1.0, help="Espera (s) antes da segunda tentativa; dobra a cada falha.")
+    parser.add_argument("--backoff_max", type=float, default=60.0, help="Espera maxima (s) entre tentativas.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout (s) de cada requisicao.")
+    parser.add_argument("--vigiar", action="store_true", help="Continua varrendo a pasta a cada --intervalo segundos.")
+    parser.add_argument("--intervalo", type=float, default=60.0, help="Intervalo (s) entre varreduras com --vigiar.")
+    parser.add_argument("--log", type=str, default=os.path.join("log", "uploader_txt.log"), help="Arquivo de log.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    os.makedirs(os.path.dirname(args.log) or ".", exist_ok=True)
+    logging.basicConfig(level=logging.INFO, filename=args.log, filemode="a",
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+
+    auth = (args.usuario, args.senha) if args.usuario else None
+    uploader = UploaderTXT(args.pasta, args.url, args.estado, args.concorrencia, args.tentativas,
+                           args.backoff_inicial, args.backoff_max, args.timeout, auth)
+    try:
+        if args.vigiar:
+            asyncio.run(uploader.vigiar(args.intervalo))
+        else:
+            inicio = time.perf_counter()
+            resultados = asyncio.run(uploader.executar_uma_vez())
+            if resultados:
+                imprimir_resumo(resultados, time.perf_counter() - inicio)
+            else:
+                print("Nenhum arquivo pendente.")
+            if any(not r.entregue for r in resultados):
+                raise SystemExit(1)
+    except KeyboardInterrupt:
+        print("Interrompido.")
+    finally:
+        uploader.close()
+
+
+if __name__ == "__main__":
+    main()
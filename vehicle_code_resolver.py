@@ -0,0 +1,116 @@
+import logging
+import numpy as np
+
+bug_logger = logging.getLogger("bug_vehicle_code")
+
+# Mapeamento padrão de área de contagem para faixa do arquivo de configuração
+AREA_TO_FAIXA = {
+    'area_1': 'faixa1',
+    'area_2': 'faixa2'
+}
+
+# Código usado quando a classe não tem correspondência na faixa
+CODIGO_NAO_MAPEADO = -1
+
+
+def class_name_variations(class_name):
+    """
+    Variações de plural/singular testadas (em ordem de prioridade) ao procurar
+    o nome da classe YOLO nas faixas do arquivo de configuração.
+    """
+    return [
+        class_name,                              # Original (ex: "cars")
+        class_name.rstrip('s'),                  # Sem 's' final (ex: "car")
+        class_name + 's',                        # Com 's' final (ex: "motorcycles")
+        class_name.replace('cycle', 'cycles'),   # Plural irregular (ex: "motorcycles")
+        class_name.replace('cycles', 'cycle')    # Singular irregular (ex: "motorcycle")
+    ]
+
+
+class VehicleCodeResolver:
+    def __init__(self, config, class_names, area_to_faixa=None, camera='camera1', classes=None):
+        """
+        Monta uma única vez a tabela densa (área x classe) -> vehicle_code a partir
+        dos nomes de classe do modelo e das faixas da câmera no arquivo de configuração.
+
+        :param config: Configuração do cliente (codigocliente, cameras, faixas)
+        :param class_names: Nomes das classes do modelo ({class_id: nome} ou lista)
+        :param area_to_faixa: Mapeamento área -> faixa (padrão: AREA_TO_FAIXA)
+        :param camera: Chave da câmera dentro de config['cameras']
+        :param classes: Ids de classe efetivamente contados (só estes são reportados se não mapeados)
+        """
+        self.area_to_faixa = dict(area_to_faixa or AREA_TO_FAIXA)
+        self.area_names = list(self.area_to_faixa.keys())
+        self.area_index = {area: idx for idx, area in enumerate(self.area_names)}
+
+        if not isinstance(class_names, dict):
+            class_names = dict(enumerate(class_names))
+        self.class_names = {int(class_id): name for class_id, name in class_names.items()}
+        self.class_ids = {name: class_id for class_id, name in self.class_names.items()}
+
+        faixas = config['cameras'][camera]['faixas']
+        n_classes = max(self.class_names, default=-1) + 1
+        self.table = np.full((len(self.area_names), n_classes), CODIGO_NAO_MAPEADO, dtype=np.int32)
+        self.unmapped = []
+
+        for area, area_idx in self.area_index.items():
+            faixa = self.area_to_faixa[area]
+            faixa_config = faixas.get(faixa, {})
+            for class_id, class_name in self.class_names.items():
+                for variation in class_name_variations(class_name):
+                    vehicle_code = faixa_config.get(variation)
+                    if vehicle_code is not None:
+                        # Código vazio ("") vira 0: as contagens ignoram os dois
+                        self.table[area_idx, class_id] = int(vehicle_code or 0)
+                        if variation != class_name:
+                            bug_logger.info(f"✅ Mapeamento: '{class_name}' → '{variation}' = {vehicle_code} ({area}/{faixa})")
+                        break
+                else:
+                    if classes is not None and class_id not in classes:
+                        continue
+                    self.unmapped.append((area, faixa, class_id, class_name, list(faixa_config.keys())))
+
+        self._validate(faixas)
+
+    def _validate(self, faixas):
+        """Valida a tabela e reporta (uma única vez) as classes sem mapeamento."""
+        for area, faixa, class_id, class_name, config_keys in self.unmapped:
+            bug_logger.error(
+                f"CLASSE SEM MAPEAMENTO (vehicle_code={CODIGO_NAO_MAPEADO}) | "
+                f"Class YOLO: '{class_name}' (id {class_id}) | "
+                f"Area: {area} | "
+                f"Faixa: {faixa} | "
+                f"Variações testadas: {class_name_variations(class_name)} | "
+                f"Config disponível: {config_keys}"
+            )
+        if self.unmapped:
+            print(f"⚠️ {len(self.unmapped)} combinação(ões) área/classe sem vehicle_code; serão gravadas com {CODIGO_NAO_MAPEADO}.")
+
+        for area, faixa in self.area_to_faixa.items():
+            if faixa not in faixas:
+                bug_logger.error(f"Faixa '{faixa}' (area {area}) não existe no arquivo de configuração.")
+                continue
+            codes = self.table[self.area_index[area]]
+            mapped = codes[codes != CODIGO_NAO_MAPEADO]
+            if len(np.unique(mapped)) != len(mapped):
+                bug_logger.warning(f"Faixa '{faixa}' (area {area}) tem o mesmo vehicle_code para classes diferentes: {codes.tolist()}")
+
+    def code(self, area_name, class_id):
+        """
+        Retorna o vehicle_code para a área e o id de classe, ou None se a área não tiver faixa.
+        Classes sem mapeamento retornam CODIGO_NAO_MAPEADO; classes mapeadas para 0 (ou vazio)
+        retornam 0.
+        """
+        area_idx = self.area_index.get(area_name)
+        if area_idx is None:
+            return None
+        if not 0 <= class_id < self.table.shape[1]:
+            return CODIGO_NAO_MAPEADO
+        return int(self.table[area_idx, class_id])
+
+    def code_by_name(self, area_name, class_name):
+        """Mesma consulta de code(), a partir do nome da classe (usado nas contagens por tipo)."""
+        class_id = self.class_ids.get(class_name)
+        if class_id is None:
+            return None if area_name not in self.area_index else CODIGO_NAO_MAPEADO
+        return self.code(area_name, class_id)
@@ -0,0 +1,164 @@
+# Janela (s) em que uma saída sem tempo registrada pela contagem recebe o tempo de
+# permanência do mesmo veículo em vez de gerar um novo registro
+# (CORREÇÃO 1.3: 600s -> 1800s para trânsito lento ou processamento atrasado)
+JANELA_SAIDA_PENDENTE = 1800
+
+# SQL fixo: o sqlite3 mantém um cache de statements preparados por texto da consulta,
+# então cada chamada reaproveita o statement já compilado
+_CRIAR_VEHICLE_COUNTS = '''CREATE TABLE IF NOT EXISTS vehicle_counts (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      area TEXT,
+                      vehicle_code INTEGER,
+                      count_in INTEGER,
+                      count_out INTEGER,
+                      timestamp TEXT,
+                      tempo_permanencia FLOAT)'''
+_CRIAR_EXPORT_LOG = '''CREATE TABLE IF NOT EXISTS export_log (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      last_export TEXT)'''
+# Quanto de cada contador acumulado do ObjectCounter4 já virou linha em vehicle_counts
+# (contador_eventos.ContadorEventos), gravado na mesma transação dessas linhas
+_CRIAR_CONTADOR_OFFSETS = '''CREATE TABLE IF NOT EXISTS contador_offsets (
+                      fonte TEXT NOT NULL,
+                      area TEXT NOT NULL,
+                      vehicle_type TEXT NOT NULL,
+                      direcao TEXT NOT NULL,
+                      consumido INTEGER NOT NULL,
+                      ultimo_evento_id INTEGER NOT NULL,
+                      PRIMARY KEY (fonte, area, vehicle_type, direcao))'''
+# Colunas adicionadas depois da criação original da tabela
+_COLUNAS_ADICIONAIS = {
+    'tempo_permanencia': 'ALTER TABLE vehicle_counts ADD COLUMN tempo_permanencia FLOAT',
+    'enviado': 'ALTER TABLE vehicle_counts ADD COLUMN enviado INTEGER DEFAULT 0',
+}
+
+_INSERIR_EVENTO = '''INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado)
+                     VALUES (?, ?, ?, ?, ?, NULL, 0)'''
+_SAIDA_PENDENTE = f'''SELECT id FROM vehicle_counts
+                      WHERE area = ? AND vehicle_code = ? AND count_out = 1
+                        AND tempo_permanencia IS NULL
+                        AND datetime(timestamp) >= datetime(?, '-{JANELA_SAIDA_PENDENTE} seconds')
+                      ORDER BY id DESC LIMIT 1'''
+_ATUALIZAR_PERMANENCIA = '''UPDATE vehicle_counts
+                            SET tempo_permanencia = ?, timestamp = ?, enviado = 0
+                            WHERE id = ?'''
+_INSERIR_PERMANENCIA = '''INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado)
+                          VALUES (?, ?, 0, 1, ?, ?, 0)'''
+_LER_OFFSETS = '''SELECT area, vehicle_type, direcao, consumido, ultimo_evento_id
+                  FROM contador_offsets WHERE fonte = ?'''
+_GRAVAR_OFFSET = '''INSERT OR REPLACE INTO contador_offsets (fonte, area, vehicle_type, direcao, consumido, ultimo_evento_id)
+                    VALUES (?, ?, ?, ?, ?, ?)'''
+
+
+class VehicleCountsRepository:
+    def __init__(self, conn):
+        """
+        Gravações na tabela vehicle_counts (dona do schema e dos statements).
+
+        Os eventos de contagem de um frame são gravados com um único executemany e
+        um único commit. Os métodos que inserem devolvem os ids criados: dentro da
+        transação apenas esta conexão escreve, então os ids AUTOINCREMENT de um
+        executemany são consecutivos e terminam em last_insert_rowid().
+
+        :param conn: Conexão SQLite de escrita (conexao_db.abrir_escrita / init_db)
+        """
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def ensure_schema(self):
+        """
+        Cria vehicle_counts/export_log/contador_offsets e adiciona as colunas que faltarem.
+
+        :return: Lista das colunas adicionadas
+        """
+        self.cursor.execute(_CRIAR_VEHICLE_COUNTS)
+        self.cursor.execute(_CRIAR_EXPORT_LOG)
+        self.cursor.execute(_CRIAR_CONTADOR_OFFSETS)
+        existentes = {column[1] for column in self.cursor.execute('PRAGMA table_info(vehicle_counts)').fetchall()}
+        adicionadas = [coluna for coluna in _COLUNAS_ADICIONAIS if coluna not in existentes]
+        for coluna in adicionadas:
+            self.cursor.execute(_COLUNAS_ADICIONAIS[coluna])
+        self.conn.commit()
+        return adicionadas
+
+    def _ultimos_ids(self, n):
+        ultimo = self.conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return list(range(ultimo - n + 1, ultimo + 1))
+
+    def record_events(self, events, commit=True):
+        """
+        Grava eventos de contagem (uma linha por veículo) em um único executemany.
+
+        :param events: Lista de (area, vehicle_code, count_in, count_out, timestamp)
+        :param commit: Faz commit ao final (False para agrupar com outras gravações)
+        :return: Ids criados, na ordem de events
+        """
+        if not events:
+            return []
+        self.cursor.executemany(_INSERIR_EVENTO, events)
+        ids = self._ultimos_ids(len(events))
+        if commit:
+            self.conn.commit()
+        return ids
+
+    def record_entries(self, area, vehicle_code, n, timestamp, commit=True):
+        """Grava n entradas (count_in=1) da área/código no timestamp. Retorna os ids criados."""
+        return self.record_events([(area, vehicle_code, 1, 0, timestamp)] * n, commit=commit)
+
+    def record_exits(self, area, vehicle_code, n, timestamp, commit=True):
+        """Grava n saídas sem tempo (count_out=1) da área/código no timestamp. Retorna os ids criados."""
+        return self.record_events([(area, vehicle_code, 0, 1, timestamp)] * n, commit=commit)
+
+    def record_dwell(self, area, vehicle_code, timestamp, seconds, commit=True):
+        """
+        Grava o tempo de permanência de um veículo: completa a saída sem tempo mais
+        recente da mesma área/código dentro de JANELA_SAIDA_PENDENTE (registrada pela
+        contagem) ou, se não houver, insere uma saída já com o tempo.
+
+        :param area: Nome da área
+        :param vehicle_code: Código do veículo (-1 se desconhecido)
+        :param timestamp: Horário de saída ('%Y-%m-%d %H:%M:%S')
+        :param seconds: Tempo de permanência em segundos
+        :param commit: Faz commit ao final
+        :return: (id do registro, True se atualizou uma saída existente)
+        """
+        row = self.cursor.execute(_SAIDA_PENDENTE, (area, vehicle_code, timestamp)).fetchone()
+        if row:
+            record_id = row[0]
+            self.cursor.execute(_ATUALIZAR_PERMANENCIA, (seconds, timestamp, record_id))
+        else:
+            self.cursor.execute(_INSERIR_PERMANENCIA, (area, vehicle_code, timestamp, seconds))
+            record_id = self.cursor.lastrowid
+        if commit:
+            self.conn.commit()
+        return record_id, bool(row)
+
+    def load_counter_offsets(self, fonte):
+        """
+        Lê os offsets do contador da fonte gravados no último commit.
+
+        :param fonte: Identificador da câmera
+        :return: ({(area, vehicle_type, direcao): consumido}, {(area, vehicle_type, direcao): ultimo_evento_id})
+        """
+        consumido, ultimo_evento = {}, {}
+        for area, vehicle_type, direcao, valor, evento_id in self.cursor.execute(_LER_OFFSETS, (fonte,)).fetchall():
+            consumido[(area, vehicle_type, direcao)] = valor
+            ultimo_evento[(area, vehicle_type, direcao)] = evento_id
+        return consumido, ultimo_evento
+
+    def save_counter_offsets(self, fonte, offsets, commit=True):
+        """
+        Grava os offsets do contador da fonte. Use commit=False para gravar na mesma
+        transação das linhas de record_events que eles cobrem.
+
+        :param fonte: Identificador da câmera
+        :param offsets: Lista de (area, vehicle_type, direcao, consumido, ultimo_evento_id)
+        :param commit: Faz commit ao final
+        """
+        if offsets:
+            self.cursor.executemany(_GRAVAR_OFFSET, [(fonte, *offset) for offset in offsets])
+        if commit:
+            self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
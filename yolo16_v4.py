@@ -6,46 +6,32 @@ from datetime import datetime, timedelta
 import argparse
 from ultralytics import YOLO
 from ultralytics.solutions import object_counter4
-from ultralytics.utils.plotting import Annotator
 import torch
-import sqlite3
 import logging
-from shapely.geometry import Polygon, Point
-import numpy as np
 import threading  # Importar threading
 import queue  # Importar queue para comunicar entre as threads
-from permanence_tracker import PermanenceTracker
+from permanence_tracker import PermanenceTracker, ArrayPermanenceTracker
 from label_manager import draw_labels
-
-
-# Configurar o logger para salvar erros em um arquivo
-error_log_file = "error_log.txt"
-logging.basicConfig(
-    filename=error_log_file,
-    level=logging.ERROR,
-    format="%(asctime)s - ERROR - %(message)s"
-)
-
+from vehicle_code_resolver import VehicleCodeResolver
+from pipeline_contagem import PipelineContagem, init_db
+from registro_deteccoes import GravadorDeteccoes
+from arquivo_deteccoes import ArquivoDeteccoes
+from checkpoint_wal import AUTOCHECKPOINT_PADRAO, CheckpointWAL
+from conexao_db import PERFIL_PADRAO, PERFIS_PRAGMAS
+from frame_clock import FrameClock
+from log_config import configurar_logging, destinos_da_camera, parse_niveis
+from metricas_camera import MetricasCamera, ServidorMetricas
+
+
+# Loggers da aplicação. Arquivos, níveis, rotação e limite de taxa são configurados
+# após a leitura dos argumentos (configurar_logging): error_log_<camera>.txt,
+# busca_erro_<camera>.log e bug_vehicle_code_<camera>.log, gravados por uma thread
+# separada do loop de inferência.
 logging.getLogger("ultralytics").setLevel(logging.WARNING)  # Suprime logs de debug e info da YOLO
-# Criar um logger específico para debug de vehicle_code
-# Configurar o logger para salvar os logs em um arquivo
-log_file = "busca_erro.log"
-logging.basicConfig(
-    filename=log_file,
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger("busca_erro")
 
 # 📌 Novo logger para depuração do código do veículo
-bug_log_file = "bug_vehicle_code.log"
 bug_logger = logging.getLogger("bug_vehicle_code")
-bug_handler = logging.FileHandler(bug_log_file)
-bug_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-bug_handler.setFormatter(formatter)
-bug_logger.addHandler(bug_handler)
-bug_logger.setLevel(logging.DEBUG)
 
 # Verificar se a GPU está disponível
 if torch.cuda.is_available():
@@ -72,51 +58,6 @@ def load_config(file_path):
         config = json.load(f)
     return config
 
-def init_db(db_path):
-    conn = sqlite3.connect(db_path, timeout=10)  # Adiciona timeout de 10 segundos
-    cursor = conn.cursor()
-    
-    # Criar tabela para contagens de veículos
-    cursor.execute('''CREATE TABLE IF NOT EXISTS vehicle_counts (
-                      id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      area TEXT,
-                      vehicle_code INTEGER,
-                      count_in INTEGER,
-                      count_out INTEGER,
-                      timestamp TEXT,
-                      tempo_permanencia FLOAT)''')
-
-    # Criar tabela para exportação de log
-    cursor.execute('''CREATE TABLE IF NOT EXISTS export_log (
-                      id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      last_export TEXT)''')
-    
-    # Garantir colunas na vehicle_counts
-    cursor.execute('''PRAGMA table_info(vehicle_counts)''')
-    columns_vc = [column[1] for column in cursor.fetchall()]
-    if 'tempo_permanencia' not in columns_vc:
-        cursor.execute('''ALTER TABLE vehicle_counts ADD COLUMN tempo_permanencia FLOAT''')
-    if 'enviado' not in columns_vc:
-        cursor.execute('''ALTER TABLE vehicle_counts ADD COLUMN enviado INTEGER DEFAULT 0''')
-    
-    conn.commit()
-    return conn, cursor
-
-# Função utilitária para retry em operações de escrita no banco
-import time
-
-def safe_execute(cursor, query, params=(), max_retries=5, delay=0.5):
-    for attempt in range(max_retries):
-        try:
-            cursor.execute(query, params)
-            return True
-        except sqlite3.OperationalError as e:
-            if 'database is locked' in str(e):
-                time.sleep(delay)
-            else:
-                raise
-    raise sqlite3.OperationalError('database is locked (após múltiplas tentativas)')
-
 def get_average_area_time(cursor, area):
     """
     Retorna o tempo médio de permanência de uma área baseado nos registros recentes.
@@ -213,110 +154,6 @@ def has_count_changed(area, vehicle_code, count_in, count_out, cursor):
     
     return False  # Nenhuma mudança
 
-# Função para salvar contagens no banco de dados com tempo de permanência
-def save_counts_to_db(area_counts, cursor, conn, previous_counts, config, im0, tracker):
-    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    area_to_faixa = {
-        'area_1': 'faixa1',
-        'area_2': 'faixa2'
-    }
-
-    for area, counts in area_counts.items():
-        faixa = area_to_faixa.get(area)
-        if not faixa:
-            logger.warning(f'Faixa nao encontrada para a area {area}')
-            continue
-
-        for vehicle_type, type_counts in counts['types'].items():
-            faixa_config = config['cameras']['camera1']['faixas'].get(faixa, {})
-
-            # 🔧 CORREÇÃO: Melhor mapeamento com múltiplas variações
-            type_variations = [
-                vehicle_type,                              # Original
-                vehicle_type.rstrip('s'),                  # Sem 's' final
-                vehicle_type + 's',                        # Com 's' final
-                vehicle_type.replace('cycle', 'cycles'),   # Plural irregular
-                vehicle_type.replace('cycles', 'cycle')    # Singular irregular
-            ]
-
-            vehicle_code = None
-            for variation in type_variations:
-                vehicle_code = faixa_config.get(variation)
-                if vehicle_code is not None:
-                    if variation != vehicle_type:
-                        bug_logger.info(f"✅ Mapeamento counts: '{vehicle_type}' → '{variation}' = {vehicle_code}")
-                    break
-
-            if not vehicle_code:
-                logger.warning(f'Codigo de veiculo nao encontrado para {vehicle_type} na faixa {faixa}')
-                bug_logger.error(
-                    f"CODIGO NAO ENCONTRADO em save_counts_to_db | "
-                    f"Vehicle Type: '{vehicle_type}' | "
-                    f"Faixa: {faixa} | "
-                    f"Variações testadas: {type_variations} | "
-                    f"Config disponível: {list(faixa_config.keys())}"
-                )
-                continue
-
-            count_in = type_counts['in']
-            count_out = type_counts['out']
-
-            state = previous_counts.setdefault(area, {}).setdefault(vehicle_code, {'in': 0, 'out': 0})
-            prev_in = state.get('in', 0)
-            prev_out = state.get('out', 0)
-
-            if count_in < prev_in:
-                bug_logger.info(f'RESET de entrada detectado (area {area}, codigo {vehicle_code}): {prev_in} -> {count_in}')
-                prev_in = count_in
-                state['in'] = count_in
-            if count_out < prev_out:
-                bug_logger.info(f'RESET de saida detectado (area {area}, codigo {vehicle_code}): {prev_out} -> {count_out}')
-                prev_out = count_out
-                state['out'] = count_out
-
-            if count_in > prev_in:
-                delta_in = count_in - prev_in
-                authorize_vehicle('CROSSING_EVENT', area, vehicle_code, (0, 0), datetime.now())
-
-                try:
-                    insert_entry = (
-                        """INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado)
-                               VALUES (?, ?, 1, 0, ?, NULL, 0)"""
-                    )
-                    for _ in range(delta_in):
-                        ts_now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        safe_execute(cursor, insert_entry, (area, vehicle_code, ts_now))
-                    conn.commit()
-                    bug_logger.info(f'ENTRADA(S) SALVA(S) -> Area: {area}, Codigo: {vehicle_code}, Qtde: {delta_in}')
-                except Exception as e:
-                    logger.error(f'Falha ao salvar ENTRADA em vehicle_counts (Area: {area}, Codigo: {vehicle_code}): {e}')
-
-                state['in'] = count_in
-                bug_logger.info(f'ENTRADA AUTORIZADA -> Area: {area}, Codigo: {vehicle_code}')
-            else:
-                state['in'] = count_in
-
-            if count_out > prev_out:
-                delta_out = count_out - prev_out
-
-                try:
-                    insert_exit = (
-                        """INSERT INTO vehicle_counts (area, vehicle_code, count_in, count_out, timestamp, tempo_permanencia, enviado)
-                               VALUES (?, ?, 0, 1, ?, NULL, 0)"""
-                    )
-                    for _ in range(delta_out):
-                        ts_now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        safe_execute(cursor, insert_exit, (area, vehicle_code, ts_now))
-                    conn.commit()
-                    bug_logger.info(f'SAIDA(S) SALVA(S) -> Area: {area}, Codigo: {vehicle_code}, Qtde: {delta_out}')
-                except Exception as e:
-                    logger.error(f'Falha ao salvar SAIDA em vehicle_counts (Area: {area}, Codigo: {vehicle_code}): {e}')
-
-                state['out'] = count_out
-            else:
-                state['out'] = count_out
-
 # FUNÇÃO DESATIVADA - Agora apenas o permanence_tracker salva na vehicle_counts
 # Isso garante regra 1:1 sem duplicações
 def save_permanence_to_vehicle_counts(cursor, conn, area, vehicle_code, timestamp, tempo_permanencia):
@@ -334,6 +171,15 @@ def start_new_video_writer(output_width, output_height, effective_fps):
     video_writer = cv2.VideoWriter(video_filepath, cv2.VideoWriter_fourcc(*'mp4v'), effective_fps, (output_width, output_height))
     return video_writer, video_filepath
 
+def fechar_registro(registro):
+    """Fecha um registro de auditoria (gravador ou arquivo de detecções) sem derrubar o processo; retorna None."""
+    if registro is not None:
+        try:
+            registro.close()
+        except OSError as e:
+            logger.error(f"Falha ao fechar {type(registro).__name__}: {e}")
+    return None
+
 # Função para verificar mudanças nas contagens
 def counts_changed(current_counts, last_counts):
     if last_counts is None:
@@ -358,8 +204,40 @@ parser.add_argument('--output_width', type=int, default=320, help='Largura do v
 parser.add_argument('--output_height', type=int, default=240, help='Altura do vídeo de saída.')
 parser.add_argument('--db_path', type=str, required=True, help='Caminho para o arquivo SQLite (.db).')  # Adicionar o argumento para o banco de dados
 parser.add_argument('--permanencia_config_path', type=str, required=True, help='Caminho para o arquivo JSON com as áreas para o tempo de permanência.')
+parser.add_argument('--track_store', type=str, choices=['dict', 'array'], default='dict', help='Armazenamento do estado dos tracks ativos: dict (padrão) ou array (NumPy pré-alocado).')
+parser.add_argument('--record', type=str, default=None, help='Grava as detecções de cada frame processado em um log binário colunar para replay_deteccoes.py; cada execução cria um segmento novo (data/hora e pid no nome), sem sobrescrever os anteriores.')
+parser.add_argument('--archive_dir', type=str, default=None, help='Diretório do arquivo de auditoria das detecções (um arquivo mapeado em memória por câmera por dia).')
+parser.add_argument('--archive_camera', type=str, default=None, help='Nome da câmera no arquivo de auditoria (padrão: nome do arquivo de configuração).')
+parser.add_argument('--sqlite_perfil', type=str, choices=sorted(PERFIS_PRAGMAS), default=PERFIL_PADRAO, help='Perfil de PRAGMAs do SQLite aplicado na abertura do banco (ver conexao_db.PERFIS_PRAGMAS).')
+parser.add_argument('--wal_checkpoint_interval', type=float, default=30, help='Intervalo (segundos) dos checkpoints do WAL feitos em thread própria; 0 mantém o auto-checkpoint do SQLite no loop de inferência.')
+parser.add_argument('--log_level', type=str, action='append', default=[], metavar='LOGGER=NIVEL[:LIMITE]', help='Nível (e opcionalmente o limite de mensagens por janela) de um logger, ex.: busca_erro=WARNING ou bug_vehicle_code=INFO:50. Pode ser repetido; use root para o logger raiz.')
+parser.add_argument('--log_max_mb', type=float, default=50, help='Tamanho máximo (MB) de cada arquivo de log antes da rotação.')
+parser.add_argument('--log_backups', type=int, default=5, help='Quantidade de arquivos de log rotacionados mantidos.')
+parser.add_argument('--log_rate', type=int, default=10, help='Máximo de mensagens por ponto de log a cada --log_rate_window segundos (0 desativa o limite; o bug_vehicle_code, trilha de auditoria das contagens, não é limitado).')
+parser.add_argument('--log_rate_window', type=float, default=60, help='Janela (segundos) do limite de taxa dos logs.')
+parser.add_argument('--metrics_port', type=int, default=0, help='Porta do endpoint HTTP de métricas (formato Prometheus, GET /metrics) servido por uma thread própria; 0 desativa.')
+parser.add_argument('--metrics_host', type=str, default='127.0.0.1', help='Endereço de escuta do endpoint de métricas (padrão: apenas local).')
+parser.add_argument('--log_sample', type=int, default=0, help='Após o limite, registra 1 a cada N mensagens suprimidas (0 = suprime todas).')
 args = parser.parse_args()
 
+# Nome da câmera (arquivo de configuração sem '_config'): identifica os arquivos de log,
+# os offsets do contador no banco (os totais do contador são restaurados deles após um reinício), o arquivo de auditoria e as métricas
+camera_nome = os.path.splitext(os.path.basename(args.config_path))[0].replace('_config', '')
+
+# Logging assíncrono (QueueHandler/QueueListener) com rotação e limite de taxa; um
+# conjunto de arquivos por câmera (os processos compartilham o diretório da aplicação)
+log_niveis, log_limites = parse_niveis(args.log_level)
+configurar_logging(
+    destinos=destinos_da_camera(camera_nome),
+    niveis=log_niveis,
+    limites=log_limites,
+    max_bytes=args.log_max_mb * 1024 * 1024,
+    backups=args.log_backups,
+    limite=args.log_rate,
+    janela=args.log_rate_window,
+    amostragem=args.log_sample,
+)
+
 # Inicializar o modelo YOLO
 model = YOLO(args.model_path)
 
@@ -413,6 +291,9 @@ classes_to_count = [0,1,2,3,4]
 # Classe 3 = caminhão
 # classe 4 = vuc 
 
+# Tabela (área x classe) -> vehicle_code montada uma única vez a partir de model.names
+resolver = VehicleCodeResolver(config, model.names, area_to_faixa, classes=classes_to_count)
+
 # Inicializar contador de objetos
 counter = object_counter4.ObjectCounter4(config)
 counter.set_args(view_img=True,
@@ -429,35 +310,57 @@ vehicles_crossed_line = {}  # Formato: {track_id: {"vehicle_code": vehicle_code,
 
 # Inicializa o banco de dados
 # Inicializa o banco de dados com o caminho fornecido
-conn, cursor = init_db(args.db_path)
-# CORREÇÃO 1.2: Usar WAL (Write-Ahead Logging) ao invés de DELETE para melhor performance e menos locks
-cursor.execute('PRAGMA journal_mode=WAL;')
-logger.info(f"Banco de dados inicializado em {args.db_path} com WAL ativado.")
-
-# Variável para armazenar as últimas contagens
-previous_counts = {}
-
-# SISTEMA DE AUTORIZAÇÃO - Apenas veículos que cruzaram linha podem ter tempo de permanência
-authorized_vehicles = {
-    'vehicle_ids': set(),  # IDs autorizados
-    'recent_crossings': [],  # Lista: [(timestamp, area, vehicle_code, last_position)]
-    'lost_vehicles': {}  # Veículos perdidos: {area: [(timestamp, vehicle_code, last_position)]}
-}
+# CORREÇÃO 1.2: WAL (Write-Ahead Logging) ao invés de DELETE para melhor performance e menos locks;
+# o perfil de PRAGMAs (WAL, synchronous, cache, busy_timeout) é aplicado pelo init_db
+conn, cursor = init_db(args.db_path, perfil=args.sqlite_perfil)
+logger.info(f"Banco de dados inicializado em {args.db_path} com o perfil '{args.sqlite_perfil}'.")
+
+# Checkpoints do WAL fora do loop de inferência: o auto-checkpoint desta conexão é desligado.
+# Entre as câmeras que compartilham o banco, só a que detém o lock de arquivo faz os checkpoints.
+checkpoint_wal = None
+if args.wal_checkpoint_interval > 0:
+    cursor.execute('PRAGMA wal_autocheckpoint=0;')
+    checkpoint_wal = CheckpointWAL(args.db_path, intervalo=args.wal_checkpoint_interval)
+    checkpoint_wal.start()
+
+# Relógio do caminho de tracking: um timestamp monotônico por frame + âncora de parede
+clock = FrameClock()
+
+# Métricas do loop (contadores sem lock) expostas em HTTP por uma thread própria
+metricas = MetricasCamera(camera_nome) if args.metrics_port > 0 else None
+
+if args.track_store == 'array':
+    tracker = ArrayPermanenceTracker(cursor, conn, config['codigocliente'], permanencia_config, clock=clock, metricas=metricas)
+else:
+    tracker = PermanenceTracker(cursor, conn, config['codigocliente'], permanencia_config, clock=clock, metricas=metricas)
+
+# Etapas do frame (contagem, permanência, autorização, rótulos e gravação) compartilhadas
+# com benchmark_pipeline.py
+pipeline = PipelineContagem(cursor, conn, tracker, resolver, permanencia_areas, counter=counter,
+                            region_points=region_points, second_region_points=second_region_points,
+                            class_names=model.names, client_code=client_code, fps=fps, fonte=camera_nome,
+                            metricas=metricas)
+
+# Registro opcional das detecções para reprocessamento sem inferência (replay_deteccoes.py)
+gravador_deteccoes = None
+if args.record:
+    gravador_deteccoes = GravadorDeteccoes(
+        args.record, model.names, clock, fps=fps, frame_shape=(h, w),
+        extras={'config_path': args.config_path, 'area_config_path': args.area_config_path,
+                'permanencia_config_path': args.permanencia_config_path, 'classes': classes_to_count}
+    )
+    logger.info(f"Gravando detecções em {gravador_deteccoes.caminho}")
 
-tracker = PermanenceTracker(cursor, conn, config['codigocliente'], permanencia_config)
+# Arquivo de auditoria das detecções brutas (consultado com LeitorArquivoDeteccoes)
+arquivo_deteccoes = None
+if args.archive_dir:
+    archive_camera = args.archive_camera or camera_nome
+    arquivo_deteccoes = ArquivoDeteccoes(args.archive_dir, archive_camera, clock)
+    logger.info(f"Arquivando detecções em {args.archive_dir} (câmera {archive_camera})")
 
 # Dicionário para persistência de rótulos dos veículos
 label_persistence = {}
 
-# Função principal
-def desenhar_areas(im0, permanencia_areas):
-    for area_name, area_info in permanencia_areas.items():
-        area_coords = np.array(area_info['coordenadas'], np.int32)
-        area_coords = area_coords.reshape((-1, 1, 2))
-        overlay = im0.copy()
-        cv2.polylines(overlay, [area_coords], isClosed=True, color=(0, 255, 0), thickness=2)
-        cv2.addWeighted(overlay, 0.4, im0, 0.6, 0, im0)  # Ajusta transparência
-
 # Função principal
 frame_count = 0
 
@@ -465,6 +368,17 @@ frame_count = 0
 # CORREÇÃO 1.1: Queue com limite de 100 frames (~8s de buffer) para evitar pulos nos vídeos
 frame_queue = queue.Queue(maxsize=100)
 
+servidor_metricas = None
+if metricas is not None:
+    # Lidos no scrape sem pegar locks do loop (len da deque em vez de qsize())
+    metricas.registrar_medidor('fila_video', 'Frames aguardando a thread de gravação de vídeo.', lambda: len(frame_queue.queue))
+    metricas.registrar_medidor('linhas_pendentes_db', 'Linhas de vehicle_counts aguardando gravação após falha.', pipeline.linhas_pendentes)
+    metricas.registrar_medidor('tracks_ativos', 'Tracks ativos por área de permanência.', tracker.tracks_por_area, rotulo='area')
+    if checkpoint_wal is not None:
+        metricas.registrar_medidor('wal_bytes', 'Tamanho do arquivo -wal do banco da câmera.', checkpoint_wal.tamanho_wal)
+    servidor_metricas = ServidorMetricas(metricas, args.metrics_port, host=args.metrics_host)
+    servidor_metricas.start()
+
 # Função para a thread de gravação de vídeo
 def video_writer_thread(frame_queue):
     current_video_writer = None
@@ -501,113 +415,12 @@ if args.save_video:
     # Envia o video_writer inicial para a thread
     frame_queue.put(('change_writer', video_writer))
 
-# SISTEMA DE AUTORIZAÇÃO - Funções de gerenciamento
-def authorize_vehicle(track_id, area, vehicle_code, position, timestamp):
-    """
-    Autoriza um veículo que cruzou a linha de contagem.
-    """
-    authorized_vehicles['vehicle_ids'].add(track_id)
-    authorized_vehicles['recent_crossings'].append((timestamp, area, vehicle_code, position))
-    
-    # Limpar crossings antigos (mais de 5 minutos)
-    current_time = datetime.now()
-    authorized_vehicles['recent_crossings'] = [
-        crossing for crossing in authorized_vehicles['recent_crossings'] 
-        if (current_time - crossing[0]).total_seconds() < 300
-    ]
-    
-    bug_logger.info(f"AUTORIZADO -> Track {track_id} cruzou linha na {area} (codigo {vehicle_code})")
-
-def check_vehicle_authorization(track_id, area, position, timestamp):
-    """
-    Verifica se um veículo está autorizado a ter tempo de permanência.
-    Retorna: (autorizado: bool, vehicle_code: int)
-    """
-    # 1. AUTORIZAÇÃO PRIMÁRIA: ID já está na lista
-    if track_id in authorized_vehicles['vehicle_ids']:
-        return True, None  # vehicle_code será obtido depois
-    
-    # 2. FALLBACK POR PROXIMIDADE: Novo ID próximo de onde outro desapareceu
-    for lost_timestamp, lost_area, lost_vehicle_code, lost_position in authorized_vehicles.get('lost_vehicles', {}).get(area, []):
-        if (timestamp - lost_timestamp).total_seconds() < 30:  # Máximo 30s de diferença
-            distance = ((position[0] - lost_position[0])**2 + (position[1] - lost_position[1])**2)**0.5
-            if distance < 100:  # Máximo 100 pixels de distância
-                # Transferir autorização
-                authorized_vehicles['vehicle_ids'].add(track_id)
-                bug_logger.info(f"AUTORIZADO POR PROXIMIDADE -> Track {track_id} (similar ao perdido na {area})")
-                return True, lost_vehicle_code
-    
-    # 3. FALLBACK TEMPORAL: Crossing recente na área
-    current_time = datetime.now()
-    for crossing_timestamp, crossing_area, vehicle_code, crossing_position in authorized_vehicles['recent_crossings']:
-        if crossing_area == area and (current_time - crossing_timestamp).total_seconds() < 60:  # 60s de janela
-            authorized_vehicles['vehicle_ids'].add(track_id)
-            bug_logger.info(f"AUTORIZADO TEMPORAL -> Track {track_id} na {area} (crossing recente)")
-            return True, vehicle_code
-    
-    # 4. NÃO AUTORIZADO
-    bug_logger.warning(f"NAO AUTORIZADO -> Track {track_id} na {area} (nao cruzou linha)")
-    return False, None
-
-def handle_lost_vehicle(track_id, area, vehicle_code, position, timestamp):
-    """
-    Registra um veículo autorizado que foi perdido (para matching posterior).
-    """
-    if area not in authorized_vehicles['lost_vehicles']:
-        authorized_vehicles['lost_vehicles'][area] = []
-    
-    authorized_vehicles['lost_vehicles'][area].append((timestamp, area, vehicle_code, position))
-    
-    # Limitar histórico a 10 veículos perdidos por área
-    authorized_vehicles['lost_vehicles'][area] = authorized_vehicles['lost_vehicles'][area][-10:]
-    
-    bug_logger.info(f"VEICULO PERDIDO -> Track {track_id} na {area} (registrado para matching)")
-
-def get_vehicle_code(area_detectada, class_name, config):
-    """
-    Retorna o código do veículo baseado na área detectada e na classe.
-    🔧 CORREÇÃO: Suporta múltiplas variações de plural/singular.
-    """
-    faixa_map = {"area_1": "faixa1", "area_2": "faixa2"}
-    faixa_detectada = faixa_map.get(area_detectada, None)
-
-    if faixa_detectada:
-        faixa_config = config["cameras"]["camera1"]["faixas"].get(faixa_detectada, {})
-
-        # 🔧 CORREÇÃO: Tentar múltiplas variações
-        class_variations = [
-            class_name,                              # Original
-            class_name.rstrip('s'),                  # Sem 's' final
-            class_name + 's',                        # Com 's' final
-            class_name.replace('cycle', 'cycles'),   # Plural irregular
-            class_name.replace('cycles', 'cycle')    # Singular irregular
-        ]
-
-        for variation in class_variations:
-            vehicle_code = faixa_config.get(variation)
-            if vehicle_code is not None:
-                if variation != class_name:
-                    bug_logger.info(f"✅ Mapeamento get_vehicle_code: '{class_name}' → '{variation}' = {vehicle_code}")
-                return vehicle_code
-
-    # Se não encontrou nenhuma variação
-    config_keys = list(config["cameras"]["camera1"]["faixas"].get(faixa_detectada, {}).keys()) if faixa_detectada else []
-    bug_logger.error(
-        f"VEHICLE_CODE=-1 em get_vehicle_code | "
-        f"Class: '{class_name}' | "
-        f"Area: {area_detectada} | "
-        f"Faixa: {faixa_detectada} | "
-        f"Config disponível: {config_keys}"
-    )
-    print(f"Código do veículo não encontrado para '{class_name}' na área '{area_detectada}' (faixa: {faixa_detectada}). Usando -1.")
-    return -1  # Retorna -1 caso não seja encontrado
-
-
-
 while True:
     success, im0 = cap.read()
     if not success:
         logger.warning("Falha ao capturar o quadro, tentando reconectar...")
+        if metricas is not None:
+            metricas.registrar_reconexao()
         cap.release()
         cap = read_video(args.video_path)
         continue
@@ -626,172 +439,45 @@ while True:
                 frames_written = 0
         continue
 
-    current_timestamp = datetime.now()
+    # Timestamp monotônico único do frame (usado por tracker, autorização e gravação)
+    current_timestamp = clock.tick()
 
     # Realizar inferência com YOLOv8 e rastreamento
+    inicio_inferencia = time.perf_counter()
     results = model.track(im0, persist=True, stream=True, show=False, classes=classes_to_count, conf=0.60, imgsz=1024)
     tracks = list(results)  # Converter o gerador para lista
+    if metricas is not None:
+        metricas.registrar_frame(time.perf_counter() - inicio_inferencia)
 
-    # Criar um único Annotator para desenhar rótulos personalizados
-    annotator = Annotator(im0, line_width=2, example=str(model.names))
-
-    # Desenhar as áreas de permanência
-    desenhar_areas(im0, permanencia_areas)
-
-    # Desenhar as linhas de contagem para área 1 e área 2
-    im0 = counter.start_counting(im0, tracks, region_points, 'area_1', fps=fps)
-    if second_region_points:
-        im0 = counter.start_counting(im0, tracks, second_region_points, 'area_2', fps=fps)
-
-    # Atualizar os tempos de permanência no tracker
-    tracker.calculate_permanence(tracks, current_timestamp)
-
-    # Processar cada track e adicionar rótulos personalizados com tempo de permanência
-    for track in tracks:
-        if hasattr(track, 'boxes') and track.boxes is not None:
-            if track.boxes.id is not None and track.boxes.xyxy is not None and track.boxes.cls is not None:
-                for box, track_id_tensor, class_id_tensor in zip(
-                    track.boxes.xyxy.cpu(), track.boxes.id.cpu(), track.boxes.cls.cpu()
-                ):
-                    x1, y1, x2, y2 = map(int, box.tolist())
-                    track_id = int(track_id_tensor.item())
-                    class_id = int(class_id_tensor.item())
-                    class_name = model.names[class_id]  # Nome da classe detectada (motorcycle, cars, etc.)
-
-                    vehicle_code = None   # Inicializa como None antes da busca
-
-                    # Descobrir em qual área/faixa o veículo está
-                    area_detectada = None
-                    for area_name, area_info in permanencia_areas.items():
-                        polygon_area = Polygon(area_info['coordenadas'])
-                        centro_x = float((box[0] + box[2]) / 2)
-                        centro_y = float((box[1] + box[3]) / 2)
-                        centro = Point(centro_x, centro_y)
-
-                        if polygon_area.contains(centro):
-                            area_detectada = area_name
-                            break  # Assim que encontrar a área, podemos sair do loop
-
-                    # 🔹 VERIFICAÇÃO: Se `area_detectada` for None, pula para o próximo track
-                    if area_detectada is None:
-                        logger.warning(f"Track ID {track_id} não está dentro de nenhuma área válida. Pulando para o próximo veículo.")
-                        continue  # Ignora esse veículo e passa para o próximo
-                    
-                    # CORREÇÃO 2.1: Relaxar autorização (conservadora) - permite tempo de permanência mesmo sem crossing
-                    # Mantém o sistema de autorização para tracking, mas não descarta veículos não autorizados
-                    # Isso resolve o problema de contagens baixas causadas por veículos descartados
-                    center_position = (centro_x, centro_y)
-                    is_authorized, fallback_vehicle_code = check_vehicle_authorization(track_id, area_detectada, center_position, current_timestamp)
-
-                    if not is_authorized:
-                        # MUDANÇA: Ao invés de descartar, apenas loga e continua processando
-                        logger.info(f"Track ID {track_id} na {area_detectada} sem autorização formal - mas permitindo tempo de permanência")
-                        # NÃO descarta mais: permite que o veículo seja rastreado para permanência
-
-                    # Se a área ainda não foi inicializada no tracker, criamos ela
-                    if area_detectada not in tracker.permanence_data:
-                        tracker.permanence_data[area_detectada] = {
-                            "timestamps": {}, "last_seen": {}, "processed": set(), "vehicle_codes": {}
-                        }
-                        print(f"🟢 Criando estrutura de dados para a área {area_detectada}")
-
-
-                    # 🔹 ADICIONANDO VERIFICAÇÃO: Se `vehicle_codes` ainda não existe, criamos o dicionário
-                    if "vehicle_codes" not in tracker.permanence_data[area_detectada]:
-                        tracker.permanence_data[area_detectada]["vehicle_codes"] = {}
-
-                    # Se o veículo ainda não tiver um código armazenado, buscamos um novo
-                    if track_id not in tracker.permanence_data[area_detectada]["vehicle_codes"]:
-                        faixa_map = {"area_1": "faixa1", "area_2": "faixa2"}
-                        faixa_detectada = faixa_map.get(area_detectada)
-
-                        if faixa_detectada:
-                            # 🔧 CORREÇÃO: Tentar múltiplas variações de plural/singular
-                            faixa_config = config["cameras"]["camera1"]["faixas"].get(faixa_detectada, {})
-
-                            # Lista de variações para testar (ordem de prioridade)
-                            class_variations = [
-                                class_name,                              # Original (ex: "cars")
-                                class_name.rstrip('s'),                  # Sem 's' final (ex: "car")
-                                class_name + 's',                        # Com 's' final (ex: "motorcycles")
-                                class_name.replace('cycle', 'cycles'),   # Plural irregular (ex: "motorcycles")
-                                class_name.replace('cycles', 'cycle')    # Singular irregular (ex: "motorcycle")
-                            ]
-
-                            vehicle_code = None
-                            for variation in class_variations:
-                                vehicle_code = faixa_config.get(variation)
-                                if vehicle_code is not None:
-                                    if variation != class_name:
-                                        bug_logger.info(f"✅ Mapeamento encontrado: '{class_name}' → '{variation}' = {vehicle_code}")
-                                    break
-
-                        if vehicle_code is None:
-                            logger.warning(f"Não foi possível mapear vehicle_code para {class_name} na {area_detectada} (faixa: {faixa_detectada})")
-                            vehicle_code = -1  # Código de fallback para veículos sem correspondência
-
-                            # 🐛 CORREÇÃO: Log detalhado quando vehicle_code=-1 for atribuído
-                            config_keys = list(config['cameras']['camera1']['faixas'].get(faixa_detectada, {}).keys())
-                            bug_logger.error(
-                                f"VEHICLE_CODE=-1 DETECTADO! | "
-                                f"Track: {track_id} | "
-                                f"Area: {area_detectada} | "
-                                f"Faixa: {faixa_detectada} | "
-                                f"Class YOLO: '{class_name}' | "
-                                f"Variações testadas: {class_variations} | "
-                                f"Config disponível: {config_keys} | "
-                                f"CAUSA: Nenhuma variação da classe YOLO encontrada no mapeamento"
-                            )
-
-                        tracker.permanence_data[area_detectada]['vehicle_codes'][track_id] = vehicle_code
-                        logger.info(f"Veículo {track_id} identificado como {class_name} na {area_detectada} com código {vehicle_code}.")
-
-                    # Obter tempos de permanência
-                    tempos_permanencia = tracker.get_permanence_time(track_id)
-
-                    # Se não encontrou tempo de permanência, loga e continua para o próximo track_id
-                    if not tempos_permanencia:
-                        logger.warning(f"Track ID {track_id} não encontrado em nenhuma área.")
-                        continue
-
-                    # Construir o rótulo personalizado
-                    label = f"{class_name} ID:{track_id}"
-
-                    for area, tempo in tempos_permanencia.items():
-                        label += f" {area}: {tempo:.1f}s"
-
-
-                    # 🚗 Salvar tempo de permanência quando o veículo sair
-                    if tracker.has_vehicle_left(track_id, area_detectada):
-                        vehicle_code = get_vehicle_code(area_detectada, class_name, config)
-
-                        bug_logger.info(f"VEICULO SAIU -> Cliente: {client_code}, Area: {area_detectada}, Veiculo: {track_id}, Codigo: {vehicle_code}, Tempo: {tempo:.2f}s")
-
-                        # A gravação na tabela vehicle_counts é feita pelo PermanenceTracker
-                        # Nenhum insert manual aqui (vehicle_permanence descontinuada)
-                            
-
-                    # Desenhar o rótulo e a bounding box no frame
-                    annotator.box_label((x1, y1, x2, y2), label)
-
-    # Atualizar o frame com o Annotator
-    im0 = annotator.result()
-
-    # Exibe contagens no terminal
-    for area, counts in counter.area_counts.items():
-        for vehicle_type, type_counts in counts['types'].items():
-            logger.info(f"Entrada: {type_counts['in']}, Saída: {type_counts['out']}")
-
-    # Salvamento em tempo real apenas se os valores mudarem
-    try:
-        save_counts_to_db(counter.area_counts, cursor, conn, previous_counts, config, im0, tracker)
-        
-        # A cada 100 frames, tenta atualizar registros NULL com dados da vehicle_permanence
-        if frame_count % 100 == 0:
+    # Registros de auditoria são opcionais: uma falha de disco desativa o registro, não a contagem
+    if gravador_deteccoes is not None:
+        try:
+            gravador_deteccoes.registrar(current_timestamp, tracks)
+        except OSError as e:
+            logger.error(f"Falha ao gravar o log de detecções ({gravador_deteccoes.caminho}); gravação desativada: {e}")
+            gravador_deteccoes = fechar_registro(gravador_deteccoes)
+    if arquivo_deteccoes is not None:
+        try:
+            arquivo_deteccoes.registrar(current_timestamp, tracks)
+        except OSError as e:
+            logger.error(f"Falha ao arquivar detecções em {arquivo_deteccoes.diretorio}; arquivo desativado: {e}")
+            arquivo_deteccoes = fechar_registro(arquivo_deteccoes)
+
+    # Contagem, permanência, rótulos e gravação das contagens no banco
+    im0 = pipeline.processar_frame(im0, tracks, current_timestamp)
+
+    # A cada 100 frames, tenta atualizar registros NULL com dados da vehicle_permanence
+    if frame_count % 100 == 0:
+        # Sem a thread de checkpoint nada mais limita o -wal: volta o auto-checkpoint desta conexão
+        if checkpoint_wal is not None and not checkpoint_wal.ativo():
+            cursor.execute(f'PRAGMA wal_autocheckpoint={AUTOCHECKPOINT_PADRAO};')
+            logger.error("Thread de checkpoint do WAL parou; auto-checkpoint do SQLite religado")
+            checkpoint_wal.stop(truncar=False)
+            checkpoint_wal = None
+        try:
             update_null_permanence_records(cursor, conn)
-            
-    except Exception as e:
-        logger.error(f"Erro ao salvar no banco de dados: {e}")
+        except Exception as e:
+            logger.error(f"Erro ao salvar no banco de dados: {e}")
 
     # Gravação de frames na thread
     if args.save_video:
@@ -816,12 +502,18 @@ while True:
         break
 
 cap.release()
+fechar_registro(gravador_deteccoes)
+fechar_registro(arquivo_deteccoes)
 if args.save_video:
     frame_queue.put(None)
     video_thread.join()
 
 cv2.destroyAllWindows()
+if servidor_metricas is not None:
+    servidor_metricas.stop()
 tracker.close()
+if checkpoint_wal is not None:
+    checkpoint_wal.stop()
 conn.close()
 
 